@@ -423,6 +423,7 @@ exports = module.exports = durableEngine = function () {
         var that = {};
         var actions = {};
         var handle;
+        var timerSample = {time: new Date().getTime(), fired: 0};
         
         that.bind = function (databases) {
             for (var i = 0; i < databases.length; ++i) {
@@ -525,9 +526,29 @@ exports = module.exports = durableEngine = function () {
             return JSON.parse(r.getRulesetState(handle));
         }
 
+        that.getTimerStats = function () {
+            var stats = r.getTimerStats(handle);
+            // the rate is measured since the previous call
+            var now = new Date().getTime();
+            var elapsed = (now - timerSample.time) / 1000;
+            stats.firedPerSecond = elapsed > 0 ? (stats.fired - timerSample.fired) / elapsed : 0;
+            timerSample = {time: now, fired: stats.fired};
+            return stats;
+        };
+
+        that.getTimerWait = function (maxWait) {
+            var nextTimer = r.getTimerStats(handle).nextTimer;
+            if (!nextTimer) {
+                return maxWait;
+            }
+
+            return Math.min(Math.max(nextTimer - new Date().getTime(), 0), maxWait);
+        };
+
         that.dispatchTimers = function (complete) { 
+            // one batch per call, the host keeps calling while timers are due
             try {
-                if (!r.assertTimers(handle)) {
+                if (!r.assertTimers(handle, host.getTimerBatchSize())) {
                     complete(null, true);
                 } else {
                     complete(null, false);
@@ -1110,14 +1131,19 @@ exports = module.exports = durableEngine = function () {
         return branches;
     };
 
-    var host = function (databases, stateCacheSize) {
+    var host = function (databases, stateCacheSize, timerBatchSize) {
         var that = {};
         var rulesDirectory = {};
         var instanceDirectory = {};
         var rulesList = [];
         databases = databases || [{host: 'localhost', port: 6379, password:null, db:0}];
         stateCacheSize = stateCacheSize || 1024;
+        timerBatchSize = Math.max(timerBatchSize || 50, 1);
         
+        that.getTimerBatchSize = function () {
+            return timerBatchSize;
+        };
+
         that.getAction = function (actionName) {
             throw 'Action ' + actionName + ' not found';
         };
@@ -1262,6 +1288,10 @@ exports = module.exports = durableEngine = function () {
             return that.getRuleset(rulesetName).renewActionLease(sid);
         };
 
+        that.getTimerStats = function (rulesetName) {
+            return that.getRuleset(rulesetName).getTimerStats();
+        };
+
         var dispatchRules = function (index, wait) {
             if (!rulesList.length) {
                 setTimeout(dispatchRules, 500, index);
@@ -1307,7 +1337,13 @@ exports = module.exports = durableEngine = function () {
                     }
 
                     if ((index === (rulesList.length -1)) && wait) {
-                        setTimeout(dispatchTimers, 250, (index + 1) % rulesList.length, wait);
+                        // sleep until the earliest timer is due, still polling 
+                        // for timers started elsewhere
+                        var waitTime = 250;
+                        for (var i = 0; i < rulesList.length; ++i) {
+                            waitTime = Math.min(waitTime, rulesList[i].getTimerWait(250));
+                        }
+                        setTimeout(dispatchTimers, waitTime, (index + 1) % rulesList.length, wait);
                     } else {
                         setImmediate(dispatchTimers, (index + 1) % rulesList.length, wait);
                     }
@@ -0,0 +1,207 @@
+import asyncio
+import threading
+import rules
+import os
+import sys
+import traceback
+from . import engine
+
+
+def _set_result(future, result):
+    if not future.done():
+        future.set_result(result)
+
+
+class AsyncRuleset(object):
+
+    def __init__(self, ruleset, host):
+        self._ruleset = ruleset
+        self._host = host
+
+    # the engine calls wait on redis, they run in the loop executor
+    def _start_actions(self, max_count):
+        return rules.start_actions(self._ruleset._handle, max_count)
+
+    def _dispatch_timers(self):
+        return rules.assert_timers(self._ruleset._handle, self._host._timer_batch_size)
+
+    def _delete_state(self, sid):
+        self._ruleset.delete_state(sid)
+
+    async def start_actions(self, max_count):
+        return await asyncio.get_event_loop().run_in_executor(None, self._start_actions, max_count)
+
+    async def dispatch_timers(self):
+        return await asyncio.get_event_loop().run_in_executor(None, self._dispatch_timers)
+
+    async def get_timer_wait(self, max_wait):
+        return await asyncio.get_event_loop().run_in_executor(None, self._ruleset.get_timer_wait, max_wait)
+
+    async def _wait_action(self, future, c, time_left):
+        # the host timer wheel renews the action lease while the action 
+        # is pending, instead of a timer per action
+        entry = self._host._timer_wheel.start(c)
+        try:
+            return await asyncio.wait_for(future, time_left or None)
+        finally:
+            self._host._timer_wheel.cancel(entry)
+
+    async def _run_promise(self, promise, c):
+        loop = asyncio.get_event_loop()
+        while promise:
+            try:
+                if promise._coroutine:
+                    await self._wait_action(asyncio.ensure_future(promise._func(c)), c, None)
+                elif promise._sync:
+                    promise._func(c)
+                else:
+                    future = loop.create_future()
+                    def callback(e, future = future):
+                        loop.call_soon_threadsafe(_set_result, future, e)
+
+                    time_left = promise._func(c, callback)
+                    e = await self._wait_action(future, c, time_left)
+                    if e:
+                        c.s.exception = str(e)
+            except asyncio.TimeoutError:
+                c.s.exception = 'timeout expired'
+                return
+            except asyncio.CancelledError:
+                raise
+            except BaseException as error:
+                c.s.exception = 'exception caught {0}'.format(str(error))
+                if not promise._sync:
+                    return
+
+            promise = promise._next
+
+    async def run_action(self, state, message, action_handle, action_binding):
+        while message:
+            action_name = None
+            for action_name, action_message in message.items():
+                break
+
+            c = engine.Closure(self._host, state, action_message, action_handle, self._ruleset._name)
+            await self._run_promise(self._ruleset._actions[action_name], c)
+            if c._has_completed():
+                return
+
+            try:
+                new_result = await asyncio.get_event_loop().run_in_executor(None, self._ruleset._commit_action, c)
+            except BaseException as error:
+                t, v, tb = sys.exc_info()
+                print('base exception type {0}, value {1}, traceback {2}'.format(t, str(v), traceback.format_tb(tb)))
+                return
+
+            message = None
+            if new_result:
+                message = new_result
+
+            if c._is_deleted():
+                try:
+                    await asyncio.get_event_loop().run_in_executor(None, self._delete_state, c.s.sid)
+                except BaseException as error:
+                    print('Error deleting state {0}'.format(str(error)))
+
+
+class AsyncHost(engine.Host):
+
+    def __init__(self, ruleset_definitions = None, databases = None, state_cache_size = 1024, concurrency = 1000, batch_size = 10, partition_migration = False, state_cache_policy = 'lru', state_cache_buckets = 0, timer_batch_size = 50, connection_pool_size = 4):
+        self._async_rulesets = []
+        self._concurrency = max(concurrency, 1)
+        self._in_flight = 0
+        self._loop = None
+        self._wake = None
+        self._slot = None
+        super(AsyncHost, self).__init__(ruleset_definitions, databases, state_cache_size, batch_size = batch_size, partition_migration = partition_migration, state_cache_policy = state_cache_policy, state_cache_buckets = state_cache_buckets, timer_batch_size = timer_batch_size, connection_pool_size = connection_pool_size)
+
+    def register_rulesets(self, parent_name, ruleset_definitions):
+        ruleset_names = super(AsyncHost, self).register_rulesets(parent_name, ruleset_definitions)
+        for ruleset_name in ruleset_names:
+            self._async_rulesets.append(AsyncRuleset(self._ruleset_directory[ruleset_name], self))
+
+        return ruleset_names
+
+    def _ring(self):
+        if self._execute and self._loop:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def _run_action(self, ruleset, result):
+        try:
+            await ruleset.run_action(*result)
+        except BaseException as error:
+            print('Error running action {0}'.format(str(error)))
+        finally:
+            self._in_flight -= 1
+            self._slot.set()
+
+    async def _dispatch_actions(self):
+        # the actions in flight are bounded, each of them holds
+        # the lease on its session until it commits
+        while self._execute:
+            dispatched = False
+            for ruleset in list(self._async_rulesets):
+                while self._in_flight >= self._concurrency:
+                    self._slot.clear()
+                    await self._slot.wait()
+
+                try:
+                    results = await ruleset.start_actions(min(self._batch_size, self._concurrency - self._in_flight))
+                except BaseException as error:
+                    if str(error).find('306') == -1:
+                        print('Exiting {0}'.format(str(error)))
+                        os._exit(1)
+
+                    continue
+
+                for result in results:
+                    dispatched = True
+                    self._in_flight += 1
+                    asyncio.ensure_future(self._run_action(ruleset, result))
+
+            # the doorbell wakes the loop, polling picks up expired
+            # leases and doorbells lost while pub/sub reconnects
+            if not dispatched:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), 3)
+                except asyncio.TimeoutError:
+                    pass
+
+                self._wake.clear()
+
+    async def _dispatch_timers(self):
+        while self._execute:
+            fired = False
+            for ruleset in list(self._async_rulesets):
+                try:
+                    if await ruleset.dispatch_timers():
+                        fired = True
+                except BaseException as error:
+                    print('Error {0}'.format(str(error)))
+
+            if not fired:
+                wait_time = 1
+                for ruleset in list(self._async_rulesets):
+                    wait_time = min(wait_time, await ruleset.get_timer_wait(wait_time))
+
+                await asyncio.sleep(wait_time)
+
+    async def serve(self):
+        self._loop = asyncio.get_event_loop()
+        self._wake = asyncio.Event()
+        self._slot = asyncio.Event()
+        self._running = True
+        for ruleset in self._ruleset_list:
+            self._start_doorbell(ruleset)
+
+        await asyncio.gather(self._dispatch_actions(), self._dispatch_timers())
+
+    def run(self):
+        def serve():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(self.serve())
+
+        thread = threading.Thread(target = serve)
+        thread.daemon = True
+        thread.start()
@@ -1,7 +1,7 @@
-import json
 import copy
 import rules
 import threading
+import multiprocessing
 import inspect
 import random
 import time
@@ -10,6 +10,8 @@ import os
 import sys
 import traceback
 
+_state_cache_policies = ['lru', 'clock', 'tinylfu']
+
 def _unix_now():
     dt = datetime.datetime.now()
     epoch = datetime.datetime.utcfromtimestamp(0)
@@ -53,10 +55,15 @@ class Closure_Queue(object):
 
 class Closure(object):
 
+    __slots__ = ('ruleset_name', 'host', 's', 'm', '_m', '_content', '_handle', '_timer_directory', 
+                 '_cancelled_timer_directory', '_message_directory', '_queue_directory', '_branch_directory', 
+                 '_fact_directory', '_delete_directory', '_retract_directory', '_completed', '_deleted', '_start_time', '__dict__')
+
     def __init__(self, host, state, message, handle, ruleset_name):
         self.ruleset_name = ruleset_name
         self.host = host
         self.s = Content(state)
+        self._content = {}
         self._handle = handle
         self._timer_directory = {}
         self._cancelled_timer_directory = {}
@@ -72,6 +79,7 @@ class Closure(object):
         if isinstance(message, dict): 
             self._m = message
         else:
+            self._m = None
             self.m = []
             for one_message in message:
                 if ('m' in one_message) and len(one_message) == 1:
@@ -188,15 +196,15 @@ class Closure(object):
         if not 'sid' in fact:
             fact['sid'] = self.s.sid
 
-        if isinstance(fact, Content):
-            fact = copy.deepcopy(fact._d)
-
         fact_list = []
         if  ruleset_name in self._fact_directory:
             fact_list = self._fact_directory[ruleset_name]
         else:
             self._fact_directory[ruleset_name] = fact_list
 
+        if isinstance(fact, Content):
+            fact = fact._share(fact_list)
+
         fact_list.append(fact)
 
     def retract_fact(self, ruleset_name, fact = None):
@@ -207,21 +215,27 @@ class Closure(object):
         if not 'sid' in fact:
             fact['sid'] = self.s.sid
 
-        if isinstance(fact, Content):
-            fact = copy.deepcopy(fact._d)
-
         retract_list = []
         if  ruleset_name in self._retract_directory:
             retract_list = self._retract_directory[ruleset_name]
         else:
             self._retract_directory[ruleset_name] = retract_list
 
+        if isinstance(fact, Content):
+            fact = fact._share(retract_list)
+
         retract_list.append(fact)
 
     def renew_action_lease(self):
+        if self._renew_lease_time():
+            self.host.renew_action_lease(self.ruleset_name, self.s.sid) 
+
+    def _renew_lease_time(self):
         if _unix_now() - self._start_time < 10:
             self._start_time = _unix_now()
-            self.host.renew_action_lease(self.ruleset_name, self.s.sid) 
+            return True
+
+        return False
 
     def _has_completed(self):
         if _unix_now() - self._start_time > 10:
@@ -239,29 +253,70 @@ class Closure(object):
             return None
 
         if name in self._m:
-            return Content(self._m[name])
+            content = self._content.get(name)
+            if content is None:
+                content = Content(self._m[name])
+                self._content[name] = content
+
+            return content
         else:
             return None
 
 class Content(object):
 
+    __slots__ = ('_d', '_parent', '_children', '_shares')
+
     def items(self):
         return self._d.items()
 
-    def __init__(self, data):
-        self._d = data
+    def __init__(self, data, parent = None):
+        object.__setattr__(self, '_d', data)
+        object.__setattr__(self, '_parent', parent)
+        object.__setattr__(self, '_children', None)
+        object.__setattr__(self, '_shares', None)
 
     def __getitem__(self, key):
         if key in self._d:
             data = self._d[key]
             if isinstance(data, dict):
-                data = Content(data)
+                children = self._children
+                if children is None:
+                    children = {}
+                    object.__setattr__(self, '_children', children)
+
+                content = children.get(key)
+                if content is None or content._d is not data:
+                    content = Content(data, self)
+                    children[key] = content
+
+                return content
 
             return data 
         else:
             return None
 
+    def _share(self, target):
+        # the content is copied into the target list only when 
+        # it is written after having been asserted or retracted
+        if self._shares is None:
+            object.__setattr__(self, '_shares', [])
+
+        self._shares.append((target, len(target)))
+        return self._d
+
+    def _copy_shares(self):
+        content = self
+        while content is not None:
+            if content._shares:
+                for target, index in content._shares:
+                    target[index] = copy.deepcopy(content._d)
+
+                object.__setattr__(content, '_shares', None)
+
+            content = content._parent
+
     def __setitem__(self, key, value):
+        self._copy_shares()
         if value == None:
             del self._d[key]
         elif isinstance(value, Content):
@@ -280,7 +335,7 @@ class Content(object):
 
     def __setattr__(self, name, value):
         if name == '_d':
-            self.__dict__['_d'] = value
+            object.__setattr__(self, '_d', value)
         else:
             self.__setitem__(name, value)
 
@@ -297,7 +352,7 @@ class Promise(object):
         self._func = func
         self._next = None
         self._sync = True
-        self._timer = None
+        self._coroutine = hasattr(inspect, 'iscoroutinefunction') and inspect.iscoroutinefunction(func)
         self.root = self
 
         arg_count = func.__code__.co_argcount
@@ -321,17 +376,10 @@ class Promise(object):
         return self._next
 
     def run(self, c, complete):
-        def timeout(max_time):
-            if _unix_now() > max_time:
-                c.s.exception = 'timeout expired'
-                complete(None)
-            else:
-                c.renew_action_lease()
-                self._timer = threading.Timer(5, timeout, (max_time, ))
-                self._timer.daemon = True
-                self._timer.start()
-
-        if self._sync:
+        if self._coroutine:
+            c.s.exception = 'coroutine actions require an AsyncHost'
+            complete(None)
+        elif self._sync:
             try:
                 self._func(c) 
             except BaseException as error:
@@ -345,10 +393,11 @@ class Promise(object):
                 complete(None)
         else:
             try:
+                timer = {}
                 def callback(e):
-                    if self._timer:
-                        self._timer.cancel()
-                        self._timer = None
+                    timer['completed'] = True
+                    if 'entry' in timer:
+                        c.host._timer_wheel.cancel(timer['entry'])
 
                     if e:
                         c.s.exception = str(e) 
@@ -359,10 +408,12 @@ class Promise(object):
                         complete(None)
 
                 time_left = self._func(c, callback)     
-                if time_left:
-                    self._timer = threading.Timer(5, timeout, (_unix_now() + time_left, ))      
-                    self._timer.daemon = True     
-                    self._timer.start()
+                if time_left and not 'completed' in timer:
+                    def timeout():
+                        c.s.exception = 'timeout expired'
+                        complete(None)
+
+                    timer['entry'] = c.host._timer_wheel.start(c, _unix_now() + time_left, timeout)
             except BaseException as error:
                 c.s.exception = 'exception caught {0}'.format(str(error))
                 complete(None)
@@ -410,8 +461,9 @@ class Ruleset(object):
             elif (hasattr(action, '__call__')):
                 self._actions[rule_name] = Promise(action)
 
-        self._handle = rules.create_ruleset(state_cache_size, name, json.dumps(ruleset_definition, ensure_ascii=False))
+        self._handle = rules.create_ruleset(state_cache_size, name, ruleset_definition)
         self._definition = ruleset_definition
+        self._timer_sample = (time.time(), 0)
         
     def bind(self, databases):
         for db in databases:
@@ -427,64 +479,64 @@ class Ruleset(object):
                 rules.bind_ruleset(db['port'], db['db'], db['host'], db['password'], self._handle)
 
     def assert_event(self, message):
-        return rules.assert_event(self._handle, json.dumps(message, ensure_ascii=False))
+        return rules.assert_event(self._handle, message)
 
     def queue_assert_event(self, sid, ruleset_name, message):
         if sid != None: 
             sid = str(sid)
 
-        rules.queue_assert_event(self._handle, sid, ruleset_name, json.dumps(message, ensure_ascii=False))
+        rules.queue_assert_event(self._handle, sid, ruleset_name, message)
 
     def start_assert_event(self, message):
-        return rules.start_assert_event(self._handle, json.dumps(message, ensure_ascii=False))
+        return rules.start_assert_event(self._handle, message)
 
     def assert_events(self, messages):
-        return rules.assert_events(self._handle, json.dumps(messages, ensure_ascii=False))
+        return rules.assert_events(self._handle, messages)
     
     def start_assert_events(self, messages):
-        return rules.start_assert_events(self._handle, json.dumps(messages, ensure_ascii=False))
+        return rules.start_assert_events(self._handle, messages)
 
     def assert_fact(self, fact):
-        return rules.assert_fact(self._handle, json.dumps(fact, ensure_ascii=False))
+        return rules.assert_fact(self._handle, fact)
 
     def queue_assert_fact(self, sid, ruleset_name, message):
         if sid != None: 
             sid = str(sid)
 
-        rules.queue_assert_fact(self._handle, sid, ruleset_name, json.dumps(message, ensure_ascii=False))
+        rules.queue_assert_fact(self._handle, sid, ruleset_name, message)
 
     def start_assert_fact(self, fact):
-        return rules.start_assert_fact(self._handle, json.dumps(fact, ensure_ascii=False))
+        return rules.start_assert_fact(self._handle, fact)
 
     def assert_facts(self, facts):
-        return rules.assert_facts(self._handle, json.dumps(facts, ensure_ascii=False))
+        return rules.assert_facts(self._handle, facts)
 
     def start_assert_facts(self, facts):
-        return rules.start_assert_facts(self._handle, json.dumps(facts, ensure_ascii=False))
+        return rules.start_assert_facts(self._handle, facts)
 
     def retract_fact(self, fact):
-        return rules.retract_fact(self._handle, json.dumps(fact, ensure_ascii=False))
+        return rules.retract_fact(self._handle, fact)
         
     def queue_retract_fact(self, sid, ruleset_name, message):
         if sid != None: 
             sid = str(sid)
 
-        rules.queue_retract_fact(self._handle, sid, ruleset_name, json.dumps(message, ensure_ascii=False))
+        rules.queue_retract_fact(self._handle, sid, ruleset_name, message)
 
     def start_retract_fact(self, fact):
-        return rules.start_retract_fact(self._handle, json.dumps(fact, ensure_ascii=False))
+        return rules.start_retract_fact(self._handle, fact)
 
     def retract_facts(self, facts):
-        return rules.retract_facts(self._handle, json.dumps(facts, ensure_ascii=False))
+        return rules.retract_facts(self._handle, facts)
 
     def start_retract_facts(self, facts):
-        return rules.start_retract_facts(self._handle, json.dumps(facts, ensure_ascii=False))
+        return rules.start_retract_facts(self._handle, facts)
 
     def start_timer(self, sid, timer, timer_duration, manual_reset):
         if sid != None: 
             sid = str(sid)
 
-        rules.start_timer(self._handle, timer_duration, manual_reset, json.dumps(timer, ensure_ascii=False), sid)
+        rules.start_timer(self._handle, timer_duration, manual_reset, timer, sid)
 
     def cancel_timer(self, sid, timer_name):
         if sid != None: 
@@ -494,21 +546,24 @@ class Ruleset(object):
 
     def assert_state(self, state):
         if 'sid' in state:
-            return rules.assert_state(self._handle, str(state['sid']), json.dumps(state, ensure_ascii=False))
+            return rules.assert_state(self._handle, str(state['sid']), state)
         else:
-            return rules.assert_state(self._handle, None, json.dumps(state, ensure_ascii=False))
+            return rules.assert_state(self._handle, None, state)
 
     def get_state(self, sid):
         if sid != None: 
             sid = str(sid)
 
-        return json.loads(rules.get_state(self._handle, sid))
+        return rules.get_state(self._handle, sid)
 
     def delete_state(self, sid):
         if sid != None: 
             sid = str(sid)
 
         rules.delete_state(self._handle, sid)
+
+    def delete_states(self, sids):
+        rules.delete_states(self._handle, [str(sid) for sid in sids])
     
     def renew_action_lease(self, sid):
         if sid != None: 
@@ -516,6 +571,49 @@ class Ruleset(object):
 
         rules.renew_action_lease(self._handle, sid)
 
+    def renew_action_leases(self, sids):
+        rules.renew_action_leases(self._handle, [str(sid) for sid in sids])
+
+    def wait_action(self, timeout):
+        return rules.wait_action(self._handle, timeout)
+
+    def set_partition(self, partition, partitions):
+        rules.set_partition(self._handle, partition, partitions)
+
+    def set_partition_migration(self, migrate):
+        rules.set_partition_migration(self._handle, 1 if migrate else 0)
+
+    def set_state_cache(self, policy, buckets = 0):
+        if policy not in _state_cache_policies:
+            raise Exception('Unknown state cache policy {0}'.format(policy))
+
+        rules.set_state_cache(self._handle, _state_cache_policies.index(policy), buckets)
+
+    def set_connection_pool(self, pool_size):
+        rules.set_connection_pool(self._handle, pool_size)
+
+    def get_state_cache_stats(self):
+        stats = rules.get_state_cache_stats(self._handle)
+        stats['policy'] = _state_cache_policies[stats['policy']]
+        return stats
+
+    def get_timer_stats(self):
+        stats = rules.get_timer_stats(self._handle)
+        # the rate is measured since the previous call
+        now = time.time()
+        sample_time, sample_fired = self._timer_sample
+        elapsed = now - sample_time
+        stats['fired_per_second'] = (stats['fired'] - sample_fired) / elapsed if elapsed > 0 else 0.0
+        self._timer_sample = (now, stats['fired'])
+        return stats
+
+    def get_timer_wait(self, max_wait):
+        next_timer = rules.get_timer_stats(self._handle)['next_timer']
+        if not next_timer:
+            return max_wait
+
+        return min(max(next_timer / 1000.0 - time.time(), 0), max_wait)
+
     def get_definition(self):
         return self._definition
 
@@ -544,47 +642,143 @@ class Ruleset(object):
         return branches
 
     def dispatch_timers(self, complete):
+        # due timers are drained a batch at a time, other calls 
+        # on the ruleset run between batches
+        fired = False
         try:
-            if not rules.assert_timers(self._handle):
-               complete(None, True)
-            else:
-               complete(None, False) 
+            while self._host._execute:
+                result = rules.assert_timers(self._handle, self._host._timer_batch_size)
+
+                if not result:
+                    break
+
+                fired = True
         except Exception as error:
             complete(error, True)
             return
 
+        if not fired:
+           complete(None, True)
+        else:
+           complete(None, False)
+
+    def _get_commit_descriptor(self, c):
+        sid = c.s['sid']
+        if sid != None:
+            sid = str(sid)
+
+        timers = list(c.get_timers().values())
+
+        queued_posts = []
+        queued_asserts = []
+        queued_retracts = []
+        for ruleset_name, q in c.get_queues().items():
+            for queued_list, messages in ((queued_posts, q.get_queued_posts()), (queued_asserts, q.get_queued_asserts()), (queued_retracts, q.get_queued_retracts())):
+                for message in messages:
+                    queued_sid = message['sid']
+                    if queued_sid != None:
+                        queued_sid = str(queued_sid)
+
+                    queued_list.append((queued_sid, ruleset_name, message))
+
+        # the action session is deleted after the commit, 
+        # once its own state has been written
+        deletes = []
+        for ruleset_name, sid_list in c.get_deletes().items():
+            handle = self._host.get_ruleset(ruleset_name)._handle
+            for delete_sid in sid_list:
+                if ruleset_name == self._name and delete_sid == c.s.sid:
+                    continue
+
+                if delete_sid != None:
+                    delete_sid = str(delete_sid)
+
+                deletes.append((handle, delete_sid))
+
+        message_lists = []
+        for directory in (c.get_retract_facts(), c.get_facts(), c.get_messages()):
+            message_list = []
+            for ruleset_name, messages in directory.items():
+                message_list.append((self._host.get_ruleset(ruleset_name)._handle, messages))
+
+            message_lists.append(message_list)
+
+        return (sid, 
+                c.s._d,
+                list(c.get_cancelled_timers().keys()),
+                timers,
+                queued_posts,
+                queued_asserts,
+                queued_retracts,
+                deletes,
+                message_lists[0],
+                message_lists[1],
+                message_lists[2])
+
+    def _commit_action(self, c):
+        # all the commands of the closure are built and flushed in a 
+        # single native call, which locks every ruleset it writes to
+        try:
+            return rules.commit_action(self._handle, c._handle, self._get_commit_descriptor(c))
+        except:
+            rules.abandon_action(self._handle, c._handle)
+            raise
+
     def dispatch(self, complete, async_result = None):
-        state = None
-        action_handle = None
-        action_binding = None
-        result_container = {}
         if async_result:
-            state = async_result[0]
-            result_container = {'message': json.loads(async_result[1])}
-            action_handle = async_result[2]
-            action_binding = async_result[3]
-        else:
-            try:
-                result = rules.start_action(self._handle)
-                if not result:
-                    complete(None, True)
-                    return
-                else: 
-                    state = json.loads(result[0])
-                    result_container = {'message': json.loads(result[1])}
-                    action_handle = result[2]
-                    action_binding = result[3]
-            except BaseException as error:
-                t, v, tb = sys.exc_info()
-                print('start action base exception type {0}, value {1}, traceback {2}'.format(t, str(v), traceback.format_tb(tb)))
-                complete(error, True)
-                return
-            except:
-                t, v, tb = sys.exc_info()
-                print('start action unknown exception type {0}, value {1}, traceback {2}'.format(t, str(v), traceback.format_tb(tb)))
-                complete('unknown error', True)
+            self._dispatch_action(complete, async_result[0], async_result[1], async_result[2], async_result[3])
+            return
+
+        try:
+            results = rules.start_actions(self._handle, self._host._batch_size)
+
+            if not results:
+                complete(None, True)
                 return
-        
+        except BaseException as error:
+            t, v, tb = sys.exc_info()
+            print('start action base exception type {0}, value {1}, traceback {2}'.format(t, str(v), traceback.format_tb(tb)))
+            complete(error, True)
+            return
+        except:
+            t, v, tb = sys.exc_info()
+            print('start action unknown exception type {0}, value {1}, traceback {2}'.format(t, str(v), traceback.format_tb(tb)))
+            complete('unknown error', True)
+            return
+
+        actions = results
+
+        # the chain goes on once, when the last action of the batch
+        # has committed, async actions may finish after this returns
+        outstanding = [len(actions)]
+        errors = []
+        lock = threading.Lock()
+        def action_complete(e, wait):
+            with lock:
+                if e:
+                    errors.append(e)
+
+                outstanding[0] -= 1
+                if outstanding[0]:
+                    return
+
+            if errors:
+                complete(errors[0], True)
+            else:
+                complete(None, False)
+
+        # the batch is leased at once, the timer wheel renews the leases
+        # of the actions still waiting in it while the others run
+        entry = self._host._timer_wheel.start_leases(self._name, [action[0]['sid'] for action in actions[1:]])
+        for i in range(len(actions)):
+            entry['sids'] = [action[0]['sid'] for action in actions[i + 1:]]
+            state, messages, action_handle, action_binding = actions[i]
+            self._dispatch_action(action_complete, state, messages, action_handle, action_binding)
+
+        self._host._timer_wheel.cancel(entry)
+
+    def _dispatch_action(self, complete, state, messages, action_handle, action_binding):
+        result_container = {'message': messages}
         while 'message' in result_container:
             action_name = None
             for action_name, message in result_container['message'].items():
@@ -597,112 +791,45 @@ class Ruleset(object):
                 if c._has_completed():
                     return
 
+                # complete is called once per action, after the
+                # last action started for the same sid has committed
                 if e:
                     rules.abandon_action(self._handle, c._handle)
                     complete(e, True)
-                else:
-                    try:
-                        for timer_name, timer in c.get_cancelled_timers().items():
-                            self.cancel_timer(c.s['sid'], timer_name)
-
-                        for timer_id, timer_tuple in c.get_timers().items():
-                            self.start_timer(c.s['sid'], timer_tuple[0], timer_tuple[1], timer_tuple[2])
-
-                        for ruleset_name, q in c.get_queues().items():
-                            for message in q.get_queued_posts():
-                                self.queue_assert_event(message['sid'], ruleset_name, message)
-
-                            for message in q.get_queued_asserts():
-                                self.queue_assert_fact(message['sid'], ruleset_name, message)
-
-                            for message in q.get_queued_retracts():
-                                self.queue_retract_fact(message['sid'], ruleset_name, message)
-
-  
-                        for ruleset_name, sid in c.get_deletes().items():
-                            self._host.delete_state(ruleset_name, sid)
+                    return
 
-                        binding  = 0
-                        replies = 0
-                        pending = {action_binding: 0}
-        
-                        for ruleset_name, facts in c.get_retract_facts().items():
-                            if len(facts) == 1:
-                                binding, replies = self._host.start_retract_fact(ruleset_name, facts[0])
-                            else:
-                                binding, replies = self._host.start_retract_facts(ruleset_name, facts)
-                           
-                            if binding in pending:
-                                pending[binding] = pending[binding] + replies
-                            else:
-                                pending[binding] = replies
-                        
-                        for ruleset_name, facts in c.get_facts().items():
-                            if len(facts) == 1:
-                                binding, replies = self._host.start_assert_fact(ruleset_name, facts[0])
-                            else:
-                                binding, replies = self._host.start_assert_facts(ruleset_name, facts)
-                            
-                            if binding in pending:
-                                pending[binding] = pending[binding] + replies
-                            else:
-                                pending[binding] = replies
-
-                        for ruleset_name, messages in c.get_messages().items():
-                            if len(messages) == 1:
-                                binding, replies = self._host.start_post(ruleset_name, messages[0])
-                            else:
-                                binding, replies = self._host.start_post_batch(ruleset_name, messages)
-                            
-                            if binding in pending:
-                                pending[binding] = pending[binding] + replies
-                            else:
-                                pending[binding] = replies
-
-                        binding, replies = rules.start_update_state(self._handle, c._handle, json.dumps(c.s._d, ensure_ascii=False))
-                        if binding in pending:
-                            pending[binding] = pending[binding] + replies
-                        else:
-                            pending[binding] = replies
-                        
-                        for binding, replies in pending.items():
-                            if binding != 0:
-                                if binding != action_binding:
-                                    rules.complete(binding, replies)
-                                else:
-                                    new_result = rules.complete_and_start_action(self._handle, replies, c._handle)
-                                    if new_result:
-                                        if 'async' in result_container:
-                                            def terminal(e, wait):
-                                                return
-
-                                            self.dispatch(terminal, [state, new_result, action_handle, action_binding])
-                                        else:
-                                            result_container['message'] = json.loads(new_result)
+                try:
+                    new_result = self._commit_action(c)
+                except BaseException as error:
+                    t, v, tb = sys.exc_info()
+                    print('base exception type {0}, value {1}, traceback {2}'.format(t, str(v), traceback.format_tb(tb)))
+                    complete(error, True)
+                    return
+                except:
+                    t, v, tb = sys.exc_info()
+                    print('unknown exception type {0}, value {1}, traceback {2}'.format(t, str(v), traceback.format_tb(tb)))
+                    complete('unknown error', True)
+                    return
 
+                if c._is_deleted():
+                    try:
+                        self.delete_state(c.s.sid)
                     except BaseException as error:
-                        t, v, tb = sys.exc_info()
-                        print('base exception type {0}, value {1}, traceback {2}'.format(t, str(v), traceback.format_tb(tb)))
-                        rules.abandon_action(self._handle, c._handle)
                         complete(error, True)
-                    except:
-                        print('unknown exception type {0}, value {1}, traceback {2}'.format(t, str(v), traceback.format_tb(tb)))
-                        rules.abandon_action(self._handle, c._handle)
-                        complete('unknown error', True)
+                        return
 
-                    if c._is_deleted():
-                        try:
-                            self.delete_state(c.s.sid)
-                        except BaseException as error:
-                            complete(error, True)
+                if not new_result:
+                    complete(None, False)
+                elif 'async' in result_container:
+                    self._dispatch_action(complete, state, new_result, action_handle, action_binding)
+                else:
+                    result_container['message'] = new_result
 
             if 'async' in result_container:
                 del result_container['async']
                 
             self._actions[action_name].run(c, action_callback) 
             result_container['async'] = True 
-           
-        complete(None, False)
 
 class Statechart(Ruleset):
 
@@ -933,17 +1060,142 @@ class Flowchart(Ruleset):
                 started = True
 
 
+class Timer_Wheel(object):
+
+    def __init__(self, host, slots = 64, levels = 3):
+        self._host = host
+        self._slots = slots
+        self._wheels = [[[] for slot in range(slots)] for level in range(levels)]
+        self._tick = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self, c, max_time = None, timeout = None):
+        return self._start({'closure': c, 'max_time': max_time, 'timeout': timeout, 'cancelled': False})
+
+    def start_leases(self, ruleset_name, sids):
+        return self._start({'ruleset_name': ruleset_name, 'sids': sids, 'max_time': None, 'timeout': None, 'cancelled': False})
+
+    def _start(self, entry):
+        with self._lock:
+            if not self._thread:
+                self._tick = int(_unix_now())
+                self._thread = threading.Thread(target = self._run)
+                self._thread.daemon = True
+                self._thread.start()
+
+            self._schedule(entry, _unix_now() + 5)
+
+        return entry
+
+    def cancel(self, entry):
+        entry['cancelled'] = True
+
+    def _schedule(self, entry, due_time):
+        if entry['max_time'] and entry['max_time'] < due_time:
+            due_time = entry['max_time']
+
+        entry['due_tick'] = max(int(due_time) + 1, self._tick + 1)
+        self._place(entry)
+
+    def _place(self, entry):
+        # each level spans slots times the previous one, entries beyond 
+        # the last level are placed in its farthest slot and cascaded again
+        due_tick = entry['due_tick']
+        span = 1
+        for level in range(len(self._wheels)):
+            if due_tick - self._tick < span * self._slots:
+                break
+
+            if level == len(self._wheels) - 1:
+                due_tick = self._tick + span * self._slots - 1
+            else:
+                span *= self._slots
+
+        self._wheels[level][(due_tick // span) % self._slots].append(entry)
+
+    def _advance(self):
+        self._tick += 1
+        span = self._slots ** (len(self._wheels) - 1)
+        for level in range(len(self._wheels) - 1, 0, -1):
+            if self._tick % span == 0:
+                slot = (self._tick // span) % self._slots
+                entries = self._wheels[level][slot]
+                self._wheels[level][slot] = []
+                for entry in entries:
+                    if not entry['cancelled']:
+                        self._place(entry)
+
+            span //= self._slots
+
+        slot = self._tick % self._slots
+        entries = self._wheels[0][slot]
+        self._wheels[0][slot] = []
+        return entries
+
+    def _run(self):
+        while True:
+            time.sleep(1)
+            timeouts = []
+            renewals = {}
+            with self._lock:
+                now = _unix_now()
+                while self._tick < int(now):
+                    for entry in self._advance():
+                        if entry['cancelled']:
+                            continue
+
+                        if entry['max_time'] and now > entry['max_time']:
+                            entry['cancelled'] = True
+                            timeouts.append(entry['timeout'])
+                            continue
+
+                        if 'sids' in entry:
+                            if entry['sids']:
+                                renewals.setdefault(entry['ruleset_name'], []).extend(entry['sids'])
+                        else:
+                            c = entry['closure']
+                            if c._renew_lease_time():
+                                renewals.setdefault(c.ruleset_name, []).append(c.s.sid)
+
+                        self._schedule(entry, now + 5)
+
+            # all the leases due in a ruleset are renewed in one call
+            for ruleset_name, sids in renewals.items():
+                try:
+                    self._host.renew_action_leases(ruleset_name, sids)
+                except BaseException as error:
+                    print('Error renewing action leases {0}'.format(str(error)))
+
+            for timeout in timeouts:
+                try:
+                    timeout()
+                except BaseException as error:
+                    print('Error in action timeout {0}'.format(str(error)))
+
+
 class Host(object):
 
-    def __init__(self, ruleset_definitions = None, databases = None, state_cache_size = 1024):
+    def __init__(self, ruleset_definitions = None, databases = None, state_cache_size = 1024, workers = 1, partition = 0, partitions = 1, batch_size = 10, partition_migration = False, state_cache_policy = 'lru', state_cache_buckets = 0, timer_batch_size = 50, connection_pool_size = 4):
         if not databases:
             databases = [{'host': 'localhost', 'port': 6379, 'password': None, 'db': 0}]
         self._ruleset_directory = {}
         self._ruleset_list = []
         self._databases = databases
         self._state_cache_size = state_cache_size
+        self._workers = max(workers, 1)
+        self._partition = partition
+        self._partitions = partitions
+        self._batch_size = max(batch_size, 1)
+        self._partition_migration = partition_migration
+        self._state_cache_policy = state_cache_policy
+        self._state_cache_buckets = state_cache_buckets
+        self._timer_batch_size = max(timer_batch_size, 1)
+        self._connection_pool_size = max(connection_pool_size, 1)
         self._execute = True
-        print ruleset_definitions
+        self._running = False
+        self._d_event = threading.Event()
+        self._timer_wheel = Timer_Wheel(self)
         if ruleset_definitions:
             self.register_rulesets(None, ruleset_definitions)
 
@@ -979,9 +1231,15 @@ class Host(object):
     def delete_state(self, ruleset_name, sid):
         self.get_ruleset(ruleset_name).delete_state(sid)
 
+    def delete_states(self, ruleset_name, sids):
+        self.get_ruleset(ruleset_name).delete_states(sids)
+
     def get_ruleset_state(self, ruleset_name):
         return self.get_ruleset(ruleset_name).get_ruleset_state(sid)
 
+    def get_timer_stats(self, ruleset_name):
+        return self.get_ruleset(ruleset_name).get_timer_stats()
+
     def post_batch(self, ruleset_name, messages):
         return self.get_ruleset(ruleset_name).assert_events(messages)
 
@@ -1024,16 +1282,58 @@ class Host(object):
     def renew_action_lease(self, ruleset_name, sid):
         self.get_ruleset(ruleset_name).renew_action_lease(sid)
 
+    def renew_action_leases(self, ruleset_name, sids):
+        self.get_ruleset(ruleset_name).renew_action_leases(sids)
+
     def register_rulesets(self, parent_name, ruleset_definitions):
         rulesets = Ruleset.create_rulesets(parent_name, self, ruleset_definitions, self._state_cache_size)
         for ruleset_name, ruleset in rulesets.items():
             self._ruleset_directory[ruleset_name] = ruleset
             self._ruleset_list.append(ruleset)
             ruleset.bind(self._databases)
+            if self._partition_migration:
+                ruleset.set_partition_migration(True)
+
+            if self._state_cache_policy != 'lru' or self._state_cache_buckets:
+                ruleset.set_state_cache(self._state_cache_policy, self._state_cache_buckets)
+
+            if self._connection_pool_size > 1:
+                ruleset.set_connection_pool(self._connection_pool_size)
+
+            if self._partitions > 1:
+                ruleset.set_partition(self._partition, self._partitions)
+
+            if self._running:
+                self._start_doorbell(ruleset)
 
         return list(rulesets.keys())
 
+    def _start_doorbell(self, ruleset):
+        def ring():
+            while self._execute:
+                try:
+                    ruleset.wait_action(3)
+                except BaseException as error:
+                    print('Error waiting for actions {0}'.format(str(error)))
+                    time.sleep(3)
+
+                # wake up the dispatcher on timeout as well, so a missed
+                # doorbell is picked up by the next dispatch round
+                self._ring()
+
+        doorbell = threading.Thread(target = ring)
+        doorbell.daemon = True
+        doorbell.start()
+
+    def _ring(self):
+        self._d_event.set()
+
     def run(self):
+        def wait_dispatch_ruleset(index, wait):
+            self._d_event.wait()
+            self._d_event.clear()
+            dispatch_ruleset(index, wait)
+
         def dispatch_ruleset(index, wait):
             def callback(e, w):
                 inner_wait = wait
@@ -1047,18 +1347,18 @@ class Host(object):
                     inner_wait = False
 
                 if (index == (len(self._ruleset_list) -1)) and inner_wait:
-                    self._d_timer = threading.Timer(3, dispatch_ruleset, ((index + 1) % len(self._ruleset_list), inner_wait, ))
-                    self._d_timer.daemon = True
-                    self._d_timer.start()
+                    d_timer = threading.Thread(target = wait_dispatch_ruleset, args = ((index + 1) % len(self._ruleset_list), inner_wait, ))
+                    d_timer.daemon = True
+                    d_timer.start()
                 else:
-                    self._d_timer = threading.Thread(target = dispatch_ruleset, args = ((index + 1) % len(self._ruleset_list), inner_wait, ))
-                    self._d_timer.daemon = True
-                    self._d_timer.start()
+                    d_timer = threading.Thread(target = dispatch_ruleset, args = ((index + 1) % len(self._ruleset_list), inner_wait, ))
+                    d_timer.daemon = True
+                    d_timer.start()
 
             if not len(self._ruleset_list):
-                self._d_timer = threading.Timer(6, dispatch_ruleset, (0, False, ))
-                self._d_timer.daemon = True
-                self._d_timer.start()
+                d_timer = threading.Timer(6, dispatch_ruleset, (0, False, ))
+                d_timer.daemon = True
+                d_timer.start()
             else: 
                 ruleset = self._ruleset_list[index]
                 if not index:
@@ -1075,7 +1375,10 @@ class Host(object):
                     inner_wait = False
 
                 if (index == (len(self._ruleset_list) -1)) and inner_wait:
-                    self._t_timer = threading.Timer(3, dispatch_timers, ((index + 1) % len(self._ruleset_list), inner_wait, ))
+                    # sleep until the earliest timer is due, still polling 
+                    # every second for timers started elsewhere
+                    wait_time = min([ruleset.get_timer_wait(1) for ruleset in self._ruleset_list])
+                    self._t_timer = threading.Timer(wait_time, dispatch_timers, ((index + 1) % len(self._ruleset_list), inner_wait, ))
                     self._t_timer.daemon = True
                     self._t_timer.start()
                 else:
@@ -1095,14 +1398,205 @@ class Host(object):
                 ruleset.dispatch_timers(callback)
 
 
-        self._d_timer = threading.Timer(1, dispatch_ruleset, (0, False, ))
-        self._d_timer.daemon = True
-        self._d_timer.start()
+        self._running = True
+        for ruleset in self._ruleset_list:
+            self._start_doorbell(ruleset)
+
+        # each worker runs its own dispatch chain, the action lease
+        # in the ruleset store keeps a sid from running on two workers
+        for worker in range(self._workers):
+            d_timer = threading.Timer(1, dispatch_ruleset, (0, False, ))
+            d_timer.daemon = True
+            d_timer.start()
+
         self._t_timer = threading.Timer(1, dispatch_timers, (0, False, ))
         self._t_timer.daemon = True
         self._t_timer.start()
 
 
+def _run_partition(connection, ruleset_definitions, databases, state_cache_size, workers, partition, partitions, batch_size, partition_migration, state_cache_policy, state_cache_buckets, timer_batch_size, connection_pool_size):
+    if hasattr(ruleset_definitions, '__call__'):
+        ruleset_definitions = ruleset_definitions()
+
+    host = Host(ruleset_definitions, databases, state_cache_size, workers, partition, partitions, batch_size, partition_migration, state_cache_policy, state_cache_buckets, timer_batch_size, connection_pool_size)
+    host.run()
+    while True:
+        try:
+            method_name, args = connection.recv()
+        except EOFError:
+            return
+
+        try:
+            connection.send((None, getattr(host, method_name)(*args)))
+        except BaseException as error:
+            connection.send((str(error), None))
+
+
+class PartitionedHost(Host):
+
+    def __init__(self, ruleset_definitions = None, databases = None, state_cache_size = 1024, workers = 1, processes = 2, batch_size = 10, partition_migration = False, state_cache_policy = 'lru', state_cache_buckets = 0, timer_batch_size = 50, connection_pool_size = 4):
+        # start the workers before binding, so they don't inherit this process' connections.
+        # ruleset_definitions can be a module level function returning the definitions, 
+        # each worker then loads its own actions and nothing is pickled under spawn
+        self._partition_connections = []
+        for partition in range(processes):
+            parent_connection, child_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(target = _run_partition, args = (child_connection, ruleset_definitions, databases, state_cache_size, workers, partition, processes, batch_size, partition_migration, state_cache_policy, state_cache_buckets, timer_batch_size, connection_pool_size))
+            process.daemon = True
+            process.start()
+            self._partition_connections.append((parent_connection, threading.Lock()))
+
+        if hasattr(ruleset_definitions, '__call__'):
+            ruleset_definitions = ruleset_definitions()
+
+        super(PartitionedHost, self).__init__(ruleset_definitions, databases, state_cache_size, workers, 0, 1, batch_size, partition_migration, state_cache_policy, state_cache_buckets, timer_batch_size, connection_pool_size)
+
+    def close(self):
+        # a worker exits when its connection is closed
+        self._execute = False
+        for connection, lock in self._partition_connections:
+            with lock:
+                connection.close()
+
+    def _forward(self, sid, method_name, *args):
+        if sid == None:
+            sid = '0'
+
+        partition = rules.get_partition(str(sid), len(self._partition_connections))
+        return self._send(self._partition_connections[partition], method_name, args)
+
+    def _send(self, partition_connection, method_name, args):
+        connection, lock = partition_connection
+        with lock:
+            connection.send((method_name, args))
+            error, result = connection.recv()
+
+        if error:
+            raise Exception(error)
+
+        return result
+
+    def _forward_batch(self, method_name, ruleset_name, messages):
+        batches = {}
+        for message in messages:
+            sid = str(message['sid']) if 'sid' in message else '0'
+            partition = rules.get_partition(sid, len(self._partition_connections))
+            if partition in batches:
+                batches[partition].append(message)
+            else:
+                batches[partition] = [message]
+
+        result = 0
+        for batch in batches.values():
+            batch_result = self._forward(batch[0].get('sid'), method_name, ruleset_name, batch)
+            if not result:
+                result = batch_result
+
+        return result
+
+    def _forward_sids(self, method_name, ruleset_name, sids):
+        batches = {}
+        for sid in sids:
+            partition = rules.get_partition(str(sid), len(self._partition_connections))
+            if partition in batches:
+                batches[partition].append(sid)
+            else:
+                batches[partition] = [sid]
+
+        for batch in batches.values():
+            self._forward(batch[0], method_name, ruleset_name, batch)
+
+    def _forward_all(self, method_name, *args):
+        return [self._send(partition_connection, method_name, args) for partition_connection in self._partition_connections]
+
+    def _start_unsupported(self, method_name):
+        # the replies of a started batch are completed on the connection 
+        # that sent it, which lives in the partition's process
+        raise Exception('{0} is not supported by a partitioned host, use {1}'.format(method_name, method_name[len('start_'):]))
+
+    def set_ruleset(self, ruleset_name, ruleset_definition):
+        self._forward_all('set_ruleset', ruleset_name, ruleset_definition)
+        super(PartitionedHost, self).set_ruleset(ruleset_name, ruleset_definition)
+
+    def delete_ruleset(self, ruleset_name):
+        self._forward_all('delete_ruleset', ruleset_name)
+        super(PartitionedHost, self).delete_ruleset(ruleset_name)
+
+    def get_state(self, ruleset_name, sid):
+        return self._forward(sid, 'get_state', ruleset_name, sid)
+
+    def delete_state(self, ruleset_name, sid):
+        self._forward(sid, 'delete_state', ruleset_name, sid)
+
+    def delete_states(self, ruleset_name, sids):
+        self._forward_sids('delete_states', ruleset_name, sids)
+
+    def get_timer_stats(self, ruleset_name):
+        # timers fire on every partition, the counters are summed 
+        # and the earliest pending timer is reported
+        stats = None
+        for partition_stats in self._forward_all('get_timer_stats', ruleset_name):
+            if not stats:
+                stats = partition_stats
+                continue
+
+            for name, value in partition_stats.items():
+                if name != 'next_timer':
+                    stats[name] += value
+                elif value and (not stats[name] or value < stats[name]):
+                    stats[name] = value
+
+        return stats
+
+    def start_post_batch(self, ruleset_name, messages):
+        self._start_unsupported('start_post_batch')
+
+    def post_batch(self, ruleset_name, messages):
+        return self._forward_batch('post_batch', ruleset_name, messages)
+
+    def post(self, ruleset_name, message):
+        return self._forward(message.get('sid'), 'post', ruleset_name, message)
+
+    def start_post(self, ruleset_name, message):
+        self._start_unsupported('start_post')
+
+    def assert_fact(self, ruleset_name, fact):
+        return self._forward(fact.get('sid'), 'assert_fact', ruleset_name, fact)
+
+    def start_assert_fact(self, ruleset_name, fact):
+        self._start_unsupported('start_assert_fact')
+
+    def assert_facts(self, ruleset_name, facts):
+        return self._forward_batch('assert_facts', ruleset_name, facts)
+
+    def start_assert_facts(self, ruleset_name, facts):
+        self._start_unsupported('start_assert_facts')
+
+    def retract_fact(self, ruleset_name, fact):
+        return self._forward(fact.get('sid'), 'retract_fact', ruleset_name, fact)
+
+    def start_retract_fact(self, ruleset_name, fact):
+        self._start_unsupported('start_retract_fact')
+
+    def retract_facts(self, ruleset_name, facts):
+        return self._forward_batch('retract_facts', ruleset_name, facts)
+
+    def start_retract_facts(self, ruleset_name, facts):
+        self._start_unsupported('start_retract_facts')
+
+    def patch_state(self, ruleset_name, state):
+        return self._forward(state.get('sid'), 'patch_state', ruleset_name, state)
+
+    def renew_action_lease(self, ruleset_name, sid):
+        self._forward(sid, 'renew_action_lease', ruleset_name, sid)
+
+    def renew_action_leases(self, ruleset_name, sids):
+        self._forward_sids('renew_action_leases', ruleset_name, sids)
+
+    def run(self):
+        return
+
+
 class Queue(object):
 
     def __init__(self, ruleset_name, database = None, state_cache_size = 1024):
@@ -1130,27 +1624,27 @@ class Queue(object):
             raise Exception('Queue has already been closed')
 
         if 'sid' in message:
-            rules.queue_assert_event(self._handle, str(message['sid']), self._ruleset_name, json.dumps(message, ensure_ascii=False))
+            rules.queue_assert_event(self._handle, str(message['sid']), self._ruleset_name, message)
         else:
-            rules.queue_assert_event(self._handle, None, self._ruleset_name, json.dumps(message, ensure_ascii=False))
+            rules.queue_assert_event(self._handle, None, self._ruleset_name, message)
 
     def assert_fact(self, message):
         if self._handle == 0:
             raise Exception('Queue has already been closed')
 
         if 'sid' in message:
-            rules.queue_assert_fact(self._handle, str(message['sid']), self._ruleset_name, json.dumps(message, ensure_ascii=False))
+            rules.queue_assert_fact(self._handle, str(message['sid']), self._ruleset_name, message)
         else: 
-            rules.queue_assert_fact(self._handle, None, self._ruleset_name, json.dumps(message, ensure_ascii=False))
+            rules.queue_assert_fact(self._handle, None, self._ruleset_name, message)
 
     def retract_fact(self, message):
         if self._handle == 0:
             raise Exception('Queue has already been closed')
 
         if 'sid' in message:
-            rules.queue_retract_fact(self._handle, str(message['sid']), self._ruleset_name, json.dumps(message, ensure_ascii=False))
+            rules.queue_retract_fact(self._handle, str(message['sid']), self._ruleset_name, message)
         else:
-            rules.queue_retract_fact(self._handle, None, self._ruleset_name, json.dumps(message, ensure_ascii=False))
+            rules.queue_retract_fact(self._handle, None, self._ruleset_name, message)
 
     def close(self):
         if self._handle != 0:
@@ -98,9 +98,14 @@ def _update_rulesets(request):
         file.save(os.path.join(UPLOAD_FOLDER, filename))
     execfile(UPLOAD_FOLDER + filename)
     global host
-    host._execute = False
+    processes = 1
+    if isinstance(host, engine.PartitionedHost):
+        processes = len(host._partition_connections)
+        host.close()
+    else:
+        host._execute = False
     db = host._databases
-    create_host(db)
+    create_host(db, host._state_cache_size, host._workers, processes)
 
 
 @app.route('/<ruleset_name>/definition', methods=['POST'])
@@ -442,14 +447,22 @@ def facts_request(ruleset_name, sid):
     return jsonify(result)
 
 
-def create_host(databases=None, state_cache_size=1024):
+def _define_rulesets():
     ruleset_definitions = {}
     for rset in _rulesets:
         ruleset_name, ruleset_definition = rset.define()
         ruleset_definitions[ruleset_name] = ruleset_definition
 
+    return ruleset_definitions
+
+
+def create_host(databases=None, state_cache_size=1024, workers=1, processes=1):
     global host
-    host = engine.Host(ruleset_definitions, databases, state_cache_size)
+    if processes > 1:
+        # the workers define the rulesets themselves, actions are not pickled
+        host = engine.PartitionedHost(_define_rulesets, databases, state_cache_size, workers, processes)
+    else:
+        host = engine.Host(_define_rulesets(), databases, state_cache_size, workers)
     for start in _start_functions:
         start(host)
 
@@ -651,10 +651,14 @@ def create_queue(ruleset_name, database = None, state_cache_size = 1024):
     return engine.Queue(ruleset_name, database, state_cache_size)
 
 
-def run_all(databases = None, host_name = '127.0.0.1', port = 5000, routing_rules = None, run = None, state_cache_size = 1024):
-    interface.create_host(databases, state_cache_size)
+def run_all(databases = None, host_name = '127.0.0.1', port = 5000, routing_rules = None, run = None, state_cache_size = 1024, workers = 1):
+    interface.create_host(databases, state_cache_size, workers)
     interface.app_run(host_name, port)
 
-def run_server(run, databases = None, routing_rules = None, state_cache_size = 1024):
-    run_all(databases, None, None, routing_rules, run, state_cache_size)
+def run_processes(processes, databases = None, host_name = '127.0.0.1', port = 5000, state_cache_size = 1024, workers = 1):
+    interface.create_host(databases, state_cache_size, workers, processes)
+    interface.app_run(host_name, port)
+
+def run_server(run, databases = None, routing_rules = None, state_cache_size = 1024, workers = 1):
+    run_all(databases, None, None, routing_rules, run, state_cache_size, workers)
 
@@ -437,6 +437,7 @@ module Engine
 
       @handle = Rules.create_ruleset name, JSON.generate(ruleset_definition), state_cache_size
       @definition = ruleset_definition
+      @timer_sample = [Time.now.to_f, 0]
     end
 
     def bind(databases)
@@ -545,6 +546,24 @@ module Engine
       Rules.renew_action_lease @handle, sid.to_s
     end
 
+    def get_timer_stats
+      stats = Rules.get_timer_stats @handle
+      # the rate is measured since the previous call
+      now = Time.now.to_f
+      sample_time, sample_fired = @timer_sample
+      elapsed = now - sample_time
+      stats[:fired_per_second] = elapsed > 0 ? (stats[:fired] - sample_fired) / elapsed : 0.0
+      @timer_sample = [now, stats[:fired]]
+      stats
+    end
+
+    def get_timer_wait(max_wait)
+      next_timer = (Rules.get_timer_stats @handle)[:next_timer]
+      return max_wait if next_timer == 0
+
+      [[next_timer / 1000.0 - Time.now.to_f, 0].max, max_wait].min
+    end
+
     def Ruleset.create_rulesets(parent_name, host, ruleset_definitions, state_cache_size)
       branches = {}
       for name, definition in ruleset_definitions do
@@ -567,16 +586,18 @@ module Engine
     end
 
     def dispatch_timers(complete)
+      # due timers are drained a batch at a time
+      fired = false
       begin
-        if !(Rules.assert_timers @handle)
-          complete.call nil, false
-        else
-          complete.call nil, true
+        while (Rules.assert_timers @handle, @host.timer_batch_size) == 1
+          fired = true
         end
       rescue Exception => e
         complete.call e, true
         return
       end
+
+      complete.call nil, !fired
     end
 
     def dispatch(complete, async_result = nil)
@@ -1102,12 +1123,14 @@ module Engine
   end
 
   class Host
+    attr_reader :timer_batch_size
 
-    def initialize(ruleset_definitions = nil, databases = [{:host => 'localhost', :port => 6379, :password => nil, :db => 0}], state_cache_size = 1024)
+    def initialize(ruleset_definitions = nil, databases = [{:host => 'localhost', :port => 6379, :password => nil, :db => 0}], state_cache_size = 1024, timer_batch_size = 50)
       @ruleset_directory = {}
       @ruleset_list = []
       @databases = databases
       @state_cache_size = state_cache_size
+      @timer_batch_size = [timer_batch_size, 1].max
       register_rulesets nil, ruleset_definitions if ruleset_definitions
     end
 
@@ -1201,6 +1224,10 @@ module Engine
       get_ruleset(ruleset_name).renew_action_lease sid
     end
 
+    def get_timer_stats(ruleset_name)
+      get_ruleset(ruleset_name).get_timer_stats
+    end
+
     def register_rulesets(parent_name, ruleset_definitions)
       rulesets = Ruleset.create_rulesets(parent_name, self, ruleset_definitions, @state_cache_size)
       for ruleset_name, ruleset in rulesets do
@@ -1243,7 +1270,10 @@ module Engine
           if (Thread.current[:index] == (@ruleset_list.length-1)) & inner_wait
             Thread.current[:index] = (Thread.current[:index] + 1) % @ruleset_list.length
             Thread.current[:wait] = inner_wait
-            timer.after 0.25, &thread_lambda
+            # sleep until the earliest timer is due, still polling 
+            # for timers started elsewhere
+            wait_time = @ruleset_list.map { |ruleset| ruleset.get_timer_wait 0.25 }.min
+            timer.after wait_time, &thread_lambda
           else
             Thread.current[:index] = (Thread.current[:index] + 1) % @ruleset_list.length
             Thread.current[:wait] = inner_wait
@@ -1,13 +1,16 @@
 try:
   from setuptools import setup, Extension
   from setuptools.command import install_lib as _install_lib
+  from setuptools.command import build_py as _build_py
 except ImportError:
   from distutils.core import setup, Extension
   from distutils.command import install_lib as _install_lib
+  from distutils.command import build_py as _build_py
 from codecs import open
 from os import path
 from os import environ
 from sys import platform
+from sys import version_info
 
 if (platform == 'win32'):
   environ['CFLAGS'] = '-std=c99 -D_GNU_SOURCE -_WIN32'
@@ -27,6 +30,15 @@ class install_lib(_install_lib.install_lib):
         if self.distribution.has_ext_modules():
           self.run_command('build_ext')
 
+# The asyncio host (durable.aio) needs Python 3.5, it is left out
+# of older builds so byte-compiling the package doesn't fail.
+class build_py(_build_py.build_py):
+  def find_package_modules(self, package, package_dir):
+    modules = _build_py.build_py.find_package_modules(self, package, package_dir)
+    if version_info < (3, 5):
+      modules = [module for module in modules if module[1] != 'aio']
+    return modules
+
 if (platform == 'win32'):
   rules_lib = ('rules_py', 
              {'sources': ['deps/Win32_Interop/%s' % src for src in ('win32_error.c', 'win32_ansi.c', 'win32_fdapi.cpp', 'win32_fdapi_crt.cpp', 'win32_rfdmap.cpp', 'win32_variadic_functor.cpp', 'win32_common.cpp')] + 
@@ -72,6 +84,6 @@ setup (
     package_dir = {'': 'libpy'},
     libraries = [rules_lib],
     ext_modules = [rules],
-    # Override 'install_lib' command
-    cmdclass={'install_lib': install_lib},
+    # Override 'install_lib' and 'build_py' commands
+    cmdclass={'install_lib': install_lib, 'build_py': build_py},
 )
@@ -13,9 +13,9 @@
 #define MAX_NODE_RESULTS 16
 #define MAX_STACK_SIZE 64
 #define MAX_STATE_PROPERTY_TIME 2
-#define MAX_COMMAND_COUNT 10000
 #define MAX_ADD_COUNT 1000
 #define MAX_EVAL_COUNT 1000
+#define MAX_QUEUE_COUNT 100
 
 #define OP_BOOL_BOOL 0x0404
 #define OP_BOOL_INT 0x0402
@@ -66,15 +66,14 @@ static unsigned int handleMessage(ruleset *tree,
                                   char *state,
                                   char *message, 
                                   unsigned char actionType, 
-                                  char **commands,
-                                  unsigned int *commandCount,
+                                  commandBuffer *commands,
                                   void **rulesBinding);
 
-static unsigned int reduceIdiom(ruleset *tree, 
+static unsigned int executeCode(ruleset *tree, 
                                 char *sid,
                                 char *message,
                                 jsonObject *messageObject,
-                                unsigned int idiomOffset,
+                                idiom *currentIdiom,
                                 char **state,
                                 unsigned char *releaseState,
                                 jsonProperty **targetValue);
@@ -260,13 +259,6 @@ static double reduceDouble(double left,
     return 0;
 }
 
-static void freeCommands(char **commands,
-                         unsigned int commandCount) {
-    for (unsigned int i = 0; i < commandCount; ++i) {
-        free(commands[i]);
-    }
-}
-
 static unsigned int handleAction(ruleset *tree, 
                                  char *sid, 
                                  char *mid,
@@ -277,7 +269,7 @@ static unsigned int handleAction(ruleset *tree,
                                  unsigned int *evalCount,
                                  char **addKeys,
                                  unsigned int *addCount,
-                                 char **removeCommand,
+                                 unsigned char *removeAction,
                                  void **rulesBinding) {
     unsigned int result = ERR_UNEXPECTED_VALUE;
     if (*rulesBinding == NULL) {
@@ -325,17 +317,7 @@ static unsigned int handleAction(ruleset *tree,
 
         case ACTION_REMOVE_EVENT:
         case ACTION_REMOVE_FACT:
-            if (*removeCommand == NULL) {
-                result = formatRemoveMessage(*rulesBinding, 
-                                         sid,
-                                         mid, 
-                                         actionType == ACTION_REMOVE_FACT ? 1 : 0,
-                                         removeCommand);  
-
-                if (result != RULES_OK) {
-                    return result;
-                }
-            }
+            *removeAction = actionType;
             break;
     }
     return RULES_OK;
@@ -350,7 +332,7 @@ static unsigned int handleBeta(ruleset *tree,
                                unsigned int *evalCount,
                                char **addKeys,
                                unsigned int *addCount,
-                               char **removeCommand,
+                               unsigned char *removeAction,
                                void **rulesBinding) {
     int prefixLength = 0;
     node *currentNode = betaNode;
@@ -415,7 +397,7 @@ static unsigned int handleBeta(ruleset *tree,
                         evalCount,
                         addKeys,
                         addCount,
-                        removeCommand,
+                        removeAction,
                         rulesBinding);
 }
 
@@ -434,26 +416,24 @@ static unsigned int valueToProperty(ruleset *tree,
     switch(sourceValue->type) {
         case JSON_EVENT_LOCAL_IDIOM:
         case JSON_STATE_IDIOM:
-            result = reduceIdiom(tree, 
+            result = executeCode(tree, 
                                  sid, 
                                  message,
                                  messageObject,
-                                 sourceValue->value.idiomOffset,
+                                 &tree->idiomPool[sourceValue->value.idiomOffset],
                                  state,
                                  releaseState,
                                  targetProperty);
 
             return result;
         case JSON_EVENT_LOCAL_PROPERTY:
-            for (unsigned short i = 0; i < messageObject->propertiesLength; ++i) {
-                if (sourceValue->value.property.nameHash == messageObject->properties[i].hash) {
-                    *targetProperty = &messageObject->properties[i];
-                    rehydrateProperty(*targetProperty, message);
-                    return RULES_OK;
-                } 
+            result = getObjectProperty(messageObject, sourceValue->value.property.nameHash, targetProperty);
+            if (result != RULES_OK) {
+                return result;
             }
 
-            return ERR_PROPERTY_NOT_FOUND;
+            rehydrateProperty(*targetProperty, message);
+            return RULES_OK;
         case JSON_STATE_PROPERTY:
             if (sourceValue->value.property.idOffset) {
                 sid = &tree->stringPool[sourceValue->value.property.idOffset];
@@ -472,11 +452,12 @@ static unsigned int valueToProperty(ruleset *tree,
                     return result;
                 }
 
+                // the state was just refreshed, so it is not looked up as stale
                 result = fetchStateProperty(tree, 
                                             sid, 
                                             sourceValue->value.property.nameHash, 
                                             MAX_STATE_PROPERTY_TIME, 
-                                            0,
+                                            1,
                                             state,
                                             targetProperty);
             }
@@ -648,74 +629,95 @@ static unsigned int reduceProperties(unsigned char operator,
     return RULES_OK;
 }
 
-static unsigned int reduceIdiom(ruleset *tree, 
+static unsigned int executeCode(ruleset *tree, 
                                 char *sid,
                                 char *message,
                                 jsonObject *messageObject,
-                                unsigned int idiomOffset,
+                                idiom *currentIdiom,
                                 char **state,
                                 unsigned char *releaseState,
                                 jsonProperty **targetValue) {
     unsigned int result = RULES_OK;
+    unsigned int stackSize = currentIdiom->stackSize;
+#ifdef _WIN32
+    jsonProperty *values = (jsonProperty *)_alloca(sizeof(jsonProperty) * stackSize);
+    jsonProperty **stack = (jsonProperty **)_alloca(sizeof(jsonProperty *) * stackSize);
+    char **states = (char **)_alloca(sizeof(char *) * stackSize);
+    unsigned char *releaseStates = (unsigned char *)_alloca(sizeof(unsigned char) * stackSize);
+#else
+    jsonProperty values[stackSize];
+    jsonProperty *stack[stackSize];
+    char *states[stackSize];
+    unsigned char releaseStates[stackSize];
+#endif
+    unsigned int top = 0;
     *releaseState = 0;
-    idiom *currentIdiom = &tree->idiomPool[idiomOffset];
-    jsonProperty leftValue;
-    jsonProperty *leftProperty = &leftValue;
-    unsigned char releaseLeftState = 0;
-    char *leftState = NULL;
-    result = valueToProperty(tree,
-                             sid,
-                             message,
-                             messageObject,
-                             &currentIdiom->left,
-                             &leftState,
-                             &releaseLeftState,
-                             &leftProperty);
-    if (result != RULES_OK) {
-        return result;
-    }
-
-    jsonProperty rightValue;
-    jsonProperty *rightProperty = &rightValue;
-    unsigned char releaseRightState = 0;
-    char *rightState = NULL;
-    result = valueToProperty(tree,
-                             sid,
-                             message,
-                             messageObject,
-                             &currentIdiom->right,
-                             &rightState,
-                             &releaseRightState,
-                             &rightProperty);
-    if (result != RULES_OK) {
-        if (releaseLeftState) {
-            free(leftState);
-        }
+    for (instruction *currentInstruction = &tree->codePool[currentIdiom->codeOffset]; 
+         currentInstruction->operator != OP_END; 
+         ++currentInstruction) {
+        if (currentInstruction->operator == OP_NOP) {
+            stack[top] = &values[top];
+            states[top] = NULL;
+            result = valueToProperty(tree,
+                                     sid,
+                                     message,
+                                     messageObject,
+                                     &currentInstruction->value,
+                                     &states[top],
+                                     &releaseStates[top],
+                                     &stack[top]);
+            if (result != RULES_OK) {
+                break;
+            }
 
-        return result;
-    }
+            ++top;
+        } else {
+            // the reduced value is not written over its operands,
+            // string operands are terminated in place while reducing
+            jsonProperty reducedValue;
+            reducedValue.type = JSON_NIL;
+            reducedValue.isMaterial = 1;
+            char *reducedState = NULL;
+            --top;
+            result = reduceProperties(currentInstruction->operator, 
+                                      stack[top - 1], 
+                                      states[top - 1],
+                                      stack[top], 
+                                      states[top], 
+                                      &reducedValue,
+                                      &reducedState);
+            if (releaseStates[top]) {
+                free(states[top]);
+            }
 
-    result = reduceProperties(currentIdiom->operator, 
-                            leftProperty, 
-                            leftState,
-                            rightProperty, 
-                            rightState, 
-                            *targetValue,
-                            state);
+            if (releaseStates[top - 1]) {
+                free(states[top - 1]);
+            }
 
-    if (releaseLeftState) {
-        free(leftState);
+            values[top - 1] = reducedValue;
+            stack[top - 1] = &values[top - 1];
+            states[top - 1] = reducedState;
+            releaseStates[top - 1] = 1;
+            if (result != RULES_OK) {
+                break;
+            }
+        }
     }
 
-    if (releaseRightState) {
-        free(rightState);
-    }
+    if (result != RULES_OK) {
+        for (unsigned int i = 0; i < top; ++i) {
+            if (releaseStates[i]) {
+                free(states[i]);
+            }
+        }
 
-    if (state) {
-        *releaseState = 1;
+        return result;
     }
 
-    return result;
+    **targetValue = *stack[0];
+    *state = states[0];
+    *releaseState = releaseStates[0];
+    return RULES_OK;
 }
 
 static unsigned int isMatch(ruleset *tree,
@@ -948,15 +950,17 @@ static unsigned int isArrayMatch(ruleset *tree,
     char *last;
     unsigned char type;
     jsonObject jo;
+    jsonProperty item;
     result = readNextArrayValue(first, &first, &last, &type);
     while (result == PARSE_OK) {
         unsigned short top = 1;
         alpha *stack[MAX_STACK_SIZE];
         stack[0] = arrayAlpha;
         alpha *currentAlpha;
+        // items left behind by an error are released with the message 
+        initObject(tree, &jo);
         if (type == JSON_OBJECT) {
             char *next;
-            jo.propertiesLength = 0;
             result = constructObject(first,
                                      "$i", 
                                      NULL, 
@@ -968,14 +972,21 @@ static unsigned int isArrayMatch(ruleset *tree,
                 return result;
             }
         } else {
+            item.hash = HASH_I;
+            item.type = type;
+            item.isMaterial = 0;
+            item.valueString = first;
+            item.valueLength = last - first;
+            item.nameLength = 2;
+            item.name = "$i";
+            jo.properties = &item;
             jo.propertiesLength = 1;
-            jo.properties[0].hash = HASH_I;
-            jo.properties[0].type = type;
-            jo.properties[0].isMaterial = 0;
-            jo.properties[0].valueString = first;
-            jo.properties[0].valueLength = last - first;
-            jo.properties[0].nameLength = 2;
-            strcpy(jo.properties[0].name, "$i");
+            jo.maxPropertiesLength = 1;
+        }
+
+        result = indexProperties(&jo);
+        if (result != RULES_OK) {
+            return result;
         }
 
         while (top) {
@@ -985,15 +996,8 @@ static unsigned int isArrayMatch(ruleset *tree,
                 unsigned int *nextList = &tree->nextPool[currentAlpha->nextListOffset];
                 for (unsigned int entry = 0; nextList[entry] != 0; ++entry) {
                     node *listNode = &tree->nodePool[nextList[entry]];
-                    char exists = 0;
-                    for(unsigned int propertyIndex = 0; propertyIndex < jo.propertiesLength; ++propertyIndex) {
-                        if (listNode->value.a.hash == jo.properties[propertyIndex].hash) {
-                            exists = 1;
-                            break;
-                        }
-                    }
-
-                    if (!exists) {
+                    jsonProperty *property;
+                    if (getObjectProperty(&jo, listNode->value.a.hash, &property) != RULES_OK) {
                         if (top == MAX_STACK_SIZE) {
                             return ERR_MAX_STACK_SIZE;
                         }
@@ -1055,6 +1059,7 @@ static unsigned int isArrayMatch(ruleset *tree,
             }
         }
         
+        releaseObject(&jo);
         if ((arrayAlpha->operator == OP_IALL && !*propertyMatch) ||
             (arrayAlpha->operator == OP_IANY && *propertyMatch)) {
             break;
@@ -1077,7 +1082,7 @@ static unsigned int handleAlpha(ruleset *tree,
                                 unsigned int *evalCount,
                                 char **addKeys,
                                 unsigned int *addCount,
-                                char **removeCommand,
+                                unsigned char *removeAction,
                                 void **rulesBinding) {                        
     unsigned int result = ERR_EVENT_NOT_HANDLED;
     unsigned short top = 1;
@@ -1092,15 +1097,8 @@ static unsigned int handleAlpha(ruleset *tree,
             unsigned int *nextList = &tree->nextPool[currentAlpha->nextListOffset];
             for (entry = 0; nextList[entry] != 0; ++entry) {
                 node *listNode = &tree->nodePool[nextList[entry]];
-                char exists = 0;
-                for(unsigned int propertyIndex = 0; propertyIndex < jo->propertiesLength; ++propertyIndex) {
-                    if (listNode->value.a.hash == jo->properties[propertyIndex].hash) {
-                        exists = 1;
-                        break;
-                    }
-                }
-
-                if (!exists) {
+                jsonProperty *property;
+                if (getObjectProperty(jo, listNode->value.a.hash, &property) != RULES_OK) {
                     if (top == MAX_STACK_SIZE) {
                         return ERR_MAX_STACK_SIZE;
                     }
@@ -1177,7 +1175,7 @@ static unsigned int handleAlpha(ruleset *tree,
                                     evalCount,
                                     addKeys,
                                     addCount,
-                                    removeCommand,
+                                    removeAction,
                                     rulesBinding);
                 if (bresult != RULES_OK && bresult != ERR_NEW_SESSION) {
                     return result;
@@ -1198,11 +1196,9 @@ static unsigned int handleMessageCore(ruleset *tree,
                                       char *message, 
                                       jsonObject *jo, 
                                       unsigned char actionType,
-                                      char **commands,
-                                      unsigned int *commandCount,
+                                      commandBuffer *commands,
                                       void **rulesBinding) {
     unsigned int result;
-    char *storeCommand;
     jsonProperty *sidProperty = &jo->properties[jo->sidIndex];
     jsonProperty *midProperty = &jo->properties[jo->idIndex];
     
@@ -1222,10 +1218,6 @@ static unsigned int handleMessageCore(ruleset *tree,
     strncpy(mid, midProperty->valueString, midProperty->valueLength);
     mid[midProperty->valueLength] = '\0';
     
-    if (*commandCount == MAX_COMMAND_COUNT) {
-        return ERR_MAX_COMMAND_COUNT;
-    }
-
     if (state) {
         if (!*rulesBinding) {
             result = resolveBinding(tree, sid, rulesBinding);
@@ -1234,15 +1226,12 @@ static unsigned int handleMessageCore(ruleset *tree,
             }
         }
 
-        result = formatStoreSession(*rulesBinding, sid, state, 0, &storeCommand);
+        result = formatStoreSession(*rulesBinding, sid, state, 0, commands);
         if (result != RULES_OK) {
             return result;
         }
-
-        commands[*commandCount] = storeCommand;
-        ++*commandCount;
     }
-    char *removeCommand = NULL;
+    unsigned char removeAction = 0;
     char *addKeys[MAX_ADD_COUNT];
     unsigned int addCount = 0;
     char *evalKeys[MAX_EVAL_COUNT];
@@ -1258,28 +1247,29 @@ static unsigned int handleMessageCore(ruleset *tree,
                          &evalCount,
                          addKeys,
                          &addCount,
-                         &removeCommand,
+                         &removeAction,
                          rulesBinding);
     if (result == RULES_OK) {
-        if (*commandCount == MAX_COMMAND_COUNT - 3) {
-            for (unsigned int i = 0; i < addCount; ++i) {
-                free(addKeys[i]);
-            }
+        if (removeAction) {
+            result = formatRemoveMessage(*rulesBinding, 
+                                         sid,
+                                         mid, 
+                                         removeAction == ACTION_REMOVE_FACT ? 1 : 0,
+                                         commands);  
+            if (result != RULES_OK) {
+                for (unsigned int i = 0; i < addCount; ++i) {
+                    free(addKeys[i]);
+                }
 
-            for (unsigned int i = 0; i < evalCount; ++i) {
-                free(evalKeys[i]);
-            }
-            
-            return ERR_MAX_COMMAND_COUNT;
-        }
+                for (unsigned int i = 0; i < evalCount; ++i) {
+                    free(evalKeys[i]);
+                }
 
-        if (removeCommand) {
-            commands[*commandCount] = removeCommand;
-            ++*commandCount;
+                return result;
+            }
         }
 
         if (addCount > 0) {
-            char *addCommand = NULL;
             result = formatStoreMessage(*rulesBinding,
                                         sid,
                                         message,
@@ -1288,7 +1278,7 @@ static unsigned int handleMessageCore(ruleset *tree,
                                         evalCount == 0 ? 1 : 0, 
                                         addKeys,
                                         addCount,
-                                        &addCommand);
+                                        commands);
             for (unsigned int i = 0; i < addCount; ++i) {
                 free(addKeys[i]);
             }
@@ -1300,13 +1290,9 @@ static unsigned int handleMessageCore(ruleset *tree,
 
                 return result;
             }
-
-            commands[*commandCount] = addCommand;
-            ++*commandCount;
         }
 
         if (evalCount > 0) {
-            char *evalCommand = NULL;
             result = formatEvalMessage(*rulesBinding,
                                         sid,
                                         mid,
@@ -1315,7 +1301,7 @@ static unsigned int handleMessageCore(ruleset *tree,
                                         actionType == ACTION_REMOVE_FACT ? ACTION_RETRACT_FACT : actionType,
                                         evalKeys,
                                         evalCount,
-                                        &evalCommand);
+                                        commands);
 
             for (unsigned int i = 0; i < evalCount; ++i) {
                 free(evalKeys[i]);
@@ -1324,9 +1310,6 @@ static unsigned int handleMessageCore(ruleset *tree,
             if (result != RULES_OK) {
                 return result;
             }
-
-            commands[*commandCount] = evalCommand;
-            ++*commandCount;
         }
 
         if (!state) {
@@ -1365,23 +1348,16 @@ static unsigned int handleMessageCore(ruleset *tree,
             snprintf(newState, sizeof(char)*(12 + sidProperty->valueLength), "{\"sid\":\"%s\"}", sid);
 #endif
 
-            if (*commandCount == MAX_COMMAND_COUNT) {
-                return ERR_MAX_COMMAND_COUNT;
-            }
-
-            result = formatStoreSession(*rulesBinding, sid, newState, 1, &storeCommand);
+            result = formatStoreSession(*rulesBinding, sid, newState, 1, commands);
             if (result != RULES_OK) {
                 return result;
             }
 
-            commands[*commandCount] = storeCommand;
-            ++*commandCount;
             result = handleMessage(tree, 
                                    NULL,
                                    stateMessage,  
                                    ACTION_ASSERT_EVENT,
                                    commands,
-                                   commandCount,
                                    rulesBinding);
             if (result != RULES_OK && result != ERR_EVENT_NOT_HANDLED) {
                 return result;
@@ -1402,11 +1378,11 @@ static unsigned int handleMessage(ruleset *tree,
                                   char *state,
                                   char *message, 
                                   unsigned char actionType, 
-                                  char **commands,
-                                  unsigned int *commandCount,
+                                  commandBuffer *commands,
                                   void **rulesBinding) {
     char *next;
     jsonObject jo;
+    initObject(tree, &jo);
     int result = constructObject(message,
                                  NULL, 
                                  NULL, 
@@ -1416,26 +1392,26 @@ static unsigned int handleMessage(ruleset *tree,
                                  actionType == ACTION_REMOVE_FACT,
                                  &jo, 
                                  &next);
-    if (result != RULES_OK) {
-        return result;
+    if (result == RULES_OK) {
+        result = handleMessageCore(tree,
+                                   state, 
+                                   message, 
+                                   &jo,
+                                   actionType,
+                                   commands,
+                                   rulesBinding);
     }
     
-    return handleMessageCore(tree,
-                            state, 
-                            message, 
-                            &jo,
-                            actionType,
-                            commands,
-                            commandCount,
-                            rulesBinding);
+    releaseObject(&jo);
+    return result;
 }
 
 static unsigned int handleMessages(void *handle, 
                                    unsigned char actionType,
                                    char *messages, 
-                                   char **commands,
-                                   unsigned int *commandCount,
+                                   commandBuffer *commands,
                                    void **rulesBinding) {
+    ruleset *tree = (ruleset*)handle;
     unsigned int result;
     unsigned int returnResult = RULES_OK;
     jsonObject jo;
@@ -1448,6 +1424,8 @@ static unsigned int handleMessages(void *handle,
         ++first;
     }
 
+    // the messages of a batch reuse the same arena pages
+    initObject(tree, &jo);
     while (constructObject(first,
                            NULL, 
                            NULL, 
@@ -1470,10 +1448,10 @@ static unsigned int handleMessages(void *handle,
                                  &jo, 
                                  actionType, 
                                  commands,
-                                 commandCount,
                                  rulesBinding);
         
         *last = lastTemp;
+        releaseObject(&jo);
         if (result != RULES_OK && result != ERR_EVENT_NOT_HANDLED) {
             return result;
         }
@@ -1486,6 +1464,50 @@ static unsigned int handleMessages(void *handle,
         while (*first != '{' && *first != '\0' ) {
             ++first;
         }
+
+        initObject(tree, &jo);
+    }
+
+    releaseObject(&jo);
+    return returnResult;
+}
+
+// objects built by a binding are loaded into the message object as 
+// they are, the message text is only used to store them
+static unsigned int handleObjects(void *handle, 
+                                  unsigned char actionType,
+                                  messageObject *messages, 
+                                  unsigned int messagesLength,
+                                  commandBuffer *commands,
+                                  void **rulesBinding) {
+    ruleset *tree = (ruleset*)handle;
+    unsigned int returnResult = RULES_OK;
+    jsonObject jo;
+    for (unsigned int i = 0; i < messagesLength; ++i) {
+        initObject(tree, &jo);
+        unsigned int result = loadObject(&messages[i],
+                                         actionType == ACTION_ASSERT_FACT || 
+                                         actionType == ACTION_RETRACT_FACT || 
+                                         actionType == ACTION_REMOVE_FACT,
+                                         &jo);
+        if (result == RULES_OK) {
+            result = handleMessageCore(tree,
+                                       NULL, 
+                                       messages[i].message, 
+                                       &jo, 
+                                       actionType, 
+                                       commands,
+                                       rulesBinding);
+        }
+
+        releaseObject(&jo);
+        if (result != RULES_OK && result != ERR_EVENT_NOT_HANDLED) {
+            return result;
+        }
+
+        if (result == ERR_EVENT_NOT_HANDLED) {
+            returnResult = ERR_EVENT_NOT_HANDLED;
+        }
     }
 
     return returnResult;
@@ -1493,8 +1515,7 @@ static unsigned int handleMessages(void *handle,
 
 static unsigned int handleState(ruleset *tree, 
                                 char *state,
-                                char **commands,
-                                unsigned int *commandCount,
+                                commandBuffer *commands,
                                 void **rulesBinding) {
     int stateLength = strlen(state);
     if (stateLength < 2) {
@@ -1522,29 +1543,20 @@ static unsigned int handleState(ruleset *tree,
                                         stateMessage,  
                                         ACTION_ASSERT_EVENT,
                                         commands,
-                                        commandCount,
                                         rulesBinding);
 
     return result;
 }
 
-static unsigned int handleTimers(void *handle, 
-                                 char **commands,
-                                 unsigned int *commandCount,
-                                 void **rulesBinding) {
-    redisReply *reply;
-    unsigned int result = peekTimers(handle, rulesBinding, &reply);
-    if (result != RULES_OK) {
-        return result;
-    }
-
+// fired timers and queued messages are members of the !t set, 
+// they are removed in the same batch as the results of handling them
+static unsigned int handleMembers(void *handle, 
+                                  redisReply *reply,
+                                  commandBuffer *commands,
+                                  void **rulesBinding) {
+    unsigned int result;
     for (unsigned long i = 0; i < reply->elements; ++i) {
-        if (*commandCount == MAX_COMMAND_COUNT) {
-            return ERR_MAX_COMMAND_COUNT;
-        }
-
-        char *command;
-        result = formatRemoveTimer(*rulesBinding, reply->element[i]->str, &command);
+        result = formatRemoveTimer(*rulesBinding, reply->element[i]->str, commands);
         if (result != RULES_OK) {
             freeReplyObject(reply);
             return result;
@@ -1563,14 +1575,11 @@ static unsigned int handleTimers(void *handle,
                 break;
         }
 
-        commands[*commandCount] = command;
-        ++*commandCount;
         result = handleMessage(handle, 
                                NULL,
                                reply->element[i]->str + 2, 
                                action,
                                commands, 
-                               commandCount, 
                                rulesBinding);
         if (result != RULES_OK && result != ERR_EVENT_NOT_HANDLED) {
             freeReplyObject(reply);
@@ -1582,26 +1591,62 @@ static unsigned int handleTimers(void *handle,
     return RULES_OK;
 }
 
+static unsigned int handleTimers(void *handle, 
+                                 unsigned int maxCount,
+                                 commandBuffer *commands,
+                                 void **rulesBinding) {
+    ruleset *tree = (ruleset*)handle;
+    redisReply *reply;
+    unsigned int result = peekTimers(tree, maxCount, rulesBinding, &reply);
+    if (result != RULES_OK) {
+        return result;
+    }
+
+    tree->timersFired += reply->elements;
+    ++tree->timerBatches;
+    return handleMembers(handle, reply, commands, rulesBinding);
+}
+
+static unsigned int handleQueue(void *handle, 
+                                unsigned int maxCount,
+                                commandBuffer *commands,
+                                void **rulesBinding) {
+    ruleset *tree = (ruleset*)handle;
+    redisReply *reply;
+    unsigned int result = peekQueue(tree, maxCount, rulesBinding, &reply);
+    if (result != RULES_OK) {
+        return result;
+    }
+
+    // a full batch leaves more messages behind
+    if (reply->elements >= maxCount) {
+        tree->queuePending = 1;
+    }
+
+    tree->messagesDequeued += reply->elements;
+    return handleMembers(handle, reply, commands, rulesBinding);
+}
+
 static unsigned int startHandleMessage(void *handle, 
                                        char *message, 
                                        unsigned char actionType,
                                        void **rulesBinding,
                                        unsigned int *replyCount) {
-    char *commands[MAX_COMMAND_COUNT];
-    unsigned int commandCount = 0;
+    commandBuffer commands;
+    initCommandBuffer(&commands);
     unsigned int result = handleMessage(handle, 
                                         NULL,
                                         message, 
                                         actionType, 
-                                        commands,
-                                        &commandCount,
+                                        &commands,
                                         rulesBinding);
     if (result != RULES_OK && result != ERR_EVENT_NOT_HANDLED) {
-        freeCommands(commands, commandCount);
+        freeCommandBuffer(&commands);
         return result;
     }
 
-    unsigned int batchResult = startNonBlockingBatch(*rulesBinding, commands, commandCount, replyCount);
+    unsigned int batchResult = startNonBlockingBatch(&commands, replyCount);
+    freeCommandBuffer(&commands);
     if (batchResult != RULES_OK) {
         return batchResult;
     }
@@ -1612,22 +1657,22 @@ static unsigned int startHandleMessage(void *handle,
 static unsigned int executeHandleMessage(void *handle, 
                                          char *message, 
                                          unsigned char actionType) {
-    char *commands[MAX_COMMAND_COUNT];
-    unsigned int commandCount = 0;
+    commandBuffer commands;
+    initCommandBuffer(&commands);
     void *rulesBinding = NULL;
     unsigned int result = handleMessage(handle, 
                                         NULL,
                                         message, 
                                         actionType, 
-                                        commands,
-                                        &commandCount,
+                                        &commands,
                                         &rulesBinding);
     if (result != RULES_OK && result != ERR_EVENT_NOT_HANDLED) {
-        freeCommands(commands, commandCount);
+        freeCommandBuffer(&commands);
         return result;
     }
 
-    unsigned int batchResult = executeBatch(rulesBinding, commands, commandCount);
+    unsigned int batchResult = executeBatch(&commands);
+    freeCommandBuffer(&commands);
     if (batchResult != RULES_OK) {
         return batchResult;
     }
@@ -1640,20 +1685,20 @@ static unsigned int startHandleMessages(void *handle,
                                         unsigned char actionType,
                                         void **rulesBinding,
                                         unsigned int *replyCount) {
-    char *commands[MAX_COMMAND_COUNT];
-    unsigned int commandCount = 0;
+    commandBuffer commands;
+    initCommandBuffer(&commands);
     unsigned int result = handleMessages(handle,
                                          actionType,
                                          messages,
-                                         commands,
-                                         &commandCount,
+                                         &commands,
                                          rulesBinding);
     if (result != RULES_OK && result != ERR_EVENT_NOT_HANDLED) {
-        freeCommands(commands, commandCount);
+        freeCommandBuffer(&commands);
         return result;
     }
 
-    unsigned int batchResult = startNonBlockingBatch(*rulesBinding, commands, commandCount, replyCount);
+    unsigned int batchResult = startNonBlockingBatch(&commands, replyCount);
+    freeCommandBuffer(&commands);
     if (batchResult != RULES_OK) {
         return batchResult;
     }
@@ -1664,21 +1709,49 @@ static unsigned int startHandleMessages(void *handle,
 static unsigned int executeHandleMessages(void *handle, 
                                           char *messages, 
                                           unsigned char actionType) {
-    char *commands[MAX_COMMAND_COUNT];
-    unsigned int commandCount = 0;
+    commandBuffer commands;
+    initCommandBuffer(&commands);
     void *rulesBinding = NULL;
     unsigned int result = handleMessages(handle,
                                          actionType,
                                          messages,
-                                         commands,
-                                         &commandCount,
+                                         &commands,
                                          &rulesBinding);
     if (result != RULES_OK && result != ERR_EVENT_NOT_HANDLED) {
-        freeCommands(commands, commandCount);
+        freeCommandBuffer(&commands);
+        return result;
+    }
+
+    unsigned int batchResult = executeBatch(&commands);
+    freeCommandBuffer(&commands);
+    if (batchResult != RULES_OK) {
+        return batchResult;
+    }
+
+    return result;
+}
+
+static unsigned int startHandleObjects(void *handle, 
+                                       messageObject *messages, 
+                                       unsigned int messagesLength,
+                                       unsigned char actionType,
+                                       void **rulesBinding,
+                                       unsigned int *replyCount) {
+    commandBuffer commands;
+    initCommandBuffer(&commands);
+    unsigned int result = handleObjects(handle,
+                                        actionType,
+                                        messages,
+                                        messagesLength,
+                                        &commands,
+                                        rulesBinding);
+    if (result != RULES_OK && result != ERR_EVENT_NOT_HANDLED) {
+        freeCommandBuffer(&commands);
         return result;
     }
 
-    unsigned int batchResult = executeBatch(rulesBinding, commands, commandCount);
+    unsigned int batchResult = startNonBlockingBatch(&commands, replyCount);
+    freeCommandBuffer(&commands);
     if (batchResult != RULES_OK) {
         return batchResult;
     }
@@ -1695,6 +1768,10 @@ unsigned int complete(void *rulesBinding, unsigned int replyCount) {
     return RULES_OK;
 }
 
+unsigned int completeMessage(void *rulesBinding, unsigned int replyCount) {
+    return completeNonBlockingBatch(rulesBinding, replyCount);
+}
+
 unsigned int assertEvent(void *handle, char *message) {
     return executeHandleMessage(handle, message, ACTION_ASSERT_EVENT);
 }
@@ -1768,22 +1845,46 @@ unsigned int startRetractFacts(void *handle,
     return startHandleMessages(handle, messages, ACTION_REMOVE_FACT, rulesBinding, replyCount);
 }
 
+unsigned int startAssertEventObjects(void *handle, 
+                                     messageObject *messages, 
+                                     unsigned int messagesLength,
+                                     void **rulesBinding, 
+                                     unsigned int *replyCount) {
+    return startHandleObjects(handle, messages, messagesLength, ACTION_ASSERT_EVENT, rulesBinding, replyCount);
+}
+
+unsigned int startAssertFactObjects(void *handle, 
+                                    messageObject *messages, 
+                                    unsigned int messagesLength,
+                                    void **rulesBinding, 
+                                    unsigned int *replyCount) {
+    return startHandleObjects(handle, messages, messagesLength, ACTION_ASSERT_FACT, rulesBinding, replyCount);
+}
+
+unsigned int startRetractFactObjects(void *handle, 
+                                     messageObject *messages, 
+                                     unsigned int messagesLength,
+                                     void **rulesBinding, 
+                                     unsigned int *replyCount) {
+    return startHandleObjects(handle, messages, messagesLength, ACTION_REMOVE_FACT, rulesBinding, replyCount);
+}
+
 unsigned int assertState(void *handle, char *sid, char *state) {
-    char *commands[MAX_COMMAND_COUNT];
-    unsigned int commandCount = 0;
+    commandBuffer commands;
+    initCommandBuffer(&commands);
     void *rulesBinding = NULL;
 
     unsigned int result = handleState(handle, 
                                       state, 
-                                      commands,
-                                      &commandCount,
+                                      &commands,
                                       &rulesBinding);
     if (result != RULES_OK && result != ERR_EVENT_NOT_HANDLED) {
-        freeCommands(commands, commandCount);
+        freeCommandBuffer(&commands);
         return result;
     }
 
-    unsigned int batchResult = executeBatch(rulesBinding, commands, commandCount);
+    unsigned int batchResult = executeBatch(&commands);
+    freeCommandBuffer(&commands);
     if (batchResult != RULES_OK) {
         return batchResult;
     }
@@ -1791,20 +1892,54 @@ unsigned int assertState(void *handle, char *sid, char *state) {
     return result;
 }
 
-unsigned int assertTimers(void *handle) {
-    char *commands[MAX_COMMAND_COUNT];
-    unsigned int commandCount = 0;
+static unsigned int assertQueue(void *handle, unsigned int maxCount) {
+    commandBuffer commands;
+    initCommandBuffer(&commands);
+    void *rulesBinding = NULL;
+    unsigned int result = handleQueue(handle, 
+                                      maxCount,
+                                      &commands,
+                                      &rulesBinding);
+    if (result != RULES_OK) {
+        freeCommandBuffer(&commands);
+        return result;
+    }
+
+    result = executeBatch(&commands);
+    freeCommandBuffer(&commands);
+    if (result != RULES_OK && result != ERR_EVENT_OBSERVED) {
+        return result;
+    }
+
+    return RULES_OK;
+}
+
+// the queue is drained on its doorbell by the action dispatch,
+// the timer dispatch drains it as well in case a doorbell is missed
+unsigned int assertTimers(void *handle, unsigned int maxCount) {
+    unsigned int queueResult = assertQueue(handle, maxCount);
+    if (queueResult != RULES_OK && queueResult != ERR_NO_MESSAGES_AVAILABLE) {
+        return queueResult;
+    }
+
+    commandBuffer commands;
+    initCommandBuffer(&commands);
     void *rulesBinding = NULL;
     unsigned int result = handleTimers(handle, 
-                                       commands,
-                                       &commandCount,
+                                       maxCount,
+                                       &commands,
                                        &rulesBinding);
     if (result != RULES_OK) {
-        freeCommands(commands, commandCount);
+        freeCommandBuffer(&commands);
+        if (result == ERR_NO_TIMERS_AVAILABLE && queueResult == RULES_OK) {
+            return RULES_OK;
+        }
+
         return result;
     }
 
-    result = executeBatch(rulesBinding, commands, commandCount);
+    result = executeBatch(&commands);
+    freeCommandBuffer(&commands);
     if (result != RULES_OK && result != ERR_EVENT_OBSERVED) {
         return result;
     }
@@ -1812,14 +1947,43 @@ unsigned int assertTimers(void *handle) {
     return RULES_OK;
 }
 
+static unsigned int startQueue(void *handle) {
+    ruleset *tree = (ruleset*)handle;
+    if (!tree->queuePending) {
+        return RULES_OK;
+    }
+
+    tree->queuePending = 0;
+    unsigned int result = assertQueue(handle, MAX_QUEUE_COUNT);
+    if (result != RULES_OK && result != ERR_NO_MESSAGES_AVAILABLE) {
+        return result;
+    }
+
+    return RULES_OK;
+}
+
+unsigned int getTimerStats(void *handle, timerStats *stats) {
+    ruleset *tree = (ruleset*)handle;
+    stats->fired = tree->timersFired;
+    stats->batches = tree->timerBatches;
+    stats->nextTimer = tree->nextTimer;
+    stats->dequeued = tree->messagesDequeued;
+    return RULES_OK;
+}
+
 unsigned int startAction(void *handle, 
                          char **state, 
                          char **messages, 
                          void **actionHandle,
                          void **actionBinding) {
+    unsigned int result = startQueue(handle);
+    if (result != RULES_OK) {
+        return result;
+    }
+
     redisReply *reply;
     void *rulesBinding;
-    unsigned int result = peekAction(handle, &rulesBinding, &reply);
+    result = peekAction(handle, &rulesBinding, &reply);
     if (result != RULES_OK) {
         return result;
     }
@@ -1838,26 +2002,86 @@ unsigned int startAction(void *handle,
     return RULES_OK;
 }
 
+unsigned int startActions(void *handle, 
+                          unsigned int maxCount,
+                          char **states, 
+                          char **messages, 
+                          void **actionHandles,
+                          void **actionBindings,
+                          unsigned int *actionCount) {
+    *actionCount = 0;
+    unsigned int result = startQueue(handle);
+    if (result != RULES_OK) {
+        return result;
+    }
+
+    redisReply *reply;
+    void *rulesBinding;
+    result = peekActions(handle, maxCount, &rulesBinding, &reply);
+    if (result != RULES_OK) {
+        return result;
+    }
+
+    // each action takes its sid, state and frame out of the batch reply,
+    // so it can be completed or abandoned on its own
+    for (unsigned int i = 0; i + 2 < reply->elements && *actionCount < maxCount; i += 3) {
+        actionContext *context = malloc(sizeof(actionContext));
+        redisReply *actionReply = calloc(1, sizeof(redisReply));
+        redisReply **elements = malloc(3 * sizeof(redisReply*));
+        if (!context || !actionReply || !elements) {
+            free(context);
+            free(actionReply);
+            free(elements);
+            for (unsigned int ii = 0; ii < *actionCount; ++ii) {
+                abandonAction(handle, actionHandles[ii]);
+            }
+
+            *actionCount = 0;
+            freeReplyObject(reply);
+            return ERR_OUT_OF_MEMORY;
+        }
+
+        for (unsigned int ii = 0; ii < 3; ++ii) {
+            elements[ii] = reply->element[i + ii];
+            reply->element[i + ii] = NULL;
+        }
+
+        actionReply->type = REDIS_REPLY_ARRAY;
+        actionReply->elements = 3;
+        actionReply->element = elements;
+        context->reply = actionReply;
+        context->rulesBinding = rulesBinding;
+        states[*actionCount] = elements[1]->str;
+        messages[*actionCount] = elements[2]->str;
+        actionHandles[*actionCount] = context;
+        actionBindings[*actionCount] = rulesBinding;
+        ++*actionCount;
+    }
+
+    freeReplyObject(reply);
+    return RULES_OK;
+}
+
 unsigned int startUpdateState(void *handle, 
                               void *actionHandle, 
                               char *state,
                               void **rulesBinding,
                               unsigned int *replyCount) {
-    char *commands[MAX_COMMAND_COUNT];
+    commandBuffer commands;
     unsigned int result = RULES_OK;
-    unsigned int commandCount = 0;
+    initCommandBuffer(&commands);
     result = handleState(handle, 
                          state,
-                         commands,
-                         &commandCount,
+                         &commands,
                          rulesBinding);
     if (result != RULES_OK && result != ERR_EVENT_NOT_HANDLED) {
         //reply object should be freed by the app during abandonAction
-        freeCommands(commands, commandCount);
+        freeCommandBuffer(&commands);
         return result;
     }
 
-    result = startNonBlockingBatch(*rulesBinding, commands, commandCount, replyCount);
+    result = startNonBlockingBatch(&commands, replyCount);
+    freeCommandBuffer(&commands);
     return result;
 
 }
@@ -1865,33 +2089,33 @@ unsigned int startUpdateState(void *handle,
 unsigned int completeAction(void *handle, 
                             void *actionHandle, 
                             char *state) {
-    char *commands[MAX_COMMAND_COUNT];
-    unsigned int commandCount = 0;
+    commandBuffer commands;
+    initCommandBuffer(&commands);
     actionContext *context = (actionContext*)actionHandle;
     redisReply *reply = context->reply;
     void *rulesBinding = context->rulesBinding;
     
     unsigned int result = formatRemoveAction(rulesBinding, 
                                              reply->element[0]->str, 
-                                             &commands[commandCount]);
+                                             &commands);
     if (result != RULES_OK) {
         //reply object should be freed by the app during abandonAction
+        freeCommandBuffer(&commands);
         return result;
     }
 
-    ++commandCount;
     result = handleState(handle, 
                          state,
-                         commands,
-                         &commandCount,
+                         &commands,
                          &rulesBinding);
     if (result != RULES_OK && result != ERR_EVENT_NOT_HANDLED) {
         //reply object should be freed by the app during abandonAction
-        freeCommands(commands, commandCount);
+        freeCommandBuffer(&commands);
         return result;
     }
 
-    result = executeBatch(rulesBinding, commands, commandCount); 
+    result = executeBatch(&commands);
+    freeCommandBuffer(&commands);
     if (result != RULES_OK && result != ERR_EVENT_OBSERVED) {
         //reply object should be freed by the app during abandonAction
         return result;
@@ -1906,43 +2130,44 @@ unsigned int completeAndStartAction(void *handle,
                                     unsigned int expectedReplies,
                                     void *actionHandle, 
                                     char **messages) {
-    char *commands[MAX_COMMAND_COUNT];
-    unsigned int commandCount = 0;
+    commandBuffer commands;
+    initCommandBuffer(&commands);
     actionContext *context = (actionContext*)actionHandle;
     redisReply *reply = context->reply;
     void *rulesBinding = context->rulesBinding;
-    
-    unsigned int result = formatRemoveAction(rulesBinding, 
-                                             reply->element[0]->str, 
-                                             &commands[commandCount]);
-    if (result != RULES_OK) {
+
+    // the posts started for the action are acknowledged on their own
+    // conversation before the action is removed on the primary connection
+    unsigned int result = completeNonBlockingBatch(rulesBinding, expectedReplies);
+    if (result != RULES_OK && result != ERR_EVENT_OBSERVED) {
         //reply object should be freed by the app during abandonAction
+        freeCommandBuffer(&commands);
         return result;
     }
 
-    ++commandCount;
-    if (commandCount == MAX_COMMAND_COUNT) {
+    result = formatRemoveAction(rulesBinding,
+                                reply->element[0]->str,
+                                &commands);
+    if (result != RULES_OK) {
         //reply object should be freed by the app during abandonAction
-        freeCommands(commands, commandCount);
-        return ERR_MAX_COMMAND_COUNT;
+        freeCommandBuffer(&commands);
+        return result;
     }
 
     result = formatPeekAction(rulesBinding, 
                               reply->element[0]->str,
-                              &commands[commandCount]);
+                              &commands);
     if (result != RULES_OK) {
         //reply object should be freed by the app during abandonAction
-        freeCommands(commands, commandCount);
+        freeCommandBuffer(&commands);
         return result;
     }
 
-    ++commandCount;
     redisReply *newReply;
-    result = executeBatchWithReply(rulesBinding, 
-                                   expectedReplies, 
-                                   commands, 
-                                   commandCount, 
+    result = executeBatchWithReply(&commands, 
+                                   0, 
                                    &newReply);  
+    freeCommandBuffer(&commands);
     if (result != RULES_OK && result != ERR_EVENT_OBSERVED) {
         //reply object should be freed by the app during abandonAction
         return result;
@@ -1959,12 +2184,265 @@ unsigned int completeAndStartAction(void *handle,
     return RULES_OK;
 }
 
+static unsigned int handleCommitMessages(commitMessages *messagesList,
+                                         unsigned int messagesLength,
+                                         unsigned char actionType,
+                                         commandBuffer *commands) {
+    for (unsigned int i = 0; i < messagesLength; ++i) {
+        void *rulesBinding = NULL;
+        unsigned int result;
+        if (messagesList[i].objects) {
+            result = handleObjects(messagesList[i].handle, 
+                                   actionType, 
+                                   messagesList[i].objects, 
+                                   messagesList[i].objectsLength,
+                                   commands,
+                                   &rulesBinding);
+        } else {
+            result = handleMessages(messagesList[i].handle, 
+                                    actionType, 
+                                    messagesList[i].messages, 
+                                    commands,
+                                    &rulesBinding);
+        }
+        if (result != RULES_OK && result != ERR_EVENT_NOT_HANDLED) {
+            return result;
+        }
+    }
+
+    return RULES_OK;
+}
+
+static unsigned int formatCommit(void *handle, 
+                                 void *actionBinding,
+                                 char *actionSid,
+                                 commitDescriptor *descriptor,
+                                 commandBuffer *commands) {
+    unsigned int result;
+    void *rulesBinding;
+    char *sid = descriptor->sid ? descriptor->sid : "0";
+    for (unsigned int i = 0; i < descriptor->deletesLength; ++i) {
+        commitDelete *currentDelete = &descriptor->deletes[i];
+        char *deleteSid = currentDelete->sid ? currentDelete->sid : "0";
+        result = resolveBinding(currentDelete->handle, deleteSid, &rulesBinding);
+        if (result != RULES_OK) {
+            return result;
+        }
+
+        result = formatDeleteSession(currentDelete->handle, 
+                                     rulesBinding, 
+                                     deleteSid, 
+                                     fnv1Hash32(deleteSid, strlen(deleteSid)), 
+                                     commands);
+        if (result != RULES_OK) {
+            return result;
+        }
+
+        removeStateEntry(currentDelete->handle, deleteSid, fnv1Hash32(deleteSid, strlen(deleteSid)));
+    }
+
+    if (descriptor->cancelledTimersLength || descriptor->timersLength) {
+        result = resolveBinding(handle, sid, &rulesBinding);
+        if (result != RULES_OK) {
+            return result;
+        }
+    }
+
+    for (unsigned int i = 0; i < descriptor->cancelledTimersLength; ++i) {
+        result = formatCancelTimer(rulesBinding, 
+                                   sid,
+                                   descriptor->cancelledTimers[i], 
+                                   commands);
+        if (result != RULES_OK) {
+            return result;
+        }
+    }
+
+    for (unsigned int i = 0; i < descriptor->timersLength; ++i) {
+        commitTimer *currentTimer = &descriptor->timers[i];
+        result = formatRegisterTimer(rulesBinding, 
+                                     currentTimer->duration, 
+                                     currentTimer->manualReset, 
+                                     currentTimer->timer, 
+                                     commands);
+        if (result != RULES_OK) {
+            return result;
+        }
+    }
+
+    for (unsigned int i = 0; i < descriptor->queuesLength; ++i) {
+        commitQueue *currentQueue = &descriptor->queues[i];
+        result = resolveBinding(handle, 
+                                currentQueue->sid ? currentQueue->sid : "0", 
+                                &rulesBinding);
+        if (result != RULES_OK) {
+            return result;
+        }
+
+        result = formatRegisterMessage(rulesBinding, 
+                                       currentQueue->queueAction, 
+                                       currentQueue->destination, 
+                                       currentQueue->message, 
+                                       commands);
+        if (result != RULES_OK) {
+            return result;
+        }
+    }
+
+    result = handleCommitMessages(descriptor->retracts, 
+                                  descriptor->retractsLength, 
+                                  ACTION_REMOVE_FACT, 
+                                  commands);
+    if (result != RULES_OK) {
+        return result;
+    }
+
+    result = handleCommitMessages(descriptor->facts, 
+                                  descriptor->factsLength, 
+                                  ACTION_ASSERT_FACT, 
+                                  commands);
+    if (result != RULES_OK) {
+        return result;
+    }
+
+    result = handleCommitMessages(descriptor->events, 
+                                  descriptor->eventsLength, 
+                                  ACTION_ASSERT_EVENT, 
+                                  commands);
+    if (result != RULES_OK) {
+        return result;
+    }
+
+    rulesBinding = NULL;
+    result = handleState(handle, 
+                         descriptor->state,
+                         commands,
+                         &rulesBinding);
+    if (result != RULES_OK && result != ERR_EVENT_NOT_HANDLED) {
+        return result;
+    }
+
+    result = formatRemoveAction(actionBinding, 
+                                actionSid, 
+                                commands);
+    if (result != RULES_OK) {
+        return result;
+    }
+
+    return formatPeekAction(actionBinding, 
+                            actionSid,
+                            commands);
+}
+
+static unsigned int flushCommit(void *actionBinding,
+                                commandBuffer *commands,
+                                redisReply **newReply) {
+    unsigned int result = RULES_OK;
+    unsigned int buffersLength = 0;
+    commandBuffer *actionCommands = NULL;
+    for (commandBuffer *current = commands; current; current = current->next) {
+        if (current->rulesBinding == actionBinding) {
+            actionCommands = current;
+        }
+
+        ++buffersLength;
+    }
+
+    unsigned int *pendingReplies = calloc(buffersLength, sizeof(unsigned int));
+    if (!pendingReplies) {
+        return ERR_OUT_OF_MEMORY;
+    }
+
+    // all bindings are written before any reply is read, 
+    // the action binding goes last as it returns the next action 
+    unsigned int i = 0;
+    for (commandBuffer *current = commands; current && result == RULES_OK; current = current->next) {
+        if (current != actionCommands) {
+            unsigned int replyCount;
+            result = startNonBlockingBatch(current, &replyCount);
+            if (result == RULES_OK) {
+                pendingReplies[i] = replyCount;
+            }
+        }
+
+        ++i;
+    }
+
+    if (result == RULES_OK) {
+        result = executeBatchWithReply(actionCommands, 
+                                       0, 
+                                       newReply);
+    }
+
+    i = 0;
+    for (commandBuffer *current = commands; current; current = current->next) {
+        unsigned int pendingResult = completeNonBlockingBatch(current->rulesBinding, pendingReplies[i]);
+        if (pendingResult != RULES_OK && pendingResult != ERR_EVENT_OBSERVED && 
+            (result == RULES_OK || result == ERR_EVENT_OBSERVED)) {
+            result = pendingResult;
+        }
+
+        ++i;
+    }
+
+    free(pendingReplies);
+    return result;
+}
+
+unsigned int commitAction(void *handle, 
+                          void *actionHandle, 
+                          commitDescriptor *descriptor,
+                          char **messages) {
+    actionContext *context = (actionContext*)actionHandle;
+    redisReply *reply = context->reply;
+    void *actionBinding = context->rulesBinding;
+    commandBuffer commands;
+    initCommandBuffer(&commands);
+    unsigned int result = formatCommit(handle, 
+                                       actionBinding, 
+                                       reply->element[0]->str, 
+                                       descriptor, 
+                                       &commands);
+    if (result != RULES_OK) {
+        //reply object should be freed by the app during abandonAction
+        freeCommandBuffer(&commands);
+        return result;
+    }
+
+    redisReply *newReply = NULL;
+    result = flushCommit(actionBinding, 
+                         &commands, 
+                         &newReply);
+    freeCommandBuffer(&commands);
+    if (result != RULES_OK && result != ERR_EVENT_OBSERVED) {
+        //reply object should be freed by the app during abandonAction
+        if (newReply) {
+            freeReplyObject(newReply);
+        }
+        return result;
+    }
+
+    freeReplyObject(reply);
+    if (newReply == NULL) {
+        free(actionHandle);
+        return ERR_NO_ACTION_AVAILABLE;
+    }
+
+    *messages = newReply->element[1]->str;
+    context->reply = newReply;
+    return RULES_OK;
+}
+
 unsigned int abandonAction(void *handle, void *actionHandle) {
     freeReplyObject(((actionContext*)actionHandle)->reply);
     free(actionHandle);
     return RULES_OK;
 }
 
+unsigned int waitAction(void *handle, unsigned int timeout) {
+    return waitForActions(handle, timeout);
+}
+
 unsigned int queueMessage(void *handle, unsigned int queueAction, char *sid, char *destination, char *message) {
     void *rulesBinding;
     if (!sid) {
@@ -2004,7 +2482,7 @@ unsigned int cancelTimer(void *handle, char *sid, char *timerName) {
         return result;
     }
 
-    return removeTimer(rulesBinding, timerName);
+    return removeTimer(rulesBinding, sid, timerName);
 }
 
 unsigned int renewActionLease(void *handle, char *sid) {
@@ -2021,3 +2499,30 @@ unsigned int renewActionLease(void *handle, char *sid) {
     return updateAction(rulesBinding, sid);
 }
 
+unsigned int renewActionLeases(void *handle, char **sids, unsigned int sidsLength) {
+    commandBuffer commands;
+    initCommandBuffer(&commands);
+    unsigned int result = RULES_OK;
+    for (unsigned int i = 0; i < sidsLength; ++i) {
+        void *rulesBinding;
+        char *sid = sids[i] ? sids[i] : "0";
+        result = resolveBinding(handle, sid, &rulesBinding);
+        if (result != RULES_OK) {
+            break;
+        }
+
+        result = formatUpdateAction(rulesBinding, sid, &commands);
+        if (result != RULES_OK) {
+            break;
+        }
+    }
+
+    // one pipeline per binding for all the leases due
+    for (commandBuffer *current = &commands; current && result == RULES_OK; current = current->next) {
+        result = executeBatch(current);
+    }
+
+    freeCommandBuffer(&commands);
+    return result;
+}
+
@@ -31,6 +31,7 @@ static unsigned int getArray(char *start, char **first, char **last);
 static unsigned int getNumber(char *start, char **first, char **last, unsigned char *type);
 static unsigned int getString(char *start, char **first, char **last);
 static unsigned int getStringAndHash(char *start, char **first, char **last, unsigned int *hash);
+static unsigned int skipObject(char *start, char **first, char **last);
 
 unsigned int readNextName(char *start, char **first, char **last, unsigned int *hash) {
     unsigned char state = ST_OBJECT_SEEK;
@@ -90,6 +91,35 @@ unsigned int readNextValue(char *start, char **first, char **last, unsigned char
     return ERR_PARSE_OBJECT;
 }
 
+unsigned int skipNextValue(char *start, char **first, char **last, unsigned char *type) {
+    unsigned char state = ST_OBJECT_PROP_PARSE;
+    ++start;
+    
+    while(start[0] != '\0') {
+        switch(state) {
+            case ST_OBJECT_PROP_PARSE:
+                if (start[0] == ':') {
+                    state = ST_OBJECT_PROP_VAL;
+                } else if (!IS_WHITESPACE(start[0])) {
+                    return ERR_PARSE_OBJECT;
+                }
+                break;
+            case ST_OBJECT_PROP_VAL:
+                if (start[0] == '{') {
+                    *type = JSON_OBJECT;
+                    return skipObject(start, first, last);
+                } else if (!IS_WHITESPACE(start[0])) {
+                    return getValue(start, first, last, type);
+                }
+                break;
+        }
+                
+        ++start;
+    }
+
+    return ERR_PARSE_OBJECT;
+}
+
 unsigned int readNextString(char *start, char **first, char **last, unsigned int *hash) {
     unsigned char state = ST_OBJECT_PROP_PARSE;
     ++start;
@@ -264,6 +294,41 @@ static unsigned int getObject(char *start, char **first, char **last) {
     return ERR_PARSE_OBJECT;
 }
 
+// brackets are matched without validating the content, strings 
+// are stepped over so the brackets inside them are not counted
+static unsigned int skipObject(char *start, char **first, char **last) {
+    unsigned int depth = 0;
+    char delimiter = '\0';
+    *first = start;
+    while(start[0] != '\0') {
+        if (delimiter) {
+            if (start[0] == '\\') {
+                if (start[1] == '\0') {
+                    break;
+                }
+
+                ++start;
+            } else if (start[0] == delimiter) {
+                delimiter = '\0';
+            }
+        } else if (start[0] == '"' || start[0] == '\'') {
+            delimiter = start[0];
+        } else if (start[0] == '{' || start[0] == '[') {
+            ++depth;
+        } else if (start[0] == '}' || start[0] == ']') {
+            --depth;
+            if (!depth) {
+                *last = start;
+                return PARSE_OK;
+            }
+        }
+
+        ++start;
+    }
+
+    return ERR_PARSE_OBJECT;
+}
+
 static unsigned int getArray(char *start, char** first, char **last) {
     unsigned char state = ST_ARRAY_SEEK;
     char *dummy;
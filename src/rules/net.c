@@ -4,8 +4,11 @@
 #include <errno.h>
 #ifndef _WIN32
 #include <time.h> /* for struct timeval */
+#include <sys/select.h>
+#include <sys/time.h>
 #else
 #include <WinSock2.h>
+#include <sys/timeb.h>
 #endif
 #include "net.h"
 #include "rules.h"
@@ -364,30 +367,59 @@ static unsigned int createTest(ruleset *tree, expression *expr, char **test, cha
     return RULES_OK;
 }
 
-static unsigned int loadPartitionCommand(ruleset *tree, binding *rulesBinding) {
+// the action set of a partitioned ruleset is indexed per partition in the
+// !ap! sets, so a partition peeks only its own sids. every script writing
+// the action set keeps the partition sets in step, for the partitions
+// count they were built for, which is stored in !pn
+static unsigned int createActionSetLua(ruleset *tree, char **lua) {
     char *name = &tree->stringPool[tree->nameOffset];
-    redisContext *reContext = rulesBinding->reContext;
-    redisReply *reply;
-    char *lua = NULL;
-    if (asprintf(&lua, 
-"local partition_key = \"%s!p\"\n"
-"local res = redis.call(\"hget\", partition_key, ARGV[1])\n"
-"if (not res) then\n"
-"   res = redis.call(\"hincrby\", partition_key, \"index\", 1)\n"
-"   res = res %% tonumber(ARGV[2])\n"
-"   redis.call(\"hset\", partition_key, ARGV[1], res)\n"
+    if (asprintf(lua,
+"local action_key = \"%s!a\"\n"
+"local partition_key = \"%s!ap!\"\n"
+"local partitions_key = \"%s!pn\"\n"
+"local indexed_partitions = tonumber(redis.call(\"get\", partitions_key)) or 1\n"
+"local xor_byte = function(left, right)\n"
+"    local result = 0\n"
+"    local bit_value = 1\n"
+"    for i = 1, 8, 1 do\n"
+"        if (left %% 2) ~= (right %% 2) then\n"
+"            result = result + bit_value\n"
+"        end\n"
+"        left = math.floor(left / 2)\n"
+"        right = math.floor(right / 2)\n"
+"        bit_value = bit_value * 2\n"
+"    end\n"
+"    return result\n"
+"end\n"
+"local get_partition = function(sid, partitions_length)\n"
+"    local hash = 2166136261\n"
+"    for i = 1, #sid, 1 do\n"
+"        local low = hash %% 256\n"
+"        hash = hash - low + xor_byte(low, string.byte(sid, i))\n"
+"        low = hash %% 65536\n"
+"        local high = (hash - low) / 65536\n"
+"        hash = (low * 16777619 + ((high * 16777619) %% 65536) * 65536) %% 4294967296\n"
+"    end\n"
+"    return hash %% partitions_length\n"
+"end\n"
+"local add_action = function(score, sid)\n"
+"    redis.call(\"zadd\", action_key, score, sid)\n"
+"    if indexed_partitions > 1 then\n"
+"        redis.call(\"zadd\", partition_key .. get_partition(sid, indexed_partitions), score, sid)\n"
+"    end\n"
 "end\n"
-"return tonumber(res)\n", name)  == -1) {
+"local remove_action = function(sid)\n"
+"    redis.call(\"zrem\", action_key, sid)\n"
+"    if indexed_partitions > 1 then\n"
+"        redis.call(\"zrem\", partition_key .. get_partition(sid, indexed_partitions), sid)\n"
+"    end\n"
+"end\n",
+                 name,
+                 name,
+                 name) == -1) {
         return ERR_OUT_OF_MEMORY;
     }
 
-    unsigned int result = redisAppendCommand(reContext, "SCRIPT LOAD %s", lua); 
-    GET_REPLY(result, "loadPartitionCommand", reply);
-
-    strncpy(rulesBinding->partitionHash, reply->str, 40);
-    rulesBinding->partitionHash[40] = '\0';
-    freeReplyObject(reply);
-    free(lua);
     return RULES_OK;
 }
 
@@ -395,6 +427,12 @@ static unsigned int loadRemoveActionCommand(ruleset *tree, binding *rulesBinding
     char *name = &tree->stringPool[tree->nameOffset];
     redisContext *reContext = rulesBinding->reContext;
     redisReply *reply;
+    char *actionSetLua = NULL;
+    unsigned int result = createActionSetLua(tree, &actionSetLua);
+    if (result != RULES_OK) {
+        return result;
+    }
+
     char *lua = NULL;
     if (asprintf(&lua, 
 "local delete_frame = function(key, action_key)\n"
@@ -410,16 +448,21 @@ static unsigned int loadRemoveActionCommand(ruleset *tree, binding *rulesBinding
 "end\n"
 "local sid = ARGV[1]\n"
 "local max_score = tonumber(ARGV[2])\n"
-"local action_key = \"%s!a\"\n"
+"%s"
+"local doorbell_key = \"%s!w\"\n"
 "if delete_frame(action_key .. \"!\" .. sid, action_key) then\n"
-"    redis.call(\"zadd\", action_key , max_score, sid)\n"
+"    add_action(max_score, sid)\n"
+"    redis.call(\"publish\", doorbell_key, sid)\n"
 "else\n"
-"    redis.call(\"zrem\", action_key, sid)\n"
-"end\n", name)  == -1) {
+"    remove_action(sid)\n"
+"end\n", actionSetLua, name)  == -1) {
+        free(actionSetLua);
         return ERR_OUT_OF_MEMORY;
     }
 
-    unsigned int result = redisAppendCommand(reContext, "SCRIPT LOAD %s", lua);
+    free(actionSetLua);
+
+    result = redisAppendCommand(reContext, "SCRIPT LOAD %s", lua);
     GET_REPLY(result, "loadRemoveActionCommand", reply);
     strncpy(rulesBinding->removeActionHash, reply->str, 40);
     rulesBinding->removeActionHash[40] = '\0';
@@ -428,6 +471,19 @@ static unsigned int loadRemoveActionCommand(ruleset *tree, binding *rulesBinding
     return RULES_OK;
 }
 
+// timer scores are in milliseconds
+static long long currentMilliseconds(void) {
+#ifdef _WIN32
+    struct __timeb64 now;
+    _ftime64_s(&now);
+    return (long long)now.time * 1000 + now.millitm;
+#else
+    struct timeval now;
+    gettimeofday(&now, NULL);
+    return (long long)now.tv_sec * 1000 + now.tv_usec / 1000;
+#endif
+}
+
 static unsigned int loadTimerCommand(ruleset *tree, binding *rulesBinding) {
     char *name = &tree->stringPool[tree->nameOffset];
     redisContext *reContext = rulesBinding->reContext;
@@ -436,13 +492,17 @@ static unsigned int loadTimerCommand(ruleset *tree, binding *rulesBinding) {
     if (asprintf(&lua,
 "local timer_key = \"%s!t\"\n"
 "local timestamp = tonumber(ARGV[1])\n"
-"local res = redis.call(\"zrangebyscore\", timer_key, 0, timestamp, \"limit\", 0, 50)\n"
+"local res = redis.call(\"zrangebyscore\", timer_key, 0, timestamp, \"limit\", 0, tonumber(ARGV[2]))\n"
 "if #res > 0 then\n"
 "    for i = 1, #res, 1 do\n"
-"        redis.call(\"zincrby\", timer_key, 10, tostring(res[i]))\n"
+"        redis.call(\"zincrby\", timer_key, 10000, tostring(res[i]))\n"
 "    end\n"
 "    return res\n"
 "end\n"
+"local next_timer = redis.call(\"zrange\", timer_key, 0, 0, \"withscores\")\n"
+"if #next_timer > 0 then\n"
+"    return tonumber(next_timer[2])\n"
+"end\n"
 "return 0\n", name)  == -1) {
         return ERR_OUT_OF_MEMORY;
     }
@@ -457,6 +517,99 @@ static unsigned int loadTimerCommand(ruleset *tree, binding *rulesBinding) {
     return RULES_OK;
 }
 
+// earlier versions scored timers in seconds, such scores are far below
+// any millisecond timestamp and are converted once, when a binding loads
+static unsigned int migrateTimers(ruleset *tree, binding *rulesBinding) {
+    char *name = &tree->stringPool[tree->nameOffset];
+    redisContext *reContext = rulesBinding->reContext;
+    redisReply *reply;
+    char *lua = NULL;
+    if (asprintf(&lua,
+"local timer_key = \"%s!t\"\n"
+"local res = redis.call(\"zrangebyscore\", timer_key, \"-inf\", \"(100000000000\", \"withscores\")\n"
+"for i = 1, #res, 2 do\n"
+"    redis.call(\"zadd\", timer_key, tonumber(res[i + 1]) * 1000, res[i])\n"
+"end\n"
+"return #res / 2\n", name)  == -1) {
+        return ERR_OUT_OF_MEMORY;
+    }
+
+    unsigned int result = redisAppendCommand(reContext, "EVAL %s 0", lua);
+    free(lua);
+    GET_REPLY(result, "migrateTimers", reply);
+    freeReplyObject(reply);
+    return RULES_OK;
+}
+
+// queued messages are moved from the !q list to the !t set with a lease,
+// a dispatcher failing before its commit leaves them to the timer dispatch
+static unsigned int loadPeekQueueCommand(ruleset *tree, binding *rulesBinding) {
+    char *name = &tree->stringPool[tree->nameOffset];
+    redisContext *reContext = rulesBinding->reContext;
+    redisReply *reply;
+    char *lua = NULL;
+    if (asprintf(&lua,
+"local queue_key = \"%s!q\"\n"
+"local timer_key = \"%s!t\"\n"
+"local lease = tonumber(ARGV[1]) + 10000\n"
+"local res = redis.call(\"lrange\", queue_key, 0, tonumber(ARGV[2]) - 1)\n"
+"if #res > 0 then\n"
+"    redis.call(\"ltrim\", queue_key, #res, -1)\n"
+"    for i = 1, #res, 1 do\n"
+"        redis.call(\"zadd\", timer_key, lease, res[i])\n"
+"    end\n"
+"end\n"
+"return res\n", name, name)  == -1) {
+        return ERR_OUT_OF_MEMORY;
+    }
+
+    unsigned int result = redisAppendCommand(reContext, "SCRIPT LOAD %s", lua);
+    GET_REPLY(result, "loadPeekQueueCommand", reply);
+
+    strncpy(rulesBinding->queueHash, reply->str, 40);
+    rulesBinding->queueHash[40] = '\0';
+    freeReplyObject(reply);
+    free(lua);
+    return RULES_OK;
+}
+
+// timers are indexed by sid and name in the !ti hash, so they
+// are cancelled without scanning the sorted set
+static unsigned int loadAddTimerCommand(ruleset *tree, binding *rulesBinding) {
+    char *name = &tree->stringPool[tree->nameOffset];
+    redisContext *reContext = rulesBinding->reContext;
+    redisReply *reply;
+    char *lua = NULL;
+    if (asprintf(&lua,
+"local timer_key = \"%s!t\"\n"
+"local index_key = \"%s!ti\"\n"
+"local member = ARGV[2]\n"
+"local ok, timer = pcall(cjson.decode, string.sub(member, 3))\n"
+"if ok and type(timer) == \"table\" and timer[\"$t\"] then\n"
+"    local field = tostring(timer[\"sid\"] or \"0\") .. \"!\" .. tostring(timer[\"$t\"])\n"
+"    local previous = redis.call(\"hget\", index_key, field)\n"
+"    if previous and previous ~= member then\n"
+"        redis.call(\"zrem\", timer_key, previous)\n"
+"    end\n"
+"    redis.call(\"hset\", index_key, field, member)\n"
+"end\n"
+"redis.call(\"zadd\", timer_key, tonumber(ARGV[1]), member)\n"
+"return 0\n", name, name)  == -1) {
+        return ERR_OUT_OF_MEMORY;
+    }
+
+    unsigned int result = redisAppendCommand(reContext, "SCRIPT LOAD %s", lua);
+    GET_REPLY(result, "loadAddTimerCommand", reply);
+
+    strncpy(rulesBinding->addTimerHash, reply->str, 40);
+    rulesBinding->addTimerHash[40] = '\0';
+    freeReplyObject(reply);
+    free(lua);
+    return RULES_OK;
+}
+
+// called with the sid and name of a timer to cancel it, 
+// or with the member of a timer that has fired
 static unsigned int loadRemoveTimerCommand(ruleset *tree, binding *rulesBinding) {
     char *name = &tree->stringPool[tree->nameOffset];
     redisContext *reContext = rulesBinding->reContext;
@@ -464,14 +617,26 @@ static unsigned int loadRemoveTimerCommand(ruleset *tree, binding *rulesBinding)
     char *lua = NULL;
     if (asprintf(&lua,
 "local timer_key = \"%s!t\"\n"
-"local timer_name = ARGV[1]\n"
-"local res = redis.call(\"zrange\", timer_key, 0, -1)\n"
-"for i = 1, #res, 1 do\n"
-"    if string.find(res[i], \"\\\"%%$t\\\"%%s*:%%s*\\\"\" .. timer_name .. \"\\\"\") then\n"
-"        redis.call(\"zrem\", timer_key, res[i])\n"
+"local index_key = \"%s!ti\"\n"
+"if #ARGV == 1 then\n"
+"    local member = ARGV[1]\n"
+"    redis.call(\"zrem\", timer_key, member)\n"
+"    local ok, timer = pcall(cjson.decode, string.sub(member, 3))\n"
+"    if ok and type(timer) == \"table\" and timer[\"$t\"] then\n"
+"        local field = tostring(timer[\"sid\"] or \"0\") .. \"!\" .. tostring(timer[\"$t\"])\n"
+"        if redis.call(\"hget\", index_key, field) == member then\n"
+"            redis.call(\"hdel\", index_key, field)\n"
+"        end\n"
 "    end\n"
+"    return 0\n"
 "end\n"
-"return 0\n", name)  == -1) {
+"local field = ARGV[1] .. \"!\" .. ARGV[2]\n"
+"local member = redis.call(\"hget\", index_key, field)\n"
+"if member then\n"
+"    redis.call(\"zrem\", timer_key, member)\n"
+"    redis.call(\"hdel\", index_key, field)\n"
+"end\n"
+"return 0\n", name, name)  == -1) {
         return ERR_OUT_OF_MEMORY;
     }
 
@@ -486,21 +651,28 @@ static unsigned int loadRemoveTimerCommand(ruleset *tree, binding *rulesBinding)
 }
 
 static unsigned int loadUpdateActionCommand(ruleset *tree, binding *rulesBinding) {
-    char *name = &tree->stringPool[tree->nameOffset];
     redisContext *reContext = rulesBinding->reContext;
     redisReply *reply;
+    char *actionSetLua = NULL;
+    unsigned int result = createActionSetLua(tree, &actionSetLua);
+    if (result != RULES_OK) {
+        return result;
+    }
+
     char *lua = NULL;
     if (asprintf(&lua,
-"local actions_key = \"%s!a\"\n"
+"%s"
 "local score = tonumber(ARGV[2])\n"
 "local sid = ARGV[1]\n"
-"if redis.call(\"zscore\", actions_key, sid) then\n"
-"    redis.call(\"zadd\", actions_key , score, sid)\n"
-"end\n", name)  == -1) {
+"if redis.call(\"zscore\", action_key, sid) then\n"
+"    add_action(score, sid)\n"
+"end\n", actionSetLua)  == -1) {
+        free(actionSetLua);
         return ERR_OUT_OF_MEMORY;
     }
 
-    unsigned int result = redisAppendCommand(reContext, "SCRIPT LOAD %s", lua);
+    free(actionSetLua);
+    result = redisAppendCommand(reContext, "SCRIPT LOAD %s", lua);
     GET_REPLY(result, "loadUpdateActionCommand", reply);
 
     strncpy(rulesBinding->updateActionHash, reply->str, 40);
@@ -510,6 +682,65 @@ static unsigned int loadUpdateActionCommand(ruleset *tree, binding *rulesBinding
     return RULES_OK;
 }
 
+static unsigned int loadStoreSessionCommand(ruleset *tree, binding *rulesBinding) {
+    char *name = &tree->stringPool[tree->nameOffset];
+    redisContext *reContext = rulesBinding->reContext;
+    redisReply *reply;
+    char *lua = NULL;
+    if (asprintf(&lua, 
+"local sid = ARGV[1]\n"
+"if ARGV[3] == \"1\" and redis.call(\"hexists\", \"%s!s\", sid) == 1 then\n"
+"    return 0\n"
+"end\n"
+"redis.call(\"hset\", \"%s!s\", sid, ARGV[2])\n"
+"return redis.call(\"hincrby\", \"%s!s!v\", sid, 1)\n",
+                name,
+                name,
+                name)  == -1) {
+        return ERR_OUT_OF_MEMORY;
+    }
+
+    unsigned int result = redisAppendCommand(reContext, "SCRIPT LOAD %s", lua);
+    GET_REPLY(result, "loadStoreSessionCommand", reply);
+
+    strncpy(rulesBinding->storeSessionHash, reply->str, 40);
+    rulesBinding->storeSessionHash[40] = '\0';
+    freeReplyObject(reply);
+    free(lua);
+    return RULES_OK;
+}
+
+static unsigned int loadRefreshSessionCommand(ruleset *tree, binding *rulesBinding) {
+    char *name = &tree->stringPool[tree->nameOffset];
+    redisContext *reContext = rulesBinding->reContext;
+    redisReply *reply;
+    char *lua = NULL;
+    if (asprintf(&lua, 
+"local sid = ARGV[1]\n"
+"local version = tonumber(redis.call(\"hget\", \"%s!s!v\", sid)) or 0\n"
+"if version ~= 0 and version == tonumber(ARGV[2]) then\n"
+"    return {version, 1}\n"
+"end\n"
+"local state = redis.call(\"hget\", \"%s!s\", sid)\n"
+"if not state then\n"
+"    return {version, 0}\n"
+"end\n"
+"return {version, state}\n",
+                name,
+                name)  == -1) {
+        return ERR_OUT_OF_MEMORY;
+    }
+
+    unsigned int result = redisAppendCommand(reContext, "SCRIPT LOAD %s", lua);
+    GET_REPLY(result, "loadRefreshSessionCommand", reply);
+
+    strncpy(rulesBinding->refreshSessionHash, reply->str, 40);
+    rulesBinding->refreshSessionHash[40] = '\0';
+    freeReplyObject(reply);
+    free(lua);
+    return RULES_OK;
+}
+
 static unsigned int loadDeleteSessionCommand(ruleset *tree, binding *rulesBinding) {
     char *name = &tree->stringPool[tree->nameOffset];
     redisContext *reContext = rulesBinding->reContext;
@@ -551,14 +782,10 @@ static unsigned int loadDeleteSessionCommand(ruleset *tree, binding *rulesBindin
 
                     oldDeleteSessionLua = deleteSessionLua;
                     if (asprintf(&deleteSessionLua, 
-"%sdelete_message_keys(\"%s!f!\" .. sid)\n"
-"delete_message_keys(\"%s!e!\" .. sid)\n"
-"delete_closure_keys(\"%s!c!\" .. sid)\n"
-"delete_closure_keys(\"%s!i!\" .. sid)\n",
+"%sredis.call(\"del\", \"%s!f!\" .. sid)\n"
+"redis.call(\"del\", \"%s!e!\" .. sid)\n",
                                 deleteSessionLua,
                                 currentKey,
-                                currentKey,
-                                currentKey,
                                 currentKey)  == -1) {
                         return ERR_OUT_OF_MEMORY;
                     }  
@@ -569,30 +796,36 @@ static unsigned int loadDeleteSessionCommand(ruleset *tree, binding *rulesBindin
     }
 
 
+    char *actionSetLua = NULL;
+    unsigned int result = createActionSetLua(tree, &actionSetLua);
+    if (result != RULES_OK) {
+        free(deleteSessionLua);
+        return result;
+    }
+
+    // the mid lists and frame lists of a session are registered in 
+    // its !k set when created, so they are deleted without a keys scan.
+    // the !s!v version is bumped rather than deleted, so states cached 
+    // before the delete never match the version of a recreated session
     if (asprintf(&lua, 
 "local sid = ARGV[1]\n"
-"local delete_message_keys = function(events_key)\n"
-"    local all_keys = redis.call(\"keys\", events_key .. \"!m!*\")\n"
-"    for i = 1, #all_keys, 1 do\n"
-"        redis.call(\"del\", all_keys[i])\n"
-"    end\n"
-"    redis.call(\"del\", events_key)\n"
-"end\n"
-"local delete_closure_keys = function(closure_key)\n"
-"    local all_keys = redis.call(\"keys\", closure_key .. \"!*\")\n"
-"    for i = 1, #all_keys, 1 do\n"
-"        redis.call(\"del\", all_keys[i])\n"
-"    end\n"
+"%s"
+"local keys_set = \"%s!k!\" .. sid\n"
+"local session_keys = redis.call(\"smembers\", keys_set)\n"
+"for i = 1, #session_keys, 1 do\n"
+"    redis.call(\"del\", session_keys[i])\n"
 "end\n"
+"redis.call(\"del\", keys_set)\n"
 "redis.call(\"hdel\", \"%s!p\", ARGV[2])\n"
 "redis.call(\"hdel\", \"%s!c\", sid)\n"
 "redis.call(\"hdel\", \"%s!s\", sid)\n"
-"redis.call(\"hdel\", \"%s!s!v\", sid)\n"
-"redis.call(\"zrem\", \"%s!a\", sid)\n"
+"redis.call(\"hincrby\", \"%s!s!v\", sid, 1)\n"
+"remove_action(sid)\n"
 "redis.call(\"del\", \"%s!a!\" .. sid)\n"
 "redis.call(\"del\", \"%s!e!\" .. sid)\n"
 "redis.call(\"del\", \"%s!f!\" .. sid)\n"
 "redis.call(\"del\", \"%s!v!\" .. sid)\n%s",
+                actionSetLua,
                 name,
                 name,
                 name,
@@ -603,11 +836,13 @@ static unsigned int loadDeleteSessionCommand(ruleset *tree, binding *rulesBindin
                 name, 
                 name,
                 deleteSessionLua)  == -1) {
+        free(actionSetLua);
         return ERR_OUT_OF_MEMORY;
     }
 
+    free(actionSetLua);
     free(deleteSessionLua);
-    unsigned int result = redisAppendCommand(reContext, "SCRIPT LOAD %s", lua);
+    result = redisAppendCommand(reContext, "SCRIPT LOAD %s", lua);
     GET_REPLY(result, "loadDeleteSessionCommand", reply);
 
     strncpy(rulesBinding->deleteSessionHash, reply->str, 40);
@@ -705,33 +940,25 @@ static unsigned int loadAddMessageCommand(ruleset *tree, binding *rulesBinding)
 "local facts_hashset = \"%s!f!\" .. sid\n"
 "local visited_hashset = \"%s!v!\" .. sid\n"
 "local mid_count_hashset = \"%s!c\"\n"
-"local message = {}\n"
+"local keys_set = \"%s!k!\" .. sid\n"
+"local packed_message = ARGV[5 + keys_count]\n"
+"local message = cmsgpack.unpack(packed_message)\n"
 "local primary_message_keys = {}\n"
 "local input_keys = {}\n"
 "local save_message = function(current_key, message, events_key, messages_key, save_hashset)\n"
 "    if save_hashset == 1 then\n"
-"        redis.call(\"hsetnx\", messages_key, message[\"id\"], cmsgpack.pack(message))\n"
+"        redis.call(\"hsetnx\", messages_key, message[\"id\"], packed_message or cmsgpack.pack(message))\n"
 "    end\n"
 "    local primary_key = primary_message_keys[current_key](message)\n"
-"    redis.call(\"lpush\", events_key .. \"!m!\" .. primary_key, message[\"id\"])\n"
-"end\n"
-"for index = 5 + keys_count, #ARGV, 3 do\n"
-"    if ARGV[index + 2] == \"1\" then\n"
-"        message[ARGV[index]] = ARGV[index + 1]\n"
-"    elseif ARGV[index + 2] == \"2\" or  ARGV[index + 2] == \"3\" then\n"
-"        message[ARGV[index]] = tonumber(ARGV[index + 1])\n"
-"    elseif ARGV[index + 2] == \"4\" then\n"
-"        if ARGV[index + 1] == \"true\" then\n"
-"            message[ARGV[index]] = true\n"
-"        else\n"
-"            message[ARGV[index]] = false\n"
-"        end\n"
-"    elseif ARGV[index + 2] == \"5\" then\n"
-"        message[ARGV[index]] = cjson.decode(ARGV[index + 1])\n"
-"    elseif ARGV[index + 2] == \"7\" then\n"
-"        message[ARGV[index]] = \"$null\"\n"
+"    local mids_key = events_key .. \"!m!\" .. primary_key\n"
+"    if redis.call(\"lpush\", mids_key, message[\"id\"]) == 1 then\n"
+"        redis.call(\"sadd\", keys_set, mids_key)\n"
 "    end\n"
 "end\n"
+"for index = 6 + keys_count, #ARGV, 1 do\n"
+"    message[ARGV[index]] = cjson.decode(message[ARGV[index]])\n"
+"    packed_message = nil\n"
+"end\n"
 "local mid = message[\"id\"]\n"
 "if mid == \"\" then\n"
 "    if mark_visited == 0 then\n"
@@ -740,6 +967,7 @@ static unsigned int loadAddMessageCommand(ruleset *tree, binding *rulesBinding)
 "        mid = \"$m-\" .. redis.call(\"hincrby\", mid_count_hashset, sid, 1)\n"
 "    end\n"
 "    message[\"id\"] = mid\n"
+"    packed_message = nil\n"
 "else\n"
 "    if assert_fact == 1 then\n"
 "        if redis.call(\"hexists\", facts_hashset, mid) == 1 then\n"
@@ -759,7 +987,6 @@ static unsigned int loadAddMessageCommand(ruleset *tree, binding *rulesBinding)
 "    input_keys[ARGV[index]] = true\n"
 "end\n"
 "%sif assert_fact == 1 then\n"
-"    message[\"$f\"] = 1\n"
 "    for index = 5, 4 + keys_count, 1 do\n"
 "        local key = ARGV[index]\n"
 "        save_message(key, message, key .. \"!f!\" .. sid, facts_hashset, mark_visited)\n"
@@ -774,6 +1001,7 @@ static unsigned int loadAddMessageCommand(ruleset *tree, binding *rulesBinding)
                 name,
                 name,
                 name,
+                name,
                 ERR_EVENT_OBSERVED,
                 ERR_EVENT_OBSERVED,
                 ERR_EVENT_OBSERVED,
@@ -967,13 +1195,20 @@ static unsigned int loadPeekActionCommand(ruleset *tree, binding *rulesBinding)
         }
     }
 
+    char *actionSetLua = NULL;
+    unsigned int result = createActionSetLua(tree, &actionSetLua);
+    if (result != RULES_OK) {
+        return result;
+    }
+
     if (asprintf(&lua, 
+"%s"
 "local facts_key = \"%s!f!\"\n"
 "local events_key = \"%s!e!\"\n"
 "local visited_key = \"%s!v!\"\n"
-"local action_key = \"%s!a\"\n"
 "local state_key = \"%s!s\"\n"
 "local timers_key = \"%s!t\"\n"
+"local keys_key = \"%s!k!\"\n"
 "local context_directory = {}\n"
 "local keys\n"
 "local reviewers\n"
@@ -1027,7 +1262,9 @@ static unsigned int loadPeekActionCommand(ruleset *tree, binding *rulesBinding)
 "        local message = get_message(new_mids[i], messages_key, message_cache)\n"
 "        if message and not reviewers[index](message, frame, index) then\n"
 "            local frames_key = keys[index] .. \"!i!\" .. sid .. \"!\" .. new_mids[i]\n"
-"            redis.call(\"rpush\", frames_key, tostring(packed_frame))\n"
+"            if redis.call(\"rpush\", frames_key, tostring(packed_frame)) == 1 then\n"
+"                redis.call(\"sadd\", keys_key .. sid, frames_key)\n"
+"            end\n"
 "            return false\n"
 "        end\n"
 "    end\n"
@@ -1065,7 +1302,7 @@ static unsigned int loadPeekActionCommand(ruleset *tree, binding *rulesBinding)
 "        for i = 1, #frame, 1 do\n"
 "            if type(frame[i]) == \"table\" then\n"
 "                redis.call(\"hdel\", visited_key .. sid, frame[i][\"id\"])\n"
-"                redis.call(\"zadd\", timers_key, max_score, \"p:\" .. cjson.encode(frame[i]))\n"
+"                redis.call(\"zadd\", timers_key, max_score * 1000, \"p:\" .. cjson.encode(frame[i]))\n"
 "            end\n"
 "        end\n"
 "        full_frame = nil\n"
@@ -1133,7 +1370,7 @@ static unsigned int loadPeekActionCommand(ruleset *tree, binding *rulesBinding)
 "    local sid = current_action[1]\n"
 "    local name, frame = load_frame_from_sid(sid, max_score)\n"
 "    while not frame do\n"
-"        redis.call(\"zremrangebyrank\", action_key, 0, 0)\n"
+"        remove_action(sid)\n"
 "        current_action = redis.call(\"zrange\", action_key, 0, 0, \"withscores\")\n"
 "        if #current_action == 0 or (tonumber(current_action[2]) > (max_score + 5)) then\n"
 "            return nil, nil, nil\n"
@@ -1143,6 +1380,33 @@ static unsigned int loadPeekActionCommand(ruleset *tree, binding *rulesBinding)
 "    end\n"
 "    return sid, name, frame\n"
 "end\n"
+"local get_scan_key = function(partition_index, partitions_length)\n"
+"    if partitions_length > 1 and indexed_partitions == partitions_length then\n"
+"        return partition_key .. partition_index, true\n"
+"    end\n"
+"    return action_key, partitions_length == 1\n"
+"end\n"
+"local load_partition_frame = function(max_score, partition_index, partitions_length)\n"
+"    local scan_key, indexed = get_scan_key(partition_index, partitions_length)\n"
+"    local offset = 0\n"
+"    repeat\n"
+"        local current_actions = redis.call(\"zrangebyscore\", scan_key, \"-inf\", max_score + 5, \"limit\", offset, 100)\n"
+"        local removed = 0\n"
+"        for i = 1, #current_actions, 1 do\n"
+"            local sid = current_actions[i]\n"
+"            if indexed or get_partition(sid, partitions_length) == partition_index then\n"
+"                local name, frame = load_frame_from_sid(sid, max_score)\n"
+"                if frame then\n"
+"                    return sid, name, frame\n"
+"                end\n"
+"                remove_action(sid)\n"
+"                removed = removed + 1\n"
+"            end\n"
+"        end\n"
+"        offset = offset + #current_actions - removed\n"
+"    until #current_actions < 100\n"
+"    return nil, nil, nil\n"
+"end\n"
 "local fixup_frame = function(frame)\n"
 "    local new_frame = {}\n"
 "    for message_name, message in pairs(frame) do\n"
@@ -1210,28 +1474,65 @@ static unsigned int loadPeekActionCommand(ruleset *tree, binding *rulesBinding)
 "    end\n"
 "    return new_frame\n"
 "end\n"
+"local load_frames = function(lease_score, max_score, max_count, partition_index, partitions_length)\n"
+"    local result = {}\n"
+"    local offset = 0\n"
+"    local page_length = max_count + 100\n"
+"    local scan_key, indexed = get_scan_key(partition_index, partitions_length)\n"
+"    repeat\n"
+"        local current_actions = redis.call(\"zrangebyscore\", scan_key, \"-inf\", max_score + 5, \"limit\", offset, page_length)\n"
+"        local removed = 0\n"
+"        for i = 1, #current_actions, 1 do\n"
+"            local sid = current_actions[i]\n"
+"            if indexed or get_partition(sid, partitions_length) == partition_index then\n"
+"                local name, frame = load_frame_from_sid(sid, max_score)\n"
+"                if frame then\n"
+"                    add_action(lease_score, sid)\n"
+"                    removed = removed + 1\n"
+"                    table.insert(result, sid)\n"
+"                    table.insert(result, redis.call(\"hget\", state_key, sid))\n"
+"                    table.insert(result, cjson.encode({[name] = fixup_frame(frame)}))\n"
+"                    if #result == max_count * 3 then\n"
+"                        return result\n"
+"                    end\n"
+"                else\n"
+"                    remove_action(sid)\n"
+"                    removed = removed + 1\n"
+"                end\n"
+"            end\n"
+"        end\n"
+"        offset = offset + #current_actions - removed\n"
+"    until #current_actions < page_length\n"
+"    return result\n"
+"end\n"
 "get_context = function(action_key)\n"
 "    if context_directory[action_key] then\n"
 "        return context_directory[action_key]\n"
 "    end\n"
 "    local input_keys = {[action_key] = true}\n%s"
 "end\n"
+"if #ARGV == 5 then\n"
+"    return load_frames(tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4]), tonumber(ARGV[5]))\n"
+"end\n"
 "local new_sid, action_name, frame\n"
 "if #ARGV == 3 then\n"
 "    new_sid = ARGV[3]\n"
 "    action_name, frame = load_frame_from_sid(new_sid, tonumber(ARGV[2]))\n"
+"elseif #ARGV == 4 then\n"
+"    new_sid, action_name, frame = load_partition_frame(tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4]))\n"
 "else\n"
 "    new_sid, action_name, frame = load_frame(tonumber(ARGV[2]))\n"
 "end\n"
 "if frame then\n"
-"    redis.call(\"zadd\", action_key, tonumber(ARGV[1]), new_sid)\n"
-"    if #ARGV == 2 then\n"
+"    add_action(tonumber(ARGV[1]), new_sid)\n"
+"    if #ARGV ~= 3 then\n"
 "        local state = redis.call(\"hget\", state_key, new_sid)\n"
 "        return {new_sid, state, cjson.encode({[action_name] = fixup_frame(frame)})}\n"
 "    else\n"
 "        return {new_sid, cjson.encode({[action_name] = fixup_frame(frame)})}\n"
 "    end\n"
 "end\n",
+                actionSetLua,
                 name,
                 name,
                 name,
@@ -1239,10 +1540,12 @@ static unsigned int loadPeekActionCommand(ruleset *tree, binding *rulesBinding)
                 name,
                 name,
                 peekActionLua)  == -1) {
+        free(actionSetLua);
         return ERR_OUT_OF_MEMORY;
     }
+    free(actionSetLua);
     free(peekActionLua);
-    unsigned int result = redisAppendCommand(reContext, "SCRIPT LOAD %s", lua);
+    result = redisAppendCommand(reContext, "SCRIPT LOAD %s", lua);
     GET_REPLY(result, "loadPeekActionCommand", reply);
 
     strncpy(rulesBinding->peekActionHash, reply->str, 40);
@@ -1715,8 +2018,15 @@ static unsigned int loadEvalMessageCommand(ruleset *tree, binding *rulesBinding)
         free(packFrameLua);
     }
 
+    char *actionSetLua = NULL;
+    unsigned int result = createActionSetLua(tree, &actionSetLua);
+    if (result != RULES_OK) {
+        return result;
+    }
+
     oldLua = lua;
     if (asprintf(&lua,
+"%s"
 "local sid = ARGV[1]\n"
 "local mid = ARGV[2]\n"
 "local score = tonumber(ARGV[3])\n"
@@ -1726,8 +2036,10 @@ static unsigned int loadEvalMessageCommand(ruleset *tree, binding *rulesBinding)
 "local facts_hashset = \"%s!f!\" .. sid\n"
 "local visited_hashset = \"%s!v!\" .. sid\n"
 "local actions_key = \"%s!a\"\n"
+"local doorbell_key = \"%s!w\"\n"
 "local state_key = \"%s!s\"\n"
 "local mid_count_hashset = \"%s!c\"\n"
+"local keys_set = \"%s!k!\" .. sid\n"
 "local facts_message_cache = {}\n"
 "local events_message_cache = {}\n"
 "local facts_mids_cache = {}\n"
@@ -1761,9 +2073,12 @@ static unsigned int loadEvalMessageCommand(ruleset *tree, binding *rulesBinding)
 "        end\n"
 "    end\n"
 "    event_mids[primary_key] = result_mids\n"
-"    redis.call(\"del\", events_key .. \"!m!\" .. primary_key)\n"
+"    local mids_key = events_key .. \"!m!\" .. primary_key\n"
+"    redis.call(\"del\", mids_key)\n"
 "    for i = 1, #result_mids, 1 do\n"
-"        redis.call(\"rpush\", events_key .. \"!m!\" .. primary_key, result_mids[i])\n"
+"        if redis.call(\"rpush\", mids_key, result_mids[i]) == 1 then\n"
+"            redis.call(\"sadd\", keys_set, mids_key)\n"
+"        end\n"
 "    end\n"
 "end\n"
 "local get_mids = function(index, frame, events_key, messages_key, mids_cache, message_cache)\n"
@@ -1803,10 +2118,14 @@ static unsigned int loadEvalMessageCommand(ruleset *tree, binding *rulesBinding)
 "    end\n"
 "    return message\n"
 "end\n"
+"local packed_message = nil\n"
 "local save_message = function(index, message, events_key, messages_key)\n"
-"    redis.call(\"hsetnx\", messages_key, message[\"id\"], cmsgpack.pack(message))\n"
+"    redis.call(\"hsetnx\", messages_key, message[\"id\"], packed_message or cmsgpack.pack(message))\n"
 "    local primary_key = primary_message_keys[index](message)\n"
-"    redis.call(\"lpush\", events_key .. \"!m!\" .. primary_key, message[\"id\"])\n"
+"    local mids_key = events_key .. \"!m!\" .. primary_key\n"
+"    if redis.call(\"lpush\", mids_key, message[\"id\"]) == 1 then\n"
+"        redis.call(\"sadd\", keys_set, mids_key)\n"
+"    end\n"
 "end\n"
 "local save_result = function(frame, index)\n"
 "    table.insert(results, 1, frame_packers[index](frame, true))\n"
@@ -1846,7 +2165,9 @@ static unsigned int loadEvalMessageCommand(ruleset *tree, binding *rulesBinding)
 "                local frames_key\n"
 "                local primary_key = primary_frame_keys[index + 1](new_frame)\n"
 "                frames_key = keys[index + 1] .. \"!c!\" .. sid .. \"!\" .. primary_key\n"
-"                redis.call(\"rpush\", frames_key, frame_packers[index](new_frame))\n"
+"                if redis.call(\"rpush\", frames_key, frame_packers[index](new_frame)) == 1 then\n"
+"                    redis.call(\"sadd\", keys_set, frames_key)\n"
+"                end\n"
 "            end\n"
 "        end\n"
 "    end\n"
@@ -1876,7 +2197,9 @@ static unsigned int loadEvalMessageCommand(ruleset *tree, binding *rulesBinding)
 "                cleanup = true\n"
 "            elseif not reviewers[index](message, new_frame, index) then\n"
 "                local frames_key = keys[index] .. \"!i!\" .. sid .. \"!\" .. new_mids[i]\n"
-"                redis.call(\"rpush\", frames_key, frame_packers[index - 1](new_frame))\n"
+"                if redis.call(\"rpush\", frames_key, frame_packers[index - 1](new_frame)) == 1 then\n"
+"                    redis.call(\"sadd\", keys_set, frames_key)\n"
+"                end\n"
 "                result = 0\n"
 "                break\n"
 "            end\n"
@@ -1967,7 +2290,9 @@ static unsigned int loadEvalMessageCommand(ruleset *tree, binding *rulesBinding)
 "                local count = process_event_and_frame(message, frame, index, use_facts)\n"
 "                result = result + count\n"         
 "                if count == 0 or use_facts then\n"
-"                    redis.call(\"lpush\", frames_key, packed_frame)\n"
+"                    if redis.call(\"lpush\", frames_key, packed_frame) == 1 then\n"
+"                        redis.call(\"sadd\", keys_set, frames_key)\n"
+"                    end\n"
 "                else\n"
 "                    break\n" 
 "                end\n"
@@ -2017,7 +2342,8 @@ static unsigned int loadEvalMessageCommand(ruleset *tree, binding *rulesBinding)
 "            end\n"
 "            if new_remain > 0 or new_count > 0 then\n"
 "                if not redis.call(\"zscore\", actions_key, sid) then\n"
-"                    redis.call(\"zadd\", actions_key , score, sid)\n"
+"                    add_action(score, sid)\n"
+"                    redis.call(\"publish\", doorbell_key, sid)\n"
 "                end\n"
 "            end\n"
 "        end\n"
@@ -2058,7 +2384,8 @@ static unsigned int loadEvalMessageCommand(ruleset *tree, binding *rulesBinding)
 "                    redis.call(\"rpush\", actions_key .. \"!\" .. sid, \"$w\" .. window)\n"
 "                end\n"
 "                if not redis.call(\"zscore\", actions_key, sid) then\n"
-"                    redis.call(\"zadd\", actions_key , score, sid)\n"
+"                    add_action(score, sid)\n"
+"                    redis.call(\"publish\", doorbell_key, sid)\n"
 "                end\n"
 "             end\n"
 "        end\n"
@@ -2093,33 +2420,19 @@ static unsigned int loadEvalMessageCommand(ruleset *tree, binding *rulesBinding)
 "    return true\n"
 "end\n"
 "local message = nil\n"
-"if #ARGV > (6 + keys_count) then\n"
-"    message = {}\n"
-"    for index = 6 + keys_count, #ARGV, 3 do\n"
-"        if ARGV[index + 2] == \"1\" then\n"
-"            message[ARGV[index]] = ARGV[index + 1]\n"
-"        elseif ARGV[index + 2] == \"2\" or  ARGV[index + 2] == \"3\" then\n"
-"            message[ARGV[index]] = tonumber(ARGV[index + 1])\n"
-"        elseif ARGV[index + 2] == \"4\" then\n"
-"            if ARGV[index + 1] == \"true\" then\n"
-"                message[ARGV[index]] = true\n"
-"            else\n"
-"                message[ARGV[index]] = false\n"
-"            end\n"
-"        elseif ARGV[index + 2] == \"5\" then\n"
-"            message[ARGV[index]] = cjson.decode(ARGV[index + 1])\n"
-"        elseif ARGV[index + 2] == \"7\" then\n"
-"            message[ARGV[index]] = \"$null\"\n"
-"        end\n"
-"    end\n"
-"    if assert_fact == 1 then\n"
-"        message[\"$f\"] = 1\n"
+"if #ARGV >= (6 + keys_count) then\n"
+"    packed_message = ARGV[6 + keys_count]\n"
+"    message = cmsgpack.unpack(packed_message)\n"
+"    for index = 7 + keys_count, #ARGV, 1 do\n"
+"        message[ARGV[index]] = cjson.decode(message[ARGV[index]])\n"
+"        packed_message = nil\n"
 "    end\n"
 "end\n"
 "if mid == \"\" then\n"
 "    mid = \"$m-\" .. redis.call(\"hincrby\", mid_count_hashset, sid, 1)\n"
 "    if message then\n"
 "        message[\"id\"] = mid\n"
+"        packed_message = nil\n"
 "    end\n"
 "else\n"
 "    if assert_fact == 1 then\n"
@@ -2136,6 +2449,9 @@ static unsigned int loadEvalMessageCommand(ruleset *tree, binding *rulesBinding)
 "    input_keys[ARGV[index]] = true\n"
 "end\n"
 "%s\n",
+                 actionSetLua,
+                 name,
+                 name,
                  name,
                  name,
                  name,
@@ -2145,11 +2461,13 @@ static unsigned int loadEvalMessageCommand(ruleset *tree, binding *rulesBinding)
                  ERR_EVENT_OBSERVED,
                  ERR_EVENT_OBSERVED,
                  lua)  == -1) {
+        free(actionSetLua);
         return ERR_OUT_OF_MEMORY;
     }
     
+    free(actionSetLua);
     free(oldLua);
-    unsigned int result = redisAppendCommand(reContext, "SCRIPT LOAD %s", lua);
+    result = redisAppendCommand(reContext, "SCRIPT LOAD %s", lua);
     GET_REPLY(result, "loadEvalMessageCommand", reply);
 
     strncpy(rulesBinding->evalMessageHash, reply->str, 40);
@@ -2216,21 +2534,42 @@ static unsigned int setNames(ruleset *tree, binding *rulesBinding) {
     timersSortedset[nameLength + 1] = 't';
     timersSortedset[nameLength + 2] = '\0';
     rulesBinding->timersSortedset = timersSortedset;
+
+    char *doorbellChannel = malloc((nameLength + 3) * sizeof(char));
+    if (!doorbellChannel) {
+        return ERR_OUT_OF_MEMORY;
+    }
+
+    strncpy(doorbellChannel, name, nameLength);
+    doorbellChannel[nameLength] = '!';
+    doorbellChannel[nameLength + 1] = 'w';
+    doorbellChannel[nameLength + 2] = '\0';
+    rulesBinding->doorbellChannel = doorbellChannel;
     return RULES_OK;
 }
 
 static unsigned int loadCommands(ruleset *tree, binding *rulesBinding) {
-    unsigned int result = loadPartitionCommand(tree, rulesBinding);
+    // client queues have no commands to load, 
+    if (!tree->stringPool) {
+        return RULES_OK;
+    }
+
+    unsigned int result = loadTimerCommand(tree, rulesBinding);
     if (result != RULES_OK) {
         return result;
     }
 
-    // client queues have no commands to load, 
-    if (!tree->stringPool) {
-        return RULES_OK;
+    result = migrateTimers(tree, rulesBinding);
+    if (result != RULES_OK) {
+        return result;
+    }
+
+    result = loadAddTimerCommand(tree, rulesBinding);
+    if (result != RULES_OK) {
+        return result;
     }
 
-    result = loadTimerCommand(tree, rulesBinding);
+    result = loadPeekQueueCommand(tree, rulesBinding);
     if (result != RULES_OK) {
         return result;
     }
@@ -2270,6 +2609,16 @@ static unsigned int loadCommands(ruleset *tree, binding *rulesBinding) {
         return result;
     }
 
+    result = loadStoreSessionCommand(tree, rulesBinding);
+    if (result != RULES_OK) {
+        return result;
+    }
+
+    result = loadRefreshSessionCommand(tree, rulesBinding);
+    if (result != RULES_OK) {
+        return result;
+    }
+
     result = setNames(tree, rulesBinding);
     if (result != RULES_OK) {
         return result;
@@ -2278,34 +2627,315 @@ static unsigned int loadCommands(ruleset *tree, binding *rulesBinding) {
     return RULES_OK;
 }
 
-unsigned int bindRuleset(void *handle, 
-                         char *host, 
-                         unsigned int port, 
-                         char *password,
-                         unsigned char db) {
-    ruleset *tree = (ruleset*)handle;
-    bindingsList *list;
-    if (tree->bindingsList) {
-        list = tree->bindingsList;
-    }
-    else {
-        list = malloc(sizeof(bindingsList));
-        if (!list) {
+static unsigned int copyString(char *source, char **target) {
+    *target = NULL;
+    if (source) {
+        *target = malloc((strlen(source) + 1) * sizeof(char));
+        if (!*target) {
             return ERR_OUT_OF_MEMORY;
         }
 
-        list->bindings = NULL;
-        list->bindingsLength = 0;
-        list->lastBinding = 0;
-        list->lastTimersBinding = 0;
-        tree->bindingsList = list;
+        strcpy(*target, source);
     }
 
+    return RULES_OK;
+}
+
+static unsigned int connectWaitContext(binding *rulesBinding) {
     redisContext *reContext;
-    if (port == 0) {
-        reContext = redisConnectUnix(host);
+    if (rulesBinding->port == 0) {
+        reContext = redisConnectUnix(rulesBinding->host);
     } else {
-        reContext = redisConnect(host, port);
+        reContext = redisConnect(rulesBinding->host, rulesBinding->port);
+    }
+    
+    if (reContext->err) {
+        redisFree(reContext);
+        return ERR_CONNECT_REDIS;
+    }
+
+    int result = REDIS_OK;
+    if (rulesBinding->password != NULL) {
+        result = redisAppendCommand(reContext, "auth %s", rulesBinding->password);
+        VERIFY(result, "connectWaitContext");
+    }
+
+    if (rulesBinding->db) {
+        result = redisAppendCommand(reContext, "select %d", rulesBinding->db);
+        VERIFY(result, "connectWaitContext");
+    }
+
+    result = redisAppendCommand(reContext, "subscribe %s", rulesBinding->doorbellChannel);
+    VERIFY(result, "connectWaitContext");
+    rulesBinding->waitContext = reContext;
+    return RULES_OK;
+}
+
+static unsigned int connectPooledContext(binding *rulesBinding, redisContext **newContext) {
+    redisContext *reContext;
+    if (rulesBinding->port == 0) {
+        reContext = redisConnectUnix(rulesBinding->host);
+    } else {
+        reContext = redisConnect(rulesBinding->host, rulesBinding->port);
+    }
+    
+    if (reContext->err) {
+        redisFree(reContext);
+        return ERR_CONNECT_REDIS;
+    }
+
+    int result = REDIS_OK;
+
+#ifndef _WIN32
+    struct timeval tv;
+    tv.tv_sec = 10;
+    tv.tv_usec = 0;
+    result = redisSetTimeout(reContext, tv);
+    if (result != REDIS_OK) {
+        redisFree(reContext);
+        return ERR_REDIS_ERROR;
+    }
+#endif
+
+    if (rulesBinding->password != NULL) {
+        result = redisAppendCommand(reContext, "auth %s", rulesBinding->password);
+        VERIFY(result, "connectPooledContext");
+    }
+
+    if (rulesBinding->db) {
+        result = redisAppendCommand(reContext, "select %d", rulesBinding->db);
+        VERIFY(result, "connectPooledContext");
+    }
+
+    *newContext = reContext;
+    return RULES_OK;
+}
+
+static pooledContext *findConversation(connectionPool *pool) {
+    rulesThread current = CURRENT_THREAD();
+    for (unsigned int i = 0; i < pool->contextsLength; ++i) {
+        pooledContext *currentContext = &pool->contexts[i];
+        if (currentContext->pendingReplies && SAME_THREAD(currentContext->owner, current)) {
+            return currentContext;
+        }
+    }
+
+    return NULL;
+}
+
+static void awaitConversations(connectionPool *pool) {
+    // callers hold the pool lock, the current thread's own conversation 
+    // is not waited for
+    rulesThread current = CURRENT_THREAD();
+    unsigned char pending;
+    do {
+        pending = 0;
+        for (unsigned int i = 0; i < pool->contextsLength; ++i) {
+            pooledContext *currentContext = &pool->contexts[i];
+            if (currentContext->pendingReplies && !SAME_THREAD(currentContext->owner, current)) {
+                pending = 1;
+                break;
+            }
+        }
+
+        if (pending) {
+            WAIT_CONDITION(pool->released, pool->lock);
+        }
+    } while (pending);
+}
+
+static void awaitPrimaryContext(binding *rulesBinding) {
+    // posts written on the pool are acknowledged before the primary 
+    // connection is used, so peeks and commits are ordered after them
+    connectionPool *pool = rulesBinding->pool;
+    if (!pool) {
+        return;
+    }
+
+    LOCK_MUTEX(pool->lock);
+    awaitConversations(pool);
+    UNLOCK_MUTEX(pool->lock);
+}
+
+// run once a ruleset is partitioned, the partition sets are built
+// again from the action set when the partitions count has changed
+static unsigned int indexPartitions(ruleset *tree, binding *rulesBinding) {
+    redisContext *reContext = rulesBinding->reContext;
+    redisReply *reply;
+    char *actionSetLua = NULL;
+    unsigned int result = createActionSetLua(tree, &actionSetLua);
+    if (result != RULES_OK) {
+        return result;
+    }
+
+    char *lua = NULL;
+    if (asprintf(&lua,
+"%s"
+"local partitions_length = tonumber(ARGV[1])\n"
+"if indexed_partitions == partitions_length then\n"
+"    return 0\n"
+"end\n"
+"for i = 0, indexed_partitions - 1, 1 do\n"
+"    redis.call(\"del\", partition_key .. i)\n"
+"end\n"
+"local actions = redis.call(\"zrange\", action_key, 0, -1, \"withscores\")\n"
+"for i = 1, #actions, 2 do\n"
+"    redis.call(\"zadd\", partition_key .. get_partition(actions[i], partitions_length), actions[i + 1], actions[i])\n"
+"end\n"
+"redis.call(\"set\", partitions_key, partitions_length)\n"
+"return #actions / 2\n",
+                 actionSetLua) == -1) {
+        free(actionSetLua);
+        return ERR_OUT_OF_MEMORY;
+    }
+
+    free(actionSetLua);
+    awaitPrimaryContext(rulesBinding);
+    result = redisAppendCommand(reContext, "EVAL %s 0 %d", lua, tree->partitionsLength);
+    free(lua);
+    GET_REPLY(result, "indexPartitions", reply);
+    freeReplyObject(reply);
+    return RULES_OK;
+}
+
+unsigned int registerPartitions(ruleset *tree) {
+    bindingsList *list = tree->bindingsList;
+    if (!list || tree->partitionsLength <= 1) {
+        return RULES_OK;
+    }
+
+    for (unsigned int i = 0; i < list->bindingsLength; ++i) {
+        unsigned int result = indexPartitions(tree, &list->bindings[i]);
+        if (result != RULES_OK) {
+            return result;
+        }
+    }
+
+    return RULES_OK;
+}
+
+static void dropConversation(connectionPool *pool, pooledContext *pooled) {
+    // the replies still pending cannot be matched anymore, completing 
+    // the conversation reports the error
+    LOCK_MUTEX(pool->lock);
+    if (pooled->reContext) {
+        redisFree(pooled->reContext);
+        pooled->reContext = NULL;
+    }
+
+    pooled->pendingReplies = 0;
+    BROADCAST_CONDITION(pool->released);
+    UNLOCK_MUTEX(pool->lock);
+}
+
+static unsigned int createPoolContexts(unsigned int poolLength, pooledContext **contexts) {
+    // connections are opened the first time a conversation needs them
+    *contexts = malloc(sizeof(pooledContext) * poolLength);
+    if (!*contexts) {
+        return ERR_OUT_OF_MEMORY;
+    }
+
+    for (unsigned int i = 0; i < poolLength; ++i) {
+        (*contexts)[i].reContext = NULL;
+        (*contexts)[i].pendingReplies = 0;
+    }
+
+    return RULES_OK;
+}
+
+static void deletePoolContexts(connectionPool *pool) {
+    for (unsigned int i = 0; i < pool->contextsLength; ++i) {
+        if (pool->contexts[i].reContext) {
+            redisFree(pool->contexts[i].reContext);
+        }
+    }
+
+    free(pool->contexts);
+    pool->contexts = NULL;
+    pool->contextsLength = 0;
+}
+
+static unsigned int createPool(binding *rulesBinding, unsigned int poolLength) {
+    connectionPool *pool = malloc(sizeof(connectionPool));
+    if (!pool) {
+        return ERR_OUT_OF_MEMORY;
+    }
+
+    unsigned int result = createPoolContexts(poolLength, &pool->contexts);
+    if (result != RULES_OK) {
+        free(pool);
+        return result;
+    }
+
+    pool->contextsLength = poolLength;
+    INIT_MUTEX(pool->lock);
+    INIT_CONDITION(pool->released);
+    rulesBinding->pool = pool;
+    return RULES_OK;
+}
+
+static unsigned int resizePool(binding *rulesBinding, unsigned int poolLength) {
+    connectionPool *pool = rulesBinding->pool;
+    pooledContext *contexts;
+    LOCK_MUTEX(pool->lock);
+    awaitConversations(pool);
+    unsigned int result = createPoolContexts(poolLength, &contexts);
+    if (result != RULES_OK) {
+        UNLOCK_MUTEX(pool->lock);
+        return result;
+    }
+
+    deletePoolContexts(pool);
+    pool->contexts = contexts;
+    pool->contextsLength = poolLength;
+    BROADCAST_CONDITION(pool->released);
+    UNLOCK_MUTEX(pool->lock);
+    return RULES_OK;
+}
+
+static void deletePool(binding *rulesBinding) {
+    connectionPool *pool = rulesBinding->pool;
+    if (!pool) {
+        return;
+    }
+
+    deletePoolContexts(pool);
+    DESTROY_MUTEX(pool->lock);
+    DESTROY_CONDITION(pool->released);
+    free(pool);
+    rulesBinding->pool = NULL;
+}
+
+unsigned int bindRuleset(void *handle, 
+                         char *host, 
+                         unsigned int port, 
+                         char *password,
+                         unsigned char db) {
+    ruleset *tree = (ruleset*)handle;
+    bindingsList *list;
+    if (tree->bindingsList) {
+        list = tree->bindingsList;
+    }
+    else {
+        list = malloc(sizeof(bindingsList));
+        if (!list) {
+            return ERR_OUT_OF_MEMORY;
+        }
+
+        list->bindings = NULL;
+        list->bindingsLength = 0;
+        list->lastBinding = 0;
+        list->lastTimersBinding = 0;
+        list->lastQueueBinding = 0;
+        list->poolLength = 1;
+        tree->bindingsList = list;
+    }
+
+    redisContext *reContext;
+    if (port == 0) {
+        reContext = redisConnectUnix(host);
+    } else {
+        reContext = redisConnect(host, port);
     }
     
     if (reContext->err) {
@@ -2346,9 +2976,64 @@ unsigned int bindRuleset(void *handle,
         redisFree(reContext);
         return ERR_OUT_OF_MEMORY;
     }
-    list->bindings[list->bindingsLength].reContext = reContext;
+    binding *newBinding = &list->bindings[list->bindingsLength];
+    newBinding->reContext = reContext;
+    newBinding->waitContext = NULL;
+    newBinding->pool = NULL;
+    newBinding->port = port;
+    newBinding->db = db;
+    newBinding->password = NULL;
+    newBinding->doorbellChannel = NULL;
     ++list->bindingsLength;
-    return loadCommands(tree, &list->bindings[list->bindingsLength -1]);
+    result = copyString(host, &newBinding->host);
+    if (result != RULES_OK) {
+        return result;
+    }
+
+    result = copyString(password, &newBinding->password);
+    if (result != RULES_OK) {
+        return result;
+    }
+
+    result = createPool(newBinding, list->poolLength);
+    if (result != RULES_OK) {
+        return result;
+    }
+
+    result = loadCommands(tree, newBinding);
+    if (result != RULES_OK) {
+        return result;
+    }
+
+    if (tree->partitionsLength > 1) {
+        return indexPartitions(tree, newBinding);
+    }
+
+    return RULES_OK;
+}
+
+unsigned int setConnectionPool(void *handle, unsigned int poolLength) {
+    ruleset *tree = (ruleset*)handle;
+    bindingsList *list = tree->bindingsList;
+    if (!list) {
+        return ERR_BINDING_NOT_MAPPED;
+    }
+
+    if (!poolLength) {
+        return ERR_UNEXPECTED_VALUE;
+    }
+
+    // conversations of other threads are read to the end before 
+    // their connections are closed
+    list->poolLength = poolLength;
+    for (unsigned int i = 0; i < list->bindingsLength; ++i) {
+        unsigned int result = resizePool(&list->bindings[i], poolLength);
+        if (result != RULES_OK) {
+            return result;
+        }
+    }
+
+    return RULES_OK;
 }
 
 unsigned int deleteBindingsList(ruleset *tree) {
@@ -2357,6 +3042,13 @@ unsigned int deleteBindingsList(ruleset *tree) {
         for (unsigned int i = 0; i < list->bindingsLength; ++i) {
             binding *currentBinding = &list->bindings[i];
             redisFree(currentBinding->reContext);
+            deletePool(currentBinding);
+            if (currentBinding->waitContext) {
+                redisFree(currentBinding->waitContext);
+            }
+            free(currentBinding->doorbellChannel);
+            free(currentBinding->host);
+            free(currentBinding->password);
             free(currentBinding->timersSortedset);
             free(currentBinding->sessionHashset);
             free(currentBinding->factsHashset);
@@ -2369,24 +3061,373 @@ unsigned int deleteBindingsList(ruleset *tree) {
     return RULES_OK;
 }
 
+static unsigned int jumpHash(unsigned long long key, unsigned int bucketsLength) {
+    long long bucket = -1;
+    long long next = 0;
+    while (next < bucketsLength) {
+        bucket = next;
+        key = key * 2862933555777941757ULL + 1;
+        next = (long long)((bucket + 1) * ((double)(1LL << 31) / (double)((key >> 33) + 1)));
+    }
+
+    return (unsigned int)bucket;
+}
+
 unsigned int getBindingIndex(ruleset *tree, unsigned int sidHash, unsigned int *bindingIndex) {
     bindingsList *list = tree->bindingsList;
-    binding *firstBinding = &list->bindings[0];
-    redisContext *reContext = firstBinding->reContext;
+    if (list->bindingsLength == 1) {
+        *bindingIndex = 0;
+        return RULES_OK;
+    }
 
-    int result = redisAppendCommand(reContext, 
-                                    "evalsha %s 0 %u %d", 
-                                    firstBinding->partitionHash, 
-                                    sidHash, 
-                                    list->bindingsLength);
-    redisReply *reply;
-    GET_REPLY(result, "loadEvalMessageCommand", reply);
+    // sids placed by the !p hashset keep their binding while migrating,
+    // which is turned on explicitly, new sids are placed by the jump hash
+    if (tree->migratePartitions) {
+        binding *firstBinding = &list->bindings[0];
+        awaitPrimaryContext(firstBinding);
+        redisContext *reContext = firstBinding->reContext;
+        int result = redisAppendCommand(reContext, 
+                                        "hget %s %u", 
+                                        firstBinding->partitionHashset, 
+                                        sidHash);
+        redisReply *reply;
+        GET_REPLY(result, "getBindingIndex", reply);
+
+        if (reply->type == REDIS_REPLY_STRING) {
+            unsigned int index = atoi(reply->str);
+            if (index < list->bindingsLength) {
+                *bindingIndex = index;
+                freeReplyObject(reply);
+                return RULES_OK;
+            }
+        }
 
-    *bindingIndex = reply->integer;
-    freeReplyObject(reply);
+        freeReplyObject(reply);
+    }
+
+    *bindingIndex = jumpHash(sidHash, list->bindingsLength);
     return RULES_OK;
 }
 
+void initCommandBuffer(commandBuffer *commands) {
+    commands->rulesBinding = NULL;
+    commands->output = NULL;
+    commands->commandCount = 0;
+    commands->next = NULL;
+}
+
+void freeCommandBuffer(commandBuffer *commands) {
+    commandBuffer *current = commands->next;
+    while (current) {
+        commandBuffer *next = current->next;
+        if (current->output) {
+            sdsfree(current->output);
+        }
+
+        free(current);
+        current = next;
+    }
+
+    if (commands->output) {
+        sdsfree(commands->output);
+    }
+
+    initCommandBuffer(commands);
+}
+
+static unsigned int getCommandBuffer(commandBuffer *commands, 
+                                     void *rulesBinding, 
+                                     commandBuffer **target) {
+    commandBuffer *current = commands;
+    while (current->rulesBinding && current->rulesBinding != rulesBinding) {
+        if (!current->next) {
+            commandBuffer *next = malloc(sizeof(commandBuffer));
+            if (!next) {
+                return ERR_OUT_OF_MEMORY;
+            }
+
+            initCommandBuffer(next);
+            current->next = next;
+        }
+
+        current = current->next;
+    }
+
+    current->rulesBinding = rulesBinding;
+    *target = current;
+    return RULES_OK;
+}
+
+static unsigned int countDigits(size_t value) {
+    unsigned int digits = 1;
+    while (value >= 10) {
+        value /= 10;
+        ++digits;
+    }
+
+    return digits;
+}
+
+static char *writeLength(char *cursor, char prefix, size_t value) {
+    unsigned int digits = countDigits(value);
+    cursor[0] = prefix;
+    for (unsigned int i = digits; i > 0; --i) {
+        cursor[i] = '0' + value % 10;
+        value /= 10;
+    }
+
+    cursor[digits + 1] = '\r';
+    cursor[digits + 2] = '\n';
+    return &cursor[digits + 3];
+}
+
+static void writeNumber(char *target, long long value) {
+#ifdef _WIN32
+    sprintf_s(target, sizeof(char) * 21, "%lld", value);
+#else
+    snprintf(target, sizeof(char) * 21, "%lld", value);
+#endif
+}
+
+// the request is written in the redis protocol right into the 
+// buffer of its binding, which is later handed over to hiredis as is
+static unsigned int appendCommand(commandBuffer *commands, 
+                                  void *rulesBinding,
+                                  unsigned int argc, 
+                                  char **argv, 
+                                  size_t *argvl) {
+    commandBuffer *target;
+    unsigned int result = getCommandBuffer(commands, rulesBinding, &target);
+    if (result != RULES_OK) {
+        return result;
+    }
+
+    size_t length = countDigits(argc) + 3;
+    for (unsigned int i = 0; i < argc; ++i) {
+        size_t argLength = argvl ? argvl[i] : strlen(argv[i]);
+        length += countDigits(argLength) + argLength + 5;
+    }
+
+    if (!target->output) {
+        target->output = sdsempty();
+        if (!target->output) {
+            return ERR_OUT_OF_MEMORY;
+        }
+    }
+
+    sds output = sdsMakeRoomFor(target->output, length);
+    if (!output) {
+        return ERR_OUT_OF_MEMORY;
+    }
+
+    char *cursor = writeLength(output + sdslen(output), '*', argc);
+    for (unsigned int i = 0; i < argc; ++i) {
+        size_t argLength = argvl ? argvl[i] : strlen(argv[i]);
+        cursor = writeLength(cursor, '$', argLength);
+        memcpy(cursor, argv[i], argLength);
+        cursor[argLength] = '\r';
+        cursor[argLength + 1] = '\n';
+        cursor = &cursor[argLength + 2];
+    }
+
+    sdsIncrLen(output, length);
+    target->output = output;
+    ++target->commandCount;
+    return RULES_OK;
+}
+
+static size_t packedStringLength(size_t length) {
+    if (length < 32) {
+        return length + 1;
+    } else if (length < 65536) {
+        return length + 3;
+    }
+
+    return length + 5;
+}
+
+static char *packHeader(char *cursor, unsigned char type, unsigned long long value, unsigned int size) {
+    cursor[0] = type;
+    for (unsigned int i = size; i > 0; --i) {
+        cursor[i] = value & 0xFF;
+        value >>= 8;
+    }
+
+    return &cursor[size + 1];
+}
+
+static char *packString(char *cursor, char *value, size_t length) {
+    if (length < 32) {
+        cursor[0] = 0xA0 | length;
+        cursor = &cursor[1];
+    } else if (length < 65536) {
+        cursor = packHeader(cursor, 0xDA, length, 2);
+    } else {
+        cursor = packHeader(cursor, 0xDB, length, 4);
+    }
+
+    memcpy(cursor, value, length);
+    return &cursor[length];
+}
+
+static char *packInteger(char *cursor, long value) {
+    if (value >= -32 && value < 128) {
+        cursor[0] = (char)value;
+        return &cursor[1];
+    } else if (value >= -2147483647L - 1 && value <= 2147483647L) {
+        return packHeader(cursor, 0xD2, (unsigned int)value, 4);
+    }
+
+    return packHeader(cursor, 0xD3, (unsigned long long)value, 8);
+}
+
+static char *packDouble(char *cursor, double value) {
+    unsigned long long bits;
+    memcpy(&bits, &value, sizeof(double));
+    return packHeader(cursor, 0xCB, bits, 8);
+}
+
+// the message is sent to the scripts as a single msgpack map, which is 
+// also the form they store, arrays and the objects no rule refers to 
+// are left as json to be decoded in lua
+static unsigned int packMessage(char *message, 
+                                jsonObject *jo, 
+                                unsigned char isFact,
+                                char **packedMessage,
+                                size_t *packedLength,
+                                unsigned int *jsonLength) {
+    size_t length = 5;
+    *jsonLength = 0;
+    for (unsigned int i = 0; i < jo->propertiesLength; ++i) {
+        jsonProperty *property = &jo->properties[i];
+        length += packedStringLength(property->nameLength);
+        switch(property->type) {
+            case JSON_STRING:
+                length += packedStringLength(property->valueLength);
+                break;
+            case JSON_ARRAY:
+            case JSON_OBJECT:
+                length += packedStringLength(property->valueLength + 1);
+                ++*jsonLength;
+                break;
+            case JSON_NIL:
+                length += packedStringLength(5);
+                break;
+            default:
+                length += 9;
+                break;
+        }
+
+        if (property->nameLength == 2 && !strncmp(property->name, "$f", 2)) {
+            isFact = 0;
+        }
+    }
+
+    if (isFact) {
+        length += 4;
+    }
+
+    char *packed = malloc(length * sizeof(char));
+    if (!packed) {
+        return ERR_OUT_OF_MEMORY;
+    }
+
+    unsigned int count = jo->propertiesLength + (isFact ? 1 : 0);
+    char *cursor = packed;
+    if (count < 16) {
+        cursor[0] = 0x80 | count;
+        cursor = &cursor[1];
+    } else if (count < 65536) {
+        cursor = packHeader(cursor, 0xDE, count, 2);
+    } else {
+        cursor = packHeader(cursor, 0xDF, count, 4);
+    }
+
+    for (unsigned int i = 0; i < jo->propertiesLength; ++i) {
+        jsonProperty *property = &jo->properties[i];
+        cursor = packString(cursor, property->name, property->nameLength);
+        switch(property->type) {
+            case JSON_STRING:
+                cursor = packString(cursor, property->valueString, property->valueLength);
+                break;
+            case JSON_ARRAY:
+            case JSON_OBJECT:
+                cursor = packString(cursor, property->valueString, property->valueLength + 1);
+                break;
+            case JSON_INT:
+                rehydrateProperty(property, message);
+                cursor = packInteger(cursor, property->value.i);
+                break;
+            case JSON_DOUBLE:
+                rehydrateProperty(property, message);
+                cursor = packDouble(cursor, property->value.d);
+                break;
+            case JSON_BOOL:
+                rehydrateProperty(property, message);
+                cursor[0] = property->value.b ? 0xC3 : 0xC2;
+                cursor = &cursor[1];
+                break;
+            case JSON_NIL:
+                cursor = packString(cursor, "$null", 5);
+                break;
+        }
+    }
+
+    if (isFact) {
+        cursor = packString(cursor, "$f", 2);
+        cursor = packInteger(cursor, 1);
+    }
+
+    *packedMessage = packed;
+    *packedLength = cursor - packed;
+    return RULES_OK;
+}
+
+static unsigned int appendMessageCommand(commandBuffer *commands, 
+                                         void *rulesBinding,
+                                         unsigned int argc, 
+                                         char **argv, 
+                                         size_t *argvl,
+                                         char *message, 
+                                         jsonObject *jo,
+                                         unsigned char isFact) {
+    char *packedMessage;
+    size_t packedLength;
+    unsigned int jsonLength;
+    unsigned int result = packMessage(message, jo, isFact, &packedMessage, &packedLength, &jsonLength);
+    if (result != RULES_OK) {
+        return result;
+    }
+
+#ifdef _WIN32
+    char **messageArgv = (char **)_alloca(sizeof(char*)*(argc + 1 + jsonLength));
+    size_t *messageArgvl = (size_t *)_alloca(sizeof(size_t)*(argc + 1 + jsonLength));
+#else
+    char *messageArgv[argc + 1 + jsonLength];
+    size_t messageArgvl[argc + 1 + jsonLength];
+#endif
+
+    for (unsigned int i = 0; i < argc; ++i) {
+        messageArgv[i] = argv[i];
+        messageArgvl[i] = argvl[i];
+    }
+
+    messageArgv[argc] = packedMessage;
+    messageArgvl[argc] = packedLength;
+    unsigned int offset = argc + 1;
+    for (unsigned int i = 0; i < jo->propertiesLength; ++i) {
+        if (jo->properties[i].type == JSON_ARRAY || jo->properties[i].type == JSON_OBJECT) {
+            messageArgv[offset] = jo->properties[i].name;
+            messageArgvl[offset] = jo->properties[i].nameLength;
+            ++offset;
+        }
+    }
+
+    result = appendCommand(commands, rulesBinding, offset, messageArgv, messageArgvl);
+    free(packedMessage);
+    return result;
+}
+
 unsigned int formatEvalMessage(void *rulesBinding, 
                                char *sid, 
                                char *mid,
@@ -2395,12 +3436,7 @@ unsigned int formatEvalMessage(void *rulesBinding,
                                unsigned char actionType,
                                char **keys,
                                unsigned int keysLength,
-                               char **command) {
-    unsigned int propertiesLength = jo->propertiesLength;
-    if (actionType == ACTION_RETRACT_FACT || actionType == ACTION_RETRACT_EVENT) {
-        propertiesLength = 0; 
-    }
-    
+                               commandBuffer *commands) {
     binding *bindingContext = (binding*)rulesBinding;
     time_t currentTime = time(NULL);
     char score[11];
@@ -2408,13 +3444,13 @@ unsigned int formatEvalMessage(void *rulesBinding,
 #ifdef _WIN32
     sprintf_s(keysLengthString, sizeof(char) * 5, "%d", keysLength);
     sprintf_s(score, sizeof(char) * 11, "%ld", currentTime);
-    char **argv = (char **)_alloca(sizeof(char*)*(8 + keysLength + propertiesLength * 3));
-    size_t *argvl = (size_t *)_alloca(sizeof(size_t)*(8 + keysLength +  propertiesLength * 3));
+    char **argv = (char **)_alloca(sizeof(char*)*(8 + keysLength));
+    size_t *argvl = (size_t *)_alloca(sizeof(size_t)*(8 + keysLength));
 #else
     snprintf(keysLengthString, sizeof(char) * 5, "%d", keysLength);
     snprintf(score, sizeof(char) * 11, "%ld", currentTime);
-    char *argv[8 + keysLength + propertiesLength * 3];
-    size_t argvl[8 + keysLength + propertiesLength * 3];
+    char *argv[8 + keysLength];
+    size_t argvl[8 + keysLength];
 #endif
 
     argv[0] = "evalsha";
@@ -2439,45 +3475,18 @@ unsigned int formatEvalMessage(void *rulesBinding,
         argvl[8 + i] = strlen(keys[i]);
     }
 
-    unsigned int offset = 8 + keysLength;
-    for (unsigned int i = 0; i < propertiesLength; ++i) {
-        argv[offset + i * 3] = jo->properties[i].name;
-        argvl[offset + i * 3] = jo->properties[i].nameLength;
-        argv[offset + i * 3 + 1] = jo->properties[i].valueString;
-        if (jo->properties[i].type == JSON_STRING) {
-            argvl[offset + i * 3 + 1] = jo->properties[i].valueLength;
-        } else {
-            argvl[offset + i * 3 + 1] = jo->properties[i].valueLength + 1;
-        }
-
-        switch(jo->properties[i].type) {
-            case JSON_STRING:
-                argv[offset + i * 3 + 2] = "1";
-                break;
-            case JSON_INT:
-                argv[offset + i * 3 + 2] = "2";
-                break;
-            case JSON_DOUBLE:
-                argv[offset + i * 3 + 2] = "3";
-                break;
-            case JSON_BOOL:
-                argv[offset + i * 3 + 2] = "4";
-                break;
-            case JSON_ARRAY:
-                argv[offset + i * 3 + 2] = "5";
-                break;
-            case JSON_NIL:
-                argv[offset + i * 3 + 2] = "7";
-                break;
-        }
-        argvl[offset + i * 3 + 2] = 1; 
+    if (actionType == ACTION_RETRACT_FACT || actionType == ACTION_RETRACT_EVENT) {
+        return appendCommand(commands, rulesBinding, 8 + keysLength, argv, argvl);
     }
 
-    int result = redisFormatCommandArgv(command, offset + propertiesLength * 3, (const char**)argv, argvl); 
-    if (result == 0) {
-        return ERR_OUT_OF_MEMORY;
-    }
-    return RULES_OK;
+    return appendMessageCommand(commands, 
+                                rulesBinding, 
+                                8 + keysLength, 
+                                argv, 
+                                argvl, 
+                                message, 
+                                jo, 
+                                actionType == ACTION_ASSERT_FACT);
 }
 
 unsigned int formatStoreMessage(void *rulesBinding, 
@@ -2488,19 +3497,17 @@ unsigned int formatStoreMessage(void *rulesBinding,
                                 unsigned char markVisited,
                                 char **keys,
                                 unsigned int keysLength,
-                                char **command) {
-    unsigned int propertiesLength = jo->propertiesLength;
-    
+                                commandBuffer *commands) {
     binding *bindingContext = (binding*)rulesBinding;
     char keysLengthString[5];
 #ifdef _WIN32
     sprintf_s(keysLengthString, sizeof(char) * 5, "%d", keysLength);
-    char **argv = (char **)_alloca(sizeof(char*)*(7 + keysLength + propertiesLength * 3));
-    size_t *argvl = (size_t *)_alloca(sizeof(size_t)*(7 + keysLength + propertiesLength * 3));
+    char **argv = (char **)_alloca(sizeof(char*)*(7 + keysLength));
+    size_t *argvl = (size_t *)_alloca(sizeof(size_t)*(7 + keysLength));
 #else
     snprintf(keysLengthString, sizeof(char) * 5, "%d", keysLength);
-    char *argv[7 + keysLength + propertiesLength * 3];
-    size_t argvl[7 + keysLength + propertiesLength * 3];
+    char *argv[7 + keysLength];
+    size_t argvl[7 + keysLength];
 #endif
 
     argv[0] = "evalsha";
@@ -2523,213 +3530,294 @@ unsigned int formatStoreMessage(void *rulesBinding,
         argvl[7 + i] = strlen(keys[i]);
     }
 
-    unsigned int offset = 7 + keysLength;
-    for (unsigned int i = 0; i < propertiesLength; ++i) {
-        argv[offset +  i * 3] = jo->properties[i].name;
-        argvl[offset + i * 3] = jo->properties[i].nameLength;
-        argv[offset + i * 3 + 1] = jo->properties[i].valueString;
-        if (jo->properties[i].type == JSON_STRING) {
-            argvl[offset + i * 3 + 1] = jo->properties[i].valueLength;
-        } else {
-            argvl[offset + i * 3 + 1] = jo->properties[i].valueLength + 1;
-        }
-
-        switch(jo->properties[i].type) {
-            case JSON_STRING:
-                argv[offset + i * 3 + 2] = "1";
-                break;
-            case JSON_INT:
-                argv[offset + i * 3 + 2] = "2";
-                break;
-            case JSON_DOUBLE:
-                argv[offset + i * 3 + 2] = "3";
-                break;
-            case JSON_BOOL:
-                argv[offset + i * 3 + 2] = "4";
-                break;
-            case JSON_ARRAY:
-                argv[offset + i * 3 + 2] = "5";
-                break;
-            case JSON_NIL:
-                argv[offset + i * 3 + 2] = "7";
-                break;
-        }
-        argvl[offset + i * 3 + 2] = 1; 
-    }
-
-    int result = redisFormatCommandArgv(command, offset + propertiesLength * 3, (const char**)argv, argvl); 
-    if (result == 0) {
-        return ERR_OUT_OF_MEMORY;
-    }
-    return RULES_OK;
+    return appendMessageCommand(commands, 
+                                rulesBinding, 
+                                7 + keysLength, 
+                                argv, 
+                                argvl, 
+                                message, 
+                                jo, 
+                                storeFact);
 }
 
+
 unsigned int formatStoreSession(void *rulesBinding, 
                                 char *sid, 
                                 char *state,
                                 unsigned char tryExists, 
-                                char **storeCommand) {
+                                commandBuffer *commands) {
     binding *currentBinding = (binding*)rulesBinding;
 
-    int result;
-    if (tryExists) {
-        result = redisFormatCommand(storeCommand,
-                                    "hsetnx %s %s %s", 
-                                    currentBinding->sessionHashset, 
-                                    sid, 
-                                    state);
-    } else {
-        result = redisFormatCommand(storeCommand,
-                                    "hset %s %s %s", 
-                                    currentBinding->sessionHashset, 
-                                    sid, 
-                                    state);
-    }
-
-    if (result == 0) {
-        return ERR_OUT_OF_MEMORY;
-    }
-    return RULES_OK;
+    // the script bumps the session version along with the state
+    char *argv[] = {"evalsha", currentBinding->storeSessionHash, "0", sid, state, tryExists ? "1" : "0"};
+    return appendCommand(commands, rulesBinding, 6, argv, NULL);
 }
 
 unsigned int formatStoreSessionFact(void *rulesBinding, 
                                     char *sid, 
                                     char *message,
                                     unsigned char tryExists, 
-                                    char **command) {
+                                    commandBuffer *commands) {
     binding *currentBinding = (binding*)rulesBinding;
+    unsigned int sidLength = strlen(sid);
+#ifdef _WIN32
+    char *field = (char *)_alloca(sizeof(char)*(sidLength + 3));
+#else
+    char field[sidLength + 3];
+#endif
+    memcpy(field, sid, sidLength);
+    memcpy(&field[sidLength], "!f", 3);
 
-    int result;
-    if (tryExists) {
-        result = redisFormatCommand(command,
-                                    "hsetnx %s %s!f %s", 
-                                    currentBinding->sessionHashset, 
-                                    sid, 
-                                    message);
-    } else {
-        result = redisFormatCommand(command,
-                                    "hset %s %s!f %s", 
-                                    currentBinding->sessionHashset, 
-                                    sid, 
-                                    message);
-    }
-
-    if (result == 0) {
-        return ERR_OUT_OF_MEMORY;
-    }
-    return RULES_OK;
+    char *argv[] = {tryExists ? "hsetnx" : "hset", currentBinding->sessionHashset, field, message};
+    return appendCommand(commands, rulesBinding, 4, argv, NULL);
 }
 
 unsigned int formatRemoveTimer(void *rulesBinding, 
                                char *timer, 
-                               char **command) {
+                               commandBuffer *commands) {
     binding *currentBinding = (binding*)rulesBinding;
-    int result = redisFormatCommand(command,
-                                    "zrem %s %s", 
-                                    currentBinding->timersSortedset, 
-                                    timer);
-    if (result == 0) {
-        return ERR_OUT_OF_MEMORY;
+    char *argv[] = {"evalsha", currentBinding->removeTimerHash, "0", timer};
+    return appendCommand(commands, rulesBinding, 4, argv, NULL);
+}
+
+unsigned int formatRemoveAction(void *rulesBinding, 
+                                char *sid, 
+                                commandBuffer *commands) {
+    binding *bindingContext = (binding*)rulesBinding;
+    char score[21];
+    writeNumber(score, time(NULL));
+
+    char *argv[] = {"evalsha", bindingContext->removeActionHash, "0", sid, score};
+    return appendCommand(commands, rulesBinding, 5, argv, NULL);
+}
+
+unsigned int formatRemoveMessage(void *rulesBinding, 
+                                  char *sid, 
+                                  char *mid,
+                                  unsigned char removeFact,
+                                  commandBuffer *commands) {
+    binding *currentBinding = (binding*)rulesBinding;
+    char *hashset = removeFact ? currentBinding->factsHashset : currentBinding->eventsHashset;
+    unsigned int hashsetLength = strlen(hashset);
+    unsigned int sidLength = strlen(sid);
+#ifdef _WIN32
+    char *key = (char *)_alloca(sizeof(char)*(hashsetLength + sidLength + 2));
+#else
+    char key[hashsetLength + sidLength + 2];
+#endif
+    memcpy(key, hashset, hashsetLength);
+    key[hashsetLength] = '!';
+    memcpy(&key[hashsetLength + 1], sid, sidLength + 1);
+
+    char *argv[] = {"hdel", key, mid};
+    return appendCommand(commands, rulesBinding, 3, argv, NULL);
+}
+
+unsigned int formatPeekAction(void *rulesBinding,
+                              char *sid,
+                              commandBuffer *commands) {
+    binding *currentBinding = (binding*)rulesBinding;
+    time_t currentTime = time(NULL);
+    char lease[21];
+    char score[21];
+    writeNumber(lease, currentTime + 15);
+    writeNumber(score, currentTime);
+
+    char *argv[] = {"evalsha", currentBinding->peekActionHash, "0", lease, score, sid};
+    return appendCommand(commands, rulesBinding, 6, argv, NULL);
+}
+
+unsigned int formatUpdateAction(void *rulesBinding,
+                                char *sid,
+                                commandBuffer *commands) {
+    binding *currentBinding = (binding*)rulesBinding;
+    char lease[21];
+    writeNumber(lease, time(NULL) + 15);
+
+    char *argv[] = {"evalsha", currentBinding->updateActionHash, "0", sid, lease};
+    return appendCommand(commands, rulesBinding, 5, argv, NULL);
+}
+
+unsigned int formatRegisterTimer(void *rulesBinding, 
+                                 unsigned int duration, 
+                                 char assert, 
+                                 char *timer,
+                                 commandBuffer *commands) {
+    binding *currentBinding = (binding*)rulesBinding;
+    char score[21];
+    writeNumber(score, currentMilliseconds() + duration * 1000LL);
+    unsigned int timerLength = strlen(timer);
+#ifdef _WIN32
+    char *member = (char *)_alloca(sizeof(char)*(timerLength + 3));
+#else
+    char member[timerLength + 3];
+#endif
+    member[0] = assert ? 'a' : 'p';
+    member[1] = ':';
+    memcpy(&member[2], timer, timerLength + 1);
+
+    char *argv[] = {"evalsha", currentBinding->addTimerHash, "0", score, member};
+    return appendCommand(commands, rulesBinding, 5, argv, NULL);
+}
+
+unsigned int formatCancelTimer(void *rulesBinding, 
+                               char *sid,
+                               char *timerName,
+                               commandBuffer *commands) {
+    binding *currentBinding = (binding*)rulesBinding;
+    char *argv[] = {"evalsha", currentBinding->removeTimerHash, "0", sid, timerName};
+    return appendCommand(commands, rulesBinding, 5, argv, NULL);
+}
+
+unsigned int formatRegisterMessage(void *rulesBinding, 
+                                   unsigned int queueAction, 
+                                   char *destination, 
+                                   char *message,
+                                   commandBuffer *commands) {
+    char prefix;
+    switch (queueAction) {
+        case QUEUE_ASSERT_FACT:
+            prefix = 'a';
+            break;
+        case QUEUE_ASSERT_EVENT:
+            prefix = 'p';
+            break;
+        case QUEUE_RETRACT_FACT:
+            prefix = 'r';
+            break;
+        default:
+            return ERR_UNEXPECTED_VALUE;
     }
-    return RULES_OK;
-}
-
-unsigned int formatRemoveAction(void *rulesBinding, 
-                                char *sid, 
-                                char **command) {
-    binding *bindingContext = (binding*)rulesBinding;
-    time_t currentTime = time(NULL);
 
-    int result = redisFormatCommand(command,
-                                    "evalsha %s 0 %s %ld", 
-                                    bindingContext->removeActionHash, 
-                                    sid, 
-                                    currentTime); 
-    if (result == 0) {
-        return ERR_OUT_OF_MEMORY;
+    size_t destinationLength = strlen(destination);
+    size_t messageLength = strlen(message);
+#ifdef _WIN32
+    char *key = (char *)_alloca(sizeof(char)*(destinationLength + 3));
+    char *channel = (char *)_alloca(sizeof(char)*(destinationLength + 3));
+    char *member = (char *)_alloca(sizeof(char)*(messageLength + 3));
+#else
+    char key[destinationLength + 3];
+    char channel[destinationLength + 3];
+    char member[messageLength + 3];
+#endif
+    memcpy(key, destination, destinationLength);
+    memcpy(&key[destinationLength], "!q", 3);
+    memcpy(channel, destination, destinationLength);
+    memcpy(&channel[destinationLength], "!w", 3);
+    member[0] = prefix;
+    member[1] = ':';
+    memcpy(&member[2], message, messageLength + 1);
+
+    // the doorbell of the destination wakes up its action dispatch 
+    char *argv[] = {"rpush", key, member};
+    size_t argvl[] = {5, destinationLength + 2, messageLength + 2};
+    unsigned int result = appendCommand(commands, rulesBinding, 3, argv, argvl);
+    if (result != RULES_OK) {
+        return result;
     }
-    return RULES_OK;
+
+    char *doorbellArgv[] = {"publish", channel, "$q"};
+    return appendCommand(commands, rulesBinding, 3, doorbellArgv, NULL);
 }
 
-unsigned int formatRemoveMessage(void *rulesBinding, 
-                                  char *sid, 
-                                  char *mid,
-                                  unsigned char removeFact,
-                                  char **command) {
+unsigned int formatDeleteSession(ruleset *tree, 
+                                 void *rulesBinding, 
+                                 char *sid, 
+                                 unsigned int sidHash,
+                                 commandBuffer *commands) {
     binding *currentBinding = (binding*)rulesBinding;
+    char hash[21];
+    writeNumber(hash, sidHash);
 
-    int result = 0;
-    if (removeFact) {
-        result = redisFormatCommand(command,
-                                    "hdel %s!%s %s", 
-                                    currentBinding->factsHashset, 
-                                    sid, 
-                                    mid);
-    } else {
-        result = redisFormatCommand(command,
-                                    "hdel %s!%s %s", 
-                                    currentBinding->eventsHashset, 
-                                    sid, 
-                                    mid);
+    char *argv[] = {"evalsha", currentBinding->deleteSessionHash, "0", sid, hash};
+    unsigned int result = appendCommand(commands, rulesBinding, 5, argv, NULL);
+    if (result != RULES_OK) {
+        return result;
     }
 
-    if (result == 0) {
-        return ERR_OUT_OF_MEMORY;
+    bindingsList *list = tree->bindingsList;
+    binding *firstBinding = &list->bindings[0];
+    if (tree->migratePartitions && firstBinding != currentBinding) {
+        char *partitionArgv[] = {"hdel", firstBinding->partitionHashset, hash};
+        return appendCommand(commands, firstBinding, 3, partitionArgv, NULL);
     }
+
     return RULES_OK;
 }
 
-unsigned int formatPeekAction(void *rulesBinding,
-                              char *sid,
-                              char **command) {
-    binding *currentBinding = (binding*)rulesBinding;
-   
-    time_t currentTime = time(NULL);
-    int result = redisFormatCommand(command, 
-                                    "evalsha %s 0 %d %ld %s", 
-                                    currentBinding->peekActionHash, 
-                                    currentTime + 15,
-                                    currentTime,
-                                    sid); 
-    if (result == 0) {
-        return ERR_OUT_OF_MEMORY;
+static unsigned int sendCommands(commandBuffer *commands, 
+                                 redisContext *reContext) {
+    if (sdslen(reContext->obuf) == 0) {
+        sdsfree(reContext->obuf);
+        reContext->obuf = commands->output;
+    } else {
+        sds newbuf = sdscatlen(reContext->obuf, commands->output, sdslen(commands->output));
+        if (newbuf == NULL) {
+            return ERR_OUT_OF_MEMORY;
+        }
+
+        reContext->obuf = newbuf;
+        sdsfree(commands->output);
     }
 
+    commands->output = NULL;
+    commands->commandCount = 0;
     return RULES_OK;
 }
 
-
-unsigned int startNonBlockingBatch(void *rulesBinding,
-                                   char **commands,
-                                   unsigned int commandCount,
+unsigned int startNonBlockingBatch(commandBuffer *commands,
                                    unsigned int *replyCount) {
-    *replyCount = commandCount;
-    if (commandCount == 0) {
+    *replyCount = commands->commandCount;
+    if (commands->commandCount == 0) {
         return RULES_OK;
     }
 
-    unsigned int result = RULES_OK;
-    binding *currentBinding = (binding*)rulesBinding;
-    redisContext *reContext = currentBinding->reContext;
-    
-    sds newbuf = sdsempty();
-    for (unsigned int i = 0; i < commandCount; ++i) {
-        newbuf = sdscatlen(newbuf, commands[i], strlen(commands[i]));
-        if (newbuf == NULL) {
-            return ERR_OUT_OF_MEMORY;
+    binding *currentBinding = (binding*)commands->rulesBinding;
+    connectionPool *pool = currentBinding->pool;
+    LOCK_MUTEX(pool->lock);
+    // a thread holds its connection until all its replies are read, 
+    // batches started before that are appended to the same conversation
+    pooledContext *pooled = findConversation(pool);
+    while (!pooled) {
+        for (unsigned int i = 0; i < pool->contextsLength; ++i) {
+            if (!pool->contexts[i].pendingReplies) {
+                pooled = &pool->contexts[i];
+                pooled->owner = CURRENT_THREAD();
+                break;
+            }
         }
 
-        free(commands[i]);
+        if (!pooled) {
+            WAIT_CONDITION(pool->released, pool->lock);
+        }
     }
 
-    reContext->obuf = newbuf;
-    int wdone = 0;
-    do {
-        if (redisBufferWrite(reContext, &wdone) == REDIS_ERR) {
-            printf("start non blocking batch error %u %s\n", reContext->err, reContext->errstr);
-            return ERR_REDIS_ERROR;
-        }
-    } while (!wdone);
+    pooled->pendingReplies += *replyCount;
+    UNLOCK_MUTEX(pool->lock);
+
+    unsigned int result = RULES_OK;
+    if (!pooled->reContext) {
+        result = connectPooledContext(currentBinding, &pooled->reContext);
+    }
+
+    if (result == RULES_OK) {
+        result = sendCommands(commands, pooled->reContext);
+    }
+
+    if (result == RULES_OK) {
+        int wdone = 0;
+        do {
+            if (redisBufferWrite(pooled->reContext, &wdone) == REDIS_ERR) {
+                printf("start non blocking batch error %u %s\n", pooled->reContext->err, pooled->reContext->errstr);
+                result = ERR_REDIS_ERROR;
+                break;
+            }
+        } while (!wdone);
+    }
+
+    if (result != RULES_OK) {
+        dropConversation(pool, pooled);
+    }
 
     return result;
 }
@@ -2740,65 +3828,77 @@ unsigned int completeNonBlockingBatch(void *rulesBinding,
         return RULES_OK;
     }
 
-    unsigned int result = RULES_OK;
     binding *currentBinding = (binding*)rulesBinding;
-    redisContext *reContext = currentBinding->reContext;
+    connectionPool *pool = currentBinding->pool;
+    LOCK_MUTEX(pool->lock);
+    pooledContext *pooled = findConversation(pool);
+    UNLOCK_MUTEX(pool->lock);
+    if (!pooled) {
+        return ERR_REDIS_ERROR;
+    }
+
+    // only the owner reads or counts down a conversation, 
+    // so its replies are read without holding the pool lock
+    if (replyCount > pooled->pendingReplies) {
+        replyCount = pooled->pendingReplies;
+    }
+
+    unsigned int result = RULES_OK;
+    redisContext *reContext = pooled->reContext;
     redisReply *reply;
     for (unsigned int i = 0; i < replyCount; ++i) {
-        result = tryGetReply(reContext, &reply);
-        if (result != RULES_OK) {
-            return result;
-        } else {
-            if (reply->type == REDIS_REPLY_ERROR) {
-                printf("complete non blocking batch error %d %s\n", i, reply->str);
-                result = ERR_REDIS_ERROR;
-            } else if (reply->type == REDIS_REPLY_INTEGER) {
-                if (reply->integer == ERR_EVENT_OBSERVED && result == RULES_OK) {
-                    result = ERR_EVENT_OBSERVED;
-                }
+        if (redisGetReply(reContext, (void**)&reply) != REDIS_OK) {
+            printf("complete non blocking batch error %d %s\n", reContext->err, reContext->errstr);
+            dropConversation(pool, pooled);
+            return ERR_REDIS_ERROR;
+        }
+
+        if (reply->type == REDIS_REPLY_ERROR) {
+            printf("complete non blocking batch error %d %s\n", i, reply->str);
+            result = ERR_REDIS_ERROR;
+        } else if (reply->type == REDIS_REPLY_INTEGER) {
+            if (reply->integer == ERR_EVENT_OBSERVED && result == RULES_OK) {
+                result = ERR_EVENT_OBSERVED;
             }
+        }
 
-            freeReplyObject(reply);    
-        } 
+        freeReplyObject(reply);    
     }
     
+    LOCK_MUTEX(pool->lock);
+    pooled->pendingReplies -= replyCount;
+    if (!pooled->pendingReplies) {
+        BROADCAST_CONDITION(pool->released);
+    }
+
+    UNLOCK_MUTEX(pool->lock);
     return result;
 }
 
-unsigned int executeBatch(void *rulesBinding,
-                          char **commands,
-                          unsigned int commandCount) {
-    return executeBatchWithReply(rulesBinding, 0, commands, commandCount, NULL);
+unsigned int executeBatch(commandBuffer *commands) {
+    return executeBatchWithReply(commands, 0, NULL);
 }
 
-unsigned int executeBatchWithReply(void *rulesBinding,
+unsigned int executeBatchWithReply(commandBuffer *commands,
                                    unsigned int expectedReplies,
-                                   char **commands,
-                                   unsigned int commandCount,
                                    redisReply **lastReply) {
-    if (commandCount == 0) {
+    if (commands->commandCount == 0) {
         return RULES_OK;
     }
 
-    unsigned int result = RULES_OK;
-    unsigned int replyCount = commandCount + expectedReplies;
-    binding *currentBinding = (binding*)rulesBinding;
+    unsigned int replyCount = commands->commandCount + expectedReplies;
+    binding *currentBinding = (binding*)commands->rulesBinding;
+    awaitPrimaryContext(currentBinding);
     redisContext *reContext = currentBinding->reContext;
     if (lastReply) {
         *lastReply = NULL;
     }
 
-    sds newbuf = sdsempty();
-    for (unsigned int i = 0; i < commandCount; ++i) {
-        newbuf = sdscatlen(newbuf, commands[i], strlen(commands[i]));
-        if (newbuf == NULL) {
-            return ERR_OUT_OF_MEMORY;
-        }
-
-        free(commands[i]);
+    unsigned int result = sendCommands(commands, reContext);
+    if (result != RULES_OK) {
+        return result;
     }
 
-    reContext->obuf = newbuf;
     redisReply *reply;
     for (unsigned int i = 0; i < replyCount; ++i) {
         result = tryGetReply(reContext, &reply);
@@ -2836,6 +3936,7 @@ unsigned int executeBatchWithReply(void *rulesBinding,
 
 unsigned int removeMessage(void *rulesBinding, char *sid, char *mid) {
     binding *currentBinding = (binding*)rulesBinding;
+    awaitPrimaryContext(currentBinding);
     redisContext *reContext = currentBinding->reContext;  
     int result = redisAppendCommand(reContext, 
                                     "hdel %s!%s %s", 
@@ -2851,14 +3952,27 @@ unsigned int peekAction(ruleset *tree, void **bindingContext, redisReply **reply
     for (unsigned int i = 0; i < list->bindingsLength; ++i) {
         binding *currentBinding = &list->bindings[list->lastBinding % list->bindingsLength];
         ++list->lastBinding;
+        awaitPrimaryContext(currentBinding);
         redisContext *reContext = currentBinding->reContext;
         time_t currentTime = time(NULL);
 
-        int result = redisAppendCommand(reContext, 
+        int result;
+        if (tree->partitionsLength > 1) {
+            result = redisAppendCommand(reContext, 
+                                        "evalsha %s 0 %d %ld %u %u", 
+                                        currentBinding->peekActionHash, 
+                                        currentTime + 15,
+                                        currentTime,
+                                        tree->partitionIndex,
+                                        tree->partitionsLength); 
+        } else {
+            result = redisAppendCommand(reContext, 
                                         "evalsha %s 0 %d %ld", 
                                         currentBinding->peekActionHash, 
                                         currentTime + 15,
                                         currentTime); 
+        }
+
         if (result != REDIS_OK) {
             continue;
         }
@@ -2890,18 +4004,69 @@ unsigned int peekAction(ruleset *tree, void **bindingContext, redisReply **reply
     return ERR_NO_ACTION_AVAILABLE;
 }
 
-unsigned int peekTimers(ruleset *tree, void **bindingContext, redisReply **reply) {
+unsigned int peekActions(ruleset *tree, unsigned int maxCount, void **bindingContext, redisReply **reply) {
+    bindingsList *list = tree->bindingsList;
+    for (unsigned int i = 0; i < list->bindingsLength; ++i) {
+        binding *currentBinding = &list->bindings[list->lastBinding % list->bindingsLength];
+        ++list->lastBinding;
+        awaitPrimaryContext(currentBinding);
+        redisContext *reContext = currentBinding->reContext;
+        time_t currentTime = time(NULL);
+
+        int result = redisAppendCommand(reContext, 
+                                        "evalsha %s 0 %ld %ld %u %u %u", 
+                                        currentBinding->peekActionHash, 
+                                        currentTime + 15,
+                                        currentTime,
+                                        maxCount,
+                                        tree->partitionIndex,
+                                        tree->partitionsLength); 
+        if (result != REDIS_OK) {
+            continue;
+        }
+
+        result = tryGetReply(reContext, reply);
+        if (result != RULES_OK) {
+            return result;
+        }
+
+        if ((*reply)->type == REDIS_REPLY_ERROR) {
+            printf("peekActions err string %s\n", (*reply)->str);
+            freeReplyObject(*reply);
+            return ERR_REDIS_ERROR;
+        }
+        
+        if ((*reply)->type == REDIS_REPLY_ARRAY && (*reply)->elements > 0) {
+            if ((*reply)->elements % 3) {
+                freeReplyObject(*reply);
+                return ERR_REDIS_ERROR;       
+            }
+            
+            *bindingContext = currentBinding;
+            return RULES_OK;
+        } else {
+            freeReplyObject(*reply);
+        }
+    }
+
+    return ERR_NO_ACTION_AVAILABLE;
+}
+
+unsigned int peekTimers(ruleset *tree, unsigned int maxCount, void **bindingContext, redisReply **reply) {
     bindingsList *list = tree->bindingsList;
+    tree->nextTimer = 0;
     for (unsigned int i = 0; i < list->bindingsLength; ++i) {
         binding *currentBinding = &list->bindings[list->lastTimersBinding % list->bindingsLength];
         ++list->lastTimersBinding;
+        awaitPrimaryContext(currentBinding);
         redisContext *reContext = currentBinding->reContext;
-        time_t currentTime = time(NULL);
+        long long currentTime = currentMilliseconds();
 
         int result = redisAppendCommand(reContext, 
-                                        "evalsha %s 0 %ld", 
+                                        "evalsha %s 0 %lld %d", 
                                         currentBinding->timersHash,
-                                        currentTime); 
+                                        currentTime,
+                                        maxCount); 
         if (result != REDIS_OK) {
             continue;
         }
@@ -2920,31 +4085,172 @@ unsigned int peekTimers(ruleset *tree, void **bindingContext, redisReply **reply
         if ((*reply)->type == REDIS_REPLY_ARRAY) {
             *bindingContext = currentBinding;
             return RULES_OK;
-        } else {
-            freeReplyObject(*reply);
+        } 
+
+        // nothing is due, the score of the earliest timer is returned
+        if ((*reply)->type == REDIS_REPLY_INTEGER && (*reply)->integer > 0 &&
+            (!tree->nextTimer || (*reply)->integer < tree->nextTimer)) {
+            tree->nextTimer = (*reply)->integer;
         }
+
+        freeReplyObject(*reply);
     }
 
     return ERR_NO_TIMERS_AVAILABLE;
 }
 
+unsigned int peekQueue(ruleset *tree, unsigned int maxCount, void **bindingContext, redisReply **reply) {
+    bindingsList *list = tree->bindingsList;
+    for (unsigned int i = 0; i < list->bindingsLength; ++i) {
+        binding *currentBinding = &list->bindings[list->lastQueueBinding % list->bindingsLength];
+        ++list->lastQueueBinding;
+        awaitPrimaryContext(currentBinding);
+        redisContext *reContext = currentBinding->reContext;
+        int result = redisAppendCommand(reContext, 
+                                        "evalsha %s 0 %lld %d", 
+                                        currentBinding->queueHash,
+                                        currentMilliseconds(),
+                                        maxCount); 
+        if (result != REDIS_OK) {
+            continue;
+        }
+
+        result = tryGetReply(reContext, reply);
+        if (result != RULES_OK) {
+            return result;
+        }
+
+        if ((*reply)->type == REDIS_REPLY_ERROR) {
+            freeReplyObject(*reply);
+            return ERR_REDIS_ERROR;
+        }
+        
+        if ((*reply)->type == REDIS_REPLY_ARRAY && (*reply)->elements > 0) {
+            *bindingContext = currentBinding;
+            return RULES_OK;
+        } 
+
+        freeReplyObject(*reply);
+    }
+
+    return ERR_NO_MESSAGES_AVAILABLE;
+}
+
+static unsigned int isDoorbell(redisReply *reply) {
+    // pubsub messages are {"message", channel, sid}
+    return reply->type == REDIS_REPLY_ARRAY && reply->elements == 3 && !strcmp(reply->element[0]->str, "message");
+}
+
+static unsigned int isQueueDoorbell(redisReply *reply) {
+    return isDoorbell(reply) && !strcmp(reply->element[2]->str, "$q");
+}
+
+static unsigned int isPartitionSid(ruleset *tree, redisReply *reply) {
+    if (!isDoorbell(reply)) {
+        return 0;
+    }
+
+    if (tree->partitionsLength <= 1) {
+        return 1;
+    }
+
+    unsigned int partitionIndex;
+    getPartition(reply->element[2]->str, tree->partitionsLength, &partitionIndex);
+    return partitionIndex == tree->partitionIndex;
+}
+
+unsigned int waitForActions(ruleset *tree, unsigned int timeout) {
+    bindingsList *list = tree->bindingsList;
+    if (!list || !list->bindingsLength || !tree->stringPool) {
+        return ERR_NO_ACTION_AVAILABLE;
+    }
+
+#ifdef _WIN32
+    // no doorbell subscription, rely on polling 
+    Sleep(timeout * 1000);
+    return ERR_NO_ACTION_AVAILABLE;
+#else
+    fd_set readSet;
+    int maxFd = -1;
+    FD_ZERO(&readSet);
+    for (unsigned int i = 0; i < list->bindingsLength; ++i) {
+        // the doorbell connection is only opened by processes dispatching actions
+        if (!list->bindings[i].waitContext) {
+            unsigned int result = connectWaitContext(&list->bindings[i]);
+            if (result != RULES_OK) {
+                return result;
+            }
+        }
+
+        redisContext *reContext = list->bindings[i].waitContext;
+        FD_SET(reContext->fd, &readSet);
+        if (reContext->fd > maxFd) {
+            maxFd = reContext->fd;
+        }
+    }
+
+    struct timeval tv;
+    tv.tv_sec = timeout;
+    tv.tv_usec = 0;
+    int readyCount = select(maxFd + 1, &readSet, NULL, NULL, &tv);
+    if (readyCount < 0) {
+        return (errno == EINTR) ? ERR_NO_ACTION_AVAILABLE: ERR_REDIS_ERROR;
+    }
+
+    unsigned int result = ERR_NO_ACTION_AVAILABLE;
+    for (unsigned int i = 0; i < list->bindingsLength && readyCount > 0; ++i) {
+        redisContext *reContext = list->bindings[i].waitContext;
+        if (!reContext || !FD_ISSET(reContext->fd, &readSet)) {
+            continue;
+        }
+
+        // drain every doorbell received so far without blocking
+        if (redisBufferRead(reContext) != REDIS_OK) {
+            return ERR_REDIS_ERROR;
+        }
+
+        redisReply *reply = NULL;
+        do {
+            if (redisGetReplyFromReader(reContext, (void**)&reply) != REDIS_OK) {
+                return ERR_REDIS_ERROR;
+            }
+
+            if (reply) {
+                // messages queued by other rulesets ring with $q, every partition drains the list
+                if (isQueueDoorbell(reply)) {
+                    tree->queuePending = 1;
+                    result = RULES_OK;
+                } else if (isPartitionSid(tree, reply)) {
+                    result = RULES_OK;
+                }
+
+                freeReplyObject(reply);
+            }
+        } while (reply);
+    }
+
+    return result;
+#endif
+}
+
 unsigned int registerTimer(void *rulesBinding, unsigned int duration, char assert, char *timer) {
     binding *currentBinding = (binding*)rulesBinding;
+    awaitPrimaryContext(currentBinding);
     redisContext *reContext = currentBinding->reContext;   
-    time_t currentTime = time(NULL);
+    long long currentTime = currentMilliseconds();
 
     int result = RULES_OK;
     if (assert) {
         result = redisAppendCommand(reContext, 
-                                    "zadd %s %ld a:%s", 
-                                    currentBinding->timersSortedset, 
-                                    currentTime + duration, 
+                                    "evalsha %s 0 %lld a:%s", 
+                                    currentBinding->addTimerHash, 
+                                    currentTime + duration * 1000LL, 
                                     timer);
     } else {
         result = redisAppendCommand(reContext, 
-                                    "zadd %s %ld p:%s", 
-                                    currentBinding->timersSortedset, 
-                                    currentTime + duration, 
+                                    "evalsha %s 0 %lld p:%s", 
+                                    currentBinding->addTimerHash, 
+                                    currentTime + duration * 1000LL, 
                                     timer);
     } 
 
@@ -2952,12 +4258,14 @@ unsigned int registerTimer(void *rulesBinding, unsigned int duration, char asser
     return RULES_OK;
 }
 
-unsigned int removeTimer(void *rulesBinding, char *timerName) {
+unsigned int removeTimer(void *rulesBinding, char *sid, char *timerName) {
     binding *currentBinding = (binding*)rulesBinding;
+    awaitPrimaryContext(currentBinding);
     redisContext *reContext = currentBinding->reContext;   
     int result = redisAppendCommand(reContext, 
-                                    "evalsha %s 0 %s", 
+                                    "evalsha %s 0 %s %s", 
                                     currentBinding->removeTimerHash,
+                                    sid,
                                     timerName); 
     VERIFY(result, "removeTimer");  
     return RULES_OK;
@@ -2965,41 +4273,45 @@ unsigned int removeTimer(void *rulesBinding, char *timerName) {
 
 unsigned int registerMessage(void *rulesBinding, unsigned int queueAction, char *destination, char *message) {
     binding *currentBinding = (binding*)rulesBinding;
+    awaitPrimaryContext(currentBinding);
     redisContext *reContext = currentBinding->reContext;   
-    time_t currentTime = time(NULL);
-
     int result = RULES_OK;
 
     switch (queueAction) {
         case QUEUE_ASSERT_FACT:
             result = redisAppendCommand(reContext, 
-                                        "zadd %s!t %ld a:%s", 
+                                        "rpush %s!q a:%s", 
                                         destination, 
-                                        currentTime, 
                                         message);
             break;
         case QUEUE_ASSERT_EVENT:
             result = redisAppendCommand(reContext, 
-                                        "zadd %s!t %ld p:%s", 
+                                        "rpush %s!q p:%s", 
                                         destination, 
-                                        currentTime, 
                                         message);
             break;
         case QUEUE_RETRACT_FACT:
             result = redisAppendCommand(reContext, 
-                                        "zadd %s!t %ld r:%s", 
+                                        "rpush %s!q r:%s", 
                                         destination, 
-                                        currentTime, 
                                         message);
             break;
+        default:
+            return ERR_UNEXPECTED_VALUE;
     }
     
     VERIFY(result, "registerMessage");  
+
+    result = redisAppendCommand(reContext, 
+                                "publish %s!w $q", 
+                                destination);
+    VERIFY(result, "registerMessage");  
     return RULES_OK;
 }
 
 unsigned int getSession(void *rulesBinding, char *sid, char **state) {
     binding *currentBinding = (binding*)rulesBinding;
+    awaitPrimaryContext(currentBinding);
     redisContext *reContext = currentBinding->reContext; 
     unsigned int result = redisAppendCommand(reContext, 
                                 "hget %s %s", 
@@ -3021,8 +4333,41 @@ unsigned int getSession(void *rulesBinding, char *sid, char **state) {
     return REDIS_OK;
 }
 
+unsigned int refreshSession(void *rulesBinding, char *sid, unsigned long *stateVersion, char **state) {
+    binding *currentBinding = (binding*)rulesBinding;
+    awaitPrimaryContext(currentBinding);
+    redisContext *reContext = currentBinding->reContext; 
+    unsigned int result = redisAppendCommand(reContext, 
+                                             "evalsha %s 0 %s %lu", 
+                                             currentBinding->refreshSessionHash, 
+                                             sid,
+                                             *stateVersion);
+    redisReply *reply;
+    GET_REPLY(result, "refreshSession", reply);
+
+    *state = NULL;
+    *stateVersion = reply->element[0]->integer;
+    redisReply *stateReply = reply->element[1];
+    if (stateReply->type != REDIS_REPLY_STRING) {
+        result = (stateReply->integer ? RULES_OK : ERR_NEW_SESSION);
+        freeReplyObject(reply);
+        return result;
+    }
+
+    *state = malloc((stateReply->len + 1) * sizeof(char));
+    if (!*state) {
+        freeReplyObject(reply);
+        return ERR_OUT_OF_MEMORY;
+    }
+
+    strcpy(*state, stateReply->str);
+    freeReplyObject(reply); 
+    return RULES_OK;
+}
+
 unsigned int getSessionVersion(void *rulesBinding, char *sid, unsigned long *stateVersion) {
     binding *currentBinding = (binding*)rulesBinding;
+    awaitPrimaryContext(currentBinding);
     redisContext *reContext = currentBinding->reContext; 
     unsigned int result = redisAppendCommand(reContext, 
                                              "hget %s!v %s", 
@@ -3043,6 +4388,7 @@ unsigned int getSessionVersion(void *rulesBinding, char *sid, unsigned long *sta
 
 unsigned int deleteSession(ruleset *tree, void *rulesBinding, char *sid, unsigned int sidHash) {
     binding *currentBinding = (binding*)rulesBinding;
+    awaitPrimaryContext(currentBinding);
     redisContext *reContext = currentBinding->reContext; 
 
     int result = redisAppendCommand(reContext, 
@@ -3054,7 +4400,8 @@ unsigned int deleteSession(ruleset *tree, void *rulesBinding, char *sid, unsigne
 
     bindingsList *list = tree->bindingsList;
     binding *firstBinding = &list->bindings[0];
-    if (firstBinding != currentBinding) {
+    if (tree->migratePartitions && firstBinding != currentBinding) {
+        awaitPrimaryContext(firstBinding);
         reContext = firstBinding->reContext;
         result = redisAppendCommand(reContext, 
                                     "hdel %s %u", 
@@ -3068,6 +4415,7 @@ unsigned int deleteSession(ruleset *tree, void *rulesBinding, char *sid, unsigne
 
 unsigned int updateAction(void *rulesBinding, char *sid) {
     binding *currentBinding = (binding*)rulesBinding;
+    awaitPrimaryContext(currentBinding);
     redisContext *reContext = currentBinding->reContext;   
     time_t currentTime = time(NULL);
 
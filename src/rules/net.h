@@ -1,11 +1,13 @@
 
 #include "rete.h"
 #ifdef _WIN32
+#include <WinSock2.h>
 #include "../../deps/hiredis_win/hiredis.h"
 #include "../../deps/hiredis_win/sds.h"
 #else
 #include "../../deps/hiredis/hiredis.h"
 #include "../../deps/hiredis/sds.h"
+#include <pthread.h>
 #endif
 
 #define HASH_LENGTH 40
@@ -22,22 +24,45 @@
 
 typedef char functionHash[HASH_LENGTH + 1];
 
+typedef struct pooledContext {
+    redisContext *reContext;
+    unsigned int pendingReplies;
+    rulesThread owner;
+} pooledContext;
+
+typedef struct connectionPool {
+    pooledContext *contexts;
+    unsigned int contextsLength;
+    rulesMutex lock;
+    rulesCondition released;
+} connectionPool;
+
 typedef struct binding {
     redisContext *reContext;
+    redisContext *waitContext;
+    connectionPool *pool;
+    char *host;
+    unsigned int port;
+    char *password;
+    unsigned char db;
     functionHash evalMessageHash;
     functionHash addMessageHash;
     functionHash peekActionHash;
     functionHash removeActionHash;
-    functionHash partitionHash;
     functionHash timersHash;
+    functionHash queueHash;
+    functionHash addTimerHash;
     functionHash removeTimerHash;
     functionHash updateActionHash;
     functionHash deleteSessionHash;
+    functionHash storeSessionHash;
+    functionHash refreshSessionHash;
     char *partitionHashset;
     char *sessionHashset;
     char *factsHashset;
     char *eventsHashset;
     char *timersSortedset;
+    char *doorbellChannel;
 } binding;
 
 typedef struct bindingsList {
@@ -45,8 +70,21 @@ typedef struct bindingsList {
     unsigned int bindingsLength;
     unsigned int lastBinding;
     unsigned int lastTimersBinding;
+    unsigned int lastQueueBinding;
+    unsigned int poolLength;
 } bindingsList;
 
+typedef struct commandBuffer {
+    void *rulesBinding;
+    sds output;
+    unsigned int commandCount;
+    struct commandBuffer *next;
+} commandBuffer;
+
+void initCommandBuffer(commandBuffer *commands);
+
+void freeCommandBuffer(commandBuffer *commands);
+
 unsigned int getBindingIndex(ruleset *tree, 
                              unsigned int sidHash, 
                              unsigned int *bindingIndex);
@@ -59,7 +97,7 @@ unsigned int formatEvalMessage(void *rulesBinding,
                                unsigned char actionType,
                                char **keys,
                                unsigned int keysLength,
-                               char **command);
+                               commandBuffer *commands);
 
 unsigned int formatStoreMessage(void *rulesBinding, 
                                 char *sid, 
@@ -69,51 +107,72 @@ unsigned int formatStoreMessage(void *rulesBinding,
                                 unsigned char markVisited,
                                 char **keys,
                                 unsigned int keysLength,
-                                char **command);
+                                commandBuffer *commands);
 
 unsigned int formatStoreSession(void *rulesBinding, 
                                 char *sid, 
                                 char *state, 
                                 unsigned char tryExists,
-                                char **storeCommand);
+                                commandBuffer *commands);
 
 unsigned int formatStoreSessionFact(void *rulesBinding, 
                                     char *sid, 
                                     char *message,
                                     unsigned char tryExists, 
-                                    char **command);
+                                    commandBuffer *commands);
 
 unsigned int formatRemoveTimer(void *rulesBinding, 
                                char *timer,
-                               char **command);
+                               commandBuffer *commands);
 
 unsigned int formatRemoveAction(void *rulesBinding, 
                                 char *sid, 
-                                char **command);
+                                commandBuffer *commands);
 
 unsigned int formatRemoveMessage(void *rulesBinding, 
                                  char *sid, 
                                  char *mid,
                                  unsigned char removeFact,
-                                 char **command);
+                                 commandBuffer *commands);
 
 unsigned int formatPeekAction(void *rulesBinding,
                               char *sid,
-                              char **command);
+                              commandBuffer *commands);
+
+unsigned int formatUpdateAction(void *rulesBinding,
+                                char *sid,
+                                commandBuffer *commands);
+
+unsigned int formatRegisterTimer(void *rulesBinding, 
+                                 unsigned int duration, 
+                                 char assert, 
+                                 char *timer,
+                                 commandBuffer *commands);
+
+unsigned int formatCancelTimer(void *rulesBinding, 
+                               char *sid,
+                               char *timerName,
+                               commandBuffer *commands);
+
+unsigned int formatRegisterMessage(void *rulesBinding, 
+                                   unsigned int queueAction, 
+                                   char *destination, 
+                                   char *message,
+                                   commandBuffer *commands);
+
+unsigned int formatDeleteSession(ruleset *tree, 
+                                 void *rulesBinding, 
+                                 char *sid, 
+                                 unsigned int sidHash,
+                                 commandBuffer *commands);
 
-unsigned int executeBatch(void *rulesBinding,
-                          char **commands,
-                          unsigned int commandCount);
+unsigned int executeBatch(commandBuffer *commands);
 
-unsigned int executeBatchWithReply(void *rulesBinding,
+unsigned int executeBatchWithReply(commandBuffer *commands,
                                    unsigned int expectedReplies,
-                                   char **commands,
-                                   unsigned int commandCount,
                                    redisReply **lastReply);
 
-unsigned int startNonBlockingBatch(void *rulesBinding,
-                                   char **commands,
-                                   unsigned int commandCount,
+unsigned int startNonBlockingBatch(commandBuffer *commands,
                                    unsigned int *replyCount); 
 
 unsigned int completeNonBlockingBatch(void *rulesBinding,
@@ -127,16 +186,31 @@ unsigned int peekAction(ruleset *tree,
                         void **bindingContext, 
                         redisReply **reply);
 
+unsigned int peekActions(ruleset *tree, 
+                         unsigned int maxCount,
+                         void **bindingContext, 
+                         redisReply **reply);
+
 unsigned int peekTimers(ruleset *tree, 
+                        unsigned int maxCount,
                         void **bindingContext, 
                         redisReply **reply);
 
+unsigned int peekQueue(ruleset *tree, 
+                       unsigned int maxCount,
+                       void **bindingContext, 
+                       redisReply **reply);
+
+unsigned int waitForActions(ruleset *tree, 
+                            unsigned int timeout);
+
 unsigned int registerTimer(void *rulesBinding, 
                            unsigned int duration, 
                            char assert,
                            char *timer);
 
 unsigned int removeTimer(void *rulesBinding, 
+                         char *sid,
                          char *timerName);
 
 unsigned int registerMessage(void *rulesBinding, 
@@ -146,10 +220,17 @@ unsigned int registerMessage(void *rulesBinding,
 
 unsigned int deleteBindingsList(ruleset *tree);
 
+unsigned int registerPartitions(ruleset *tree);
+
 unsigned int getSession(void *rulesBinding, 
                         char *sid, 
                         char **state);
 
+unsigned int refreshSession(void *rulesBinding, 
+                            char *sid, 
+                            unsigned long *stateVersion,
+                            char **state);
+
 unsigned int getSessionVersion(void *rulesBinding, 
                                char *sid, 
                                unsigned long *stateVersion);
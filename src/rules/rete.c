@@ -294,6 +294,27 @@ static unsigned int ensureBetaList(ruleset *tree, node *newNode) {
     return RULES_OK;
 }
 
+static unsigned int storeInstruction(ruleset *tree, 
+                                     unsigned char operator, 
+                                     jsonValue *value) {
+    instruction *newPool = realloc(tree->codePool, (tree->codeOffset + 1) * sizeof(instruction));
+    if (!newPool) {
+        return ERR_OUT_OF_MEMORY;
+    }
+
+    tree->codePool = newPool;
+    instruction *newInstruction = &tree->codePool[tree->codeOffset];
+    newInstruction->operator = operator;
+    if (value) {
+        newInstruction->value = *value;
+    } else {
+        newInstruction->value.type = JSON_NIL;
+    }
+
+    tree->codeOffset = tree->codeOffset + 1;
+    return RULES_OK;
+}
+
 static unsigned int copyValue(ruleset *tree, 
                               jsonValue *right, 
                               char *first, 
@@ -1025,6 +1046,122 @@ static unsigned int readIdiom(ruleset *tree, char *rule, unsigned char *idiomTyp
     return RULES_OK;
 }
 
+static unsigned char foldValues(unsigned char operator, 
+                                jsonValue *left, 
+                                jsonValue *right, 
+                                jsonValue *target) {
+    if ((left->type != JSON_INT && left->type != JSON_DOUBLE && left->type != JSON_BOOL) ||
+        (right->type != JSON_INT && right->type != JSON_DOUBLE && right->type != JSON_BOOL)) {
+        return 0;
+    }
+
+    // same promotion as the message time reduction, bools are added as ints
+    if (left->type == JSON_DOUBLE || right->type == JSON_DOUBLE) {
+        double leftd = (left->type == JSON_DOUBLE) ? left->value.d : (left->type == JSON_INT) ? left->value.i : left->value.b;
+        double rightd = (right->type == JSON_DOUBLE) ? right->value.d : (right->type == JSON_INT) ? right->value.i : right->value.b;
+        target->type = JSON_DOUBLE;
+        switch(operator) {
+            case OP_ADD:
+                target->value.d = leftd + rightd;
+                return 1;
+            case OP_SUB:
+                target->value.d = leftd - rightd;
+                return 1;
+            case OP_MUL:
+                target->value.d = leftd * rightd;
+                return 1;
+            case OP_DIV: 
+                target->value.d = leftd / rightd;
+                return 1;
+        }
+
+        return 0;
+    }
+
+    long lefti = (left->type == JSON_INT) ? left->value.i : left->value.b;
+    long righti = (right->type == JSON_INT) ? right->value.i : right->value.b;
+    target->type = JSON_INT;
+    switch(operator) {
+        case OP_ADD:
+            target->value.i = lefti + righti;
+            return 1;
+        case OP_SUB:
+            target->value.i = lefti - righti;
+            return 1;
+        case OP_MUL:
+            target->value.i = lefti * righti;
+            return 1;
+        case OP_DIV: 
+            if (!righti) {
+                return 0;
+            }
+
+            target->value.i = lefti / righti;
+            return 1;
+    }
+
+    return 0;
+}
+
+static unsigned int compileValue(ruleset *tree, jsonValue *value, unsigned int top, unsigned int *stackSize) {
+    if (value->type != JSON_STATE_IDIOM && value->type != JSON_EVENT_LOCAL_IDIOM) {
+        if (top + 1 > *stackSize) {
+            *stackSize = top + 1;
+        }
+
+        return storeInstruction(tree, OP_NOP, value);
+    }
+
+    idiom *currentIdiom = &tree->idiomPool[value->value.idiomOffset];
+    unsigned int leftOffset = tree->codeOffset;
+    unsigned int result = compileValue(tree, &currentIdiom->left, top, stackSize);
+    if (result != RULES_OK) {
+        return result;
+    }
+
+    unsigned int rightOffset = tree->codeOffset;
+    result = compileValue(tree, &currentIdiom->right, top + 1, stackSize);
+    if (result != RULES_OK) {
+        return result;
+    }
+
+    if (rightOffset - leftOffset == 1 && tree->codeOffset - rightOffset == 1 &&
+        tree->codePool[leftOffset].operator == OP_NOP && tree->codePool[rightOffset].operator == OP_NOP) {
+        jsonValue foldedValue;
+        if (foldValues(currentIdiom->operator, 
+                       &tree->codePool[leftOffset].value, 
+                       &tree->codePool[rightOffset].value, 
+                       &foldedValue)) {
+            tree->codeOffset = leftOffset;
+            return storeInstruction(tree, OP_NOP, &foldedValue);
+        }
+    }
+
+    return storeInstruction(tree, currentIdiom->operator, NULL);
+}
+
+// idioms evaluated in the alpha network are compiled to a postfix 
+// sequence of pushes and reductions, arithmetic over constants is folded.
+// the operand stack is sized by the deepest push of the sequence
+static unsigned int compileIdiom(ruleset *tree, jsonValue *right) {
+    unsigned int codeOffset = tree->codeOffset;
+    unsigned int stackSize = 0;
+    unsigned int result = compileValue(tree, right, 0, &stackSize);
+    if (result != RULES_OK) {
+        return result;
+    }
+
+    if (tree->codeOffset - codeOffset == 1) {
+        *right = tree->codePool[codeOffset].value;
+        tree->codeOffset = codeOffset;
+        return RULES_OK;
+    }
+
+    tree->idiomPool[right->value.idiomOffset].codeOffset = codeOffset;
+    tree->idiomPool[right->value.idiomOffset].stackSize = stackSize;
+    return storeInstruction(tree, OP_END, NULL);
+}
+
 static unsigned int findAlpha(ruleset *tree, 
                               unsigned int parentOffset, 
                               unsigned char operator, 
@@ -1117,6 +1254,13 @@ static unsigned int findAlpha(ruleset *tree,
             return result;
         }
 
+        if (type == JSON_STATE_IDIOM || type == JSON_EVENT_LOCAL_IDIOM) {
+            result = compileIdiom(tree, &newAlpha->value.a.right);
+            if (result != RULES_OK) {
+                return result;
+            }
+        }
+
         if (type == JSON_EVENT_PROPERTY || type == JSON_EVENT_IDIOM) {
             result = appendTerm(expr, *resultOffset);
             if (result != RULES_OK) {
@@ -1763,6 +1907,75 @@ static void printAlphaNode(ruleset *tree, node *alphaNode, int level) {
 
 #endif
 
+static void addPath(unsigned int *paths, unsigned int pathsLength, unsigned int hash) {
+    unsigned int mask = pathsLength - 1;
+    unsigned int candidate = hash & mask;
+    while (paths[candidate]) {
+        if (paths[candidate] == hash) {
+            return;
+        }
+
+        candidate = (candidate + 1) & mask;
+    }
+
+    paths[candidate] = hash;
+}
+
+static unsigned int scanPaths(char *rules, unsigned int *paths, unsigned int pathsLength) {
+    unsigned int count = 0;
+    unsigned int hash = FNV_32_OFFSET_BASIS;
+    char delimiter = '\0';
+    for (char *current = rules; current[0] != '\0'; ++current) {
+        if (!delimiter) {
+            if (current[0] == '"' || current[0] == '\'') {
+                delimiter = current[0];
+                hash = FNV_32_OFFSET_BASIS;
+            }
+        } else if (current[0] == delimiter) {
+            delimiter = '\0';
+            ++count;
+            if (paths && hash) {
+                addPath(paths, pathsLength, hash);
+            }
+        } else {
+            if (current[0] == '.') {
+                ++count;
+                if (paths && hash) {
+                    addPath(paths, pathsLength, hash);
+                }
+            } else if (current[0] == '\\' && current[1] != '\0') {
+                hash ^= current[0];
+                hash *= FNV_32_PRIME;
+                ++current;
+            }
+
+            hash ^= current[0];
+            hash *= FNV_32_PRIME;
+        }
+    }
+
+    return count;
+}
+
+// every string in the definition and each of its dotted prefixes is 
+// recorded, messages only flatten the objects found in this set
+static unsigned int storePaths(ruleset *tree, char *rules) {
+    unsigned int count = scanPaths(rules, NULL, 0);
+    unsigned int pathsLength = 16;
+    while (pathsLength < count * 2) {
+        pathsLength = pathsLength * 2;
+    }
+
+    tree->referencedPaths = calloc(pathsLength, sizeof(unsigned int));
+    if (!tree->referencedPaths) {
+        return ERR_OUT_OF_MEMORY;
+    }
+
+    tree->referencedPathsLength = pathsLength;
+    scanPaths(rules, tree->referencedPaths, pathsLength);
+    return RULES_OK;
+}
+
 static unsigned int createTree(ruleset *tree, char *rules) {
     char *first;
     char *last;
@@ -1771,7 +1984,12 @@ static unsigned int createTree(ruleset *tree, char *rules) {
     char *lastName;
     unsigned char type;
     unsigned int hash;
-    unsigned int result = readNextName(rules, &firstName, &lastName, &hash);
+    unsigned int result = storePaths(tree, rules);
+    if (result != RULES_OK) {
+        return result;
+    }
+
+    result = readNextName(rules, &firstName, &lastName, &hash);
     while (result == PARSE_OK) {
         path *betaPath = NULL;
         node *ruleAction;
@@ -1861,6 +2079,8 @@ unsigned int createRuleset(void **handle, char *name, char *rules, unsigned int
     if (!tree) {
         return ERR_OUT_OF_MEMORY;
     }
+
+    INIT_MUTEX(tree->lock);
     
     tree->stringPool = NULL;
     tree->stringPoolLength = 0;
@@ -1874,18 +2094,44 @@ unsigned int createRuleset(void **handle, char *name, char *rules, unsigned int
     tree->idiomOffset = 0;
     tree->joinPool = NULL;
     tree->joinOffset = 0;
+    tree->codePool = NULL;
+    tree->codeOffset = 0;
     tree->regexStateMachinePool = NULL;
     tree->regexStateMachineOffset = 0;
     tree->actionCount = 0;
     tree->bindingsList = NULL;
     tree->stateLength = 0;
-    tree->state = calloc(stateCaheSize, sizeof(stateEntry));
+    // the entry past the cache holds a sid not admitted to the cache
+    tree->state = calloc(stateCaheSize + 1, sizeof(stateEntry));
     tree->maxStateLength = stateCaheSize;
     tree->stateBucketsLength = stateCaheSize / 4;
     tree->stateBuckets = malloc(tree->stateBucketsLength * sizeof(unsigned int));
     memset(tree->stateBuckets, 0xFF, tree->stateBucketsLength * sizeof(unsigned int));
     tree->lruStateOffset = UNDEFINED_HASH_OFFSET;
     tree->mruStateOffset = UNDEFINED_HASH_OFFSET;
+    tree->statePolicy = STATE_CACHE_LRU;
+    tree->stateHits = 0;
+    tree->stateMisses = 0;
+    tree->stateEvictions = 0;
+    tree->stateRejections = 0;
+    tree->timersFired = 0;
+    tree->timerBatches = 0;
+    tree->nextTimer = 0;
+    tree->queuePending = 0;
+    tree->messagesDequeued = 0;
+    tree->clockStateOffset = 0;
+    tree->stateSketch = NULL;
+    tree->stateSketchLength = 0;
+    tree->stateSketchSamples = 0;
+    tree->stateNames = NULL;
+    tree->stateNamesLength = 0;
+    tree->stateNamesCount = 0;
+    tree->partitionIndex = 0;
+    tree->partitionsLength = 1;
+    tree->migratePartitions = 0;
+    initObjectArena(&tree->objectArena);
+    tree->referencedPaths = NULL;
+    tree->referencedPathsLength = 0;
 
     result = storeString(tree, name, &tree->nameOffset, strlen(name));
     if (result != RULES_OK) {
@@ -1946,18 +2192,12 @@ unsigned int deleteRuleset(void *handle) {
     free(tree->expressionPool);
     free(tree->idiomPool);
     free(tree->joinPool);
+    free(tree->codePool);
     free(tree->stateBuckets);
-    for (unsigned int i = 0; i < tree->stateLength; ++i) {
-        stateEntry *entry = &tree->state[i];
-        if (entry->state) {
-            free(entry->state);
-        }
-
-        if (entry->sid) {
-            free(entry->sid);
-        }
-    }
-    free(tree->state);
+    free(tree->referencedPaths);
+    deleteStateEntries(tree);
+    deleteObjectArena(&tree->objectArena);
+    DESTROY_MUTEX(tree->lock);
     free(tree);
     return RULES_OK;
 }
@@ -1967,6 +2207,8 @@ unsigned int createClient(void **handle, char *name, unsigned int stateCaheSize)
     if (!tree) {
         return ERR_OUT_OF_MEMORY;
     }
+
+    INIT_MUTEX(tree->lock);
     
     tree->stringPool = NULL;
     tree->stringPoolLength = 0;
@@ -1980,16 +2222,42 @@ unsigned int createClient(void **handle, char *name, unsigned int stateCaheSize)
     tree->idiomOffset = 0;
     tree->joinPool = NULL;
     tree->joinOffset = 0;
+    tree->codePool = NULL;
+    tree->codeOffset = 0;
     tree->actionCount = 0;
     tree->bindingsList = NULL;
     tree->stateLength = 0;
-    tree->state = calloc(stateCaheSize, sizeof(stateEntry));
+    // the entry past the cache holds a sid not admitted to the cache
+    tree->state = calloc(stateCaheSize + 1, sizeof(stateEntry));
     tree->maxStateLength = stateCaheSize;
     tree->stateBucketsLength = stateCaheSize / 4;
     tree->stateBuckets = malloc(tree->stateBucketsLength * sizeof(unsigned int));
     memset(tree->stateBuckets, 0xFF, tree->stateBucketsLength * sizeof(unsigned int));
     tree->lruStateOffset = UNDEFINED_HASH_OFFSET;
     tree->mruStateOffset = UNDEFINED_HASH_OFFSET;
+    tree->statePolicy = STATE_CACHE_LRU;
+    tree->stateHits = 0;
+    tree->stateMisses = 0;
+    tree->stateEvictions = 0;
+    tree->stateRejections = 0;
+    tree->timersFired = 0;
+    tree->timerBatches = 0;
+    tree->nextTimer = 0;
+    tree->queuePending = 0;
+    tree->messagesDequeued = 0;
+    tree->clockStateOffset = 0;
+    tree->stateSketch = NULL;
+    tree->stateSketchLength = 0;
+    tree->stateSketchSamples = 0;
+    tree->stateNames = NULL;
+    tree->stateNamesLength = 0;
+    tree->stateNamesCount = 0;
+    tree->partitionIndex = 0;
+    tree->partitionsLength = 1;
+    tree->migratePartitions = 0;
+    initObjectArena(&tree->objectArena);
+    tree->referencedPaths = NULL;
+    tree->referencedPathsLength = 0;
 
     unsigned int result = storeString(tree, name, &tree->nameOffset, strlen(name));
     if (result != RULES_OK) {
@@ -2000,22 +2268,43 @@ unsigned int createClient(void **handle, char *name, unsigned int stateCaheSize)
     return RULES_OK;
 }
 
+unsigned int lockRuleset(void *handle) {
+    ruleset *tree = (ruleset*)(handle);
+    LOCK_MUTEX(tree->lock);
+    return RULES_OK;
+}
+
+unsigned int unlockRuleset(void *handle) {
+    ruleset *tree = (ruleset*)(handle);
+    UNLOCK_MUTEX(tree->lock);
+    return RULES_OK;
+}
+
+unsigned int setPartition(void *handle, unsigned int partitionIndex, unsigned int partitionsLength) {
+    ruleset *tree = (ruleset*)(handle);
+    if (!partitionsLength || partitionIndex >= partitionsLength) {
+        return ERR_UNEXPECTED_VALUE;
+    }
+
+    tree->partitionIndex = partitionIndex;
+    tree->partitionsLength = partitionsLength;
+    return registerPartitions(tree);
+}
+
+unsigned int setPartitionMigration(void *handle, unsigned char migrate) {
+    ruleset *tree = (ruleset*)(handle);
+    tree->migratePartitions = migrate;
+    return RULES_OK;
+}
+
 unsigned int deleteClient(void *handle) {
     ruleset *tree = (ruleset*)(handle);
     deleteBindingsList(tree);
     free(tree->stringPool);
     free(tree->stateBuckets);
-    for (unsigned int i = 0; i < tree->stateLength; ++i) {
-        stateEntry *entry = &tree->state[i];
-        if (entry->state) {
-            free(entry->state);
-        }
-
-        if (entry->sid) {
-            free(entry->sid);
-        }
-    }
-    
+    deleteStateEntries(tree);
+    deleteObjectArena(&tree->objectArena);
+    DESTROY_MUTEX(tree->lock);
     free(tree);
     return RULES_OK;
 }
@@ -1,4 +1,9 @@
 #include "state.h"
+#ifdef _WIN32
+#include <WinSock2.h>
+#else
+#include <pthread.h>
+#endif
 
 #define OP_NOP 0
 #define OP_LT 0x01
@@ -30,6 +35,36 @@
 #define NODE_ACTION 2
 #define NODE_M_OFFSET 0
 
+#ifdef _WIN32
+typedef CRITICAL_SECTION rulesMutex;
+typedef CONDITION_VARIABLE rulesCondition;
+typedef DWORD rulesThread;
+#define INIT_MUTEX(mutex) InitializeCriticalSection(&(mutex))
+#define DESTROY_MUTEX(mutex) DeleteCriticalSection(&(mutex))
+#define LOCK_MUTEX(mutex) EnterCriticalSection(&(mutex))
+#define UNLOCK_MUTEX(mutex) LeaveCriticalSection(&(mutex))
+#define INIT_CONDITION(condition) InitializeConditionVariable(&(condition))
+#define DESTROY_CONDITION(condition)
+#define WAIT_CONDITION(condition, mutex) SleepConditionVariableCS(&(condition), &(mutex), INFINITE)
+#define BROADCAST_CONDITION(condition) WakeAllConditionVariable(&(condition))
+#define CURRENT_THREAD() GetCurrentThreadId()
+#define SAME_THREAD(left, right) ((left) == (right))
+#else
+typedef pthread_mutex_t rulesMutex;
+typedef pthread_cond_t rulesCondition;
+typedef pthread_t rulesThread;
+#define INIT_MUTEX(mutex) pthread_mutex_init(&(mutex), NULL)
+#define DESTROY_MUTEX(mutex) pthread_mutex_destroy(&(mutex))
+#define LOCK_MUTEX(mutex) pthread_mutex_lock(&(mutex))
+#define UNLOCK_MUTEX(mutex) pthread_mutex_unlock(&(mutex))
+#define INIT_CONDITION(condition) pthread_cond_init(&(condition), NULL)
+#define DESTROY_CONDITION(condition) pthread_cond_destroy(&(condition))
+#define WAIT_CONDITION(condition, mutex) pthread_cond_wait(&(condition), &(mutex))
+#define BROADCAST_CONDITION(condition) pthread_cond_broadcast(&(condition))
+#define CURRENT_THREAD() pthread_self()
+#define SAME_THREAD(left, right) pthread_equal(left, right)
+#endif
+
 typedef struct reference {
     unsigned int nameHash;
     unsigned int nameOffset;
@@ -60,8 +95,15 @@ typedef struct idiom {
     unsigned char operator;
     jsonValue left;
     jsonValue right; 
+    unsigned int codeOffset;
+    unsigned int stackSize;
 } idiom;
 
+typedef struct instruction {
+    unsigned char operator;
+    jsonValue value;
+} instruction;
+
 typedef struct expression {
     unsigned int nameOffset;
     unsigned int aliasOffset;
@@ -127,6 +169,8 @@ typedef struct ruleset {
     unsigned int idiomOffset;
     join *joinPool;
     unsigned int joinOffset;
+    instruction *codePool;
+    unsigned int codeOffset;
     char *regexStateMachinePool;
     unsigned int regexStateMachineOffset;
     unsigned int actionCount;
@@ -138,9 +182,33 @@ typedef struct ruleset {
     unsigned int stateLength;
     unsigned int lruStateOffset;
     unsigned int mruStateOffset;
+    unsigned char statePolicy;
+    unsigned int stateHits;
+    unsigned int stateMisses;
+    unsigned int stateEvictions;
+    unsigned int stateRejections;
+    unsigned int timersFired;
+    unsigned int timerBatches;
+    long long nextTimer;
+    unsigned char queuePending;
+    unsigned int messagesDequeued;
+    unsigned int clockStateOffset;
+    unsigned char *stateSketch;
+    unsigned int stateSketchLength;
+    unsigned int stateSketchSamples;
+    char **stateNames;
+    unsigned int stateNamesLength;
+    unsigned int stateNamesCount;
+    objectArena objectArena;
+    unsigned int *referencedPaths;
+    unsigned int referencedPathsLength;
+    unsigned int partitionIndex;
+    unsigned int partitionsLength;
+    unsigned char migratePartitions;
     unsigned int orNodeOffset;
     unsigned int andNodeOffset;
     unsigned int endNodeOffset;
+    rulesMutex lock;
 } ruleset;
 
 
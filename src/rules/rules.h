@@ -16,14 +16,12 @@
 #define ERR_PARSE_OBJECT 104
 #define ERR_PARSE_ARRAY 105
 #define ERR_EVENT_NOT_HANDLED 201
-#define ERR_EVENT_MAX_PROPERTIES 202
 #define ERR_MAX_STACK_SIZE 203
 #define ERR_NO_ID_DEFINED 204
 #define ERR_INVALID_ID 205
 #define ERR_PARSE_PATH 206
 #define ERR_MAX_NODE_RESULTS 207
 #define ERR_MAX_RESULT_NODES 208
-#define ERR_MAX_COMMAND_COUNT 209
 #define ERR_MAX_ADD_COUNT 210
 #define ERR_MAX_EVAL_COUNT 211
 #define ERR_EVENT_OBSERVED 212
@@ -33,6 +31,7 @@
 #define ERR_NO_TIMERS_AVAILABLE 304
 #define ERR_NEW_SESSION 305 
 #define ERR_TRY_AGAIN 306
+#define ERR_NO_MESSAGES_AVAILABLE 307
 #define ERR_STATE_CACHE_FULL 401
 #define ERR_BINDING_NOT_MAPPED 402
 #define ERR_STATE_NOT_LOADED 403
@@ -56,6 +55,107 @@
 #define QUEUE_ASSERT_EVENT 2
 #define QUEUE_RETRACT_FACT 3
 
+#define STATE_CACHE_LRU 0
+#define STATE_CACHE_CLOCK 1
+#define STATE_CACHE_TINYLFU 2
+
+#define JSON_STRING 0x01
+#define JSON_INT 0x02
+#define JSON_DOUBLE 0x03
+#define JSON_BOOL 0x04
+#define JSON_ARRAY 0x05
+#define JSON_OBJECT 0x06
+#define JSON_NIL 0x07
+
+typedef struct stateCacheStats {
+    unsigned char policy;
+    unsigned int hits;
+    unsigned int misses;
+    unsigned int evictions;
+    unsigned int rejections;
+    unsigned int entries;
+    unsigned int capacity;
+    unsigned int buckets;
+    unsigned int usedBuckets;
+    unsigned int maxChainLength;
+} stateCacheStats;
+
+typedef struct timerStats {
+    unsigned int fired;
+    unsigned int batches;
+    long long nextTimer;
+    unsigned int dequeued;
+} timerStats;
+
+typedef struct commitTimer {
+    char *timer;
+    unsigned int duration;
+    char manualReset;
+} commitTimer;
+
+typedef struct commitQueue {
+    unsigned int queueAction;
+    char *sid;
+    char *destination;
+    char *message;
+} commitQueue;
+
+typedef struct commitDelete {
+    void *handle;
+    char *sid;
+} commitDelete;
+
+// a message built by a binding from its own objects, nested objects are 
+// flattened into dotted names and values are converted, so the engine 
+// does not parse the message text again. offsets are into the message
+// text and the names, string values are located without their quotes
+typedef struct messageProperty {
+    unsigned int nameOffset;
+    unsigned short nameLength;
+    unsigned char type;
+    unsigned char isMaterial;
+    unsigned int valueOffset;
+    unsigned int valueLength;
+    union {
+        long i; 
+        double d; 
+        unsigned char b; 
+    } value;
+} messageProperty;
+
+typedef struct messageObject {
+    char *message;
+    char *names;
+    messageProperty *properties;
+    unsigned int propertiesLength;
+} messageObject;
+
+typedef struct commitMessages {
+    void *handle;
+    char *messages;
+    messageObject *objects;
+    unsigned int objectsLength;
+} commitMessages;
+
+typedef struct commitDescriptor {
+    char *sid;
+    char *state;
+    char **cancelledTimers;
+    unsigned int cancelledTimersLength;
+    commitTimer *timers;
+    unsigned int timersLength;
+    commitQueue *queues;
+    unsigned int queuesLength;
+    commitDelete *deletes;
+    unsigned int deletesLength;
+    commitMessages *retracts;
+    unsigned int retractsLength;
+    commitMessages *facts;
+    unsigned int factsLength;
+    commitMessages *events;
+    unsigned int eventsLength;
+} commitDescriptor;
+
 #ifdef __cplusplus
 extern "C" {
 #endif
@@ -73,15 +173,36 @@ unsigned int createClient(void **handle,
 
 unsigned int deleteClient(void *handle);
 
+unsigned int lockRuleset(void *handle);
+
+unsigned int unlockRuleset(void *handle);
+
 unsigned int bindRuleset(void *handle, 
                          char *host, 
                          unsigned int port, 
                          char *password,
                          unsigned char db);
 
+unsigned int setConnectionPool(void *handle, 
+                               unsigned int poolLength);
+
+unsigned int setPartition(void *handle, 
+                          unsigned int partitionIndex, 
+                          unsigned int partitionsLength);
+
+unsigned int setPartitionMigration(void *handle, 
+                                   unsigned char migrate);
+
+unsigned int getPartition(char *sid, 
+                          unsigned int partitionsLength, 
+                          unsigned int *partitionIndex);
+
 unsigned int complete(void *rulesBinding, 
                       unsigned int replyCount);
 
+unsigned int completeMessage(void *rulesBinding, 
+                             unsigned int replyCount);
+
 unsigned int assertEvent(void *handle, 
                          char *message);
 
@@ -133,6 +254,24 @@ unsigned int startRetractFacts(void *handle,
                               void **rulesBinding, 
                               unsigned int *replyCount);
 
+unsigned int startAssertEventObjects(void *handle, 
+                                     messageObject *messages, 
+                                     unsigned int messagesLength,
+                                     void **rulesBinding, 
+                                     unsigned int *replyCount);
+
+unsigned int startAssertFactObjects(void *handle, 
+                                    messageObject *messages, 
+                                    unsigned int messagesLength,
+                                    void **rulesBinding, 
+                                    unsigned int *replyCount);
+
+unsigned int startRetractFactObjects(void *handle, 
+                                     messageObject *messages, 
+                                     unsigned int messagesLength,
+                                     void **rulesBinding, 
+                                     unsigned int *replyCount);
+
 unsigned int startUpdateState(void *handle, 
                               void *actionHandle, 
                               char *state,
@@ -149,6 +288,14 @@ unsigned int startAction(void *handle,
                          void **actionHandle,
                          void **actionBinding);
 
+unsigned int startActions(void *handle, 
+                          unsigned int maxCount,
+                          char **states, 
+                          char **messages, 
+                          void **actionHandles,
+                          void **actionBindings,
+                          unsigned int *actionCount);
+
 unsigned int completeAction(void *handle, 
                             void *actionHandle, 
                             char *state);
@@ -158,9 +305,17 @@ unsigned int completeAndStartAction(void *handle,
                                     void *actionHandle, 
                                     char **messages);
 
+unsigned int commitAction(void *handle, 
+                          void *actionHandle, 
+                          commitDescriptor *descriptor,
+                          char **messages);
+
 unsigned int abandonAction(void *handle, 
                            void *actionHandle);
 
+unsigned int waitAction(void *handle, 
+                        unsigned int timeout);
+
 unsigned int startTimer(void *handle, 
                         char *sid, 
                         unsigned int duration, 
@@ -177,7 +332,11 @@ unsigned int queueMessage(void *handle,
                           char *destination, 
                           char *message);
 
-unsigned int assertTimers(void *handle);
+unsigned int assertTimers(void *handle, 
+                          unsigned int maxCount);
+
+unsigned int getTimerStats(void *handle, 
+                           timerStats *stats);
 
 unsigned int getState(void *handle, 
                       char *sid, 
@@ -186,9 +345,24 @@ unsigned int getState(void *handle,
 unsigned int deleteState(void *handle, 
                          char *sid);
 
+unsigned int deleteStates(void *handle, 
+                          char **sids,
+                          unsigned int sidsLength);
+
+unsigned int setStateCache(void *handle, 
+                           unsigned char policy, 
+                           unsigned int bucketsLength);
+
+unsigned int getStateCacheStats(void *handle, 
+                                stateCacheStats *stats);
+
 unsigned int renewActionLease(void *handle, 
                               char *sid);
 
+unsigned int renewActionLeases(void *handle, 
+                               char **sids,
+                               unsigned int sidsLength);
+
 #ifdef _WIN32
 int asprintf(char** ret, char* format, ...);
 #endif
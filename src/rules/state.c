@@ -15,123 +15,93 @@ unsigned int fnv1Hash32(char *str, unsigned int len) {
     return hash;
 }
 
-static unsigned int evictEntry(ruleset *tree) {
-    stateEntry *lruEntry = &tree->state[tree->lruStateOffset];
-    unsigned int lruBucket = lruEntry->sidHash % tree->stateBucketsLength;
-    unsigned int offset = tree->stateBuckets[lruBucket];
-    unsigned int lastOffset = UNDEFINED_HASH_OFFSET;
-    unsigned char found = 0;
-    while (!found) {
-        stateEntry *current = &tree->state[offset];
-        if (current->sidHash == lruEntry->sidHash) {
-            if (!strcmp(current->sid, lruEntry->sid)) {
-                if (lastOffset == UNDEFINED_HASH_OFFSET) {
-                    tree->stateBuckets[lruBucket] = current->nextHashOffset;
-                } else {
-                    tree->state[lastOffset].nextHashOffset = current->nextHashOffset;
-                }
-
-                if (current->state) {
-                    free(current->state);
-                    current->state = NULL;
-                }
-
-                free(current->sid);
-                current->sid = NULL;
-                current->sidHash = 0;
-                current->bindingIndex = 0;
-                current->lastRefresh = 0;
-                current->jo.propertiesLength = 0;
-                found = 1;
-            }
-        }
-
-        lastOffset = offset;
-        offset = current->nextHashOffset;
+unsigned int getPartition(char *sid, unsigned int partitionsLength, unsigned int *partitionIndex) {
+    // FNV-1a over unsigned bytes, the peek action script computes the same hash 
+    unsigned int hash = FNV_32_OFFSET_BASIS;
+    for (unsigned char *current = (unsigned char *)sid; *current; ++current) {
+        hash ^= *current;
+        hash *= FNV_32_PRIME;
     }
 
-    unsigned int result = tree->lruStateOffset;
-    tree->lruStateOffset = lruEntry->nextLruOffset;
-    tree->state[tree->lruStateOffset].prevLruOffset = UNDEFINED_HASH_OFFSET;
-    return result;
+    *partitionIndex = partitionsLength ? hash % partitionsLength : 0;
+    return RULES_OK;
 }
 
-static unsigned int addEntry(ruleset *tree, char *sid, unsigned int sidHash) {
-    unsigned newOffset;
-    if (tree->stateLength == tree->maxStateLength) {
-        newOffset = evictEntry(tree);
-    } else {
-        newOffset = tree->stateLength;
-        ++tree->stateLength;
+static void releaseName(ruleset *tree, char *name) {
+    stateName *header = STATE_NAME(name);
+    if (--header->refCount) {
+        return;
     }
 
-    stateEntry *current = &tree->state[newOffset];
-    current->prevLruOffset = UNDEFINED_HASH_OFFSET;
-    current->nextLruOffset = UNDEFINED_HASH_OFFSET;
-    current->nextHashOffset = UNDEFINED_HASH_OFFSET;
-    current->sid = malloc(strlen(sid) + 1);
-    strcpy(current->sid, sid);
-    current->sidHash = sidHash;
-    unsigned int bucket = sidHash % tree->stateBucketsLength;
-    unsigned int offset = tree->stateBuckets[bucket];
-    if (offset == UNDEFINED_HASH_OFFSET) {
-        tree->stateBuckets[bucket] = newOffset;
+    unsigned int mask = tree->stateNamesLength - 1;
+    unsigned int hole = header->hash & mask;
+    while (tree->stateNames[hole] != name) {
+        hole = (hole + 1) & mask;
     }
-    else {
-        while (1) {
-            current = &tree->state[offset];
-            if (current->nextHashOffset == UNDEFINED_HASH_OFFSET) {
-                current->nextHashOffset = newOffset;
-                break;
-            }
 
-            offset = current->nextHashOffset;
+    // later names of the probe chain are shifted back into the hole
+    tree->stateNames[hole] = NULL;
+    unsigned int candidate = hole;
+    while (1) {
+        candidate = (candidate + 1) & mask;
+        char *current = tree->stateNames[candidate];
+        if (!current) {
+            break;
+        }
+
+        unsigned int home = STATE_NAME(current)->hash & mask;
+        if (((candidate - home) & mask) >= ((candidate - hole) & mask)) {
+            tree->stateNames[hole] = current;
+            tree->stateNames[candidate] = NULL;
+            hole = candidate;
         }
     }
 
-    return newOffset;
+    --tree->stateNamesCount;
+    free(header);
 }
 
-static unsigned char ensureEntry(ruleset *tree, char *sid, unsigned int sidHash, stateEntry **result) {
-    unsigned int bucket = sidHash % tree->stateBucketsLength;
-    unsigned int offset = tree->stateBuckets[bucket];
-    stateEntry *current = NULL;
-    unsigned char found = 0;
-    // find state entry by sid in hash table
-    while (offset != UNDEFINED_HASH_OFFSET) {
-        current = &tree->state[offset];
-        if (current->sidHash == sidHash) {
-            if (!strcmp(current->sid, sid)) {
-                found = 1;
-                break;
+static void clearProperties(ruleset *tree, stateEntry *entry) {
+    if (entry->properties) {
+        for (unsigned int i = 0; i < entry->propertiesLength; ++i) {
+            if (entry->properties[i].type) {
+                releaseName(tree, entry->properties[i].name);
             }
         }
 
-        offset = current->nextHashOffset;
-    }  
+        free(entry->properties);
+        entry->properties = NULL;
+    }
 
-    // create entry if not found
-    if (offset == UNDEFINED_HASH_OFFSET) {
-        offset = addEntry(tree, sid, sidHash);
-        current = &tree->state[offset];
+    entry->propertiesLength = 0;
+    if (entry->state) {
+        free(entry->state);
+        entry->state = NULL;
     }
 
-    // remove entry from lru double linked list
+    entry->version = 0;
+}
+
+static void unlinkLruEntry(ruleset *tree, unsigned int offset) {
+    stateEntry *current = &tree->state[offset];
     if (current->prevLruOffset != UNDEFINED_HASH_OFFSET) {
         tree->state[current->prevLruOffset].nextLruOffset = current->nextLruOffset;
-        if (tree->mruStateOffset == offset) {
-            tree->mruStateOffset = current->prevLruOffset;
-        }
+    } else if (tree->lruStateOffset == offset) {
+        tree->lruStateOffset = current->nextLruOffset;
     }
 
     if (current->nextLruOffset != UNDEFINED_HASH_OFFSET) {
         tree->state[current->nextLruOffset].prevLruOffset = current->prevLruOffset;
-        if (tree->lruStateOffset == offset) {
-            tree->lruStateOffset = current->nextLruOffset;
-        }
+    } else if (tree->mruStateOffset == offset) {
+        tree->mruStateOffset = current->prevLruOffset;
     }
 
-    // attach entry to end of linked list
+    current->prevLruOffset = UNDEFINED_HASH_OFFSET;
+    current->nextLruOffset = UNDEFINED_HASH_OFFSET;
+}
+
+static void linkMruEntry(ruleset *tree, unsigned int offset) {
+    stateEntry *current = &tree->state[offset];
     current->nextLruOffset = UNDEFINED_HASH_OFFSET;
     current->prevLruOffset = tree->mruStateOffset;
     if (tree->mruStateOffset == UNDEFINED_HASH_OFFSET) {
@@ -139,33 +109,434 @@ static unsigned char ensureEntry(ruleset *tree, char *sid, unsigned int sidHash,
     } else {
         tree->state[tree->mruStateOffset].nextLruOffset = offset;
     }
+
     tree->mruStateOffset = offset;
+}
 
-    *result = current;
-    return found;
+static void touchEntry(ruleset *tree, unsigned int offset) {
+    if (tree->statePolicy == STATE_CACHE_CLOCK) {
+        tree->state[offset].referenced = 1;
+    } else {
+        unlinkLruEntry(tree, offset);
+        linkMruEntry(tree, offset);
+    }
 }
 
-static stateEntry *getEntry(ruleset *tree, char *sid, unsigned int sidHash) {
+static void clearEntry(ruleset *tree, stateEntry *entry) {
+    clearProperties(tree, entry);
+    if (entry->sid) {
+        free(entry->sid);
+        entry->sid = NULL;
+    }
+
+    entry->sidHash = 0;
+    entry->bindingIndex = 0;
+    entry->lastRefresh = 0;
+    entry->referenced = 0;
+}
+
+static unsigned int setEntry(stateEntry *entry, char *sid, unsigned int sidHash) {
+    entry->prevLruOffset = UNDEFINED_HASH_OFFSET;
+    entry->nextLruOffset = UNDEFINED_HASH_OFFSET;
+    entry->nextHashOffset = UNDEFINED_HASH_OFFSET;
+    entry->sid = malloc(strlen(sid) + 1);
+    if (!entry->sid) {
+        return ERR_OUT_OF_MEMORY;
+    }
+
+    strcpy(entry->sid, sid);
+    entry->sidHash = sidHash;
+    entry->referenced = 1;
+    return RULES_OK;
+}
+
+static void unlinkEntry(ruleset *tree, unsigned int offset) {
+    stateEntry *current = &tree->state[offset];
+    unsigned int bucket = current->sidHash % tree->stateBucketsLength;
+    if (tree->stateBuckets[bucket] == offset) {
+        tree->stateBuckets[bucket] = current->nextHashOffset;
+    } else {
+        stateEntry *previous = &tree->state[tree->stateBuckets[bucket]];
+        while (previous->nextHashOffset != offset) {
+            previous = &tree->state[previous->nextHashOffset];
+        }
+
+        previous->nextHashOffset = current->nextHashOffset;
+    }
+
+    if (tree->statePolicy != STATE_CACHE_CLOCK) {
+        unlinkLruEntry(tree, offset);
+    }
+}
+
+static void evictEntry(ruleset *tree, unsigned int offset) {
+    unlinkEntry(tree, offset);
+    clearEntry(tree, &tree->state[offset]);
+    ++tree->stateEvictions;
+}
+
+static void moveEntry(ruleset *tree, unsigned int fromOffset, unsigned int toOffset) {
+    stateEntry *from = &tree->state[fromOffset];
+    stateEntry *to = &tree->state[toOffset];
+    unsigned int bucket = from->sidHash % tree->stateBucketsLength;
+    if (tree->stateBuckets[bucket] == fromOffset) {
+        tree->stateBuckets[bucket] = toOffset;
+    } else {
+        stateEntry *previous = &tree->state[tree->stateBuckets[bucket]];
+        while (previous->nextHashOffset != fromOffset) {
+            previous = &tree->state[previous->nextHashOffset];
+        }
+
+        previous->nextHashOffset = toOffset;
+    }
+
+    if (tree->statePolicy != STATE_CACHE_CLOCK) {
+        if (from->prevLruOffset != UNDEFINED_HASH_OFFSET) {
+            tree->state[from->prevLruOffset].nextLruOffset = toOffset;
+        } else {
+            tree->lruStateOffset = toOffset;
+        }
+
+        if (from->nextLruOffset != UNDEFINED_HASH_OFFSET) {
+            tree->state[from->nextLruOffset].prevLruOffset = toOffset;
+        } else {
+            tree->mruStateOffset = toOffset;
+        }
+    }
+
+    memcpy(to, from, sizeof(stateEntry));
+    // the sid and id properties point into the entry buffers
+    for (unsigned int i = 0; i < to->propertiesLength; ++i) {
+        jsonProperty *property = &to->properties[i];
+        if (property->valueString == from->sidBuffer) {
+            property->valueString = to->sidBuffer;
+        } else if (property->valueString == from->idBuffer) {
+            property->valueString = to->idBuffer;
+        }
+    }
+
+    // the vacated slot is reused by the next new sid, which must
+    // not look as if it had been refreshed already
+    from->sid = NULL;
+    from->state = NULL;
+    from->properties = NULL;
+    from->propertiesLength = 0;
+    from->version = 0;
+    from->lastRefresh = 0;
+}
+
+static unsigned int selectVictim(ruleset *tree) {
+    if (tree->statePolicy != STATE_CACHE_CLOCK) {
+        return tree->lruStateOffset;
+    }
+
+    // second chance, referenced entries are skipped once
+    while (1) {
+        unsigned int offset = tree->clockStateOffset;
+        tree->clockStateOffset = (offset + 1) % tree->stateLength;
+        stateEntry *current = &tree->state[offset];
+        if (!current->referenced) {
+            return offset;
+        }
+
+        current->referenced = 0;
+    }
+}
+
+static unsigned int sketchIndex(ruleset *tree, unsigned int sidHash, unsigned char row) {
+    static const unsigned int seeds[] = { 0x9E3779B1, 0x85EBCA77, 0xC2B2AE3D, 0x27D4EB2F };
+    unsigned int hash = sidHash * seeds[row];
+    hash ^= hash >> 15;
+    return row * tree->stateSketchLength + (hash & (tree->stateSketchLength - 1));
+}
+
+static unsigned char estimateFrequency(ruleset *tree, unsigned int sidHash) {
+    unsigned char frequency = 0xFF;
+    for (unsigned char i = 0; i < 4; ++i) {
+        unsigned char count = tree->stateSketch[sketchIndex(tree, sidHash, i)];
+        if (count < frequency) {
+            frequency = count;
+        }
+    }
+
+    return frequency;
+}
+
+static void recordFrequency(ruleset *tree, unsigned int sidHash) {
+    for (unsigned char i = 0; i < 4; ++i) {
+        unsigned char *count = &tree->stateSketch[sketchIndex(tree, sidHash, i)];
+        if (*count < 15) {
+            ++*count;
+        }
+    }
+
+    // counts are halved periodically, so old popularity fades out
+    ++tree->stateSketchSamples;
+    if (tree->stateSketchSamples == tree->stateSketchLength * 10) {
+        for (unsigned int i = 0; i < tree->stateSketchLength * 4; ++i) {
+            tree->stateSketch[i] >>= 1;
+        }
+
+        tree->stateSketchSamples = 0;
+    }
+}
+
+static unsigned int findEntry(ruleset *tree, char *sid, unsigned int sidHash) {
     unsigned int bucket = sidHash % tree->stateBucketsLength;
     unsigned int offset = tree->stateBuckets[bucket];
     while (offset != UNDEFINED_HASH_OFFSET) {
         stateEntry *current = &tree->state[offset];
         if (current->sidHash == sidHash) {
             if (!strcmp(current->sid, sid)) {
-                return current;
+                return offset;
             }
         }
 
         offset = current->nextHashOffset;
     }  
+
+    return UNDEFINED_HASH_OFFSET;
+}
+
+static unsigned int ensureEntry(ruleset *tree, char *sid, unsigned int sidHash, stateEntry **entry, unsigned char *found) {
+    if (tree->statePolicy == STATE_CACHE_TINYLFU) {
+        recordFrequency(tree, sidHash);
+    }
+
+    unsigned int offset = findEntry(tree, sid, sidHash);
+    if (offset != UNDEFINED_HASH_OFFSET) {
+        ++tree->stateHits;
+        touchEntry(tree, offset);
+        *entry = &tree->state[offset];
+        *found = 1;
+        return RULES_OK;
+    }
+
+    stateEntry *rejectedEntry = &tree->state[tree->maxStateLength];
+    if (rejectedEntry->sid && rejectedEntry->sidHash == sidHash && !strcmp(rejectedEntry->sid, sid)) {
+        ++tree->stateHits;
+        *entry = rejectedEntry;
+        *found = 1;
+        return RULES_OK;
+    }
+
+    ++tree->stateMisses;
+    if (tree->stateLength == tree->maxStateLength) {
+        offset = selectVictim(tree);
+        // a sid seen less often than the victim is not admitted
+        if (tree->statePolicy == STATE_CACHE_TINYLFU && 
+            estimateFrequency(tree, sidHash) <= estimateFrequency(tree, tree->state[offset].sidHash)) {
+            ++tree->stateRejections;
+            clearEntry(tree, rejectedEntry);
+            unsigned int result = setEntry(rejectedEntry, sid, sidHash);
+            if (result != RULES_OK) {
+                return result;
+            }
+
+            *entry = rejectedEntry;
+            *found = 0;
+            return RULES_OK;
+        }
+
+        evictEntry(tree, offset);
+    } else {
+        offset = tree->stateLength;
+        ++tree->stateLength;
+    }
+
+    stateEntry *current = &tree->state[offset];
+    unsigned int result = setEntry(current, sid, sidHash);
+    if (result != RULES_OK) {
+        // the slot is not linked yet, the last entry fills it
+        --tree->stateLength;
+        if (offset != tree->stateLength) {
+            moveEntry(tree, tree->stateLength, offset);
+        }
+
+        if (tree->clockStateOffset >= tree->stateLength) {
+            tree->clockStateOffset = 0;
+        }
+
+        return result;
+    }
+
+    unsigned int bucket = sidHash % tree->stateBucketsLength;
+    current->nextHashOffset = tree->stateBuckets[bucket];
+    tree->stateBuckets[bucket] = offset;
+    if (tree->statePolicy != STATE_CACHE_CLOCK) {
+        linkMruEntry(tree, offset);
+    }
+
+    *entry = current;
+    *found = 0;
+    return RULES_OK;
+}
+
+static stateEntry *getEntry(ruleset *tree, char *sid, unsigned int sidHash) {
+    unsigned int offset = findEntry(tree, sid, sidHash);
+    if (offset != UNDEFINED_HASH_OFFSET) {
+        return &tree->state[offset];
+    }
+
+    stateEntry *rejectedEntry = &tree->state[tree->maxStateLength];
+    if (rejectedEntry->sid && rejectedEntry->sidHash == sidHash && !strcmp(rejectedEntry->sid, sid)) {
+        return rejectedEntry;
+    }
     
     return NULL;
 }
 
+void removeStateEntry(void *handle, char *sid, unsigned int sidHash) {
+    ruleset *tree = (ruleset*)handle;
+    stateEntry *rejectedEntry = &tree->state[tree->maxStateLength];
+    if (rejectedEntry->sid && rejectedEntry->sidHash == sidHash && !strcmp(rejectedEntry->sid, sid)) {
+        clearEntry(tree, rejectedEntry);
+    }
+
+    unsigned int offset = findEntry(tree, sid, sidHash);
+    if (offset == UNDEFINED_HASH_OFFSET) {
+        return;
+    }
+
+    // the last entry fills the slot, so the cache stays dense
+    unlinkEntry(tree, offset);
+    clearEntry(tree, &tree->state[offset]);
+    --tree->stateLength;
+    if (offset != tree->stateLength) {
+        moveEntry(tree, tree->stateLength, offset);
+    }
+
+    if (tree->clockStateOffset >= tree->stateLength) {
+        tree->clockStateOffset = 0;
+    }
+}
+
+static void accessEntry(ruleset *tree, stateEntry *entry) {
+    if (tree->statePolicy == STATE_CACHE_TINYLFU) {
+        recordFrequency(tree, entry->sidHash);
+    }
+
+    ++tree->stateHits;
+    unsigned int offset = entry - tree->state;
+    if (offset < tree->maxStateLength) {
+        touchEntry(tree, offset);
+    }
+}
+
+void initObjectArena(objectArena *arena) {
+    arena->firstPage = NULL;
+    arena->currentPage = NULL;
+}
+
+void deleteObjectArena(objectArena *arena) {
+    objectPage *page = arena->firstPage;
+    while (page) {
+        objectPage *next = page->next;
+        free(page);
+        page = next;
+    }
+
+    initObjectArena(arena);
+}
+
+// objects are bump allocated from pages that are kept once allocated, 
+// releasing an object rewinds the arena to where the object started
+static void *allocateObjectMemory(objectArena *arena, unsigned int size) {
+    size = (size + 7) & ~7;
+    objectPage *page = arena->currentPage;
+    if (!page || page->offset + size > page->length) {
+        objectPage *nextPage = page ? page->next : arena->firstPage;
+        if (!nextPage || nextPage->length < size) {
+            unsigned int length = size > OBJECT_PAGE_LENGTH ? size : OBJECT_PAGE_LENGTH;
+            objectPage *newPage = malloc(sizeof(objectPage) + length);
+            if (!newPage) {
+                return NULL;
+            }
+
+            newPage->length = length;
+            newPage->next = nextPage;
+            if (page) {
+                page->next = newPage;
+            } else {
+                arena->firstPage = newPage;
+            }
+
+            nextPage = newPage;
+        }
+
+        nextPage->offset = 0;
+        page = nextPage;
+        arena->currentPage = page;
+    }
+
+    void *result = (char *)page + sizeof(objectPage) + page->offset;
+    page->offset += size;
+    return result;
+}
+
+void initObject(void *tree, jsonObject *jo) {
+    objectArena *arena = &((ruleset*)tree)->objectArena;
+    jo->properties = NULL;
+    jo->propertiesLength = 0;
+    jo->maxPropertiesLength = 0;
+    jo->propertyIndex = NULL;
+    jo->propertyIndexMask = 0;
+    jo->idIndex = UNDEFINED_INDEX;
+    jo->sidIndex = UNDEFINED_INDEX;
+    jo->referencedPaths = ((ruleset*)tree)->referencedPaths;
+    jo->referencedPathsLength = ((ruleset*)tree)->referencedPathsLength;
+    jo->arena = arena;
+    jo->arenaPage = arena->currentPage;
+    jo->arenaOffset = arena->currentPage ? arena->currentPage->offset : 0;
+}
+
+void releaseObject(jsonObject *jo) {
+    jo->arena->currentPage = jo->arenaPage;
+    if (jo->arenaPage) {
+        jo->arenaPage->offset = jo->arenaOffset;
+    }
+}
+
+static unsigned char isReferencedPath(jsonObject *jo, unsigned int hash) {
+    if (!jo->referencedPaths || !hash) {
+        return 1;
+    }
+
+    unsigned int mask = jo->referencedPathsLength - 1;
+    for (unsigned int candidate = hash & mask; jo->referencedPaths[candidate]; candidate = (candidate + 1) & mask) {
+        if (jo->referencedPaths[candidate] == hash) {
+            return 1;
+        }
+    }
+
+    return 0;
+}
+
+static unsigned int allocateProperty(jsonObject *jo, jsonProperty **property) {
+    if (jo->propertiesLength == jo->maxPropertiesLength) {
+        unsigned int maxPropertiesLength = jo->maxPropertiesLength ? jo->maxPropertiesLength * 2 : MIN_OBJECT_PROPERTIES;
+        jsonProperty *properties = allocateObjectMemory(jo->arena, sizeof(jsonProperty) * maxPropertiesLength);
+        if (!properties) {
+            return ERR_OUT_OF_MEMORY;
+        }
+
+        if (jo->propertiesLength) {
+            memcpy(properties, jo->properties, sizeof(jsonProperty) * jo->propertiesLength);
+        }
+
+        jo->properties = properties;
+        jo->maxPropertiesLength = maxPropertiesLength;
+    }
+
+    *property = &jo->properties[jo->propertiesLength];
+    ++jo->propertiesLength;
+    return RULES_OK;
+}
+
 static void insertSortProperties(jsonObject *jo, jsonProperty **properties) {
-    for (unsigned short i = 1; i < jo->propertiesLength; ++i) {
-        unsigned short ii = i; 
-        while (properties[ii]->hash < properties[ii - 1]->hash) {
+    for (unsigned int i = 1; i < jo->propertiesLength; ++i) {
+        unsigned int ii = i; 
+        while (ii > 0 && properties[ii]->hash < properties[ii - 1]->hash) {
             jsonProperty *temp = properties[ii];
             properties[ii] = properties[ii - 1];
             properties[ii - 1] = temp;
@@ -175,22 +546,22 @@ static void insertSortProperties(jsonObject *jo, jsonProperty **properties) {
 }
 
 static void radixSortProperties(jsonObject *jo, jsonProperty **properties) {
-    unsigned char counts[43];
-    memset(counts, 0, 43 * sizeof(char));
+    unsigned int counts[43];
+    memset(counts, 0, 43 * sizeof(unsigned int));
 
-    for (unsigned char i = 0; i < jo->propertiesLength; ++i) {
+    for (unsigned int i = 0; i < jo->propertiesLength; ++i) {
         unsigned char mostSignificant = jo->properties[i].hash / 100000000;
         ++counts[mostSignificant];
     }
 
-    unsigned char previousCount = 0;
+    unsigned int previousCount = 0;
     for (unsigned char i = 0; i < 43; ++i) {
-        unsigned char nextCount = counts[i] + previousCount;
+        unsigned int nextCount = counts[i] + previousCount;
         counts[i] = previousCount;
         previousCount = nextCount;
     }
 
-    for (unsigned char i = 0; i < jo->propertiesLength; ++i) {
+    for (unsigned int i = 0; i < jo->propertiesLength; ++i) {
         unsigned char mostSignificant = jo->properties[i].hash / 100000000;
         properties[counts[mostSignificant]] = &jo->properties[i];
         ++counts[mostSignificant];
@@ -200,7 +571,7 @@ static void radixSortProperties(jsonObject *jo, jsonProperty **properties) {
 static void calculateId(jsonObject *jo) {
 
 #ifdef _WIN32
-    jsonProperty **properties = (jsonProperty *)_alloca(sizeof(jsonProperty *) * (jo->propertiesLength));
+    jsonProperty **properties = (jsonProperty **)_alloca(sizeof(jsonProperty *) * (jo->propertiesLength));
 #else
     jsonProperty *properties[jo->propertiesLength];
 #endif
@@ -209,7 +580,7 @@ static void calculateId(jsonObject *jo) {
     insertSortProperties(jo, properties);
 
     unsigned long long hash = FNV_64_OFFSET_BASIS;
-    for (unsigned short i = 0; i < jo->propertiesLength; ++i) {
+    for (unsigned int i = 0; i < jo->propertiesLength; ++i) {
         jsonProperty *property = properties[i];
         for (unsigned short ii = 0; ii < property->nameLength; ++ii) {
             hash ^= property->name[ii];
@@ -248,11 +619,10 @@ static unsigned int fixupIds(jsonObject *jo, char generateId) {
 
         property->type = JSON_STRING;
     } else {
-        property = &jo->properties[jo->propertiesLength];
         jo->sidIndex = jo->propertiesLength;
-        ++jo->propertiesLength;
-        if (jo->propertiesLength == MAX_OBJECT_PROPERTIES) {
-            return ERR_EVENT_MAX_PROPERTIES;
+        unsigned int result = allocateProperty(jo, &property);
+        if (result != RULES_OK) {
+            return result;
         }
 
         strncpy(jo->sidBuffer, "0", 1);
@@ -260,7 +630,7 @@ static unsigned int fixupIds(jsonObject *jo, char generateId) {
         property->isMaterial = 1;
         property->valueString = jo->sidBuffer;
         property->valueLength = 1;
-        strncpy(property->name, "sid", 3);
+        property->name = "sid";
         property->nameLength = 3;
         property->type = JSON_STRING;
     } 
@@ -274,11 +644,10 @@ static unsigned int fixupIds(jsonObject *jo, char generateId) {
 
         property->type = JSON_STRING;
     } else {
-        property = &jo->properties[jo->propertiesLength];
         jo->idIndex = jo->propertiesLength;
-        ++jo->propertiesLength;
-        if (jo->propertiesLength == MAX_OBJECT_PROPERTIES) {
-            return ERR_EVENT_MAX_PROPERTIES;
+        unsigned int result = allocateProperty(jo, &property);
+        if (result != RULES_OK) {
+            return result;
         }
 
         jo->idBuffer[0] = 0;
@@ -286,7 +655,7 @@ static unsigned int fixupIds(jsonObject *jo, char generateId) {
         property->isMaterial = 1;
         property->valueString = jo->idBuffer;
         property->valueLength = 0;
-        strncpy(property->name, "id", 2);
+        property->name = "id";
         property->nameLength = 2;
         property->type = JSON_STRING;
         if (generateId) {
@@ -297,6 +666,54 @@ static unsigned int fixupIds(jsonObject *jo, char generateId) {
     return RULES_OK;
 }
 
+// the index holds the offset of each property plus one, so 
+// lookups by hash don't have to scan the message
+unsigned int indexProperties(jsonObject *jo) {
+    unsigned int propertyIndexLength = MIN_OBJECT_PROPERTIES * 2;
+    while (propertyIndexLength < jo->propertiesLength * 2) {
+        propertyIndexLength <<= 1;
+    }
+
+    unsigned int *propertyIndex = allocateObjectMemory(jo->arena, sizeof(unsigned int) * propertyIndexLength);
+    if (!propertyIndex) {
+        return ERR_OUT_OF_MEMORY;
+    }
+
+    memset(propertyIndex, 0, sizeof(unsigned int) * propertyIndexLength);
+    jo->propertyIndex = propertyIndex;
+    jo->propertyIndexMask = propertyIndexLength - 1;
+    for (unsigned int i = 0; i < jo->propertiesLength; ++i) {
+        unsigned int hash = jo->properties[i].hash;
+        unsigned int candidate = hash & jo->propertyIndexMask;
+        while (propertyIndex[candidate] && jo->properties[propertyIndex[candidate] - 1].hash != hash) {
+            candidate = (candidate + 1) & jo->propertyIndexMask;
+        }
+
+        if (!propertyIndex[candidate]) {
+            propertyIndex[candidate] = i + 1;
+        }
+    }
+
+    return RULES_OK;
+}
+
+unsigned int getObjectProperty(jsonObject *jo, 
+                               unsigned int hash, 
+                               jsonProperty **property) {
+    unsigned int candidate = hash & jo->propertyIndexMask;
+    while (jo->propertyIndex[candidate]) {
+        jsonProperty *current = &jo->properties[jo->propertyIndex[candidate] - 1];
+        if (current->hash == hash) {
+            *property = current;
+            return RULES_OK;
+        }
+
+        candidate = (candidate + 1) & jo->propertyIndexMask;
+    }
+
+    return ERR_PROPERTY_NOT_FOUND;
+}
+
 unsigned int constructObject(char *root,
                              char *parentName, 
                              char *object,
@@ -310,56 +727,49 @@ unsigned int constructObject(char *root,
     char *last;
     unsigned char type;
     unsigned int hash;
-    int parentNameLength;
-    if (parentName) {
-        parentNameLength = strlen(parentName);
-    } else {
-        parentNameLength = 0;
-        jo->idIndex = UNDEFINED_INDEX;
-        jo->sidIndex = UNDEFINED_INDEX;
-        jo->propertiesLength = 0;
-    }
+    int parentNameLength = parentName ? strlen(parentName) : 0;
+    unsigned int parentHash = parentName ? fnv1Hash32(parentName, parentNameLength) : 0;
 
     object = (object ? object : root);
     unsigned int result = readNextName(object, &firstName, &lastName, &hash);
     while (result == PARSE_OK) {
-        result = readNextValue(lastName, &first, &last, &type);
+        // objects no rule refers to are kept whole instead of flattened
+        unsigned char expand = 0;
+        if (jo->referencedPaths) {
+            result = skipNextValue(lastName, &first, &last, &type);
+            if (result == PARSE_OK && type == JSON_OBJECT) {
+                unsigned int pathHash = hash;
+                if (parentName) {
+                    pathHash = (parentHash ^ '.') * FNV_32_PRIME;
+                    for (char *current = firstName; current < lastName; ++current) {
+                        pathHash ^= (*current);
+                        pathHash *= FNV_32_PRIME;
+                    }
+                }
+
+                // objects longer than a property value can hold are flattened
+                expand = isReferencedPath(jo, pathHash) || (last - first) >= 0xFFFF;
+            }
+        } else {
+            result = readNextValue(lastName, &first, &last, &type);
+            expand = (type == JSON_OBJECT);
+        }
+
         if (result != PARSE_OK) {
             return result;
         }
 
         jsonProperty *property = NULL;
-        if (type != JSON_OBJECT) {
-            switch (layout) {
-                case JSON_OBJECT_SEQUENCED:
-                    property = &jo->properties[jo->propertiesLength];
-                    if (hash == HASH_ID) {
-                        jo->idIndex = jo->propertiesLength;
-                    } else if (hash == HASH_SID) {
-                        jo->sidIndex = jo->propertiesLength;
-                    }
-                    break;
-                case JSON_OBJECT_HASHED: 
-                {
-                    unsigned int candidate = hash % MAX_OBJECT_PROPERTIES;
-                    while (jo->properties[candidate].type != 0) {
-                        candidate = (candidate + 1) % MAX_OBJECT_PROPERTIES;
-                    }
-
-                    if (hash == HASH_ID) {
-                        jo->idIndex = candidate;
-                    } else if (hash == HASH_SID) {
-                        jo->sidIndex = candidate;
-                    }
-
-                    property = &jo->properties[candidate];
-                }
-                break;
+        if (!expand) {
+            if (hash == HASH_ID) {
+                jo->idIndex = jo->propertiesLength;
+            } else if (hash == HASH_SID) {
+                jo->sidIndex = jo->propertiesLength;
             }
-            
-            ++jo->propertiesLength;
-            if (jo->propertiesLength == MAX_OBJECT_PROPERTIES) {
-                return ERR_EVENT_MAX_PROPERTIES;
+
+            result = allocateProperty(jo, &property);
+            if (result != RULES_OK) {
+                return result;
             }
 
             property->isMaterial = 0;
@@ -374,8 +784,8 @@ unsigned int constructObject(char *root,
                 return ERR_MAX_PROPERTY_NAME_LENGTH;
             }
 
-            if (type != JSON_OBJECT) {
-                strncpy(property->name, firstName, nameLength);
+            if (!expand) {
+                property->name = firstName;
                 property->nameLength = nameLength;
                 property->hash = hash;
             } else {
@@ -405,7 +815,12 @@ unsigned int constructObject(char *root,
                 return ERR_MAX_PROPERTY_NAME_LENGTH;
             }
 
-            if (type != JSON_OBJECT) {
+            if (!expand) {
+                property->name = allocateObjectMemory(jo->arena, fullNameLength);
+                if (!property->name) {
+                    return ERR_OUT_OF_MEMORY;
+                }
+
                 strncpy(property->name, parentName, parentNameLength);
                 property->name[parentNameLength] = '.';
                 strncpy(&property->name[parentNameLength + 1], firstName, nameLength);
@@ -439,15 +854,85 @@ unsigned int constructObject(char *root,
     }
  
     if (!parentName) {
+        // ids are generated from the flattened content, so a 
+        // message without one is parsed again with every object expanded
+        if (generateId && jo->referencedPaths && 
+            (jo->idIndex == UNDEFINED_INDEX || jo->properties[jo->idIndex].type == JSON_NIL)) {
+            for (unsigned int i = 0; i < jo->propertiesLength; ++i) {
+                if (jo->properties[i].type == JSON_OBJECT) {
+                    releaseObject(jo);
+                    jo->properties = NULL;
+                    jo->propertiesLength = 0;
+                    jo->maxPropertiesLength = 0;
+                    jo->idIndex = UNDEFINED_INDEX;
+                    jo->sidIndex = UNDEFINED_INDEX;
+                    jo->referencedPaths = NULL;
+                    return constructObject(root, 
+                                           NULL, 
+                                           object, 
+                                           layout, 
+                                           generateId, 
+                                           jo, 
+                                           next);
+                }
+            }
+        }
+
         int idResult = fixupIds(jo, generateId);
         if (idResult != RULES_OK) {
             return idResult;
         }
+
+        int indexResult = indexProperties(jo);
+        if (indexResult != RULES_OK) {
+            return indexResult;
+        }
     }
 
     return (result == PARSE_END ? RULES_OK: result);
 }
 
+unsigned int loadObject(messageObject *message,
+                        char generateId,
+                        jsonObject *jo) {
+    for (unsigned int i = 0; i < message->propertiesLength; ++i) {
+        messageProperty *current = &message->properties[i];
+        if (current->nameLength > MAX_NAME_LENGTH) {
+            return ERR_MAX_PROPERTY_NAME_LENGTH;
+        }
+
+        unsigned int hash = fnv1Hash32(&message->names[current->nameOffset], current->nameLength);
+        if (hash == HASH_ID) {
+            jo->idIndex = jo->propertiesLength;
+        } else if (hash == HASH_SID) {
+            jo->sidIndex = jo->propertiesLength;
+        }
+
+        jsonProperty *property;
+        unsigned int result = allocateProperty(jo, &property);
+        if (result != RULES_OK) {
+            return result;
+        }
+
+        // values other than strings are located by their last character
+        property->hash = hash;
+        property->name = &message->names[current->nameOffset];
+        property->nameLength = current->nameLength;
+        property->type = current->type;
+        property->isMaterial = current->isMaterial;
+        property->valueString = &message->message[current->valueOffset];
+        property->valueLength = current->type == JSON_STRING ? current->valueLength : current->valueLength - 1;
+        memcpy(&property->value, &current->value, sizeof(property->value));
+    }
+
+    unsigned int result = fixupIds(jo, generateId);
+    if (result != RULES_OK) {
+        return result;
+    }
+
+    return indexProperties(jo);
+}
+
 void rehydrateProperty(jsonProperty *property, char *state) {
     if (!property->isMaterial) {
         unsigned short propertyLength = property->valueLength + 1;
@@ -482,13 +967,208 @@ void rehydrateProperty(jsonProperty *property, char *state) {
     }
 }
 
+static unsigned int internName(ruleset *tree, 
+                               char *name, 
+                               unsigned short nameLength, 
+                               char **internedName) {
+    if ((tree->stateNamesCount + 1) * 2 > tree->stateNamesLength) {
+        unsigned int namesLength = tree->stateNamesLength ? tree->stateNamesLength * 2 : 64;
+        char **names = calloc(namesLength, sizeof(char*));
+        if (!names) {
+            return ERR_OUT_OF_MEMORY;
+        }
+
+        for (unsigned int i = 0; i < tree->stateNamesLength; ++i) {
+            char *current = tree->stateNames[i];
+            if (current) {
+                unsigned int candidate = STATE_NAME(current)->hash & (namesLength - 1);
+                while (names[candidate]) {
+                    candidate = (candidate + 1) & (namesLength - 1);
+                }
+
+                names[candidate] = current;
+            }
+        }
+
+        free(tree->stateNames);
+        tree->stateNames = names;
+        tree->stateNamesLength = namesLength;
+    }
+
+    unsigned int mask = tree->stateNamesLength - 1;
+    unsigned int hash = fnv1Hash32(name, nameLength);
+    unsigned int candidate = hash & mask;
+    while (tree->stateNames[candidate]) {
+        char *current = tree->stateNames[candidate];
+        if (!strncmp(current, name, nameLength) && current[nameLength] == '\0') {
+            ++STATE_NAME(current)->refCount;
+            *internedName = current;
+            return RULES_OK;
+        }
+
+        candidate = (candidate + 1) & mask;
+    }
+
+    // a name is counted by the properties that use it and freed
+    // when the last entry holding it is cleared
+    stateName *header = malloc(sizeof(stateName) + nameLength + 1);
+    if (!header) {
+        return ERR_OUT_OF_MEMORY;
+    }
+
+    header->refCount = 1;
+    header->hash = hash;
+    char *current = (char *)(header + 1);
+    strncpy(current, name, nameLength);
+    current[nameLength] = '\0';
+    tree->stateNames[candidate] = current;
+    ++tree->stateNamesCount;
+    *internedName = current;
+    return RULES_OK;
+}
+
+static unsigned int storeProperties(ruleset *tree, stateEntry *entry, jsonObject *jo) {
+    // slots are sized to the state, at most half of them are used
+    unsigned int propertiesLength = 4;
+    while (propertiesLength < jo->propertiesLength * 2) {
+        propertiesLength *= 2;
+    }
+
+    jsonProperty *properties = calloc(propertiesLength, sizeof(jsonProperty));
+    if (!properties) {
+        return ERR_OUT_OF_MEMORY;
+    }
+
+    unsigned int mask = propertiesLength - 1;
+    for (unsigned int i = 0; i < jo->propertiesLength; ++i) {
+        jsonProperty *property = &jo->properties[i];
+        unsigned int candidate = property->hash & mask;
+        while (properties[candidate].type != 0) {
+            candidate = (candidate + 1) & mask;
+        }
+
+        jsonProperty *newProperty = &properties[candidate];
+        *newProperty = *property;
+        unsigned int result = internName(tree, property->name, property->nameLength, &newProperty->name);
+        if (result != RULES_OK) {
+            newProperty->type = 0;
+            for (unsigned int j = 0; j < propertiesLength; ++j) {
+                if (properties[j].type) {
+                    releaseName(tree, properties[j].name);
+                }
+            }
+
+            free(properties);
+            return result;
+        }
+
+        if (property->valueString == jo->sidBuffer) {
+            memcpy(entry->sidBuffer, jo->sidBuffer, SID_BUFFER_LENGTH);
+            newProperty->valueString = entry->sidBuffer;
+        } else if (property->valueString == jo->idBuffer) {
+            memcpy(entry->idBuffer, jo->idBuffer, ID_BUFFER_LENGTH);
+            newProperty->valueString = entry->idBuffer;
+        }
+    }
+
+    entry->properties = properties;
+    entry->propertiesLength = propertiesLength;
+    return RULES_OK;
+}
+
+static jsonProperty *findProperty(stateEntry *entry, unsigned int propertyHash) {
+    unsigned int mask = entry->propertiesLength - 1;
+    unsigned int propertyIndex = propertyHash & mask;
+    jsonProperty *result = &entry->properties[propertyIndex];
+    while (result->type != 0 && result->hash != propertyHash) {
+        propertyIndex = (propertyIndex + 1) & mask;  
+        result = &entry->properties[propertyIndex];   
+    }
+
+    return result->type ? result : NULL;
+}
+
+static unsigned char patchProperties(stateEntry *entry, jsonObject *jo) {
+    // the slots are updated in place when the new state has the same 
+    // properties, unchanged values keep their materialized value
+    if (!entry->propertiesLength || entry->propertiesLength < jo->propertiesLength * 2) {
+        return 0;
+    }
+
+    unsigned int propertiesCount = 0;
+    for (unsigned int i = 0; i < entry->propertiesLength; ++i) {
+        if (entry->properties[i].type) {
+            ++propertiesCount;
+        }
+    }
+
+    if (propertiesCount != jo->propertiesLength) {
+        return 0;
+    }
+
+    for (unsigned int i = 0; i < jo->propertiesLength; ++i) {
+        if (!findProperty(entry, jo->properties[i].hash)) {
+            return 0;
+        }
+    }
+
+    for (unsigned int i = 0; i < jo->propertiesLength; ++i) {
+        jsonProperty *property = &jo->properties[i];
+        jsonProperty *current = findProperty(entry, property->hash);
+        char *valueString = property->valueString;
+        if (valueString == jo->sidBuffer) {
+            memcpy(entry->sidBuffer, jo->sidBuffer, SID_BUFFER_LENGTH);
+            valueString = entry->sidBuffer;
+        } else if (valueString == jo->idBuffer) {
+            memcpy(entry->idBuffer, jo->idBuffer, ID_BUFFER_LENGTH);
+            valueString = entry->idBuffer;
+        }
+
+        unsigned short valueLength = property->valueLength;
+        if (property->type != JSON_STRING) {
+            ++valueLength;
+        }
+
+        if (current->type != property->type || 
+            current->valueLength != property->valueLength || 
+            (valueString != current->valueString && memcmp(current->valueString, valueString, valueLength))) {
+            current->type = property->type;
+            current->valueLength = property->valueLength;
+            current->isMaterial = property->isMaterial;
+            current->value = property->value;
+        }
+
+        current->valueString = valueString;
+    }
+
+    return 1;
+}
+
+void deleteStateEntries(void *handle) {
+    ruleset *tree = (ruleset*)handle;
+    for (unsigned int i = 0; i < tree->stateLength; ++i) {
+        clearEntry(tree, &tree->state[i]);
+    }
+
+    clearEntry(tree, &tree->state[tree->maxStateLength]);
+    free(tree->state);
+    free(tree->stateSketch);
+    free(tree->stateNames);
+}
+
 static unsigned int resolveBindingAndEntry(ruleset *tree, 
                                           char *sid, 
                                           stateEntry **entry,
                                           void **rulesBinding) {   
     unsigned int sidHash = fnv1Hash32(sid, strlen(sid));
-    if (!ensureEntry(tree, sid, sidHash, entry)) {
-        unsigned int result = getBindingIndex(tree, sidHash, &(*entry)->bindingIndex);
+    unsigned char found;
+    unsigned int result = ensureEntry(tree, sid, sidHash, entry, &found);
+    if (result != RULES_OK) {
+        return result;
+    }
+
+    if (!found) {
+        result = getBindingIndex(tree, sidHash, &(*entry)->bindingIndex);
         if (result != RULES_OK) {
             return result;
         }
@@ -516,33 +1196,61 @@ unsigned int refreshState(void *handle,
         return result;
     }
 
-    if (entry->state) {
-        free(entry->state);
-        entry->state = NULL;
-    }
-
-    result = getSession(rulesBinding, sid, &entry->state);
+    // the cached state is kept as long as the session version 
+    // has not changed, the script returns the state otherwise
+    unsigned long version = (entry->state ? entry->version : 0);
+    char *state = NULL;
+    result = refreshSession(rulesBinding, sid, &version, &state);
     if (result != RULES_OK) {
         if (result == ERR_NEW_SESSION) {
+            clearProperties((ruleset*)handle, entry);
             entry->lastRefresh = time(NULL);    
         }
         return result;
     }
 
-    memset(entry->jo.properties, 0, MAX_OBJECT_PROPERTIES * sizeof(jsonProperty));
-    entry->jo.propertiesLength = 0;
+    if (!state) {
+        entry->lastRefresh = time(NULL);
+        return RULES_OK;
+    }
+
+    ruleset *tree = (ruleset*)handle;
+    jsonObject jo;
     char *next;
-    result =  constructObject(entry->state,
+    initObject(tree, &jo);
+    // the cached state is flattened whole
+    jo.referencedPaths = NULL;
+    result =  constructObject(state,
                              NULL, 
                              NULL, 
-                             JSON_OBJECT_HASHED, 
+                             JSON_OBJECT_SEQUENCED, 
                              0,
-                             &entry->jo, 
+                             &jo, 
                              &next);
     if (result != RULES_OK) {
+        releaseObject(&jo);
+        free(state);
         return result;
     }
 
+    if (!patchProperties(entry, &jo)) {
+        clearProperties(tree, entry);
+        result = storeProperties(tree, entry, &jo);
+        if (result != RULES_OK) {
+            releaseObject(&jo);
+            free(state);
+            return result;
+        }
+    }
+
+    releaseObject(&jo);
+
+    if (entry->state) {
+        free(entry->state);
+    }
+
+    entry->state = state;
+    entry->version = version;
     entry->lastRefresh = time(NULL);
     return RULES_OK;
 }
@@ -560,18 +1268,20 @@ unsigned int fetchStateProperty(void *tree,
         return ERR_STATE_NOT_LOADED;
     }
     
-    if (!ignoreStaleState && (time(NULL) - entry->lastRefresh > maxTime)) {
-        return ERR_STALE_STATE;
+    if (!ignoreStaleState) {
+        if (time(NULL) - entry->lastRefresh > maxTime) {
+            return ERR_STALE_STATE;
+        }
+
+        accessEntry(tree, entry);
     }
 
-    unsigned int propertyIndex = propertyHash % MAX_OBJECT_PROPERTIES;
-    jsonProperty *result = &entry->jo.properties[propertyIndex];
-    while (result->type != 0 && result->hash != propertyHash) {
-        propertyIndex = (propertyIndex + 1) % MAX_OBJECT_PROPERTIES;  
-        result = &entry->jo.properties[propertyIndex];   
+    if (!entry->propertiesLength) {
+        return ERR_PROPERTY_NOT_FOUND;
     }
 
-    if (!result->type) {
+    jsonProperty *result = findProperty(entry, propertyHash);
+    if (!result) {
         return ERR_PROPERTY_NOT_FOUND;
     }
 
@@ -618,5 +1328,138 @@ unsigned int deleteState(void *handle, char *sid) {
     }
 
     unsigned int sidHash = fnv1Hash32(sid, strlen(sid));
-    return deleteSession(handle, rulesBinding, sid, sidHash);
+    result = deleteSession(handle, rulesBinding, sid, sidHash);
+    if (result != RULES_OK) {
+      return result;
+    }
+
+    removeStateEntry(handle, sid, sidHash);
+    return RULES_OK;
+}
+
+unsigned int deleteStates(void *handle, char **sids, unsigned int sidsLength) {
+    commandBuffer commands;
+    initCommandBuffer(&commands);
+    unsigned int result = RULES_OK;
+    for (unsigned int i = 0; i < sidsLength; ++i) {
+        void *rulesBinding;
+        char *sid = sids[i] ? sids[i] : "0";
+        result = resolveBinding(handle, sid, &rulesBinding);
+        if (result != RULES_OK) {
+            break;
+        }
+
+        unsigned int sidHash = fnv1Hash32(sid, strlen(sid));
+        result = formatDeleteSession(handle, 
+                                     rulesBinding, 
+                                     sid, 
+                                     sidHash, 
+                                     &commands);
+        if (result != RULES_OK) {
+            break;
+        }
+
+        removeStateEntry(handle, sid, sidHash);
+    }
+
+    // one pipeline per binding for all the sessions
+    for (commandBuffer *current = &commands; current && result == RULES_OK; current = current->next) {
+        result = executeBatch(current);
+    }
+
+    freeCommandBuffer(&commands);
+    return result;
+}
+
+unsigned int setStateCache(void *handle, unsigned char policy, unsigned int bucketsLength) {
+    ruleset *tree = (ruleset*)handle;
+    if (policy > STATE_CACHE_TINYLFU) {
+        return ERR_UNEXPECTED_VALUE;
+    }
+
+    if (bucketsLength && bucketsLength != tree->stateBucketsLength) {
+        unsigned int *buckets = malloc(bucketsLength * sizeof(unsigned int));
+        if (!buckets) {
+            return ERR_OUT_OF_MEMORY;
+        }
+
+        memset(buckets, 0xFF, bucketsLength * sizeof(unsigned int));
+        for (unsigned int i = 0; i < tree->stateLength; ++i) {
+            stateEntry *current = &tree->state[i];
+            unsigned int bucket = current->sidHash % bucketsLength;
+            current->nextHashOffset = buckets[bucket];
+            buckets[bucket] = i;
+        }
+
+        free(tree->stateBuckets);
+        tree->stateBuckets = buckets;
+        tree->stateBucketsLength = bucketsLength;
+    }
+
+    if (policy == STATE_CACHE_TINYLFU && !tree->stateSketch) {
+        unsigned int sketchLength = 64;
+        while (sketchLength < tree->maxStateLength) {
+            sketchLength = sketchLength << 1;
+        }
+
+        tree->stateSketch = calloc(sketchLength * 4, sizeof(unsigned char));
+        if (!tree->stateSketch) {
+            return ERR_OUT_OF_MEMORY;
+        }
+
+        tree->stateSketchLength = sketchLength;
+        tree->stateSketchSamples = 0;
+    } else if (policy != STATE_CACHE_TINYLFU && tree->stateSketch) {
+        free(tree->stateSketch);
+        tree->stateSketch = NULL;
+        tree->stateSketchLength = 0;
+        tree->stateSketchSamples = 0;
+    }
+
+    if (policy != tree->statePolicy) {
+        // the recency list is only kept for lru and tinylfu
+        tree->lruStateOffset = UNDEFINED_HASH_OFFSET;
+        tree->mruStateOffset = UNDEFINED_HASH_OFFSET;
+        tree->clockStateOffset = 0;
+        tree->statePolicy = policy;
+        for (unsigned int i = 0; i < tree->stateLength; ++i) {
+            tree->state[i].referenced = 0;
+            if (policy != STATE_CACHE_CLOCK) {
+                linkMruEntry(tree, i);
+            }
+        }
+    }
+
+    return RULES_OK;
+}
+
+unsigned int getStateCacheStats(void *handle, stateCacheStats *stats) {
+    ruleset *tree = (ruleset*)handle;
+    stats->policy = tree->statePolicy;
+    stats->hits = tree->stateHits;
+    stats->misses = tree->stateMisses;
+    stats->evictions = tree->stateEvictions;
+    stats->rejections = tree->stateRejections;
+    stats->entries = tree->stateLength;
+    stats->capacity = tree->maxStateLength;
+    stats->buckets = tree->stateBucketsLength;
+    stats->usedBuckets = 0;
+    stats->maxChainLength = 0;
+    for (unsigned int i = 0; i < tree->stateBucketsLength; ++i) {
+        unsigned int chainLength = 0;
+        unsigned int offset = tree->stateBuckets[i];
+        while (offset != UNDEFINED_HASH_OFFSET) {
+            ++chainLength;
+            offset = tree->state[offset].nextHashOffset;
+        }
+
+        if (chainLength) {
+            ++stats->usedBuckets;
+            if (chainLength > stats->maxChainLength) {
+                stats->maxChainLength = chainLength;
+            }
+        }
+    }
+
+    return RULES_OK;
 }
@@ -8,9 +8,9 @@
 #define UNDEFINED_HASH_OFFSET 0xFFFFFFFF
 
 #define JSON_OBJECT_SEQUENCED 1
-#define JSON_OBJECT_HASHED 2
 
-#define MAX_OBJECT_PROPERTIES 128
+#define OBJECT_PAGE_LENGTH 65536
+#define MIN_OBJECT_PROPERTIES 16
 
 typedef struct jsonProperty {
     unsigned int hash;
@@ -18,7 +18,7 @@ typedef struct jsonProperty {
     unsigned char isMaterial;
     char *valueString;
     unsigned short valueLength;
-    char name[MAX_NAME_LENGTH];
+    char *name;
     unsigned short nameLength;
     union {
         long i; 
@@ -27,13 +27,39 @@ typedef struct jsonProperty {
     } value;
 } jsonProperty;
 
+typedef struct stateName {
+    unsigned int refCount;
+    unsigned int hash;
+} stateName;
+
+#define STATE_NAME(name) ((stateName *)(name) - 1)
+
+typedef struct objectPage {
+    struct objectPage *next;
+    unsigned int length;
+    unsigned int offset;
+} objectPage;
+
+typedef struct objectArena {
+    objectPage *firstPage;
+    objectPage *currentPage;
+} objectArena;
+
 typedef struct jsonObject {
-    jsonProperty properties[MAX_OBJECT_PROPERTIES];
-    unsigned char propertiesLength; 
+    jsonProperty *properties;
+    unsigned int propertiesLength; 
+    unsigned int maxPropertiesLength;
+    unsigned int *propertyIndex;
+    unsigned int propertyIndexMask;
     unsigned int idIndex; 
     unsigned int sidIndex;
     char sidBuffer[SID_BUFFER_LENGTH];
     char idBuffer[ID_BUFFER_LENGTH];
+    unsigned int *referencedPaths;
+    unsigned int referencedPathsLength;
+    objectArena *arena;
+    objectPage *arenaPage;
+    unsigned int arenaOffset;
 } jsonObject;
 
 typedef struct stateEntry {
@@ -43,17 +69,40 @@ typedef struct stateEntry {
     unsigned int sidHash;
     unsigned int bindingIndex;
     unsigned int lastRefresh;
+    unsigned char referenced;
+    unsigned long version;
     char *state;
     char *sid;
-    jsonObject jo;
+    jsonProperty *properties;
+    unsigned int propertiesLength;
+    char sidBuffer[SID_BUFFER_LENGTH];
+    char idBuffer[ID_BUFFER_LENGTH];
 } stateEntry;
 
 unsigned int fnv1Hash32(char *str, unsigned int len);
 
 void rehydrateProperty(jsonProperty *property, char *state);
 
+void deleteStateEntries(void *tree);
+
+void removeStateEntry(void *tree, char *sid, unsigned int sidHash);
+
 unsigned int refreshState(void *tree, char *sid);
 
+void initObjectArena(objectArena *arena);
+
+void deleteObjectArena(objectArena *arena);
+
+void initObject(void *tree, jsonObject *jo);
+
+void releaseObject(jsonObject *jo);
+
+unsigned int indexProperties(jsonObject *jo);
+
+unsigned int getObjectProperty(jsonObject *jo, 
+                               unsigned int hash, 
+                               jsonProperty **property);
+
 unsigned int constructObject(char *root,
                              char *parentName, 
                              char *object,
@@ -62,6 +111,12 @@ unsigned int constructObject(char *root,
                              jsonObject *jo,
                              char **next);
 
+struct messageObject;
+
+unsigned int loadObject(struct messageObject *message,
+                        char generateId,
+                        jsonObject *jo);
+
 unsigned int resolveBinding(void *tree, 
                             char *sid, 
                             void **rulesBinding);
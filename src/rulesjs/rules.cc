@@ -842,10 +842,15 @@ void jsAssertTimers(const FunctionCallbackInfo<Value>& args) {
     isolate = args.GetIsolate();
     if (args.Length() < 1) {
         isolate->ThrowException(Exception::TypeError(String::NewFromUtf8(isolate, "Wrong number of arguments")));
-    } else if (!args[0]->IsNumber()) {
+    } else if (!args[0]->IsNumber() || (args.Length() > 1 && !args[1]->IsNumber())) {
         isolate->ThrowException(Exception::TypeError(String::NewFromUtf8(isolate, "Wrong argument type")));
     } else {
-        unsigned int result = assertTimers((void *)args[0]->IntegerValue());
+        unsigned int maxCount = 50;
+        if (args.Length() > 1) {
+            maxCount = args[1]->Uint32Value();
+        }
+
+        unsigned int result = assertTimers((void *)args[0]->IntegerValue(), maxCount);
         
         if (result == RULES_OK) {
             args.GetReturnValue().Set(1);
@@ -862,6 +867,33 @@ void jsAssertTimers(const FunctionCallbackInfo<Value>& args) {
     }
 }
 
+void jsGetTimerStats(const FunctionCallbackInfo<Value>& args) {
+    Isolate* isolate;
+    isolate = args.GetIsolate();
+    if (args.Length() < 1) {
+        isolate->ThrowException(Exception::TypeError(String::NewFromUtf8(isolate, "Wrong number of arguments")));
+    } else if (!args[0]->IsNumber()) {
+        isolate->ThrowException(Exception::TypeError(String::NewFromUtf8(isolate, "Wrong argument type")));
+    } else {
+        timerStats stats;
+        unsigned int result = getTimerStats((void *)args[0]->IntegerValue(), &stats);
+        if (result == RULES_OK) {
+            Handle<Object> output = Object::New(isolate);
+            output->Set(String::NewFromUtf8(isolate, "fired"), Number::New(isolate, stats.fired));
+            output->Set(String::NewFromUtf8(isolate, "batches"), Number::New(isolate, stats.batches));
+            output->Set(String::NewFromUtf8(isolate, "nextTimer"), Number::New(isolate, (double)stats.nextTimer));
+            args.GetReturnValue().Set(output);
+        } else {
+            char *message = NULL;
+            if (asprintf(&message, "Could not get timer stats, error code: %d", result) == -1) {
+                isolate->ThrowException(Exception::Error(String::NewFromUtf8(isolate, "Out of memory")));
+            } else {
+                isolate->ThrowException(Exception::Error(String::NewFromUtf8(isolate, message)));
+            }
+        } 
+    }
+}
+
 void jsGetState(const FunctionCallbackInfo<Value>& args) {
     Isolate* isolate;
     isolate = args.GetIsolate();
@@ -1056,6 +1088,9 @@ void init(Handle<Object> exports) {
     exports->Set(String::NewFromUtf8(isolate, "assertTimers", String::kInternalizedString),
         FunctionTemplate::New(isolate, jsAssertTimers)->GetFunction());
 
+    exports->Set(String::NewFromUtf8(isolate, "getTimerStats", String::kInternalizedString),
+        FunctionTemplate::New(isolate, jsGetTimerStats)->GetFunction());
+
     exports->Set(String::NewFromUtf8(isolate, "assertState", String::kInternalizedString),
         FunctionTemplate::New(isolate, jsAssertState)->GetFunction());
 
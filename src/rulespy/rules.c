@@ -1,25 +1,903 @@
 #include <Python.h>
+#include <errno.h>
 #include <rules.h>
 
 static PyObject *RulesError;
 
+// calls into the engine run without the GIL, the ruleset lock keeps
+// each call atomic with respect to the other calls on the same ruleset
+#define RULES_CALL(handle, call) do { \
+    Py_BEGIN_ALLOW_THREADS \
+    lockRuleset(handle); \
+    call; \
+    unlockRuleset(handle); \
+    Py_END_ALLOW_THREADS \
+} while(0)
+
+// the replies to a batch are read on the calling thread's pooled 
+// connection outside of the ruleset lock
+#define RULES_COMPLETE(result, rulesBinding, replyCount) do { \
+    unsigned int completeResult; \
+    Py_BEGIN_ALLOW_THREADS \
+    completeResult = completeMessage(rulesBinding, replyCount); \
+    Py_END_ALLOW_THREADS \
+    if (completeResult != RULES_OK) { \
+        result = completeResult; \
+    } \
+} while(0)
+
 #define PRINT_ARGS(args) do { \
     PyObject* or = PyObject_Repr(args); \
     const char* s = PyString_AsString(or); \
     printf("args %s\n", s); \
 } while(0)
 
+#if PY_MAJOR_VERSION >= 3
+#define IS_TEXT(object) PyUnicode_Check(object)
+#define IS_INT(object) PyLong_Check(object)
+#define INT_FROM_LONG(value) PyLong_FromLong(value)
+#else
+#define IS_TEXT(object) (PyString_Check(object) || PyUnicode_Check(object))
+#define IS_INT(object) (PyInt_Check(object) || PyLong_Check(object))
+#define INT_FROM_LONG(value) PyInt_FromLong(value)
+#endif
+
+typedef struct jsonBuffer {
+    char *content;
+    size_t length;
+    size_t capacity;
+} jsonBuffer;
+
+// messages are written to json text while the properties are collected, 
+// the batch shares the text, the names and the properties
+typedef struct messageBuilder {
+    jsonBuffer text;
+    jsonBuffer names;
+    messageProperty *properties;
+    unsigned int propertiesLength;
+    unsigned int maxPropertiesLength;
+} messageBuilder;
+
+static int reserveJson(jsonBuffer *buffer, size_t length) {
+    if (buffer->length + length + 1 <= buffer->capacity) {
+        return 1;
+    }
+
+    size_t capacity = buffer->capacity ? buffer->capacity * 2 : 256;
+    while (buffer->length + length + 1 > capacity) {
+        capacity *= 2;
+    }
+
+    char *content = realloc(buffer->content, capacity);
+    if (!content) {
+        PyErr_NoMemory();
+        return 0;
+    }
+
+    buffer->content = content;
+    buffer->capacity = capacity;
+    return 1;
+}
+
+static int appendJson(jsonBuffer *buffer, const char *text, size_t length) {
+    if (!reserveJson(buffer, length)) {
+        return 0;
+    }
+
+    memcpy(buffer->content + buffer->length, text, length);
+    buffer->length += length;
+    buffer->content[buffer->length] = '\0';
+    return 1;
+}
+
+static int appendJsonString(jsonBuffer *buffer, const char *text, size_t length) {
+    if (!appendJson(buffer, "\"", 1)) {
+        return 0;
+    }
+
+    size_t first = 0;
+    for (size_t i = 0; i < length; ++i) {
+        unsigned char current = (unsigned char)text[i];
+        if (current >= 0x20 && current != '"' && current != '\\') {
+            continue;
+        }
+
+        if (!appendJson(buffer, text + first, i - first)) {
+            return 0;
+        }
+
+        char escape[7];
+        switch (current) {
+            case '"':
+                strcpy(escape, "\\\"");
+                break;
+            case '\\':
+                strcpy(escape, "\\\\");
+                break;
+            case '\n':
+                strcpy(escape, "\\n");
+                break;
+            case '\r':
+                strcpy(escape, "\\r");
+                break;
+            case '\t':
+                strcpy(escape, "\\t");
+                break;
+            case '\b':
+                strcpy(escape, "\\b");
+                break;
+            case '\f':
+                strcpy(escape, "\\f");
+                break;
+            default:
+                snprintf(escape, 7, "\\u%04x", current);
+                break;
+        }
+
+        if (!appendJson(buffer, escape, strlen(escape))) {
+            return 0;
+        }
+
+        first = i + 1;
+    }
+
+    return appendJson(buffer, text + first, length - first) && appendJson(buffer, "\"", 1);
+}
+
+static int appendJsonText(jsonBuffer *buffer, PyObject *object) {
+#if PY_MAJOR_VERSION >= 3
+    Py_ssize_t length;
+    const char *text = PyUnicode_AsUTF8AndSize(object, &length);
+    if (!text) {
+        return 0;
+    }
+
+    return appendJsonString(buffer, text, length);
+#else
+    if (PyString_Check(object)) {
+        return appendJsonString(buffer, PyString_AS_STRING(object), PyString_GET_SIZE(object));
+    }
+
+    PyObject *bytes = PyUnicode_AsUTF8String(object);
+    if (!bytes) {
+        return 0;
+    }
+
+    int result = appendJsonString(buffer, PyString_AS_STRING(bytes), PyString_GET_SIZE(bytes));
+    Py_DECREF(bytes);
+    return result;
+#endif
+}
+
+static int appendJsonStr(jsonBuffer *buffer, PyObject *object, char quoted) {
+    PyObject *text = PyObject_Str(object);
+    if (!text) {
+        return 0;
+    }
+
+    int result;
+    if (quoted) {
+        result = appendJsonText(buffer, text);
+    } else {
+#if PY_MAJOR_VERSION >= 3
+        Py_ssize_t length;
+        const char *content = PyUnicode_AsUTF8AndSize(text, &length);
+        result = content && appendJson(buffer, content, length);
+#else
+        result = appendJson(buffer, PyString_AS_STRING(text), PyString_GET_SIZE(text));
+#endif
+    }
+
+    Py_DECREF(text);
+    return result;
+}
+
+// floats are written as repr writes them, infinities have no json literal
+static int appendJsonDouble(jsonBuffer *buffer, double value, char quoted) {
+    if (Py_IS_NAN(value)) {
+        return quoted ? appendJson(buffer, "\"NaN\"", 5) : appendJson(buffer, "NaN", 3);
+    } else if (Py_IS_INFINITY(value)) {
+        PyErr_SetString(PyExc_ValueError, "Out of range float values are not JSON compliant");
+        return 0;
+    }
+
+    char *text = PyOS_double_to_string(value, 'r', 0, Py_DTSF_ADD_DOT_0, NULL);
+    if (!text) {
+        return 0;
+    }
+
+    int result = quoted ? appendJsonString(buffer, text, strlen(text)) : appendJson(buffer, text, strlen(text));
+    PyMem_Free(text);
+    return result;
+}
+
+static int appendJsonKey(jsonBuffer *buffer, PyObject *key) {
+    if (IS_TEXT(key)) {
+        return appendJsonText(buffer, key);
+    } else if (key == Py_True) {
+        return appendJson(buffer, "\"true\"", 6);
+    } else if (key == Py_False) {
+        return appendJson(buffer, "\"false\"", 7);
+    } else if (key == Py_None) {
+        return appendJson(buffer, "\"null\"", 6);
+    } else if (PyFloat_Check(key)) {
+        return appendJsonDouble(buffer, PyFloat_AS_DOUBLE(key), 1);
+    } else if (IS_INT(key)) {
+        return appendJsonStr(buffer, key, 1);
+    }
+
+    PyErr_Format(PyExc_TypeError, "keys must be str, int, float, bool or None, not %.100s", Py_TYPE(key)->tp_name);
+    return 0;
+}
+
+// ints which don't fit a long are kept as text, like the engine parses them
+static int appendJsonInt(jsonBuffer *buffer, PyObject *object, long *value, char *isMaterial) {
+    int overflow = 0;
+#if PY_MAJOR_VERSION < 3
+    if (PyInt_Check(object)) {
+        *value = PyInt_AS_LONG(object);
+    } else
+#endif
+    *value = PyLong_AsLongAndOverflow(object, &overflow);
+    if (*value == -1 && PyErr_Occurred()) {
+        return 0;
+    }
+
+    if (overflow) {
+        *isMaterial = 0;
+        return appendJsonStr(buffer, object, 0);
+    }
+
+    char number[24];
+    snprintf(number, 24, "%ld", *value);
+    *isMaterial = 1;
+    return appendJson(buffer, number, strlen(number));
+}
+
+static int appendJsonValue(jsonBuffer *buffer, PyObject *object) {
+    if (IS_TEXT(object)) {
+        return appendJsonText(buffer, object);
+    } else if (object == Py_None) {
+        return appendJson(buffer, "null", 4);
+    } else if (object == Py_True) {
+        return appendJson(buffer, "true", 4);
+    } else if (object == Py_False) {
+        return appendJson(buffer, "false", 5);
+    } else if (IS_INT(object)) {
+        long value;
+        char isMaterial = 1;
+        return appendJsonInt(buffer, object, &value, &isMaterial);
+    } else if (PyFloat_Check(object)) {
+        return appendJsonDouble(buffer, PyFloat_AS_DOUBLE(object), 0);
+    } else if (PyDict_Check(object) || PyList_Check(object) || PyTuple_Check(object)) {
+        if (Py_EnterRecursiveCall(" while encoding a JSON object")) {
+            return 0;
+        }
+
+        int result = 1;
+        if (PyDict_Check(object)) {
+            PyObject *key;
+            PyObject *value;
+            Py_ssize_t position = 0;
+            Py_ssize_t count = 0;
+            result = appendJson(buffer, "{", 1);
+            while (result && PyDict_Next(object, &position, &key, &value)) {
+                result = (count++ == 0 || appendJson(buffer, ", ", 2)) &&
+                         appendJsonKey(buffer, key) && 
+                         appendJson(buffer, ": ", 2) &&
+                         appendJsonValue(buffer, value);
+            }
+
+            result = result && appendJson(buffer, "}", 1);
+        } else {
+            Py_ssize_t length = PySequence_Fast_GET_SIZE(object);
+            result = appendJson(buffer, "[", 1);
+            for (Py_ssize_t i = 0; result && i < length; ++i) {
+                result = (i == 0 || appendJson(buffer, ", ", 2)) &&
+                         appendJsonValue(buffer, PySequence_Fast_GET_ITEM(object, i));
+            }
+
+            result = result && appendJson(buffer, "]", 1);
+        }
+
+        Py_LeaveRecursiveCall();
+        return result;
+    }
+
+    PyErr_Format(PyExc_TypeError, "Object of type %.100s is not JSON serializable", Py_TYPE(object)->tp_name);
+    return 0;
+}
+
+// rulesets, states and timers are stored as json text, 
+// they are written without going through the json module
+static char *toJson(PyObject *object) {
+    jsonBuffer buffer = {NULL, 0, 0};
+    int result;
+#if PY_MAJOR_VERSION < 3
+    if (PyString_Check(object)) {
+        result = appendJson(&buffer, PyString_AS_STRING(object), PyString_GET_SIZE(object));
+    } else if (PyUnicode_Check(object)) {
+        PyObject *bytes = PyUnicode_AsUTF8String(object);
+        result = bytes && appendJson(&buffer, PyString_AS_STRING(bytes), PyString_GET_SIZE(bytes));
+        Py_XDECREF(bytes);
+    } else
+#else
+    if (PyUnicode_Check(object)) {
+        Py_ssize_t length;
+        const char *text = PyUnicode_AsUTF8AndSize(object, &length);
+        result = text && appendJson(&buffer, text, length);
+    } else
+#endif
+    {
+        result = appendJsonValue(&buffer, object);
+    }
+
+    if (!result) {
+        free(buffer.content);
+        return NULL;
+    }
+
+    return buffer.content;
+}
+
+static int addMessageProperty(messageBuilder *builder, messageProperty **property) {
+    if (builder->propertiesLength == builder->maxPropertiesLength) {
+        unsigned int maxPropertiesLength = builder->maxPropertiesLength ? builder->maxPropertiesLength * 2 : 16;
+        messageProperty *properties = realloc(builder->properties, maxPropertiesLength * sizeof(messageProperty));
+        if (!properties) {
+            PyErr_NoMemory();
+            return 0;
+        }
+
+        builder->properties = properties;
+        builder->maxPropertiesLength = maxPropertiesLength;
+    }
+
+    *property = &builder->properties[builder->propertiesLength++];
+    memset(*property, 0, sizeof(messageProperty));
+    return 1;
+}
+
+// the names of nested properties are qualified with the names of 
+// their parents, as the engine flattens them
+static int appendName(messageBuilder *builder, 
+                      size_t parentOffset, 
+                      size_t parentLength, 
+                      size_t keyOffset, 
+                      size_t keyLength, 
+                      size_t *nameOffset) {
+    if (!reserveJson(&builder->names, parentLength + keyLength + 1)) {
+        return 0;
+    }
+
+    *nameOffset = builder->names.length;
+    char *name = builder->names.content + builder->names.length;
+    if (parentLength) {
+        memcpy(name, builder->names.content + parentOffset, parentLength);
+        name[parentLength] = '.';
+        name += parentLength + 1;
+    }
+
+    memcpy(name, builder->text.content + keyOffset, keyLength);
+    builder->names.length += keyLength + (parentLength ? parentLength + 1 : 0);
+    builder->names.content[builder->names.length] = '\0';
+    return 1;
+}
+
+static int appendMessage(messageBuilder *builder, 
+                         PyObject *object, 
+                         size_t parentOffset, 
+                         size_t parentLength) {
+    if (!PyDict_Check(object)) {
+        PyErr_Format(PyExc_TypeError, "Message of type %.100s is not a dict", Py_TYPE(object)->tp_name);
+        return 0;
+    }
+
+    if (Py_EnterRecursiveCall(" while encoding a JSON object")) {
+        return 0;
+    }
+
+    jsonBuffer *text = &builder->text;
+    PyObject *key;
+    PyObject *value;
+    Py_ssize_t position = 0;
+    Py_ssize_t count = 0;
+    int result = appendJson(text, "{", 1);
+    while (result && PyDict_Next(object, &position, &key, &value)) {
+        if (count++ > 0 && !appendJson(text, ", ", 2)) {
+            result = 0;
+            break;
+        }
+
+        // keys are always quoted, the name is the escaped key text
+        size_t keyOffset = text->length + 1;
+        if (!appendJsonKey(text, key)) {
+            result = 0;
+            break;
+        }
+
+        size_t nameOffset;
+        size_t keyLength = text->length - 1 - keyOffset;
+        size_t nameLength = parentLength + keyLength + (parentLength ? 1 : 0);
+        if (!appendName(builder, parentOffset, parentLength, keyOffset, keyLength, &nameOffset) ||
+            !appendJson(text, ": ", 2)) {
+            result = 0;
+            break;
+        }
+
+        if (PyDict_Check(value)) {
+            result = appendMessage(builder, value, nameOffset, nameLength);
+            continue;
+        }
+
+        messageProperty *property;
+        if (!addMessageProperty(builder, &property)) {
+            result = 0;
+            break;
+        }
+
+        property->nameOffset = nameOffset;
+        property->nameLength = nameLength > 0xFFFF ? 0xFFFF : nameLength;
+        property->isMaterial = 1;
+        property->valueOffset = text->length;
+        if (IS_TEXT(value)) {
+            property->type = JSON_STRING;
+            result = appendJsonText(text, value);
+            ++property->valueOffset;
+            property->valueLength = text->length - property->valueOffset - 1;
+            continue;
+        } else if (value == Py_None) {
+            property->type = JSON_NIL;
+            result = appendJson(text, "null", 4);
+        } else if (value == Py_True || value == Py_False) {
+            property->type = JSON_BOOL;
+            property->value.b = (value == Py_True);
+            result = property->value.b ? appendJson(text, "true", 4) : appendJson(text, "false", 5);
+        } else if (IS_INT(value)) {
+            char isMaterial = 1;
+            property->type = JSON_INT;
+            result = appendJsonInt(text, value, &property->value.i, &isMaterial);
+            property->isMaterial = isMaterial;
+        } else if (PyFloat_Check(value)) {
+            property->value.d = PyFloat_AS_DOUBLE(value);
+            property->type = Py_IS_NAN(property->value.d) ? JSON_NIL : JSON_DOUBLE;
+            result = appendJsonDouble(text, property->value.d, 0);
+        } else if (PyList_Check(value) || PyTuple_Check(value)) {
+            property->type = JSON_ARRAY;
+            result = appendJsonValue(text, value);
+        } else {
+            result = appendJsonValue(text, value);
+        }
+
+        property->valueLength = text->length - property->valueOffset;
+    }
+
+    Py_LeaveRecursiveCall();
+    return result && appendJson(text, "}", 1);
+}
+
+static void freeMessages(messageObject *messages, unsigned int messagesLength) {
+    if (messagesLength) {
+        free(messages[0].message);
+        free(messages[0].names);
+        free(messages[0].properties);
+    }
+
+    free(messages);
+}
+
+// a dict is one message and a list of dicts a batch, each message 
+// is terminated in the shared text, so it is stored as it is
+static int toMessages(PyObject *object, messageObject **messages, unsigned int *messagesLength) {
+    messageBuilder builder;
+    memset(&builder, 0, sizeof(messageBuilder));
+    PyObject *sequence;
+    if (PyDict_Check(object)) {
+        sequence = PyTuple_Pack(1, object);
+    } else {
+        sequence = PySequence_Fast(object, "Messages must be a dict or a list of dicts");
+    }
+
+    if (!sequence) {
+        return 0;
+    }
+
+    Py_ssize_t length = PySequence_Fast_GET_SIZE(sequence);
+    size_t *offsets = malloc((length + 1) * 2 * sizeof(size_t));
+    *messages = calloc(length ? length : 1, sizeof(messageObject));
+    int result = 1;
+    if (!offsets || !*messages || !reserveJson(&builder.names, 0)) {
+        PyErr_NoMemory();
+        result = 0;
+    }
+
+    for (Py_ssize_t i = 0; result && i < length; ++i) {
+        offsets[i * 2] = builder.text.length;
+        offsets[i * 2 + 1] = builder.propertiesLength;
+        result = appendMessage(&builder, PySequence_Fast_GET_ITEM(sequence, i), 0, 0) && 
+                 reserveJson(&builder.text, 1);
+        if (result) {
+            ++builder.text.length;
+        }
+    }
+
+    Py_DECREF(sequence);
+    if (!result || !length) {
+        free(offsets);
+        free(builder.text.content);
+        free(builder.names.content);
+        free(builder.properties);
+        if (!result) {
+            free(*messages);
+            *messages = NULL;
+        }
+
+        *messagesLength = 0;
+        return result;
+    }
+
+    // value offsets are made relative to the text of their message
+    for (Py_ssize_t i = 0; i < length; ++i) {
+        messageObject *message = &(*messages)[i];
+        message->message = builder.text.content + offsets[i * 2];
+        message->names = builder.names.content;
+        message->properties = builder.properties + offsets[i * 2 + 1];
+        message->propertiesLength = (i + 1 < length ? offsets[i * 2 + 3] : builder.propertiesLength) - offsets[i * 2 + 1];
+        for (unsigned int j = 0; j < message->propertiesLength; ++j) {
+            message->properties[j].valueOffset -= offsets[i * 2];
+        }
+    }
+
+    free(offsets);
+    *messagesLength = length;
+    return 1;
+}
+
+typedef unsigned int (*startTextFunction)(void *, char *, void **, unsigned int *);
+typedef unsigned int (*startObjectsFunction)(void *, messageObject *, unsigned int, void **, unsigned int *);
+
+// messages are passed as json text, as a dict or as a list of dicts
+static int startMessages(void *handle, 
+                         PyObject *object, 
+                         startTextFunction startText, 
+                         startObjectsFunction startObjects, 
+                         void **rulesBinding, 
+                         unsigned int *replyCount, 
+                         unsigned int *result) {
+    if (IS_TEXT(object)) {
+        char *text = toJson(object);
+        if (!text) {
+            return 0;
+        }
+
+        RULES_CALL(handle, *result = startText(handle, text, rulesBinding, replyCount));
+        free(text);
+        return 1;
+    }
+
+    messageObject *messages;
+    unsigned int messagesLength;
+    if (!toMessages(object, &messages, &messagesLength)) {
+        return 0;
+    }
+
+    RULES_CALL(handle, *result = startObjects(handle, messages, messagesLength, rulesBinding, replyCount));
+    freeMessages(messages, messagesLength);
+    return 1;
+}
+
+static void skipJsonSpace(char **text) {
+    while (**text == ' ' || **text == '\t' || **text == '\n' || **text == '\r') {
+        ++*text;
+    }
+}
+
+static int readJsonHex(char *text, unsigned int *value) {
+    *value = 0;
+    for (int i = 0; i < 4; ++i) {
+        char current = text[i];
+        *value <<= 4;
+        if (current >= '0' && current <= '9') {
+            *value |= current - '0';
+        } else if (current >= 'a' && current <= 'f') {
+            *value |= current - 'a' + 10;
+        } else if (current >= 'A' && current <= 'F') {
+            *value |= current - 'A' + 10;
+        } else {
+            return 0;
+        }
+    }
+
+    return 1;
+}
+
+static PyObject *readJsonValue(char **text);
+
+// strings are unescaped to utf8 in place of a copy and then decoded
+static PyObject *readJsonString(char **text) {
+    char *first = ++*text;
+    char *last = first;
+    while (*last != '"') {
+        if (*last == '\0') {
+            PyErr_SetString(PyExc_ValueError, "Unterminated string in JSON result");
+            return NULL;
+        } else if (*last == '\\' && last[1] != '\0') {
+            ++last;
+        }
+
+        ++last;
+    }
+
+    char *content = malloc(last - first + 1);
+    if (!content) {
+        return PyErr_NoMemory();
+    }
+
+    char *current = content;
+    for (char *next = first; next < last; ++next) {
+        if (*next != '\\') {
+            *current++ = *next;
+            continue;
+        }
+
+        ++next;
+        switch (*next) {
+            case 'n':
+                *current++ = '\n';
+                break;
+            case 'r':
+                *current++ = '\r';
+                break;
+            case 't':
+                *current++ = '\t';
+                break;
+            case 'b':
+                *current++ = '\b';
+                break;
+            case 'f':
+                *current++ = '\f';
+                break;
+            case 'u':
+                {
+                    unsigned int codePoint;
+                    unsigned int lowSurrogate;
+                    if (last - next < 5 || !readJsonHex(next + 1, &codePoint)) {
+                        free(content);
+                        PyErr_SetString(PyExc_ValueError, "Invalid \\u escape in JSON result");
+                        return NULL;
+                    }
+
+                    next += 4;
+                    if (codePoint >= 0xD800 && codePoint <= 0xDBFF && last - next > 6 && 
+                        next[1] == '\\' && next[2] == 'u' && readJsonHex(next + 3, &lowSurrogate) &&
+                        lowSurrogate >= 0xDC00 && lowSurrogate <= 0xDFFF) {
+                        codePoint = 0x10000 + ((codePoint - 0xD800) << 10) + (lowSurrogate - 0xDC00);
+                        next += 6;
+                    }
+
+                    if (codePoint < 0x80) {
+                        *current++ = codePoint;
+                    } else if (codePoint < 0x800) {
+                        *current++ = 0xC0 | (codePoint >> 6);
+                        *current++ = 0x80 | (codePoint & 0x3F);
+                    } else if (codePoint < 0x10000) {
+                        *current++ = 0xE0 | (codePoint >> 12);
+                        *current++ = 0x80 | ((codePoint >> 6) & 0x3F);
+                        *current++ = 0x80 | (codePoint & 0x3F);
+                    } else {
+                        *current++ = 0xF0 | (codePoint >> 18);
+                        *current++ = 0x80 | ((codePoint >> 12) & 0x3F);
+                        *current++ = 0x80 | ((codePoint >> 6) & 0x3F);
+                        *current++ = 0x80 | (codePoint & 0x3F);
+                    }
+                }
+                break;
+            default:
+                *current++ = *next;
+                break;
+        }
+    }
+
+    *text = last + 1;
+    PyObject *result = PyUnicode_DecodeUTF8(content, current - content, "surrogatepass");
+    free(content);
+    return result;
+}
+
+static PyObject *readJsonNumber(char **text) {
+    char *first = *text;
+    char isDouble = 0;
+    if (**text == '-') {
+        ++*text;
+    }
+
+    if (strncmp(*text, "Infinity", 8) == 0) {
+        *text += 8;
+        return PyFloat_FromDouble(*first == '-' ? -Py_HUGE_VAL : Py_HUGE_VAL);
+    }
+
+    while ((**text >= '0' && **text <= '9') || **text == '.' || **text == 'e' || 
+           **text == 'E' || **text == '+' || **text == '-') {
+        if (**text == '.' || **text == 'e' || **text == 'E') {
+            isDouble = 1;
+        }
+
+        ++*text;
+    }
+
+    // the result text is not modified, the number is copied to be terminated
+    size_t length = *text - first;
+    char buffer[64];
+    char *number = length < 64 ? buffer : malloc(length + 1);
+    if (!number) {
+        return PyErr_NoMemory();
+    }
+
+    memcpy(number, first, length);
+    number[length] = '\0';
+    PyObject *result;
+    if (isDouble) {
+        double value = PyOS_string_to_double(number, NULL, PyExc_ValueError);
+        result = (value == -1.0 && PyErr_Occurred()) ? NULL : PyFloat_FromDouble(value);
+    } else {
+        errno = 0;
+        long value = strtol(number, NULL, 10);
+        if (errno == ERANGE) {
+            result = PyLong_FromString(number, NULL, 10);
+        } else {
+            result = INT_FROM_LONG(value);
+        }
+    }
+
+    if (number != buffer) {
+        free(number);
+    }
+
+    return result;
+}
+
+static PyObject *readJsonContainer(char **text) {
+    char isObject = (**text == '{');
+    char end = isObject ? '}' : ']';
+    PyObject *result = isObject ? PyDict_New() : PyList_New(0);
+    if (!result) {
+        return NULL;
+    }
+
+    ++*text;
+    skipJsonSpace(text);
+    if (**text == end) {
+        ++*text;
+        return result;
+    }
+
+    while (1) {
+        skipJsonSpace(text);
+        PyObject *key = NULL;
+        if (isObject) {
+            if (**text != '"' || !(key = readJsonString(text))) {
+                goto error;
+            }
+
+            skipJsonSpace(text);
+            if (**text != ':') {
+                Py_DECREF(key);
+                goto error;
+            }
+
+            ++*text;
+        }
+
+        PyObject *value = readJsonValue(text);
+        if (!value) {
+            Py_XDECREF(key);
+            goto error;
+        }
+
+        int setResult = isObject ? PyDict_SetItem(result, key, value) : PyList_Append(result, value);
+        Py_XDECREF(key);
+        Py_DECREF(value);
+        if (setResult == -1) {
+            goto error;
+        }
+
+        skipJsonSpace(text);
+        if (**text == end) {
+            ++*text;
+            return result;
+        } else if (**text != ',') {
+            goto error;
+        }
+
+        ++*text;
+    }
+
+error:
+    if (!PyErr_Occurred()) {
+        PyErr_SetString(PyExc_ValueError, "Invalid JSON result");
+    }
+
+    Py_DECREF(result);
+    return NULL;
+}
+
+static PyObject *readJsonValue(char **text) {
+    skipJsonSpace(text);
+    switch (**text) {
+        case '"':
+            return readJsonString(text);
+        case '{':
+        case '[':
+            {
+                if (Py_EnterRecursiveCall(" while decoding a JSON result")) {
+                    return NULL;
+                }
+
+                PyObject *result = readJsonContainer(text);
+                Py_LeaveRecursiveCall();
+                return result;
+            }
+        case 't':
+            if (strncmp(*text, "true", 4) == 0) {
+                *text += 4;
+                Py_RETURN_TRUE;
+            }
+            break;
+        case 'f':
+            if (strncmp(*text, "false", 5) == 0) {
+                *text += 5;
+                Py_RETURN_FALSE;
+            }
+            break;
+        case 'n':
+            if (strncmp(*text, "null", 4) == 0) {
+                *text += 4;
+                Py_RETURN_NONE;
+            }
+            break;
+        case 'N':
+            if (strncmp(*text, "NaN", 3) == 0) {
+                *text += 3;
+                return PyFloat_FromDouble(Py_NAN);
+            }
+            break;
+        default:
+            if (**text == '-' || **text == 'I' || (**text >= '0' && **text <= '9')) {
+                return readJsonNumber(text);
+            }
+            break;
+    }
+
+    PyErr_SetString(PyExc_ValueError, "Invalid JSON result");
+    return NULL;
+}
+
+// states and messages come back from the engine as json text
+static PyObject *fromJson(char *text) {
+    if (!text) {
+        Py_RETURN_NONE;
+    }
+
+    return readJsonValue(&text);
+}
+
 static PyObject *pyCreateRuleset(PyObject *self, PyObject *args) {
     char *name;
-    char *rules;
+    PyObject *rulesObject;
     unsigned int stateCacheSize;
-    if (!PyArg_ParseTuple(args, "iss", &stateCacheSize, &name, &rules)) {
+    if (!PyArg_ParseTuple(args, "isO", &stateCacheSize, &name, &rulesObject)) {
         PyErr_SetString(RulesError, "pyCreateRuleset Invalid argument");
         return NULL;
     }
 
+    char *rules = toJson(rulesObject);
+    if (!rules) {
+        return NULL;
+    }
+
     void *output = NULL;
     unsigned int result = createRuleset(&output, name, rules, stateCacheSize);
+    free(rules);
     if (result != RULES_OK) {
         if (result == ERR_OUT_OF_MEMORY) {
             PyErr_NoMemory();
@@ -126,7 +1004,7 @@ static PyObject *pyBindRuleset(PyObject *self, PyObject *args) {
     unsigned int db;
     unsigned int result;
     if (PyArg_ParseTuple(args, "iiszK", &port, &db, &host, &password, &handle)) {
-        result = bindRuleset(handle, host, port, password, db);
+        RULES_CALL(handle, result = bindRuleset(handle, host, port, password, db));
     } else {
         PyErr_SetString(RulesError, "pyBindRuleset Invalid argument");
         return NULL;
@@ -149,12 +1027,101 @@ static PyObject *pyBindRuleset(PyObject *self, PyObject *args) {
     Py_RETURN_NONE;
 }
 
+static PyObject *pySetPartition(PyObject *self, PyObject *args) {
+    void *handle;
+    unsigned int partitionIndex;
+    unsigned int partitionsLength;
+    if (!PyArg_ParseTuple(args, "KII", &handle, &partitionIndex, &partitionsLength)) {
+        PyErr_SetString(RulesError, "pySetPartition Invalid argument");
+        return NULL;
+    }
+
+    unsigned int result;
+    RULES_CALL(handle, result = setPartition(handle, partitionIndex, partitionsLength));
+    if (result != RULES_OK) {
+        char *message;
+        if (asprintf(&message, "Could not set partition, error code: %d", result) == -1) {
+            PyErr_NoMemory();
+        } else {
+            PyErr_SetString(RulesError, message);
+            free(message);
+        }
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject *pySetPartitionMigration(PyObject *self, PyObject *args) {
+    void *handle;
+    unsigned char migrate;
+    if (!PyArg_ParseTuple(args, "Kb", &handle, &migrate)) {
+        PyErr_SetString(RulesError, "pySetPartitionMigration Invalid argument");
+        return NULL;
+    }
+
+    unsigned int result;
+    RULES_CALL(handle, result = setPartitionMigration(handle, migrate));
+    if (result != RULES_OK) {
+        char *message;
+        if (asprintf(&message, "Could not set partition migration, error code: %d", result) == -1) {
+            PyErr_NoMemory();
+        } else {
+            PyErr_SetString(RulesError, message);
+            free(message);
+        }
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject *pySetConnectionPool(PyObject *self, PyObject *args) {
+    void *handle;
+    unsigned int poolLength;
+    if (!PyArg_ParseTuple(args, "KI", &handle, &poolLength)) {
+        PyErr_SetString(RulesError, "pySetConnectionPool Invalid argument");
+        return NULL;
+    }
+
+    unsigned int result;
+    RULES_CALL(handle, result = setConnectionPool(handle, poolLength));
+    if (result != RULES_OK) {
+        if (result == ERR_OUT_OF_MEMORY) {
+            PyErr_NoMemory();
+        } else { 
+            char *message;
+            if (asprintf(&message, "Could not set connection pool, error code: %d", result) == -1) {
+                PyErr_NoMemory();
+            } else {
+                PyErr_SetString(RulesError, message);
+                free(message);
+            }
+        }
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject *pyGetPartition(PyObject *self, PyObject *args) {
+    char *sid;
+    unsigned int partitionsLength;
+    if (!PyArg_ParseTuple(args, "sI", &sid, &partitionsLength)) {
+        PyErr_SetString(RulesError, "pyGetPartition Invalid argument");
+        return NULL;
+    }
+
+    unsigned int partitionIndex;
+    getPartition(sid, partitionsLength, &partitionIndex);
+    return Py_BuildValue("I", partitionIndex);
+}
+
 static PyObject *pyComplete(PyObject *self, PyObject *args) {
     void *rulesBinding = NULL;
     unsigned int replyCount = 0;
     unsigned int result;
     if (PyArg_ParseTuple(args, "Ki", &rulesBinding, &replyCount)) {
+        Py_BEGIN_ALLOW_THREADS
         result = complete(rulesBinding, replyCount);
+        Py_END_ALLOW_THREADS
     } else {
         PyErr_SetString(RulesError, "pyComplete Invalid argument");
         return NULL;
@@ -180,13 +1147,24 @@ static PyObject *pyComplete(PyObject *self, PyObject *args) {
 
 static PyObject *pyAssertEvent(PyObject *self, PyObject *args) {
     void *handle;
-    char *event;
-    if (!PyArg_ParseTuple(args, "Ks", &handle, &event)) {
+    PyObject *event;
+    if (!PyArg_ParseTuple(args, "KO", &handle, &event)) {
         PyErr_SetString(RulesError, "pyAssertEvent Invalid argument");
         return NULL;
     }
+
     
-    unsigned int result = assertEvent(handle, event);
+    unsigned int replyCount;
+    void *rulesBinding = NULL;
+    unsigned int result;
+    if (!startMessages(handle, event, startAssertEvent, startAssertEventObjects, &rulesBinding, &replyCount, &result)) {
+        return NULL;
+    }
+
+    if (result == RULES_OK || result == ERR_EVENT_NOT_HANDLED) {
+        RULES_COMPLETE(result, rulesBinding, replyCount);
+    }
+
     if (result == RULES_OK || result == ERR_EVENT_NOT_HANDLED || result == ERR_EVENT_OBSERVED) {
         return Py_BuildValue("i", result);
     } else {
@@ -209,13 +1187,20 @@ static PyObject *pyQueueAssertEvent(PyObject *self, PyObject *args) {
     void *handle;
     char *sid = NULL;
     char *destination = NULL;
-    char *event = NULL;
-    if (!PyArg_ParseTuple(args, "Kzss", &handle, &sid, &destination, &event)) {
+    PyObject *eventObject;
+    if (!PyArg_ParseTuple(args, "KzsO", &handle, &sid, &destination, &eventObject)) {
         PyErr_SetString(RulesError, "pyQueueAssertEvent Invalid argument");
         return NULL;
     }
 
-    unsigned int result = queueMessage(handle, QUEUE_ASSERT_EVENT, sid, destination, event);
+    char *event = toJson(eventObject);
+    if (!event) {
+        return NULL;
+    }
+
+    unsigned int result;
+    RULES_CALL(handle, result = queueMessage(handle, QUEUE_ASSERT_EVENT, sid, destination, event));
+    free(event);
     if (result != RULES_OK) {
         if (result == ERR_OUT_OF_MEMORY) {
             PyErr_NoMemory();
@@ -236,15 +1221,19 @@ static PyObject *pyQueueAssertEvent(PyObject *self, PyObject *args) {
 
 static PyObject *pyStartAssertEvent(PyObject *self, PyObject *args) {
     void *handle;
-    char *event;
-    if (!PyArg_ParseTuple(args, "Ks", &handle, &event)) {
+    PyObject *event;
+    if (!PyArg_ParseTuple(args, "KO", &handle, &event)) {
         PyErr_SetString(RulesError, "pyStartAssertEvent Invalid argument");
         return NULL;
     }
 
     unsigned int replyCount;
     void *rulesBinding = NULL;
-    unsigned int result = startAssertEvent(handle, event, &rulesBinding, &replyCount);
+    unsigned int result;
+    if (!startMessages(handle, event, startAssertEvent, startAssertEventObjects, &rulesBinding, &replyCount, &result)) {
+        return NULL;
+    }
+
     if (result == RULES_OK || result == ERR_EVENT_NOT_HANDLED) {
         return Py_BuildValue("Ki", rulesBinding, replyCount);    
     } else {
@@ -265,13 +1254,23 @@ static PyObject *pyStartAssertEvent(PyObject *self, PyObject *args) {
 
 static PyObject *pyAssertEvents(PyObject *self, PyObject *args) {
     void *handle;
-    char *events;
-    if (!PyArg_ParseTuple(args, "Ks", &handle, &events)) {
+    PyObject *events;
+    if (!PyArg_ParseTuple(args, "KO", &handle, &events)) {
         PyErr_SetString(RulesError, "pyAssertEvents Invalid argument");
         return NULL;
     }
 
-    unsigned int result = assertEvents(handle, events);
+    unsigned int replyCount;
+    void *rulesBinding = NULL;
+    unsigned int result;
+    if (!startMessages(handle, events, startAssertEvents, startAssertEventObjects, &rulesBinding, &replyCount, &result)) {
+        return NULL;
+    }
+
+    if (result == RULES_OK || result == ERR_EVENT_NOT_HANDLED) {
+        RULES_COMPLETE(result, rulesBinding, replyCount);
+    }
+
     if (result == RULES_OK || result == ERR_EVENT_NOT_HANDLED || result == ERR_EVENT_OBSERVED) {
         return Py_BuildValue("i", result);
     } else {
@@ -292,15 +1291,19 @@ static PyObject *pyAssertEvents(PyObject *self, PyObject *args) {
 
 static PyObject *pyStartAssertEvents(PyObject *self, PyObject *args) {
     void *handle;
-    char *events;
-    if (!PyArg_ParseTuple(args, "Ks", &handle, &events)) {
+    PyObject *events;
+    if (!PyArg_ParseTuple(args, "KO", &handle, &events)) {
         PyErr_SetString(RulesError, "pyStartAssertEvents Invalid argument");
         return NULL;
     }
 
     unsigned int replyCount;
     void *rulesBinding = NULL;
-    unsigned int result = startAssertEvents(handle, events, &rulesBinding, &replyCount);
+    unsigned int result;
+    if (!startMessages(handle, events, startAssertEvents, startAssertEventObjects, &rulesBinding, &replyCount, &result)) {
+        return NULL;
+    }
+
     if (result == RULES_OK || result == ERR_EVENT_NOT_HANDLED) { 
         return Py_BuildValue("Ki", rulesBinding, replyCount);    
     } else {
@@ -321,13 +1324,20 @@ static PyObject *pyStartAssertEvents(PyObject *self, PyObject *args) {
 
 static PyObject *pyRetractEvent(PyObject *self, PyObject *args) {
     void *handle;
-    char *event;
-    if (!PyArg_ParseTuple(args, "Ks", &handle, &event)) {
+    PyObject *eventObject;
+    if (!PyArg_ParseTuple(args, "KO", &handle, &eventObject)) {
         PyErr_SetString(RulesError, "pyRetractEvent Invalid argument");
         return NULL;
     }
 
-    unsigned int result = retractEvent(handle, event);
+    char *event = toJson(eventObject);
+    if (!event) {
+        return NULL;
+    }
+
+    unsigned int result;
+    RULES_CALL(handle, result = retractEvent(handle, event));
+    free(event);
     if (result == RULES_OK || result == ERR_EVENT_NOT_HANDLED || result == ERR_EVENT_OBSERVED) {
         return Py_BuildValue("i", result);
     } else {
@@ -348,13 +1358,23 @@ static PyObject *pyRetractEvent(PyObject *self, PyObject *args) {
 
 static PyObject *pyAssertFact(PyObject *self, PyObject *args) {
     void *handle;
-    char *fact;
-    if (!PyArg_ParseTuple(args, "Ks", &handle, &fact)) {
+    PyObject *fact;
+    if (!PyArg_ParseTuple(args, "KO", &handle, &fact)) {
         PyErr_SetString(RulesError, "pyAssertFact Invalid argument");
         return NULL;
     }
 
-    unsigned int result = assertFact(handle, fact);
+    unsigned int replyCount;
+    void *rulesBinding = NULL;
+    unsigned int result;
+    if (!startMessages(handle, fact, startAssertFact, startAssertFactObjects, &rulesBinding, &replyCount, &result)) {
+        return NULL;
+    }
+
+    if (result == RULES_OK || result == ERR_EVENT_NOT_HANDLED) {
+        RULES_COMPLETE(result, rulesBinding, replyCount);
+    }
+
     if (result == RULES_OK || result == ERR_EVENT_NOT_HANDLED || result == ERR_EVENT_OBSERVED) {
         return Py_BuildValue("i", result);
     } else {
@@ -377,13 +1397,20 @@ static PyObject *pyQueueAssertFact(PyObject *self, PyObject *args) {
     void *handle;
     char *sid = NULL;
     char *destination = NULL;
-    char *event = NULL;
-    if (!PyArg_ParseTuple(args, "Kzss", &handle, &sid, &destination, &event)) {
+    PyObject *eventObject;
+    if (!PyArg_ParseTuple(args, "KzsO", &handle, &sid, &destination, &eventObject)) {
         PyErr_SetString(RulesError, "pyQueueAssertFact Invalid argument");
         return NULL;
     }
 
-    unsigned int result = queueMessage(handle, QUEUE_ASSERT_FACT, sid, destination, event);
+    char *event = toJson(eventObject);
+    if (!event) {
+        return NULL;
+    }
+
+    unsigned int result;
+    RULES_CALL(handle, result = queueMessage(handle, QUEUE_ASSERT_FACT, sid, destination, event));
+    free(event);
     if (result != RULES_OK) {
         if (result == ERR_OUT_OF_MEMORY) {
             PyErr_NoMemory();
@@ -404,15 +1431,19 @@ static PyObject *pyQueueAssertFact(PyObject *self, PyObject *args) {
 
 static PyObject *pyStartAssertFact(PyObject *self, PyObject *args) {
     void *handle;
-    char *fact;
-    if (!PyArg_ParseTuple(args, "Ks", &handle, &fact)) {
+    PyObject *fact;
+    if (!PyArg_ParseTuple(args, "KO", &handle, &fact)) {
         PyErr_SetString(RulesError, "pyStartAssertFact Invalid argument");
         return NULL;
     }
 
     unsigned int replyCount;
     void *rulesBinding = NULL;
-    unsigned int result = startAssertFact(handle, fact, &rulesBinding, &replyCount);
+    unsigned int result;
+    if (!startMessages(handle, fact, startAssertFact, startAssertFactObjects, &rulesBinding, &replyCount, &result)) {
+        return NULL;
+    }
+
     if (result == RULES_OK || result == ERR_EVENT_NOT_HANDLED) {
         return Py_BuildValue("Ki", rulesBinding, replyCount);    
     } else {
@@ -433,13 +1464,23 @@ static PyObject *pyStartAssertFact(PyObject *self, PyObject *args) {
 
 static PyObject *pyAssertFacts(PyObject *self, PyObject *args) {
     void *handle;
-    char *facts;
-    if (!PyArg_ParseTuple(args, "Ks", &handle, &facts)) {
+    PyObject *facts;
+    if (!PyArg_ParseTuple(args, "KO", &handle, &facts)) {
         PyErr_SetString(RulesError, "pyAssertFacts Invalid argument");
         return NULL;
     }
 
-    unsigned int result = assertFacts(handle, facts);
+    unsigned int replyCount;
+    void *rulesBinding = NULL;
+    unsigned int result;
+    if (!startMessages(handle, facts, startAssertFacts, startAssertFactObjects, &rulesBinding, &replyCount, &result)) {
+        return NULL;
+    }
+
+    if (result == RULES_OK || result == ERR_EVENT_NOT_HANDLED) {
+        RULES_COMPLETE(result, rulesBinding, replyCount);
+    }
+
     if (result == RULES_OK || result == ERR_EVENT_NOT_HANDLED || result == ERR_EVENT_OBSERVED) {
         return Py_BuildValue("i", result);
     } else {
@@ -460,15 +1501,19 @@ static PyObject *pyAssertFacts(PyObject *self, PyObject *args) {
 
 static PyObject *pyStartAssertFacts(PyObject *self, PyObject *args) {
     void *handle;
-    char *facts;
-    if (!PyArg_ParseTuple(args, "Ks", &handle, &facts)) {
+    PyObject *facts;
+    if (!PyArg_ParseTuple(args, "KO", &handle, &facts)) {
         PyErr_SetString(RulesError, "pyStartAssertFacts Invalid argument");
         return NULL;
     }
 
     unsigned int replyCount;
     void *rulesBinding = NULL;
-    unsigned int result = startAssertFacts(handle, facts, &rulesBinding, &replyCount);
+    unsigned int result;
+    if (!startMessages(handle, facts, startAssertFacts, startAssertFactObjects, &rulesBinding, &replyCount, &result)) {
+        return NULL;
+    }
+
     if (result == RULES_OK || result == ERR_EVENT_NOT_HANDLED) {  
         return Py_BuildValue("Ki", rulesBinding, replyCount);    
     } else {
@@ -489,13 +1534,23 @@ static PyObject *pyStartAssertFacts(PyObject *self, PyObject *args) {
 
 static PyObject *pyRetractFact(PyObject *self, PyObject *args) {
     void *handle;
-    char *fact;
-    if (!PyArg_ParseTuple(args, "Ks", &handle, &fact)) {
+    PyObject *fact;
+    if (!PyArg_ParseTuple(args, "KO", &handle, &fact)) {
         PyErr_SetString(RulesError, "pyRetractFact Invalid argument");
         return NULL;
     }
 
-    unsigned int result = retractFact(handle, fact);
+    unsigned int replyCount;
+    void *rulesBinding = NULL;
+    unsigned int result;
+    if (!startMessages(handle, fact, startRetractFact, startRetractFactObjects, &rulesBinding, &replyCount, &result)) {
+        return NULL;
+    }
+
+    if (result == RULES_OK || result == ERR_EVENT_NOT_HANDLED) {
+        RULES_COMPLETE(result, rulesBinding, replyCount);
+    }
+
     if (result == RULES_OK || result == ERR_EVENT_NOT_HANDLED || result == ERR_EVENT_OBSERVED) {
         return Py_BuildValue("i", result);
     } else {
@@ -518,13 +1573,20 @@ static PyObject *pyQueueRetractFact(PyObject *self, PyObject *args) {
     void *handle;
     char *sid = NULL;
     char *destination = NULL;
-    char *event = NULL;
-    if (!PyArg_ParseTuple(args, "Kzss", &handle, &sid, &destination, &event)) {
+    PyObject *eventObject;
+    if (!PyArg_ParseTuple(args, "KzsO", &handle, &sid, &destination, &eventObject)) {
         PyErr_SetString(RulesError, "pyQueueRetractFact Invalid argument");
         return NULL;
     }
 
-    unsigned int result = queueMessage(handle, QUEUE_RETRACT_FACT, sid, destination, event);
+    char *event = toJson(eventObject);
+    if (!event) {
+        return NULL;
+    }
+
+    unsigned int result;
+    RULES_CALL(handle, result = queueMessage(handle, QUEUE_RETRACT_FACT, sid, destination, event));
+    free(event);
     if (result != RULES_OK) {
         if (result == ERR_OUT_OF_MEMORY) {
             PyErr_NoMemory();
@@ -545,15 +1607,19 @@ static PyObject *pyQueueRetractFact(PyObject *self, PyObject *args) {
 
 static PyObject *pyStartRetractFact(PyObject *self, PyObject *args) {
     void *handle;
-    char *fact;
-    if (!PyArg_ParseTuple(args, "Ks", &handle, &fact)) {
+    PyObject *fact;
+    if (!PyArg_ParseTuple(args, "KO", &handle, &fact)) {
         PyErr_SetString(RulesError, "pyStartRetractFact Invalid argument");
         return NULL;
     }
 
     unsigned int replyCount;
     void *rulesBinding = NULL;
-    unsigned int result = startRetractFact(handle, fact, &rulesBinding, &replyCount);
+    unsigned int result;
+    if (!startMessages(handle, fact, startRetractFact, startRetractFactObjects, &rulesBinding, &replyCount, &result)) {
+        return NULL;
+    }
+
     if (result == RULES_OK || result == ERR_EVENT_NOT_HANDLED) {
         return Py_BuildValue("Ki", rulesBinding, replyCount);    
     } else {
@@ -574,13 +1640,23 @@ static PyObject *pyStartRetractFact(PyObject *self, PyObject *args) {
 
 static PyObject *pyRetractFacts(PyObject *self, PyObject *args) {
     void *handle;
-    char *facts;
-    if (!PyArg_ParseTuple(args, "Ks", &handle, &facts)) {
+    PyObject *facts;
+    if (!PyArg_ParseTuple(args, "KO", &handle, &facts)) {
         PyErr_SetString(RulesError, "pyAssertFacts Invalid argument");
         return NULL;
     }
 
-    unsigned int result = retractFacts(handle, facts);
+    unsigned int replyCount;
+    void *rulesBinding = NULL;
+    unsigned int result;
+    if (!startMessages(handle, facts, startRetractFacts, startRetractFactObjects, &rulesBinding, &replyCount, &result)) {
+        return NULL;
+    }
+
+    if (result == RULES_OK || result == ERR_EVENT_NOT_HANDLED) {
+        RULES_COMPLETE(result, rulesBinding, replyCount);
+    }
+
     if (result == RULES_OK || result == ERR_EVENT_NOT_HANDLED || result == ERR_EVENT_OBSERVED) {
         return Py_BuildValue("i", result);
     } else {
@@ -601,15 +1677,19 @@ static PyObject *pyRetractFacts(PyObject *self, PyObject *args) {
 
 static PyObject *pyStartRetractFacts(PyObject *self, PyObject *args) {
     void *handle;
-    char *facts;
-    if (!PyArg_ParseTuple(args, "Ks", &handle, &facts)) {
+    PyObject *facts;
+    if (!PyArg_ParseTuple(args, "KO", &handle, &facts)) {
         PyErr_SetString(RulesError, "pyStartRetractFacts Invalid argument");
         return NULL;
     }
 
     unsigned int replyCount;
     void *rulesBinding = NULL;
-    unsigned int result = startRetractFacts(handle, facts, &rulesBinding, &replyCount);
+    unsigned int result;
+    if (!startMessages(handle, facts, startRetractFacts, startRetractFactObjects, &rulesBinding, &replyCount, &result)) {
+        return NULL;
+    }
+
     if (result == RULES_OK || result == ERR_EVENT_NOT_HANDLED) {  
         return Py_BuildValue("Ki", rulesBinding, replyCount);    
     } else {
@@ -630,14 +1710,21 @@ static PyObject *pyStartRetractFacts(PyObject *self, PyObject *args) {
 
 static PyObject *pyAssertState(PyObject *self, PyObject *args) {
     void *handle;
-    char *state;
+    PyObject *stateObject;
     char *sid;
-    if (!PyArg_ParseTuple(args, "Kzs", &handle, &sid, &state)) {
+    if (!PyArg_ParseTuple(args, "KzO", &handle, &sid, &stateObject)) {
         PyErr_SetString(RulesError, "pyAssertState Invalid argument");
         return NULL;
     }
 
-    unsigned int result = assertState(handle, sid, state);
+    char *state = toJson(stateObject);
+    if (!state) {
+        return NULL;
+    }
+
+    unsigned int result;
+    RULES_CALL(handle, result = assertState(handle, sid, state));
+    free(state);
     if (result == RULES_OK || result == ERR_EVENT_NOT_HANDLED || result == ERR_EVENT_OBSERVED) {
         return Py_BuildValue("i", result);
     } else {
@@ -659,15 +1746,22 @@ static PyObject *pyAssertState(PyObject *self, PyObject *args) {
 static PyObject *pyStartUpdateState(PyObject *self, PyObject *args) {
     void *handle;
     void *actionHandle;
-    char *state;
-    if (!PyArg_ParseTuple(args, "KKs", &handle, &actionHandle, &state)) {
+    PyObject *stateObject;
+    if (!PyArg_ParseTuple(args, "KKO", &handle, &actionHandle, &stateObject)) {
         PyErr_SetString(RulesError, "pyStartUpdateState Invalid argument");
         return NULL;
     }
 
+    char *state = toJson(stateObject);
+    if (!state) {
+        return NULL;
+    }
+
     unsigned int replyCount;
     void *rulesBinding = NULL;
-    unsigned int result = startUpdateState(handle, actionHandle, state, &rulesBinding, &replyCount);
+    unsigned int result;
+    RULES_CALL(handle, result = startUpdateState(handle, actionHandle, state, &rulesBinding, &replyCount));
+    free(state);
     if (result == RULES_OK || result == ERR_EVENT_NOT_HANDLED) {
         return Py_BuildValue("Ki", rulesBinding, replyCount);    
     } else {
@@ -675,7 +1769,53 @@ static PyObject *pyStartUpdateState(PyObject *self, PyObject *args) {
             PyErr_NoMemory();
         } else { 
             char *message;
-            if (asprintf(&message, "Could not update state, error code: %d", result) == -1) {
+            if (asprintf(&message, "Could not update state, error code: %d", result) == -1) {
+                PyErr_NoMemory();
+            } else {
+                PyErr_SetString(RulesError, message);
+                free(message);
+            }
+        }
+        return NULL;
+    }
+}
+
+static PyObject *buildAction(char *state, char *messages, void *actionHandle, void *actionBinding) {
+    PyObject *stateObject = fromJson(state);
+    if (!stateObject) {
+        return NULL;
+    }
+
+    PyObject *messagesObject = fromJson(messages);
+    if (!messagesObject) {
+        Py_DECREF(stateObject);
+        return NULL;
+    }
+
+    return Py_BuildValue("NNKK", stateObject, messagesObject, actionHandle, actionBinding);
+}
+
+static PyObject *pyStartAction(PyObject *self, PyObject *args) {
+    void *handle;
+    if (!PyArg_ParseTuple(args, "K", &handle)) {
+        PyErr_SetString(RulesError, "pyStartAction Invalid argument");
+        return NULL;
+    }
+    
+    char *state;
+    char *messages;
+    void *actionHandle;
+    void *actionBinding;
+    unsigned int result;
+    RULES_CALL(handle, result = startAction(handle, &state, &messages, &actionHandle, &actionBinding));
+    if (result == ERR_NO_ACTION_AVAILABLE) {
+        Py_RETURN_NONE;
+    } else if (result != RULES_OK) {
+        if (result == ERR_OUT_OF_MEMORY) {
+            PyErr_NoMemory();
+        } else { 
+            char *message;
+            if (asprintf(&message, "Could not start action, error code: %d", result) == -1) {
                 PyErr_NoMemory();
             } else {
                 PyErr_SetString(RulesError, message);
@@ -684,28 +1824,48 @@ static PyObject *pyStartUpdateState(PyObject *self, PyObject *args) {
         }
         return NULL;
     }
+
+    return buildAction(state, messages, actionHandle, actionBinding);
 }
 
-static PyObject *pyStartAction(PyObject *self, PyObject *args) {
+static PyObject *pyStartActions(PyObject *self, PyObject *args) {
     void *handle;
-    if (!PyArg_ParseTuple(args, "K", &handle)) {
-        PyErr_SetString(RulesError, "pyStartAction Invalid argument");
+    unsigned int maxCount;
+    if (!PyArg_ParseTuple(args, "KI", &handle, &maxCount)) {
+        PyErr_SetString(RulesError, "pyStartActions Invalid argument");
         return NULL;
     }
     
-    char *state;
-    char *messages;
-    void *actionHandle;
-    void *actionBinding;
-    unsigned int result = startAction(handle, &state, &messages, &actionHandle, &actionBinding);
-    if (result == ERR_NO_ACTION_AVAILABLE) {
-        Py_RETURN_NONE;
-    } else if (result != RULES_OK) {
+    if (!maxCount) {
+        maxCount = 1;
+    }
+
+    char **states = malloc(maxCount * sizeof(char*));
+    char **messages = malloc(maxCount * sizeof(char*));
+    void **actionHandles = malloc(maxCount * sizeof(void*));
+    void **actionBindings = malloc(maxCount * sizeof(void*));
+    if (!states || !messages || !actionHandles || !actionBindings) {
+        free(states);
+        free(messages);
+        free(actionHandles);
+        free(actionBindings);
+        PyErr_NoMemory();
+        return NULL;
+    }
+
+    unsigned int actionCount = 0;
+    unsigned int result;
+    RULES_CALL(handle, result = startActions(handle, maxCount, states, messages, actionHandles, actionBindings, &actionCount));
+    if (result != RULES_OK && result != ERR_NO_ACTION_AVAILABLE) {
+        free(states);
+        free(messages);
+        free(actionHandles);
+        free(actionBindings);
         if (result == ERR_OUT_OF_MEMORY) {
             PyErr_NoMemory();
         } else { 
             char *message;
-            if (asprintf(&message, "Could not start action, error code: %d", result) == -1) {
+            if (asprintf(&message, "Could not start actions, error code: %d", result) == -1) {
                 PyErr_NoMemory();
             } else {
                 PyErr_SetString(RulesError, message);
@@ -715,20 +1875,41 @@ static PyObject *pyStartAction(PyObject *self, PyObject *args) {
         return NULL;
     }
 
-    PyObject *returnValue = Py_BuildValue("ssKK", state, messages, actionHandle, actionBinding);
+    PyObject *returnValue = PyList_New(actionCount);
+    for (unsigned int i = 0; returnValue && i < actionCount; ++i) {
+        PyObject *action = buildAction(states[i], messages[i], actionHandles[i], actionBindings[i]);
+        if (!action) {
+            Py_DECREF(returnValue);
+            returnValue = NULL;
+        } else {
+            PyList_SET_ITEM(returnValue, i, action);
+        }
+    }
+
+    free(states);
+    free(messages);
+    free(actionHandles);
+    free(actionBindings);
     return returnValue;
 }
 
 static PyObject *pyCompleteAction(PyObject *self, PyObject *args) {
     void *handle;
     void *actionHandle;
-    char *state;
-    if (!PyArg_ParseTuple(args, "KKs", &handle, &actionHandle, &state)) {
+    PyObject *stateObject;
+    if (!PyArg_ParseTuple(args, "KKO", &handle, &actionHandle, &stateObject)) {
         PyErr_SetString(RulesError, "pyCompleteAction Invalid argument");
         return NULL;
     }
 
-    unsigned int result = completeAction(handle, actionHandle, state);
+    char *state = toJson(stateObject);
+    if (!state) {
+        return NULL;
+    }
+
+    unsigned int result;
+    RULES_CALL(handle, result = completeAction(handle, actionHandle, state));
+    free(state);
     if (result != RULES_OK) {
         if (result == ERR_OUT_OF_MEMORY) {
             PyErr_NoMemory();
@@ -757,7 +1938,8 @@ static PyObject *pyCompleteAndStartAction(PyObject *self, PyObject *args) {
     }
 
     char *messages;
-    unsigned int result = completeAndStartAction(handle, expectedReplies, actionHandle, &messages);
+    unsigned int result;
+    RULES_CALL(handle, result = completeAndStartAction(handle, expectedReplies, actionHandle, &messages));
     if (result == ERR_NO_ACTION_AVAILABLE) {
         Py_RETURN_NONE;
     } if (result != RULES_OK) {
@@ -775,8 +1957,292 @@ static PyObject *pyCompleteAndStartAction(PyObject *self, PyObject *args) {
         return NULL;
     }
 
-    PyObject *returnValue = Py_BuildValue("s", messages);
-    return returnValue;
+    return fromJson(messages);
+}
+
+static int parseListItem(PyObject *item, char itemType, char *current) {
+    if (itemType == 's') {
+        return PyArg_Parse(item, "s", (char **)current);
+    } else if (itemType == 'd') {
+        commitDelete *delete = (commitDelete *)current;
+        return PyArg_ParseTuple(item, "Kz", &delete->handle, &delete->sid);
+    } else if (itemType == 't') {
+        commitTimer *timer = (commitTimer *)current;
+        PyObject *timerObject;
+        if (!PyArg_ParseTuple(item, "OIb", &timerObject, &timer->duration, &timer->manualReset)) {
+            return 0;
+        }
+
+        timer->timer = toJson(timerObject);
+        return timer->timer != NULL;
+    } else if (itemType == 'm') {
+        commitMessages *messages = (commitMessages *)current;
+        PyObject *messagesObject;
+        if (!PyArg_ParseTuple(item, "KO", &messages->handle, &messagesObject)) {
+            return 0;
+        }
+
+        if (IS_TEXT(messagesObject)) {
+            messages->messages = toJson(messagesObject);
+            return messages->messages != NULL;
+        }
+
+        return toMessages(messagesObject, &messages->objects, &messages->objectsLength);
+    } 
+
+    commitQueue *queue = (commitQueue *)current;
+    PyObject *messageObject;
+    if (!PyArg_ParseTuple(item, "zsO", &queue->sid, &queue->destination, &messageObject)) {
+        return 0;
+    }
+
+    queue->message = toJson(messageObject);
+    if (!queue->message) {
+        return 0;
+    }
+
+    switch (itemType) {
+        case 'p':
+            queue->queueAction = QUEUE_ASSERT_EVENT;
+            break;
+        case 'a':
+            queue->queueAction = QUEUE_ASSERT_FACT;
+            break;
+        default:
+            queue->queueAction = QUEUE_RETRACT_FACT;
+            break;
+    }
+
+    return 1;
+}
+
+// items are appended, so several lists can be parsed into the same array
+static int parseList(PyObject *list, 
+                     char itemType, 
+                     unsigned int itemSize, 
+                     void **items, 
+                     unsigned int *itemsLength) {
+    PyObject *sequence = PySequence_Fast(list, "Invalid argument, sequence expected");
+    if (!sequence) {
+        return 0;
+    }
+
+    Py_ssize_t length = PySequence_Fast_GET_SIZE(sequence);
+    if (length == 0) {
+        Py_DECREF(sequence);
+        return 1;
+    }
+
+    char *newItems = realloc(*items, (*itemsLength + length) * itemSize);
+    if (!newItems) {
+        Py_DECREF(sequence);
+        PyErr_NoMemory();
+        return 0;
+    }
+
+    *items = newItems;
+    memset(newItems + *itemsLength * itemSize, 0, length * itemSize);
+    for (Py_ssize_t i = 0; i < length; ++i) {
+        // a failed item is counted, so whatever it converted is freed
+        ++*itemsLength;
+        if (!parseListItem(PySequence_Fast_GET_ITEM(sequence, i), itemType, newItems + (*itemsLength - 1) * itemSize)) {
+            Py_DECREF(sequence);
+            return 0;
+        }
+    }
+
+    Py_DECREF(sequence);
+    return 1;
+}
+
+static void freeCommitMessages(commitMessages *messagesList, unsigned int messagesListLength) {
+    for (unsigned int i = 0; i < messagesListLength; ++i) {
+        free(messagesList[i].messages);
+        if (messagesList[i].objects) {
+            freeMessages(messagesList[i].objects, messagesList[i].objectsLength);
+        }
+    }
+
+    free(messagesList);
+}
+
+// the messages, states and timers were converted to json by the binding
+static void freeCommitDescriptor(commitDescriptor *descriptor) {
+    free(descriptor->state);
+    free(descriptor->cancelledTimers);
+    for (unsigned int i = 0; i < descriptor->timersLength; ++i) {
+        free(descriptor->timers[i].timer);
+    }
+
+    free(descriptor->timers);
+    for (unsigned int i = 0; i < descriptor->queuesLength; ++i) {
+        free(descriptor->queues[i].message);
+    }
+
+    free(descriptor->queues);
+    free(descriptor->deletes);
+    freeCommitMessages(descriptor->retracts, descriptor->retractsLength);
+    freeCommitMessages(descriptor->facts, descriptor->factsLength);
+    freeCommitMessages(descriptor->events, descriptor->eventsLength);
+}
+
+static int parseCommitDescriptor(PyObject *descriptorObject, commitDescriptor *descriptor) {
+    PyObject *state;
+    PyObject *cancelledTimers;
+    PyObject *timers;
+    PyObject *queuedPosts;
+    PyObject *queuedAsserts;
+    PyObject *queuedRetracts;
+    PyObject *deletes;
+    PyObject *retracts;
+    PyObject *facts;
+    PyObject *events;
+    memset(descriptor, 0, sizeof(commitDescriptor));
+    if (!PyArg_ParseTuple(descriptorObject, 
+                          "zOOOOOOOOOO", 
+                          &descriptor->sid, 
+                          &state, 
+                          &cancelledTimers, 
+                          &timers, 
+                          &queuedPosts, 
+                          &queuedAsserts, 
+                          &queuedRetracts, 
+                          &deletes, 
+                          &retracts, 
+                          &facts, 
+                          &events)) {
+        return 0;
+    }
+
+    descriptor->state = toJson(state);
+    if (!descriptor->state) {
+        return 0;
+    }
+
+    if (!parseList(cancelledTimers, 's', sizeof(char*), (void **)&descriptor->cancelledTimers, &descriptor->cancelledTimersLength) ||
+        !parseList(timers, 't', sizeof(commitTimer), (void **)&descriptor->timers, &descriptor->timersLength) ||
+        !parseList(queuedPosts, 'p', sizeof(commitQueue), (void **)&descriptor->queues, &descriptor->queuesLength) ||
+        !parseList(queuedAsserts, 'a', sizeof(commitQueue), (void **)&descriptor->queues, &descriptor->queuesLength) ||
+        !parseList(queuedRetracts, 'r', sizeof(commitQueue), (void **)&descriptor->queues, &descriptor->queuesLength) ||
+        !parseList(deletes, 'd', sizeof(commitDelete), (void **)&descriptor->deletes, &descriptor->deletesLength) ||
+        !parseList(retracts, 'm', sizeof(commitMessages), (void **)&descriptor->retracts, &descriptor->retractsLength) ||
+        !parseList(facts, 'm', sizeof(commitMessages), (void **)&descriptor->facts, &descriptor->factsLength) ||
+        !parseList(events, 'm', sizeof(commitMessages), (void **)&descriptor->events, &descriptor->eventsLength)) {
+        freeCommitDescriptor(descriptor);
+        return 0;
+    }
+
+    return 1;
+}
+
+static int compareHandles(const void *left, const void *right) {
+    void *leftHandle = *(void **)left;
+    void *rightHandle = *(void **)right;
+    if (leftHandle == rightHandle) {
+        return 0;
+    }
+
+    return leftHandle < rightHandle ? -1 : 1;
+}
+
+// a commit also writes to the rulesets of its deletes and messages, 
+// their locks are taken in address order so commits cannot deadlock
+static int getCommitHandles(void *handle, 
+                            commitDescriptor *descriptor, 
+                            void ***handles, 
+                            unsigned int *handlesLength) {
+    *handles = malloc((1 + descriptor->deletesLength + descriptor->retractsLength + 
+                       descriptor->factsLength + descriptor->eventsLength) * sizeof(void*));
+    if (!*handles) {
+        PyErr_NoMemory();
+        return 0;
+    }
+
+    unsigned int length = 0;
+    (*handles)[length++] = handle;
+    for (unsigned int i = 0; i < descriptor->deletesLength; ++i) {
+        (*handles)[length++] = descriptor->deletes[i].handle;
+    }
+
+    for (unsigned int i = 0; i < descriptor->retractsLength; ++i) {
+        (*handles)[length++] = descriptor->retracts[i].handle;
+    }
+
+    for (unsigned int i = 0; i < descriptor->factsLength; ++i) {
+        (*handles)[length++] = descriptor->facts[i].handle;
+    }
+
+    for (unsigned int i = 0; i < descriptor->eventsLength; ++i) {
+        (*handles)[length++] = descriptor->events[i].handle;
+    }
+
+    qsort(*handles, length, sizeof(void*), compareHandles);
+    *handlesLength = 1;
+    for (unsigned int i = 1; i < length; ++i) {
+        if ((*handles)[i] != (*handles)[*handlesLength - 1]) {
+            (*handles)[(*handlesLength)++] = (*handles)[i];
+        }
+    }
+
+    return 1;
+}
+
+static PyObject *pyCommitAction(PyObject *self, PyObject *args) {
+    void *handle;
+    void *actionHandle;
+    PyObject *descriptorObject;
+    if (!PyArg_ParseTuple(args, "KKO", &handle, &actionHandle, &descriptorObject)) {
+        PyErr_SetString(RulesError, "pyCommitAction Invalid argument");
+        return NULL;
+    }
+
+    commitDescriptor descriptor;
+    if (!parseCommitDescriptor(descriptorObject, &descriptor)) {
+        if (!PyErr_Occurred()) {
+            PyErr_SetString(RulesError, "pyCommitAction Invalid argument");
+        }
+        return NULL;
+    }
+
+    void **handles;
+    unsigned int handlesLength;
+    if (!getCommitHandles(handle, &descriptor, &handles, &handlesLength)) {
+        freeCommitDescriptor(&descriptor);
+        return NULL;
+    }
+
+    char *messages;
+    unsigned int result;
+    Py_BEGIN_ALLOW_THREADS
+    for (unsigned int i = 0; i < handlesLength; ++i) {
+        lockRuleset(handles[i]);
+    }
+
+    result = commitAction(handle, actionHandle, &descriptor, &messages);
+    for (unsigned int i = handlesLength; i > 0; --i) {
+        unlockRuleset(handles[i - 1]);
+    }
+    Py_END_ALLOW_THREADS
+    free(handles);
+    freeCommitDescriptor(&descriptor);
+    if (result == ERR_NO_ACTION_AVAILABLE) {
+        Py_RETURN_NONE;
+    } if (result != RULES_OK) {
+        if (result == ERR_OUT_OF_MEMORY) {
+            PyErr_NoMemory();
+        } else { 
+            char *message;
+            if (asprintf(&message, "Could not commit action, error code: %d", result) == -1) {
+                PyErr_NoMemory();
+            } else {
+                PyErr_SetString(RulesError, message);
+                free(message);
+            }
+        }
+        return NULL;
+    }
+
+    return fromJson(messages);
 }
 
 static PyObject *pyAbandonAction(PyObject *self, PyObject *args) {
@@ -787,7 +2253,8 @@ static PyObject *pyAbandonAction(PyObject *self, PyObject *args) {
         return NULL;
     }
 
-    unsigned int result = abandonAction(handle, actionHandle);
+    unsigned int result;
+    RULES_CALL(handle, result = abandonAction(handle, actionHandle));
     if (result != RULES_OK) {
         if (result == ERR_OUT_OF_MEMORY) {
             PyErr_NoMemory();
@@ -811,13 +2278,20 @@ static PyObject *pyStartTimer(PyObject *self, PyObject *args) {
     char *sid;
     int duration = 0;
     char manualReset = 0;
-    char *timer = NULL;   
-    if (!PyArg_ParseTuple(args, "Kibsz", &handle, &duration, &manualReset, &timer, &sid)) {
+    PyObject *timerObject;
+    if (!PyArg_ParseTuple(args, "KibOz", &handle, &duration, &manualReset, &timerObject, &sid)) {
         PyErr_SetString(RulesError, "pyStartTimer Invalid argument");
         return NULL;
     }
 
-    unsigned int result = startTimer(handle, sid, duration, manualReset, timer);
+    char *timer = toJson(timerObject);
+    if (!timer) {
+        return NULL;
+    }
+
+    unsigned int result;
+    RULES_CALL(handle, result = startTimer(handle, sid, duration, manualReset, timer));
+    free(timer);
     if (result != RULES_OK) {
         if (result == ERR_OUT_OF_MEMORY) {
             PyErr_NoMemory();
@@ -845,7 +2319,8 @@ static PyObject *pyCancelTimer(PyObject *self, PyObject *args) {
         return NULL;
     }
 
-    unsigned int result = cancelTimer(handle, sid, timerName);
+    unsigned int result;
+    RULES_CALL(handle, result = cancelTimer(handle, sid, timerName));
     if (result != RULES_OK) {
         if (result == ERR_OUT_OF_MEMORY) {
             PyErr_NoMemory();
@@ -866,12 +2341,14 @@ static PyObject *pyCancelTimer(PyObject *self, PyObject *args) {
 
 static PyObject *pyAssertTimers(PyObject *self, PyObject *args) {
     void *handle;
-    if (!PyArg_ParseTuple(args, "K", &handle)) {
+    unsigned int maxCount = 50;
+    if (!PyArg_ParseTuple(args, "K|I", &handle, &maxCount)) {
         PyErr_SetString(RulesError, "pyAssertTimers Invalid argument");
         return NULL;
     }
 
-    unsigned int result = assertTimers(handle);
+    unsigned int result;
+    RULES_CALL(handle, result = assertTimers(handle, maxCount));
     if (result == RULES_OK) {
         return Py_BuildValue("i", 1);    
     } else if (result == ERR_NO_TIMERS_AVAILABLE) {
@@ -892,6 +2369,38 @@ static PyObject *pyAssertTimers(PyObject *self, PyObject *args) {
     }
 }
 
+static PyObject *pyWaitAction(PyObject *self, PyObject *args) {
+    void *handle;
+    unsigned int timeout = 0;
+    if (!PyArg_ParseTuple(args, "KI", &handle, &timeout)) {
+        PyErr_SetString(RulesError, "pyWaitAction Invalid argument");
+        return NULL;
+    }
+
+    unsigned int result;
+    Py_BEGIN_ALLOW_THREADS
+    result = waitAction(handle, timeout);
+    Py_END_ALLOW_THREADS
+    if (result == RULES_OK) {
+        return Py_BuildValue("i", 1);    
+    } else if (result == ERR_NO_ACTION_AVAILABLE) {
+        return Py_BuildValue("i", 0);    
+    } else {
+        if (result == ERR_OUT_OF_MEMORY) {
+            PyErr_NoMemory();
+        } else { 
+            char *message;
+            if (asprintf(&message, "Could not wait for action, error code: %d", result) == -1) {
+                PyErr_NoMemory();
+            } else {
+                PyErr_SetString(RulesError, message);
+                free(message);
+            }
+        }
+        return NULL;
+    }
+}
+
 static PyObject *pyGetState(PyObject *self, PyObject *args) {
     void *handle;
     char *sid;
@@ -901,7 +2410,8 @@ static PyObject *pyGetState(PyObject *self, PyObject *args) {
     }
 
     char *state;
-    unsigned int result = getState(handle, sid, &state);
+    unsigned int result;
+    RULES_CALL(handle, result = getState(handle, sid, &state));
     if (result != RULES_OK) {
         if (result == ERR_OUT_OF_MEMORY) {
             PyErr_NoMemory();
@@ -916,7 +2426,7 @@ static PyObject *pyGetState(PyObject *self, PyObject *args) {
         }
         return NULL;
     }
-    PyObject *returnValue = Py_BuildValue("s", state);
+    PyObject *returnValue = fromJson(state);
     free(state);
     return returnValue;
 }
@@ -929,7 +2439,8 @@ static PyObject *pyDeleteState(PyObject *self, PyObject *args) {
         return NULL;
     }
 
-    unsigned int result = deleteState(handle, sid);
+    unsigned int result;
+    RULES_CALL(handle, result = deleteState(handle, sid));
     if (result != RULES_OK) {
         if (result == ERR_OUT_OF_MEMORY) {
             PyErr_NoMemory();
@@ -948,6 +2459,136 @@ static PyObject *pyDeleteState(PyObject *self, PyObject *args) {
      Py_RETURN_NONE;
 }
 
+static PyObject *pyDeleteStates(PyObject *self, PyObject *args) {
+    void *handle;
+    PyObject *sidList;
+    if (!PyArg_ParseTuple(args, "KO", &handle, &sidList)) {
+        PyErr_SetString(RulesError, "pyDeleteStates Invalid argument");
+        return NULL;
+    }
+
+    char **sids = NULL;
+    unsigned int sidsLength = 0;
+    if (!parseList(sidList, 's', sizeof(char*), (void **)&sids, &sidsLength)) {
+        free(sids);
+        if (!PyErr_Occurred()) {
+            PyErr_SetString(RulesError, "pyDeleteStates Invalid argument");
+        }
+        return NULL;
+    }
+
+    unsigned int result;
+    RULES_CALL(handle, result = deleteStates(handle, sids, sidsLength));
+    free(sids);
+    if (result != RULES_OK) {
+        if (result == ERR_OUT_OF_MEMORY) {
+            PyErr_NoMemory();
+        } else { 
+            char *message;
+            if (asprintf(&message, "Could not delete states, error code: %d", result) == -1) {
+                PyErr_NoMemory();
+            } else {
+                PyErr_SetString(RulesError, message);
+                free(message);
+            }
+        }
+        return NULL;
+    }
+
+    Py_RETURN_NONE;
+}
+
+static PyObject *pySetStateCache(PyObject *self, PyObject *args) {
+    void *handle;
+    unsigned char policy;
+    unsigned int bucketsLength;
+    if (!PyArg_ParseTuple(args, "KbI", &handle, &policy, &bucketsLength)) {
+        PyErr_SetString(RulesError, "pySetStateCache Invalid argument");
+        return NULL;
+    }
+
+    unsigned int result;
+    RULES_CALL(handle, result = setStateCache(handle, policy, bucketsLength));
+    if (result != RULES_OK) {
+        if (result == ERR_OUT_OF_MEMORY) {
+            PyErr_NoMemory();
+        } else { 
+            char *message;
+            if (asprintf(&message, "Could not set state cache, error code: %d", result) == -1) {
+                PyErr_NoMemory();
+            } else {
+                PyErr_SetString(RulesError, message);
+                free(message);
+            }
+        }
+        return NULL;
+    }
+
+    Py_RETURN_NONE;
+}
+
+static PyObject *pyGetStateCacheStats(PyObject *self, PyObject *args) {
+    void *handle;
+    if (!PyArg_ParseTuple(args, "K", &handle)) {
+        PyErr_SetString(RulesError, "pyGetStateCacheStats Invalid argument");
+        return NULL;
+    }
+
+    unsigned int result;
+    stateCacheStats stats;
+    RULES_CALL(handle, result = getStateCacheStats(handle, &stats));
+    if (result != RULES_OK) {
+        char *message;
+        if (asprintf(&message, "Could not get state cache stats, error code: %d", result) == -1) {
+            PyErr_NoMemory();
+        } else {
+            PyErr_SetString(RulesError, message);
+            free(message);
+        }
+        return NULL;
+    }
+
+    return Py_BuildValue("{s:b,s:I,s:I,s:I,s:I,s:I,s:I,s:I,s:I,s:I}", 
+                         "policy", stats.policy,
+                         "hits", stats.hits,
+                         "misses", stats.misses,
+                         "evictions", stats.evictions,
+                         "rejections", stats.rejections,
+                         "entries", stats.entries,
+                         "capacity", stats.capacity,
+                         "buckets", stats.buckets,
+                         "used_buckets", stats.usedBuckets,
+                         "max_chain_length", stats.maxChainLength);
+}
+
+static PyObject *pyGetTimerStats(PyObject *self, PyObject *args) {
+    void *handle;
+    if (!PyArg_ParseTuple(args, "K", &handle)) {
+        PyErr_SetString(RulesError, "pyGetTimerStats Invalid argument");
+        return NULL;
+    }
+
+    unsigned int result;
+    timerStats stats;
+    RULES_CALL(handle, result = getTimerStats(handle, &stats));
+    if (result != RULES_OK) {
+        char *message;
+        if (asprintf(&message, "Could not get timer stats, error code: %d", result) == -1) {
+            PyErr_NoMemory();
+        } else {
+            PyErr_SetString(RulesError, message);
+            free(message);
+        }
+        return NULL;
+    }
+
+    return Py_BuildValue("{s:I,s:I,s:L,s:I}", 
+                         "fired", stats.fired,
+                         "batches", stats.batches,
+                         "next_timer", stats.nextTimer,
+                         "dequeued", stats.dequeued);
+}
+
 static PyObject *pyRenewActionLease(PyObject *self, PyObject *args) {
     void *handle;
     char *sid;
@@ -956,7 +2597,8 @@ static PyObject *pyRenewActionLease(PyObject *self, PyObject *args) {
         return NULL;
     }
 
-    unsigned int result = renewActionLease(handle, sid);
+    unsigned int result;
+    RULES_CALL(handle, result = renewActionLease(handle, sid));
     if (result != RULES_OK) {
         if (result == ERR_OUT_OF_MEMORY) {
             PyErr_NoMemory();
@@ -974,12 +2616,57 @@ static PyObject *pyRenewActionLease(PyObject *self, PyObject *args) {
     Py_RETURN_NONE;
 }
 
+static PyObject *pyRenewActionLeases(PyObject *self, PyObject *args) {
+    void *handle;
+    PyObject *sidList;
+    if (!PyArg_ParseTuple(args, "KO", &handle, &sidList)) {
+        PyErr_SetString(RulesError, "pyRenewActionLeases Invalid argument");
+        return NULL;
+    }
+
+    char **sids = NULL;
+    unsigned int sidsLength = 0;
+    if (!parseList(sidList, 's', sizeof(char*), (void **)&sids, &sidsLength)) {
+        free(sids);
+        if (!PyErr_Occurred()) {
+            PyErr_SetString(RulesError, "pyRenewActionLeases Invalid argument");
+        }
+        return NULL;
+    }
+
+    unsigned int result;
+    RULES_CALL(handle, result = renewActionLeases(handle, sids, sidsLength));
+    free(sids);
+    if (result != RULES_OK) {
+        if (result == ERR_OUT_OF_MEMORY) {
+            PyErr_NoMemory();
+        } else { 
+            char *message;
+            if (asprintf(&message, "Could not renew action leases, error code: %d", result) == -1) {
+                PyErr_NoMemory();
+            } else {
+                PyErr_SetString(RulesError, message);
+                free(message);
+            }
+        }
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
 static PyMethodDef myModule_methods[] = {
     {"create_ruleset", pyCreateRuleset, METH_VARARGS},
     {"delete_ruleset", pyDeleteRuleset, METH_VARARGS},
     {"create_client", pyCreateClient, METH_VARARGS},
     {"delete_client", pyDeleteClient, METH_VARARGS},
     {"bind_ruleset", pyBindRuleset, METH_VARARGS},
+    {"set_partition", pySetPartition, METH_VARARGS},
+    {"set_partition_migration", pySetPartitionMigration, METH_VARARGS},
+    {"set_connection_pool", pySetConnectionPool, METH_VARARGS},
+    {"set_state_cache", pySetStateCache, METH_VARARGS},
+    {"get_state_cache_stats", pyGetStateCacheStats, METH_VARARGS},
+    {"get_timer_stats", pyGetTimerStats, METH_VARARGS},
+    {"get_partition", pyGetPartition, METH_VARARGS},
     {"complete", pyComplete, METH_VARARGS},
     {"assert_event", pyAssertEvent, METH_VARARGS},
     {"queue_assert_event", pyQueueAssertEvent, METH_VARARGS},
@@ -1000,15 +2687,20 @@ static PyMethodDef myModule_methods[] = {
     {"assert_state", pyAssertState, METH_VARARGS},
     {"start_update_state", pyStartUpdateState, METH_VARARGS},
     {"start_action", pyStartAction, METH_VARARGS},
+    {"start_actions", pyStartActions, METH_VARARGS},
     {"complete_action", pyCompleteAction, METH_VARARGS},
     {"complete_and_start_action", pyCompleteAndStartAction, METH_VARARGS},
+    {"commit_action", pyCommitAction, METH_VARARGS},
     {"abandon_action", pyAbandonAction, METH_VARARGS},
     {"start_timer", pyStartTimer, METH_VARARGS},
     {"cancel_timer", pyCancelTimer, METH_VARARGS},
     {"assert_timers", pyAssertTimers, METH_VARARGS},
+    {"wait_action", pyWaitAction, METH_VARARGS},
     {"get_state", pyGetState, METH_VARARGS},
     {"delete_state", pyDeleteState, METH_VARARGS},
+    {"delete_states", pyDeleteStates, METH_VARARGS},
     {"renew_action_lease", pyRenewActionLease, METH_VARARGS},
+    {"renew_action_leases", pyRenewActionLeases, METH_VARARGS},
     {NULL, NULL}
 };
 
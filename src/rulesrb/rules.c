@@ -580,10 +580,11 @@ static VALUE rbCancelTimer(VALUE self, VALUE handle, VALUE sid, VALUE timerName)
     return Qnil;
 }
 
-static VALUE rbAssertTimers(VALUE self, VALUE handle) {
+static VALUE rbAssertTimers(VALUE self, VALUE handle, VALUE maxCount) {
     Check_Type(handle, T_FIXNUM);
+    Check_Type(maxCount, T_FIXNUM);
 
-    unsigned int result = assertTimers((void *)FIX2LONG(handle));
+    unsigned int result = assertTimers((void *)FIX2LONG(handle), FIX2UINT(maxCount));
     if (result == RULES_OK) {
         return INT2FIX(1);    
     } else if (result == ERR_NO_TIMERS_AVAILABLE) {
@@ -599,6 +600,26 @@ static VALUE rbAssertTimers(VALUE self, VALUE handle) {
     return Qnil;
 }
 
+static VALUE rbGetTimerStats(VALUE self, VALUE handle) {
+    Check_Type(handle, T_FIXNUM);
+
+    timerStats stats;
+    unsigned int result = getTimerStats((void *)FIX2LONG(handle), &stats);
+    if (result != RULES_OK) {
+        if (result == ERR_OUT_OF_MEMORY) {
+            rb_raise(rb_eNoMemError, "Out of memory");
+        } else { 
+            rb_raise(rb_eException, "Could not get timer stats, error code: %d", result);
+        }
+    }
+
+    VALUE output = rb_hash_new(); 
+    rb_hash_aset(output, ID2SYM(rb_intern("fired")), UINT2NUM(stats.fired));
+    rb_hash_aset(output, ID2SYM(rb_intern("batches")), UINT2NUM(stats.batches));
+    rb_hash_aset(output, ID2SYM(rb_intern("next_timer")), LL2NUM(stats.nextTimer));
+    return output;
+}
+
 static VALUE rbGetState(VALUE self, VALUE handle, VALUE sid) {
     Check_Type(handle, T_FIXNUM);
     Check_Type(sid, T_STRING);
@@ -682,7 +703,8 @@ void Init_rules() {
     rb_define_singleton_method(rulesModule, "abandon_action", rbAbandonAction, 2);
     rb_define_singleton_method(rulesModule, "start_timer", rbStartTimer, 5);
     rb_define_singleton_method(rulesModule, "cancel_timer", rbCancelTimer, 3);
-    rb_define_singleton_method(rulesModule, "assert_timers", rbAssertTimers, 1);
+    rb_define_singleton_method(rulesModule, "assert_timers", rbAssertTimers, 2);
+    rb_define_singleton_method(rulesModule, "get_timer_stats", rbGetTimerStats, 1);
     rb_define_singleton_method(rulesModule, "get_state", rbGetState, 2);
     rb_define_singleton_method(rulesModule, "delete_state", rbDeleteState, 2);
     rb_define_singleton_method(rulesModule, "renew_action_lease", rbRenewActionLease, 2);
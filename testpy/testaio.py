@@ -0,0 +1,23 @@
+from durable import aio
+from testhosts import approve, wait_approved
+import asyncio
+
+async def approve_async(c):
+    await asyncio.sleep(0.1)
+    approve(c)
+
+print('async1 *****')
+host = aio.AsyncHost({'async1': {
+    'r1': {
+        'all': [{'m': {'$lte': {'amount': 1000}}}],
+        'run': approve_async
+    }
+}}, concurrency = 4)
+host.run()
+sids = [str(i) for i in range(4)]
+for sid in sids:
+    host.post('async1', {'id': 1, 'sid': sid, 'amount': 100})
+    host.post('async1', {'id': 2, 'sid': sid, 'amount': 300})
+    host.post('async1', {'id': 3, 'sid': sid, 'amount': 3000})
+
+wait_approved(host, 'async1', sids, 8)
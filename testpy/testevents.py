@@ -1,5 +1,8 @@
 import rules
 import json
+import redis
+import threading
+import time
 
 print('books1 *****')
 handle = rules.create_ruleset(5, 'books1',  json.dumps({
@@ -49,8 +52,8 @@ rules.assert_event(handle, json.dumps({
 }))
 result = rules.start_action(handle)
 
-print(repr(json.loads(result[0])))
-print(repr(json.loads(result[1])))
+print(repr(result[0]))
+print(repr(result[1]))
 
 rules.complete_action(handle, result[2], result[0])
 rules.delete_ruleset(handle)
@@ -98,8 +101,8 @@ rules.assert_event(handle, json.dumps({
 
 result = rules.start_action(handle)
 
-print(repr(json.loads(result[0])))
-print(repr(json.loads(result[1])))
+print(repr(result[0]))
+print(repr(result[1]))
 
 rules.complete_action(handle, result[2], result[0])
 rules.delete_ruleset(handle)
@@ -123,8 +126,8 @@ rules.assert_event(handle, json.dumps({
 
 result = rules.start_action(handle)
 
-print(repr(json.loads(result[0])))
-print(repr(json.loads(result[1])))
+print(repr(result[0]))
+print(repr(result[1]))
 
 rules.complete_action(handle, result[2], result[0])
 rules.delete_ruleset(handle)
@@ -155,8 +158,8 @@ rules.assert_events(handle, json.dumps([
 
 result = rules.start_action(handle)
 
-print(repr(json.loads(result[0])))
-print(repr(json.loads(result[1])))
+print(repr(result[0]))
+print(repr(result[1]))
 
 rules.complete_action(handle, result[2], result[0])
 rules.delete_ruleset(handle)
@@ -194,8 +197,8 @@ rules.assert_event(handle, json.dumps({
 
 result = rules.start_action(handle)
 
-print(repr(json.loads(result[0])))
-print(repr(json.loads(result[1])))
+print(repr(result[0]))
+print(repr(result[1]))
 
 rules.complete_action(handle, result[2], result[0])
 rules.delete_ruleset(handle)
@@ -233,8 +236,8 @@ rules.assert_event(handle, json.dumps({
 
 result = rules.start_action(handle)
 
-print(repr(json.loads(result[0])))
-print(repr(json.loads(result[1])))
+print(repr(result[0]))
+print(repr(result[1]))
 
 rules.complete_action(handle, result[2], result[0])
 
@@ -252,8 +255,8 @@ rules.assert_event(handle, json.dumps({
 
 result = rules.start_action(handle)
 
-print(repr(json.loads(result[0])))
-print(repr(json.loads(result[1])))
+print(repr(result[0]))
+print(repr(result[1]))
 
 rules.delete_ruleset(handle)
 
@@ -297,26 +300,255 @@ rules.assert_events(handle, json.dumps([{
 result = rules.start_action(handle)
 
 if result:
-    print(repr(json.loads(result[0])))
-    print(repr(json.loads(result[1])))
+    print(repr(result[0]))
+    print(repr(result[1]))
 
 rules.complete_action(handle, result[2], result[0])
 
 result = rules.start_action(handle)
 
 if result:
-    print(repr(json.loads(result[0])))
-    print(repr(json.loads(result[1])))
+    print(repr(result[0]))
+    print(repr(result[1]))
 
 rules.complete_action(handle, result[2], result[0])
 
 result = rules.start_action(handle)
 
 if result:
-    print(repr(json.loads(result[0])))
-    print(repr(json.loads(result[1])))
+    print(repr(result[0]))
+    print(repr(result[1]))
 
 rules.complete_action(handle, result[2], result[0])
 
 rules.delete_ruleset(handle)
 
+print('wake1 ******')
+
+handle = rules.create_ruleset(5, 'wake1',  json.dumps({
+    'r1': {
+        'all': [{'m': {'kind': 'order'}}]
+    }
+}))
+rules.bind_ruleset(6379,  0, "localhost", None, handle)
+
+# a post rings the doorbell of a dispatcher blocked in wait_action
+waits = []
+def wait_action():
+    start = time.time()
+    waits.append((rules.wait_action(handle, 10), time.time() - start))
+
+waiter = threading.Thread(target = wait_action)
+waiter.start()
+time.sleep(0.5)
+rules.assert_event(handle, json.dumps({'id': 1, 'sid': 'first', 'kind': 'order'}))
+waiter.join()
+print('woken {0} before timeout {1}'.format(waits[0][0], waits[0][1] < 2))
+assert waits[0][0] == 1 and waits[0][1] < 2
+
+result = rules.start_action(handle)
+print(repr(result[1]))
+rules.complete_action(handle, result[2], result[0])
+
+print('waited {0}'.format(rules.wait_action(handle, 1)))
+rules.delete_ruleset(handle)
+
+print('batch1 ******')
+
+handle = rules.create_ruleset(5, 'batch1',  json.dumps({
+    'r1': {
+        'all': [{'m': {'kind': 'order'}}]
+    }
+}))
+rules.bind_ruleset(6379,  0, "localhost", None, handle)
+
+for sid in ['first', 'second', 'third']:
+    rules.assert_event(handle, json.dumps({'id': 1, 'sid': sid, 'kind': 'order'}))
+
+# each start_actions call leases at most max count sessions
+leased = []
+for max_count in [2, 2]:
+    results = rules.start_actions(handle, max_count)
+    print('leased {0}'.format(len(results)))
+    for result in results:
+        leased.append(result[0]['sid'])
+        rules.complete_action(handle, result[2], result[0])
+
+print(repr(sorted(leased)))
+assert sorted(leased) == ['first', 'second', 'third']
+print(repr(rules.start_actions(handle, 2)))
+
+rules.delete_ruleset(handle)
+
+print('commit1 ******')
+
+handle = rules.create_ruleset(5, 'commit1',  json.dumps({
+    'r1': {
+        'all': [{'m': {'kind': 'order'}}]
+    },
+    'r2': {
+        'all': [{'m': {'kind': 'shipped'}}]
+    }
+}))
+rules.bind_ruleset(6379,  0, "localhost", None, handle)
+
+rules.assert_event(handle, json.dumps({'id': 1, 'sid': 'first', 'kind': 'order'}))
+result = rules.start_action(handle)
+state = result[0]
+print(repr(result[1]))
+
+# the state and the posted events are written in one call, 
+# which returns the next action of the session
+state['status'] = 'ordered'
+next_messages = rules.commit_action(handle, result[2], (state['sid'], 
+                                                        json.dumps(state), 
+                                                        [], 
+                                                        [], 
+                                                        [], 
+                                                        [], 
+                                                        [], 
+                                                        [], 
+                                                        [], 
+                                                        [], 
+                                                        [(handle, json.dumps([{'id': 2, 'sid': 'first', 'kind': 'shipped'}]))]))
+
+print(repr(next_messages))
+assert 'r2' in next_messages
+print(repr(rules.commit_action(handle, result[2], (state['sid'], json.dumps(state), [], [], [], [], [], [], [], [], []))))
+state = rules.get_state(handle, 'first')
+print(repr(state['status']))
+assert state['status'] == 'ordered'
+print(repr(rules.start_actions(handle, 10)))
+
+rules.delete_ruleset(handle)
+
+print('delete1 ******')
+
+handle = rules.create_ruleset(5, 'delete1',  json.dumps({
+    'r1': {
+        'all': [{'m': {'kind': 'order'}}]
+    }
+}))
+rules.bind_ruleset(6379,  0, "localhost", None, handle)
+
+for sid in ['first', 'second', 'third']:
+    rules.assert_state(handle, sid, json.dumps({'sid': sid, 'status': 'open'}))
+
+rules.delete_states(handle, ['first', 'second'])
+for sid in ['first', 'second']:
+    try:
+        rules.get_state(handle, sid)
+        assert False
+    except rules.error as error:
+        print('deleted {0}: {1}'.format(sid, str(error)))
+
+print(repr(rules.get_state(handle, 'third')['status']))
+
+rules.delete_ruleset(handle)
+
+print('cache1 ******')
+
+handle = rules.create_ruleset(2, 'cache1',  json.dumps({
+    'r1': {
+        'all': [{'m': {'kind': 'set'}}]
+    }
+}))
+# clock policy, 4 hash buckets
+rules.set_state_cache(handle, 1, 4)
+rules.bind_ruleset(6379,  0, "localhost", None, handle)
+
+for i in range(4):
+    rules.assert_state(handle, str(i), json.dumps({'sid': str(i), 'n': i}))
+
+print(repr(rules.get_state(handle, '3')))
+print(repr(rules.get_state(handle, '0')))
+stats = rules.get_state_cache_stats(handle)
+print('policy {0} capacity {1} buckets {2} entries {3}'.format(stats['policy'], stats['capacity'], stats['buckets'], stats['entries']))
+print('hits {0} evictions {1}'.format(stats['hits'] > 0, stats['evictions'] > 0))
+assert stats['policy'] == 1 and stats['capacity'] == 2 and stats['entries'] == 2
+assert stats['hits'] > 0 and stats['evictions'] > 0
+
+rules.delete_ruleset(handle)
+
+print('timers1 ******')
+
+handle = rules.create_ruleset(5, 'timers1',  json.dumps({
+    'r1': {
+        'all': [{'m': {'$t': 'expired'}}]
+    },
+    'r2': {
+        'all': [{'m': {'$t': 'legacy'}}]
+    }
+}))
+
+# a timer scored in seconds by an earlier version fires on time as well
+legacy_timer = json.dumps({'sid': 'second', 'id': 'legacy', '$t': 'legacy'})
+redis.Redis().execute_command('zadd', 'timers1!t', int(time.time()) + 3, 'p:' + legacy_timer)
+rules.bind_ruleset(6379,  0, "localhost", None, handle)
+
+rules.start_timer(handle, 2, False, json.dumps({'sid': 'first', 'id': 'expired', '$t': 'expired'}), 'first')
+for i in range(2):
+    rules.assert_timers(handle)
+    stats = rules.get_timer_stats(handle)
+    print('fired {0} scheduled {1}'.format(stats['fired'], stats['next_timer'] > time.time() * 1000))
+    assert stats['fired'] == 0 and stats['next_timer'] > time.time() * 1000
+    time.sleep(1)
+
+time.sleep(2)
+while rules.assert_timers(handle):
+    pass
+
+stats = rules.get_timer_stats(handle)
+print('fired {0}'.format(stats['fired']))
+assert stats['fired'] == 2
+
+expired = []
+for result in rules.start_actions(handle, 10):
+    expired.append(result[1])
+    rules.complete_action(handle, result[2], result[0])
+
+expired.sort(key = lambda messages: list(messages.keys())[0])
+print(repr(expired))
+assert len(expired) == 2
+
+rules.delete_ruleset(handle)
+
+print('objects1 ******')
+
+# dicts and lists are passed to the engine without json text
+handle = rules.create_ruleset(5, 'objects1', {
+    'r1': {
+        'all': [{'m': {'$and': [{'kind': 'order'}, {'$gt': {'detail.amount': 100}}]}}]
+    },
+    'r2': {
+        'all': [{'m': {'$and': [{'kind': 'shipped'}, {'paid': True}]}}]
+    }
+})
+rules.bind_ruleset(6379,  0, "localhost", None, handle)
+
+rules.assert_event(handle, {'id': 1, 'sid': 'first', 'kind': 'order', 'detail': {'amount': 150.5, 'item': u'caf\xe9 au lait'}})
+rules.assert_events(handle, [{'id': 2, 'sid': 'second', 'kind': 'order', 'detail': {'amount': 50}}, 
+                             {'id': 3, 'sid': 'second', 'kind': 'order', 'detail': {'amount': 500}, 'tags': ['a', 1, 2.5]}])
+orders = []
+shipped = []
+for result in rules.start_actions(handle, 10):
+    orders.append(result[1]['r1']['m'])
+    state = result[0]
+    state['status'] = 'ordered'
+    next_messages = rules.commit_action(handle, result[2], (state['sid'], state, [], [], [], [], [], [], [], [], 
+                                                            [(handle, [{'id': 4, 'sid': state['sid'], 'kind': 'shipped', 'paid': True}])]))
+    shipped.append(next_messages['r2']['m']['sid'])
+    rules.commit_action(handle, result[2], (state['sid'], state, [], [], [], [], [], [], [], [], []))
+
+orders.sort(key = lambda order: order['id'])
+print(repr(orders))
+assert len(orders) == 2
+assert orders[0]['detail'] == {'amount': 150.5, 'item': u'caf\xe9 au lait'}
+assert orders[1]['tags'] == ['a', 1, 2.5]
+
+shipped.sort()
+print(repr(shipped))
+assert shipped == ['first', 'second']
+print(repr(rules.get_state(handle, 'first')['status']))
+
+rules.delete_ruleset(handle)
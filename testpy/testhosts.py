@@ -0,0 +1,82 @@
+from durable import engine
+import sys
+import time
+
+def approve(c):
+    c.s.approved = c.s.approved + 1 if c.s.approved else 1
+    print('{0} approved {1} {2}'.format(c.ruleset_name, c.m.sid, c.m.amount))
+    sys.stdout.flush()
+
+def define_partition1():
+    return {'partition1': {
+        'r1': {
+            'all': [{'m': {'$lte': {'amount': 1000}}}],
+            'run': approve
+        }
+    }}
+
+def wait_approved(host, ruleset_name, sids, count):
+    for i in range(100):
+        approved = 0
+        for sid in sids:
+            try:
+                approved += host.get_state(ruleset_name, sid).get('approved', 0)
+            except BaseException:
+                pass
+
+        if approved == count:
+            break
+
+        time.sleep(0.1)
+
+    print('{0} approved {1}'.format(ruleset_name, approved))
+    assert approved == count
+
+def test_partitioned_host():
+    print('partition1 *****')
+    host = engine.PartitionedHost(define_partition1, processes = 2)
+    sids = [str(i) for i in range(4)]
+    for sid in sids:
+        host.post('partition1', {'id': 1, 'sid': sid, 'amount': 100})
+        host.post('partition1', {'id': 2, 'sid': sid, 'amount': 10000})
+
+    host.post_batch('partition1', [{'id': 3, 'sid': sid, 'amount': 200} for sid in sids])
+    wait_approved(host, 'partition1', sids, 8)
+    host.delete_states('partition1', sids)
+    for sid in sids:
+        deleted = False
+        try:
+            host.get_state('partition1', sid)
+        except BaseException:
+            deleted = True
+
+        print('partition1 deleted {0} {1}'.format(sid, deleted))
+        assert deleted
+
+    unsupported = False
+    try:
+        host.start_post('partition1', {'id': 4, 'sid': '0', 'amount': 100})
+    except BaseException:
+        unsupported = True
+
+    print('partition1 start_post unsupported {0}'.format(unsupported))
+    assert unsupported
+
+    stats = host.get_timer_stats('partition1')
+    print('partition1 timer stats {0}'.format(stats['fired']))
+    assert stats['fired'] == 0
+
+    host.set_ruleset('partition2', {'partition2': {
+        'r1': {
+            'all': [{'m': {'$lte': {'amount': 1000}}}],
+            'run': approve
+        }
+    }})
+    for sid in sids:
+        host.post('partition2', {'id': 1, 'sid': sid, 'amount': 100})
+
+    wait_approved(host, 'partition2', sids, 4)
+    host.close()
+
+if __name__ == '__main__':
+    test_partitioned_host()
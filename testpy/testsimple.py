@@ -733,6 +733,22 @@ with ruleset('a16'):
         host.post('a16', {'id': 2, 'sid': 1, 'amount': None})
 
 
+deep_amount = sref().max_amount
+for i in range(24):
+    deep_amount = sref().max_amount + deep_amount
+
+with ruleset('a17'):
+    @when_all(m.amount == deep_amount)
+    def approved(c):
+        print ('a17 approved {0}'.format(c.m.amount))
+
+    @when_start
+    def start(host):
+        host.patch_state('a17', {'sid': 1, 'max_amount': 2})
+        host.post('a17', {'id': 1, 'sid': 1, 'amount': 48})
+        host.post('a17', {'id': 2, 'sid': 1, 'amount': 50})
+
+
 with ruleset('t1'): 
     @when_all(m.start == 'yes')
     def start_timer(c):
@@ -828,4 +844,34 @@ with ruleset('q0'):
         host.post('q0', {'id': 1, 'sid': 1, 'start': 'yes'})
 
 
+with ruleset('d0'):
+    @when_all(m.start == 'yes')
+    def start_state(c):
+        c.post('d0_1', {'id': 1, 'sid': 'x', 'store': 'yes', 'value': 1})
+
+    @when_all(m.stored == 'yes')
+    def delete_state(c):
+        c.delete('d0_1', 'x')
+        c.post({'id': 3, 'sid': 1, 'deleted': 'yes'})
+
+    @when_all(m.deleted == 'yes')
+    def recreate_state(c):
+        c.post('d0_1', {'id': 2, 'sid': 'x', 'check': 'yes'})
+
+    @when_start
+    def start(host):
+        host.post('d0', {'id': 1, 'sid': 1, 'start': 'yes'})
+
+
+with ruleset('d0_1'):
+    @when_all(m.store == 'yes')
+    def store(c):
+        c.s.value = c.m.value
+        c.post('d0', {'id': 2, 'sid': 1, 'stored': 'yes'})
+
+    @when_all(m.check == 'yes')
+    def check(c):
+        print('d0_1 recreated value {0}'.format(c.s.value))
+
+
 run_all()